@@ -1,625 +1,1196 @@
-from flask import Flask, request, jsonify
-import numpy as np, time
-from ortools.constraint_solver import pywrapcp, routing_enums_pb2
-from traffic_manager import TrafficAPIManager
+from flask import Flask, Response, request, jsonify, stream_with_context
+import numpy as np, time, os, threading, json, queue, logging
+from osrm_cache import DurationCache
+from payload import POINT_KEYS, PayloadError, count_points, encode, read_body, validate_points, wants_compact
+from osrm_client import CircuitBreaker, OSRMError, OSRMTableClient
+from batch import run_batch
+from colocation import merge_colocated
+from decomposition import solve_decomposed
+from experiments import PROVIDERS, ExperimentJobs, ExperimentQueueFullError, run_experiment, summarize
+from heuristics import solve_fast
+from hybrid_matrix import DetourCalibration, HybridMatrixProvider, solve_hybrid
+from jobs import PlanJobs, QueueFullError, SharedJobCounts, SolverPool
+from incremental import ArcCosts, apply_changes
+from matrices import HaversineLookup, KnnDistanceModel, haversine_matrix
+from portfolio import parse_configs, rank_configs, solve_portfolio
+from profiling import ProfileDumper, parse_profile
+from recorder import TrafficRecorder
+from solution_cache import SolutionCache, fingerprint
+from time_budget import ConvergenceHistory
+from time_matrices import TimeMatrixStore, seconds_of_day, solve_time_dependent
+from telemetry import INVALID_POINTS, OSRM_ERRORS, PHASE_SECONDS, REGISTRY, configure_logging, record_solution
+from vrp_solver import COST_KINDS, solve_vrp, solve_vrp_sparse
+from warmup import Readiness
 
 app = Flask(__name__)
 
-def haversine_matrix(coords):
-    R = 6371000.0
-    lat = np.radians(np.array([c[0] for c in coords], dtype=np.float64))
-    lon = np.radians(np.array([c[1] for c in coords], dtype=np.float64))
-    dlat = lat[:, None] - lat[None, :]
-    dlon = lon[:, None] - lon[None, :]
-    a = np.sin(dlat/2.0)**2 + np.cos(lat)[:,None]*np.cos(lat)[None,:]*np.sin(dlon/2.0)**2
-    return (2.0 * R * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))).astype(np.int64)
-
-def solve_vrp(matrix, n_vehicles, time_limit_ms=4500):
-    solve_start = time.perf_counter()
-    print(f"Iniciando VRP: {matrix.shape[0]} puntos, {n_vehicles} vehículos, {time_limit_ms}ms límite")
-    
-    n = matrix.shape[0]
-    manager = pywrapcp.RoutingIndexManager(n, n_vehicles, 0)
-    routing = pywrapcp.RoutingModel(manager)
-
-    def dist_cb(f, t):
-        i, j = manager.IndexToNode(f), manager.IndexToNode(t)
-        return int(matrix[i, j])
-
-    cb_index = routing.RegisterTransitCallback(dist_cb)
-    routing.SetArcCostEvaluatorOfAllVehicles(cb_index)
-
-    if n > n_vehicles and n_vehicles > 1:
-        customers = n - 1
-        max_capacity = max(1, (customers + n_vehicles - 1) // n_vehicles)
-        
-        def demand_cb(idx):
-            return 1 if manager.IndexToNode(idx) != 0 else 0
-        
-        demand_cb_index = routing.RegisterUnaryTransitCallback(demand_cb)
-        routing.AddDimensionWithVehicleCapacity(
-            demand_cb_index, 0, [max_capacity] * n_vehicles, True, 'Capacity'
-        )
-
-    params = pywrapcp.DefaultRoutingSearchParameters()
-    if n_vehicles > 1:
-        params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
-    else:
-        params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-    
-    params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-    params.time_limit.FromMilliseconds(time_limit_ms)
-    params.log_search = False
-
-    print(f"Configuración VRP: strategy={params.first_solution_strategy}, metaheuristic={params.local_search_metaheuristic}")
-    
-    sol = routing.SolveWithParameters(params)
-    solve_time = (time.perf_counter() - solve_start) * 1000
-    
-    print(f"VRP resuelto en {solve_time:.0f}ms (límite: {time_limit_ms}ms)")
-    
-    routes = []
-    total = 0
-    if sol:
-        print(f"Solución encontrada - Status: {routing.status()}")
-        for v in range(n_vehicles):
-            idx = routing.Start(v)
-            path = []
-            dist = 0
-            customers_served = 0
-            while not routing.IsEnd(idx):
-                node = manager.IndexToNode(idx)
-                path.append(node)
-                if node != 0:
-                    customers_served += 1
-                prev = idx
-                idx = sol.Value(routing.NextVar(idx))
-                dist += routing.GetArcCostForVehicle(prev, idx, v)
-            path.append(manager.IndexToNode(idx))
-            routes.append({
-                "vehicle": v, 
-                "stops": path, 
-                "distance_m": dist,
-                "customers_served": customers_served
-            })
-            total += dist
-            if customers_served > 0:
-                print(f"   Vehículo {v}: {customers_served} clientes, {dist}m")
+# Logs JSON estructurados; LOG_LEVEL=DEBUG para ver el detalle del camino crítico
+configure_logging()
+log = logging.getLogger("asr04")
+
+# Caché persistente de duraciones OSRM; OSRM_CACHE_PATH vacío la desactiva. El desalojo (TTL y
+# tope de filas) corre cada OSRM_CACHE_EVICT_EVERY celdas escritas o cada OSRM_CACHE_EVICT_INTERVAL_S
+OSRM_CACHE_PATH = os.environ.get(
+    "OSRM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "osrm_durations.sqlite")
+)
+osrm_cache = DurationCache(
+    OSRM_CACHE_PATH,
+    precision=int(os.environ.get("OSRM_CACHE_PRECISION", 5)),
+    ttl_s=float(os.environ.get("OSRM_CACHE_TTL_S", 7 * 24 * 3600)),
+    max_entries=int(os.environ.get("OSRM_CACHE_MAX_ENTRIES", 2_000_000)),
+    evict_every=int(os.environ.get("OSRM_CACHE_EVICT_EVERY", 100_000)),
+    evict_interval_s=float(os.environ.get("OSRM_CACHE_EVICT_INTERVAL_S", 300)),
+) if OSRM_CACHE_PATH else None
+
+# Cliente OSRM compartido: sesión keep-alive y pool de hilos para los bloques de la tabla
+osrm_client = OSRMTableClient(
+    base_url=os.environ.get("OSRM_BASE_URL", "http://router.project-osrm.org"),
+    tile_size=int(os.environ.get("OSRM_TILE_SIZE", 100)),
+    max_workers=int(os.environ.get("OSRM_MAX_WORKERS", 8)),
+    timeout_s=float(os.environ.get("OSRM_TIMEOUT_S", 30)),
+    retries=int(os.environ.get("OSRM_TILE_RETRIES", 2)),
+)
+
+# Circuito hacia OSRM y respaldo haversine; OSRM_FALLBACK_SPEED_KMH vacío desactiva el respaldo (HTTP 500)
+osrm_breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get("OSRM_BREAKER_FAILURES", 3)),
+    slow_call_s=float(os.environ.get("OSRM_BREAKER_SLOW_MS", 2000)) / 1000,
+    reset_after_s=float(os.environ.get("OSRM_BREAKER_RESET_S", 30)),
+)
+OSRM_FALLBACK_SPEED_KMH = float(os.environ.get("OSRM_FALLBACK_SPEED_KMH", 30) or 0) or None
+# Parte del SLO reservada para resolver: la consulta a OSRM solo recibe lo que queda antes de eso
+OSRM_SOLVE_RESERVE_MS = int(os.environ.get("OSRM_SOLVE_RESERVE_MS", 1000))
+
+# Matriz híbrida: estimación calibrada por región + OSRM solo para vecinos y arcos de la solución
+HYBRID_KNN = int(os.environ.get("HYBRID_KNN", 10))
+hybrid_calibration = DetourCalibration(prior_speed_kmh=OSRM_FALLBACK_SPEED_KMH or 30.0)
+
+def make_traffic_manager(fallback=True):
+    # Import diferido: el camino solo haversine no carga el gestor OSRM (ni requests, ver OSRMTableClient.session)
+    from traffic_manager import TrafficAPIManager
+    return TrafficAPIManager(cache=osrm_cache, client=osrm_client, breaker=osrm_breaker,
+                             fallback_speed_kmh=OSRM_FALLBACK_SPEED_KMH if fallback else None)
+
+# Workers web del host (gunicorn.conf.py exporta los suyos); los pools resolutores se reparten entre ellos
+WEB_CONCURRENCY = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+
+# Procesos resolutores de todo el host para /routes/jobs: cada worker web arranca su parte en el primer uso.
+# SOLVER_POOL_MAX_PENDING acota los trabajos activos sumando todos los workers web
+SOLVER_POOL_WORKERS = int(os.environ.get("SOLVER_POOL_WORKERS", os.cpu_count() or 1))
+SOLVER_POOL_WORKERS_PER_WEB = max(1, SOLVER_POOL_WORKERS // WEB_CONCURRENCY)
+SOLVER_POOL_MAX_PENDING = int(os.environ.get("SOLVER_POOL_MAX_PENDING", SOLVER_POOL_WORKERS * 4))
+# Se crea en el import: con preload_app es el maestro y los workers web heredan la misma memoria
+plan_job_counts = SharedJobCounts(slots=2 * WEB_CONCURRENCY + 2)
+_plan_jobs = None
+_plan_jobs_lock = threading.Lock()
+
+def get_plan_jobs():
+    global _plan_jobs
+    with _plan_jobs_lock:
+        if _plan_jobs is None:
+            _plan_jobs = PlanJobs(SolverPool(SOLVER_POOL_WORKERS_PER_WEB), max_pending=SOLVER_POOL_MAX_PENDING,
+                                  counts=plan_job_counts)
+    return _plan_jobs
+
+# Arranque del pool resolutor al iniciar cada worker web, en un hilo aparte para que no retrase el
+# calentamiento ni /health/ready; SOLVER_POOL_PRESTART=0 lo deja para el primer uso
+SOLVER_POOL_PRESTART = os.environ.get("SOLVER_POOL_PRESTART", "1") != "0"
+
+def prestart_plan_jobs():
+    if SOLVER_POOL_PRESTART:
+        threading.Thread(target=get_plan_jobs, name="solver-pool-start", daemon=True).start()
+
+# Pool aparte para experimentos (/debug/compare-haversine-vs-osrm): no compite con /routes/jobs.
+# También es por worker web: EXPERIMENT_POOL_WORKERS es el total del host
+EXPERIMENT_POOL_WORKERS = int(os.environ.get("EXPERIMENT_POOL_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+EXPERIMENT_MAX_PENDING = int(os.environ.get("EXPERIMENT_MAX_PENDING", 2))
+EXPERIMENT_MAX_RUNS = int(os.environ.get("EXPERIMENT_MAX_RUNS", 200))
+_experiment_pool = None
+_experiment_jobs = None
+
+def get_experiment_pool():
+    global _experiment_pool
+    with _plan_jobs_lock:
+        if _experiment_pool is None:
+            _experiment_pool = SolverPool(max(1, EXPERIMENT_POOL_WORKERS // WEB_CONCURRENCY))
+    return _experiment_pool
+
+def get_experiment_jobs():
+    global _experiment_jobs
+    pool = get_experiment_pool()
+    with _plan_jobs_lock:
+        if _experiment_jobs is None:
+            _experiment_jobs = ExperimentJobs(lambda: pool, max_pending=EXPERIMENT_MAX_PENDING)
+    return _experiment_jobs
+
+# Historial de ganadores del modo portafolio, para afinar el portafolio por defecto
+PORTFOLIO_HISTORY_PATH = os.environ.get(
+    "PORTFOLIO_HISTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "portfolio_history.jsonl")
+)
+
+# Modo de descomposición (agrupar primero, resolver por región)
+DECOMPOSE_MAX_POINTS = int(os.environ.get("DECOMPOSE_MAX_POINTS", 5000))
+DECOMPOSE_CLUSTER_SIZE = int(os.environ.get("DECOMPOSE_CLUSTER_SIZE", 120))
+
+# Modelo de distancias disperso (k vecinos más cercanos)
+SPARSE_MAX_POINTS = int(os.environ.get("SPARSE_MAX_POINTS", 5000))
+SPARSE_KNN = int(os.environ.get("SPARSE_KNN", 20))
+# Hasta este tamaño los costos k-NN van en una matriz de tránsito nativa; por encima, por callback Python
+SPARSE_NATIVE_MAX_POINTS = int(os.environ.get("SPARSE_NATIVE_MAX_POINTS", 1000))
+
+# Modo rápido ("mode": "fast"): heurística vectorizada sin OR-Tools; límite por defecto en ms
+FAST_TIME_LIMIT_MS = int(os.environ.get("FAST_TIME_LIMIT_MS", 50))
+
+# Lotes (/routes/plan/batch): máximo de problemas por solicitud y presupuesto global de CPU (ms, 0 = sin tope)
+BATCH_MAX_PROBLEMS = int(os.environ.get("BATCH_MAX_PROBLEMS", 500))
+BATCH_CPU_BUDGET_MS = int(os.environ.get("BATCH_CPU_BUDGET_MS", 0))
+BATCH_MIN_TIME_LIMIT_MS = int(os.environ.get("BATCH_MIN_TIME_LIMIT_MS", 200))
+
+# Paradas co-ubicadas ("merge_colocated") se resuelven como un super-nodo; radio por defecto en metros
+COLOCATION_RADIUS_M = float(os.environ.get("COLOCATION_RADIUS_M", 10))
+
+# Caché de soluciones por huella de la solicitud (con deduplicación de solicitudes concurrentes)
+solution_cache = SolutionCache(
+    ttl_s=float(os.environ.get("SOLUTION_CACHE_TTL_S", 60)),
+    max_entries=int(os.environ.get("SOLUTION_CACHE_MAX_ENTRIES", 256)),
+)
+
+# Límite de tiempo "auto": el menor que el historial de convergencia espera suficiente, dentro del SLO
+PLAN_SLO_MS = int(os.environ.get("PLAN_SLO_MS", 5000))
+AUTO_TL_MARGIN_MS = int(os.environ.get("AUTO_TL_MARGIN_MS", 300))
+AUTO_TL_TOLERANCE_PCT = float(os.environ.get("AUTO_TL_TOLERANCE_PCT", 1.0))
+CONVERGENCE_HISTORY_PATH = os.environ.get(
+    "CONVERGENCE_HISTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "convergence_history.jsonl")
+)
+convergence_history = ConvergenceHistory(CONVERGENCE_HISTORY_PATH or None)
+
+# Matrices por franja horaria (cubos mapeados en memoria) para conjuntos de paradas recurrentes;
+# TIME_MATRIX_DIR vacío las desactiva
+TIME_MATRIX_DIR = os.environ.get(
+    "TIME_MATRIX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "time_matrices")
+)
+TIME_MATRIX_BUCKET_MIN = int(os.environ.get("TIME_MATRIX_BUCKET_MIN", 15))
+TIME_MATRIX_ROUNDS = int(os.environ.get("TIME_MATRIX_ROUNDS", 2))
+# Opciones de plan-with-osmr que la resolución por franjas no implementa (se usa la matriz OSRM)
+TIME_MATRIX_UNSUPPORTED = ("portfolio", "early_stop", "profile", "initial_solution")
+time_matrix_store = TimeMatrixStore(TIME_MATRIX_DIR, bucket_minutes=TIME_MATRIX_BUCKET_MIN) if TIME_MATRIX_DIR else None
+
+# Perfilado opt-in ("profile": {"dump": true}): instancias y trazas para análisis offline; vacío lo desactiva
+PROFILE_DIR = os.environ.get(
+    "PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "profiles")
+)
+profile_dumper = ProfileDumper(PROFILE_DIR) if PROFILE_DIR else None
+
+# Grabación opt-in de /routes/plan y /routes/plan-with-osmr para repetirla offline (benchmarks/replay.py);
+# RECORD_SAMPLE_RATE es la fracción de solicitudes grabadas (0 = desactivada)
+RECORD_SAMPLE_RATE = float(os.environ.get("RECORD_SAMPLE_RATE", 0))
+RECORD_DIR = os.environ.get(
+    "RECORD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "recordings")
+)
+traffic_recorder = TrafficRecorder(
+    RECORD_DIR, RECORD_SAMPLE_RATE, max_records=int(os.environ.get("RECORD_MAX_RECORDS", 10_000))
+) if RECORD_SAMPLE_RATE > 0 else None
+
+# Calentamiento por proceso (resolución sintética) antes de declararse listo; WARMUP_ENABLED=0 lo omite
+readiness = Readiness(enabled=os.environ.get("WARMUP_ENABLED", "1") != "0")
+
+class MatrixProviderError(Exception):
+    pass
+
+def cached_plan(provider, coords, vehicles, tl_ms, data, compute, extra_key=None):
+    # "use_cache": false fuerza una resolución nueva; el resto de opciones forma parte de la huella.
+    # Un perfil describe la búsqueda de esta solicitud: nunca sale de la caché
+    if not data.get("use_cache", True) or data.get("profile") or solution_cache.max_entries <= 0:
+        return compute(), "bypass"
+    options = {k: v for k, v in data.items() if k not in POINT_KEYS + ("vehicles", "time_limit_ms", "use_cache", "response_format")}
+    if extra_key:
+        options.update(extra_key)
+    # tl_ms None (modo "auto") entra a la huella como 0
+    key = fingerprint(provider, coords, vehicles, tl_ms or 0, options)
+    return solution_cache.get_or_compute(key, compute)
+
+def run_solver(data, matrix, vehicles, tl_ms, cost_kind, ids, auto=None, colocation=None):
+    # "portfolio": true (portafolio por defecto) o lista de configuraciones explícitas
+    portfolio = data.get("portfolio")
+    demands = colocation.demands if colocation is not None else None
+    if data.get("mode") == "fast":
+        res = solve_fast(matrix, vehicles, time_limit_ms=tl_ms, cost_kind=cost_kind, demands=demands)
+    elif portfolio:
+        configs = parse_configs(portfolio)
+        res = solve_portfolio(get_plan_jobs().pool, matrix, vehicles, time_limit_ms=tl_ms, cost_kind=cost_kind,
+                              configs=configs, history_path=PORTFOLIO_HISTORY_PATH or None)
     else:
-        print(f"No se encontró solución - Status: {routing.status()}")
-    
-    result = {
-        "routes": routes, 
-        "total_distance_m": total, 
-        "solution_found": sol is not None,
-        "solver_info": {
-            "actual_solve_time_ms": int(solve_time),
-            "time_limit_used_ms": time_limit_ms,
-            "solver_status": routing.status(),
-            "time_limit_reached": solve_time >= time_limit_ms * 0.95
-        }
+        previous = parse_previous_plan(data, ids)
+        if colocation is not None and previous:
+            previous["initial_routes"] = colocation.reduce_routes(previous["initial_routes"])
+        seed = None
+        # "initial_solution": "fast" arranca OR-Tools desde la heurística (si no hay previous_plan)
+        if data.get("initial_solution") == "fast" and not previous:
+            seed = solve_fast(matrix, vehicles, time_limit_ms=FAST_TIME_LIMIT_MS, cost_kind=cost_kind, demands=demands)
+            previous = {"initial_routes": [[s for s in r["stops"] if s != 0] for r in seed["routes"]]}
+            # La semilla sale del mismo límite: OR-Tools busca el resto
+            tl_ms = max(1, tl_ms - seed["solver_info"]["actual_solve_time_ms"])
+        res = solve_vrp(matrix, vehicles, time_limit_ms=tl_ms, cost_kind=cost_kind, record_trace=auto is not None,
+                        demands=demands, profile=parse_profile(data) is not None, **parse_early_stop(data), **previous)
+        if seed is not None:
+            res["solver_info"]["fast_seed"] = {
+                "objective": seed[COST_KINDS[cost_kind]["total_key"]],
+                "solve_ms": seed["solver_info"]["actual_solve_time_ms"],
+                "search_ms": res["solver_info"]["actual_solve_time_ms"],
+            }
+    if auto is not None:
+        record_convergence(res, matrix.shape[0], vehicles, auto)
+    if colocation is not None:
+        colocation.expand(res)
+    return res
+
+def finish_profile(endpoint, data, res, matrix, coords, timings):
+    # Completa solver_info.profile con las fases de la solicitud y, si se pidió, guarda la instancia
+    info = res["solver_info"].get("profile")
+    if info is None:
+        return
+    info.update(timings)
+    if parse_profile(data)["dump"]:
+        if profile_dumper is None:
+            info["dump_error"] = "profile dumps are disabled (PROFILE_DIR)"
+        else:
+            options = {k: v for k, v in data.items() if k not in POINT_KEYS}
+            info["dump_id"] = profile_dumper.dump(endpoint, matrix, coords, options, res, timings)
+
+def record_request(endpoint, data, capture, cache_status, out):
+    # Solo lo que esta solicitud resolvió: un acierto de caché no dice nada del resolutor
+    if capture is not None and cache_status in ("miss", "bypass"):
+        traffic_recorder.submit(endpoint, data, capture, out)
+
+def parse_mode(data):
+    # "mode": "full" (OR-Tools) | "fast" (heurística); "initial_solution": "fast" siembra OR-Tools
+    mode = data.get("mode", "full")
+    if mode not in ("full", "fast"):
+        raise ValueError("mode must be 'full' or 'fast'")
+    if data.get("initial_solution") not in (None, "fast"):
+        raise ValueError("initial_solution must be 'fast'")
+    return mode
+
+def parse_portfolio(data):
+    # "portfolio": true | [{"first_solution", "metaheuristic", "seed"}, ...]; nombres de los enums de OR-Tools
+    portfolio = data.get("portfolio")
+    return parse_configs(portfolio) if portfolio else None
+
+def parse_decompose(data):
+    # "decompose": true | {"method": "sweep"|"kmeans", "cluster_size": N}; None = sin descomposición
+    decompose = data.get("decompose")
+    if not decompose:
+        return None
+    options = decompose if isinstance(decompose, dict) else {}
+    method = options.get("method", "sweep")
+    cluster_size = int(options.get("cluster_size", DECOMPOSE_CLUSTER_SIZE))
+    if method not in ("sweep", "kmeans"):
+        raise ValueError("decompose.method must be 'sweep' or 'kmeans'")
+    if not (10 <= cluster_size <= 500):
+        raise ValueError("decompose.cluster_size must be 10..500")
+    return {"method": method, "cluster_size": cluster_size}
+
+def parse_colocation(data):
+    # "merge_colocated": true (radio por defecto) | {"radius_m": N}; None = sin reducción
+    merge = data.get("merge_colocated")
+    if not merge:
+        return None
+    radius = float(merge.get("radius_m", COLOCATION_RADIUS_M)) if isinstance(merge, dict) else COLOCATION_RADIUS_M
+    if not (0 <= radius <= 500):
+        raise ValueError("merge_colocated.radius_m must be 0..500")
+    return radius
+
+def parse_time_limit(data, default):
+    # "time_limit_ms": "auto" -> None; el límite se decide tras medir validación y matriz
+    value = data.get("time_limit_ms", default)
+    return None if value == "auto" else int(value)
+
+def resolve_time_limit(data, tl_ms, t0, n_points, vehicles):
+    """Devuelve (límite, decisión auto o None); el presupuesto es lo que queda del SLO desde t0."""
+    if tl_ms is not None:
+        return tl_ms, None
+    budget_ms = PLAN_SLO_MS - (time.perf_counter() - t0) * 1000 - AUTO_TL_MARGIN_MS
+    tolerance_pct = float(data.get("auto_tolerance_pct", AUTO_TL_TOLERANCE_PCT))
+    auto = convergence_history.choose(n_points, vehicles, budget_ms, tolerance_pct)
+    return auto["time_limit_ms"], auto
+
+def record_convergence(res, n_points, vehicles, auto):
+    # Solo curvas de búsquedas completas: el corte temprano y el arranque en caliente las deforman
+    info = res["solver_info"]
+    curve = info.pop("convergence", None)
+    if curve and not info.get("early_stopped") and not info.get("warm_start"):
+        convergence_history.record(n_points, vehicles, auto["time_limit_ms"], auto["reference"], curve)
+    info["auto_time_limit"] = {k: v for k, v in auto.items() if k != "reference"}
+
+def filter_valid_points(data):
+    # Filtrar puntos con coordenadas válidas (máscaras vectorizadas, formato objetos o columnar)
+    coords, valid_ids, invalid = validate_points(data)
+    invalid_count = 0
+    for reason, mask in invalid.items():
+        count = int(mask.sum())
+        if count:
+            INVALID_POINTS.inc(count, reason=reason)
+            invalid_count += count
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Puntos inválidos", extra={"fields": {"reason": reason, "indices": np.flatnonzero(mask)[:20].tolist()}})
+
+    if invalid_count > 0:
+        log.debug("Puntos inválidos filtrados", extra={"fields": {"invalid": invalid_count, "valid": len(coords)}})
+    return coords, valid_ids, invalid_count
+
+def read_plan_body():
+    # JSON (objetos o columnar), msgpack u octet-stream con pares float64; ver payload.read_body
+    data = read_body(request)
+    return data, count_points(data)
+
+def plan_response(data, out):
+    body, mimetype = encode(request, out, compact=wants_compact(request, data))
+    if body is None:
+        return jsonify(out), 200
+    return Response(body, mimetype=mimetype)
+
+def parse_early_stop(data):
+    # {"early_stop": {"stall_ms": X, "min_improvement_pct": Y}} -> kwargs de solve_vrp
+    early_stop = data.get("early_stop") or {}
+    if not early_stop:
+        return {}
+    return {
+        "stall_ms": int(early_stop.get("stall_ms", 1000)),
+        "min_improvement_pct": float(early_stop.get("min_improvement_pct", 0.5)),
     }
-    
-    if sol:
-        active_vehicles = sum(1 for route in routes if len(route["stops"]) > 2)
-        result["active_vehicles"] = active_vehicles
-        result["vehicle_utilization"] = active_vehicles / n_vehicles
-    
-    return result
-
-def solve_vrp_with_traffic(time_matrix: np.ndarray, n_vehicles: int, time_limit_ms: int = 4500):
-    solve_start = time.perf_counter()
-    print(f"Iniciando VRP con tráfico: {time_matrix.shape[0]} puntos, {n_vehicles} vehículos, {time_limit_ms}ms límite")
-    
-    n = time_matrix.shape[0]
-    manager = pywrapcp.RoutingIndexManager(n, n_vehicles, 0)
-    routing = pywrapcp.RoutingModel(manager)
-
-    def time_cb(f, t):
-        i, j = manager.IndexToNode(f), manager.IndexToNode(t)
-        return int(time_matrix[i, j])
-
-    cb_index = routing.RegisterTransitCallback(time_cb)
-    routing.SetArcCostEvaluatorOfAllVehicles(cb_index)
-
-    if n > n_vehicles and n_vehicles > 1:
-        customers = n - 1
-        max_capacity = max(1, (customers + n_vehicles - 1) // n_vehicles)
-        
-        def demand_cb(idx):
-            return 1 if manager.IndexToNode(idx) != 0 else 0
-        
-        demand_cb_index = routing.RegisterUnaryTransitCallback(demand_cb)
-        routing.AddDimensionWithVehicleCapacity(
-            demand_cb_index, 0, [max_capacity] * n_vehicles, True, 'Capacity'
-        )
-
-    params = pywrapcp.DefaultRoutingSearchParameters()
-    if n_vehicles > 1:
-        params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
-    else:
-        params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-    
-    params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-    params.time_limit.FromMilliseconds(time_limit_ms)
-    params.log_search = False
-
-    print(f"Configuración VRP-Traffic: strategy={params.first_solution_strategy}, metaheuristic={params.local_search_metaheuristic}")
-    
-    sol = routing.SolveWithParameters(params)
-    solve_time = (time.perf_counter() - solve_start) * 1000
-    
-    print(f"VRP-Traffic resuelto en {solve_time:.0f}ms (límite: {time_limit_ms}ms)")
-    
-    routes = []
-    total_time = 0
-    
-    if sol:
-        print(f"Solución con tráfico encontrada - Status: {routing.status()}")
-        for v in range(n_vehicles):
-            idx = routing.Start(v)
-            path = []
-            route_time = 0
-            customers_served = 0
-            
-            while not routing.IsEnd(idx):
-                node = manager.IndexToNode(idx)
-                path.append(node)
-                if node != 0:
-                    customers_served += 1
-                prev = idx
-                idx = sol.Value(routing.NextVar(idx))
-                route_time += routing.GetArcCostForVehicle(prev, idx, v)
-            
-            path.append(manager.IndexToNode(idx))
-            routes.append({
-                "vehicle": v, 
-                "stops": path, 
-                "travel_time_s": route_time,
-                "travel_time_h": round(route_time / 3600, 2),
-                "customers_served": customers_served
-            })
-            total_time += route_time
-            if customers_served > 0:
-                print(f"   Vehículo {v}: {customers_served} clientes, {route_time}s ({round(route_time/3600, 2)}h)")
+
+def parse_previous_plan(data, ids):
+    """Traduce previous_plan (listas de IDs de punto por vehículo) a nodos del nuevo conjunto.
+
+    Acepta {"routes": [[id, ...], ...], "objective": N} o directamente la lista de rutas.
+    Los IDs sin punto en la nueva solicitud se descartan; el depósito se ignora.
+    """
+    previous_plan = data.get("previous_plan")
+    if not previous_plan:
+        return {}
+    if isinstance(previous_plan, dict):
+        routes = previous_plan.get("routes", [])
+        target = previous_plan.get("objective")
     else:
-        print(f"No se encontró solución con tráfico - Status: {routing.status()}")
-    
-    result = {
-        "routes": routes, 
-        "total_travel_time_s": total_time,
-        "total_travel_time_h": round(total_time / 3600, 2),
-        "solution_found": sol is not None,
-        "solver_info": {
-            "actual_solve_time_ms": int(solve_time),
-            "time_limit_used_ms": time_limit_ms,
-            "solver_status": routing.status(),
-            "time_limit_reached": solve_time >= time_limit_ms * 0.95
-        }
-    }
-    
-    if sol:
-        active_vehicles = sum(1 for route in routes if len(route["stops"]) > 2)
-        result["active_vehicles"] = active_vehicles
-        result["vehicle_utilization"] = active_vehicles / n_vehicles
-    
-    return result
-
-def get_customer_assignments(routes):
-    assignments = {}
+        routes, target = previous_plan, None
+
+    node_of = {str(pid): node for node, pid in enumerate(ids)}
+    initial_routes = []
+    dropped = 0
     for route in routes:
-        vehicle = route["vehicle"]
-        for stop in route["stops"]:
-            if stop != 0:
-                assignments[stop] = vehicle
-    return assignments
+        stops = route.get("stops", []) if isinstance(route, dict) else route
+        nodes = []
+        for pid in stops:
+            node = node_of.get(str(pid))
+            if node is None:
+                dropped += 1
+            elif node != 0:
+                nodes.append(node)
+        initial_routes.append(nodes)
+    if dropped:
+        log.debug("previous_plan: paradas sin punto en la nueva solicitud", extra={"fields": {"dropped": dropped}})
+    return {
+        "initial_routes": initial_routes,
+        "target_objective": int(target) if target is not None else None,
+    }
+
+def build_traffic_info(traffic_result, departure_time):
+    info = {
+        "provider": traffic_result['provider_used'],
+        "has_realtime_traffic": traffic_result['has_realtime_traffic'],
+        "departure_time": departure_time,
+        "matrix_calculation_ms": traffic_result['calculation_time_ms'],
+        "cache_hit_ratio": traffic_result['cache_hit_ratio'],
+        "osrm_cells_fetched": traffic_result['osrm_cells_fetched']
+    }
+    if 'fallback_reason' in traffic_result:
+        info["fallback_reason"] = traffic_result['fallback_reason']
+        info["fallback_speed_kmh"] = traffic_result['fallback_speed_kmh']
+    return info
+
+def record_plan_metrics(endpoint, validate_s, total_s, computed, cache_status, matrix_key):
+    # Las fases de matriz y resolución solo existen si esta solicitud las ejecutó (no en aciertos de caché)
+    PHASE_SECONDS.observe(validate_s, endpoint=endpoint, phase="validate")
+    PHASE_SECONDS.observe(total_s, endpoint=endpoint, phase="total")
+    if cache_status in ("miss", "bypass"):
+        PHASE_SECONDS.observe(computed[matrix_key] / 1000, endpoint=endpoint, phase="matrix")
+        PHASE_SECONDS.observe(computed["solve_ms"] / 1000, endpoint=endpoint, phase="solve")
+        record_solution(endpoint, computed["solution"])
 
 @app.post("/routes/plan")
 def plan():
     t0 = time.perf_counter()
-    data = request.get_json(force=True)
+    try:
+        data, n_points = read_plan_body()
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
 
     vehicles = int(data.get("vehicles", 1))
-    points = data.get("points", [])
-    tl_ms = int(data.get("time_limit_ms", 3500))
-    
-    print(f"DEBUG: Recibidos {len(points)} puntos originales")
-    
+    tl_ms = parse_time_limit(data, FAST_TIME_LIMIT_MS if data.get("mode") == "fast" else 3500)
+    # "decompose" (ver parse_decompose) levanta el tope de 150 puntos
+    decompose = data.get("decompose")
+    # "distance_model": "sparse" usa k vecinos ("knn") con índice espacial en vez de la matriz N x N
+    distance_model = data.get("distance_model", "dense")
+    if distance_model not in ("dense", "sparse"):
+        return jsonify({"error": "distance_model must be 'dense' or 'sparse'"}), 400
+    max_points = DECOMPOSE_MAX_POINTS if decompose else SPARSE_MAX_POINTS if distance_model == "sparse" else 150
+
+    try:
+        mode = parse_mode(data)
+        merge_radius = parse_colocation(data)
+        parse_portfolio(data)
+        decompose = parse_decompose(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if merge_radius is not None and (decompose or distance_model == "sparse" or data.get("portfolio")):
+        return jsonify({"error": "merge_colocated requires the dense matrix (no decompose, sparse or portfolio)"}), 400
+    if mode == "fast" and (decompose or distance_model == "sparse" or data.get("portfolio")):
+        return jsonify({"error": "mode 'fast' requires the dense matrix (no decompose, sparse or portfolio)"}), 400
+    # El historial de "auto" solo aprende de curvas de la matriz densa: las demás búsquedas no se comparan
+    if tl_ms is None and (decompose or distance_model == "sparse"):
+        return jsonify({"error": "time_limit_ms 'auto' requires the dense matrix (no decompose or sparse)"}), 400
+
     if not (1 <= vehicles <= 20):
         return jsonify({"error": "vehicles must be 1..20"}), 400
-    if not (3 <= len(points) <= 150):
-        return jsonify({"error": "points must be 3..150"}), 400
+    if not (3 <= n_points <= max_points):
+        return jsonify({"error": f"points must be 3..{max_points}"}), 400
 
-    # Filtrar puntos con coordenadas válidas
-    valid_coords = []
-    invalid_count = 0
-    for i, p in enumerate(points):
-        if p.get("lat") is not None and p.get("lng") is not None:
-            try:
-                lat = float(p["lat"])
-                lng = float(p["lng"])
-                if -90 <= lat <= 90 and -180 <= lng <= 180:
-                    valid_coords.append((lat, lng))
-                else:
-                    print(f"DEBUG: Punto {i} con coordenadas inválidas: lat={lat}, lng={lng}")
-                    invalid_count += 1
-            except (ValueError, TypeError):
-                print(f"DEBUG: Punto {i} con coordenadas no numéricas: lat={p.get('lat')}, lng={p.get('lng')}")
-                invalid_count += 1
-        else:
-            print(f"DEBUG: Punto {i} con coordenadas faltantes: lat={p.get('lat')}, lng={p.get('lng')}")
-            invalid_count += 1
-    
-    coords = valid_coords
-    if invalid_count > 0:
-        print(f"DEBUG: Se filtraron {invalid_count} puntos inválidos. Puntos válidos: {len(coords)}")
+    coords, ids, invalid_count = filter_valid_points(data)
     t1 = time.perf_counter()
-    M = haversine_matrix(coords)
-    t2 = time.perf_counter()
-    res = solve_vrp(M, vehicles, time_limit_ms=tl_ms)
+    capture = traffic_recorder.sample() if traffic_recorder is not None else None
+
+    def compute():
+        t1 = time.perf_counter()
+        if decompose:
+            t2 = time.perf_counter()
+            res = solve_decomposed(get_plan_jobs().pool, coords, vehicles, time_limit_ms=tl_ms, **decompose)
+        elif distance_model == "sparse":
+            M = KnnDistanceModel(coords, k=int(data.get("knn", SPARSE_KNN)))
+            t2 = time.perf_counter()
+            res = solve_vrp_sparse(M, vehicles, time_limit_ms=tl_ms, profile=parse_profile(data) is not None,
+                                   native_max_points=SPARSE_NATIVE_MAX_POINTS)
+            finish_profile("plan", data, res, M, coords,
+                           {"validate_ms": int((t1 - t0) * 1000), "matrix_ms": round((t2 - t1) * 1000, 2)})
+        else:
+            colocation = merge_colocated(coords, merge_radius) if merge_radius is not None else None
+            nodes = coords if colocation is None else colocation.reduce(coords)
+            M = haversine_matrix(nodes)
+            t2 = time.perf_counter()
+            tl, auto = resolve_time_limit(data, tl_ms, t0, M.shape[0], vehicles)
+            res = run_solver(data, M, vehicles, tl, "meters", ids, auto, colocation)
+            if capture is not None:
+                capture.update(matrix=M, nodes=nodes)
+            finish_profile("plan", data, res, M, nodes,
+                           {"validate_ms": int((t1 - t0) * 1000), "matrix_ms": round((t2 - t1) * 1000, 2)})
+        t3 = time.perf_counter()
+        return {"solution": res, "matrix_ms": int((t2 - t1)*1000), "solve_ms": int((t3 - t2)*1000)}
+
+    computed, cache_status = cached_plan("haversine", coords, vehicles, tl_ms, data, compute)
     t3 = time.perf_counter()
+    record_plan_metrics("plan", t1 - t0, t3 - t0, computed, cache_status, "matrix_ms")
 
     out = {
-        "solution": res,
+        "solution": computed["solution"],
         "metrics": {
             "validate_ms": int((t1 - t0)*1000),
-            "matrix_ms": int((t2 - t1)*1000),
-            "solve_ms": int((t3 - t2)*1000),
-            "duration_ms": int((t3 - t0)*1000)
+            "matrix_ms": computed["matrix_ms"] if cache_status in ("miss", "bypass") else 0,
+            "solve_ms": computed["solve_ms"] if cache_status in ("miss", "bypass") else 0,
+            "duration_ms": int((t3 - t0)*1000),
+            "cache": cache_status
         }
     }
-    return jsonify(out), 200
+    record_request("plan", data, capture, cache_status, out)
+    return plan_response(data, out)
 
 @app.post("/routes/plan-with-osmr")
 def plan_with_osmr():
     t0 = time.perf_counter()
-    data = request.get_json(force=True)
+    try:
+        data, n_points = read_plan_body()
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
 
     vehicles = int(data.get("vehicles", 1))
-    points = data.get("points", [])
-    tl_ms = int(data.get("time_limit_ms", 4500))
+    tl_ms = parse_time_limit(data, FAST_TIME_LIMIT_MS if data.get("mode") == "fast" else 4500)
     departure_time = data.get("departure_time", "now")
-    
-    print(f"DEBUG: Recibidos {len(points)} puntos originales")
-    
+    # "matrix_mode": "hybrid" pide a OSRM solo los k vecinos y los arcos de la solución
+    matrix_mode = data.get("matrix_mode", "full")
+
+    if matrix_mode not in ("full", "hybrid"):
+        return jsonify({"error": "matrix_mode must be 'full' or 'hybrid'"}), 400
+    try:
+        departure_s = seconds_of_day(departure_time)
+        mode = parse_mode(data)
+        merge_radius = parse_colocation(data)
+        parse_portfolio(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if merge_radius is not None and (matrix_mode == "hybrid" or data.get("portfolio")):
+        return jsonify({"error": "merge_colocated requires the full matrix (no hybrid or portfolio)"}), 400
+    if mode == "fast" and (matrix_mode == "hybrid" or data.get("portfolio")):
+        return jsonify({"error": "mode 'fast' requires the full matrix (no hybrid or portfolio)"}), 400
+    if tl_ms is None and matrix_mode == "hybrid":
+        return jsonify({"error": "time_limit_ms 'auto' requires the full matrix (no hybrid)"}), 400
     if not (1 <= vehicles <= 20):
         return jsonify({"error": "vehicles must be 1..20"}), 400
-    if not (3 <= len(points) <= 150):
+    if not (3 <= n_points <= 150):
         return jsonify({"error": "points must be 3..150 for traffic-aware routing"}), 400
 
-    # Filtrar puntos con coordenadas válidas
-    valid_coords = []
-    invalid_count = 0
-    for i, p in enumerate(points):
-        if p.get("lat") is not None and p.get("lng") is not None:
-            try:
-                lat = float(p["lat"])
-                lng = float(p["lng"])
-                if -90 <= lat <= 90 and -180 <= lng <= 180:
-                    valid_coords.append((lat, lng))
-                else:
-                    print(f"DEBUG: Punto {i} con coordenadas inválidas: lat={lat}, lng={lng}")
-                    invalid_count += 1
-            except (ValueError, TypeError):
-                print(f"DEBUG: Punto {i} con coordenadas no numéricas: lat={p.get('lat')}, lng={p.get('lng')}")
-                invalid_count += 1
-        else:
-            print(f"DEBUG: Punto {i} con coordenadas faltantes: lat={p.get('lat')}, lng={p.get('lng')}")
-            invalid_count += 1
-    
-    coords = valid_coords
-    if invalid_count > 0:
-        print(f"DEBUG: Se filtraron {invalid_count} puntos inválidos. Puntos válidos: {len(coords)}")
+    coords, ids, invalid_count = filter_valid_points(data)
     t1 = time.perf_counter()
-    
+    capture = traffic_recorder.sample() if traffic_recorder is not None else None
+
+    def compute_hybrid(deadline):
+        t1 = time.perf_counter()
+        provider = HybridMatrixProvider(make_traffic_manager(), hybrid_calibration, k=int(data.get("knn", HYBRID_KNN)))
+        matrix, known, meters, hybrid_info = provider.build(coords, deadline)
+        t2 = time.perf_counter()
+        vrp_result, hybrid_info = solve_hybrid(provider, coords, matrix, known, meters, hybrid_info, vehicles, tl_ms, deadline)
+        t3 = time.perf_counter()
+        traffic_info = build_traffic_info({
+            'provider_used': 'osrm_hybrid',
+            'has_realtime_traffic': False,
+            'calculation_time_ms': hybrid_info["build_ms"],
+            'cache_hit_ratio': round(hybrid_info["cells_from_cache"] / hybrid_info["cells_total"], 4),
+            'osrm_cells_fetched': hybrid_info["osrm_cells_fetched"]
+        }, departure_time)
+        traffic_info["hybrid"] = hybrid_info
+        return {
+            "solution": vrp_result,
+            "traffic_info": traffic_info,
+            "traffic_matrix_ms": int((t2 - t1) * 1000),
+            "solve_ms": int((t3 - t2) * 1000),
+            "cacheable": "osrm_error" not in hybrid_info
+        }
+
+    # Conjunto de paradas con cubo por franjas: se resuelve sin consultar OSRM ("time_dependent": false lo omite)
+    lookup_start = time.perf_counter()
+    # Los cubos por franja no manejan demandas por nodo ni el modo rápido: en esos casos se usa la matriz OSRM
+    use_td = (time_matrix_store is not None and data.get("time_dependent", True)
+              and merge_radius is None and mode == "full")
+    td = time_matrix_store.lookup(coords) if use_td else None
+    lookup_ms = int((time.perf_counter() - lookup_start) * 1000)
+    # Tampoco las opciones de búsqueda de run_solver ni "auto" (su historial es de la matriz OSRM):
+    # se honran con la matriz OSRM y se avisa en traffic_info
+    td_skipped = [key for key in TIME_MATRIX_UNSUPPORTED if data.get(key)] if td is not None else []
+    if td is not None and tl_ms is None:
+        td_skipped.append("time_limit_ms")
+    if td_skipped:
+        td = None
+
+    def compute_time_dependent():
+        t1 = time.perf_counter()
+        vrp_result = solve_time_dependent(td, departure_s, vehicles, tl_ms, rounds=TIME_MATRIX_ROUNDS,
+                                          **parse_previous_plan(data, ids))
+        if capture is not None:
+            # La grabación guarda la matriz de la franja de salida (la que resuelve la primera pasada)
+            capture.update(matrix=td.at(departure_s), nodes=coords)
+        t2 = time.perf_counter()
+        traffic_info = build_traffic_info({
+            'provider_used': 'time_buckets',
+            'has_realtime_traffic': False,
+            'calculation_time_ms': lookup_ms,
+            'cache_hit_ratio': 1.0,
+            'osrm_cells_fetched': 0
+        }, departure_time)
+        traffic_info["time_dependent"] = {**vrp_result["solver_info"]["time_dependent"],
+                                          "bucket_minutes": TIME_MATRIX_BUCKET_MIN}
+        return {
+            "solution": vrp_result,
+            "traffic_info": traffic_info,
+            "traffic_matrix_ms": lookup_ms,
+            "solve_ms": int((t2 - t1) * 1000),
+        }
+
+    def compute():
+        deadline = t0 + (PLAN_SLO_MS - OSRM_SOLVE_RESERVE_MS) / 1000
+        if td is not None:
+            return compute_time_dependent()
+        if matrix_mode == "hybrid":
+            return compute_hybrid(deadline)
+        t1 = time.perf_counter()
+        colocation = merge_colocated(coords, merge_radius) if merge_radius is not None else None
+        nodes = coords if colocation is None else colocation.reduce(coords)
+        try:
+            traffic_manager = make_traffic_manager()
+            traffic_result = traffic_manager.calculate_traffic_matrix(nodes, deadline=deadline)
+            time_matrix = traffic_result['matrix']
+        except Exception as e:
+            OSRM_ERRORS.inc(kind="matrix")
+            raise MatrixProviderError(f"OSRM API error: {str(e)}") from e
+        t2 = time.perf_counter()
+        tl, auto = resolve_time_limit(data, tl_ms, t0, time_matrix.shape[0], vehicles)
+        vrp_result = run_solver(data, time_matrix, vehicles, tl, "seconds", ids, auto, colocation)
+        if capture is not None:
+            capture.update(matrix=time_matrix, nodes=nodes)
+        finish_profile("plan-with-osmr", data, vrp_result, time_matrix, nodes,
+                       {"validate_ms": int((t1 - t0) * 1000), "matrix_ms": round((t2 - t1) * 1000, 2),
+                        "matrix_provider": traffic_result['provider_used']})
+        t3 = time.perf_counter()
+        traffic_info = build_traffic_info(traffic_result, departure_time)
+        if td_skipped:
+            traffic_info["time_dependent_skipped"] = td_skipped
+        return {
+            "solution": vrp_result,
+            "traffic_info": traffic_info,
+            "traffic_matrix_ms": int((t2 - t1) * 1000),
+            "solve_ms": int((t3 - t2) * 1000),
+            # Un plan degradado a haversine no se guarda: la siguiente solicitud vuelve a intentar OSRM
+            "cacheable": traffic_result['provider_used'] == 'osrm'
+        }
+
     try:
-        traffic_manager = TrafficAPIManager()
-        traffic_result = traffic_manager.calculate_traffic_matrix(coords)
-        time_matrix = traffic_result['matrix']
-    except Exception as e:
+        # Con cubo por franjas la huella lleva la franja de salida (departure_time "now" cambia de franja)
+        slot = None
+        if td is not None:
+            bucket, _, weight = td.slot(departure_s)
+            slot = {"departure_slot": [td.set_key, int(bucket), round(float(weight), 2)]}
+        computed, cache_status = cached_plan("osrm", coords, vehicles, tl_ms, data, compute, slot)
+    except MatrixProviderError as e:
+        log.warning("Fallo del proveedor de matriz", extra={"fields": {"endpoint": "plan-with-osmr", "error": str(e)}})
+        return jsonify({"error": str(e)}), 500
+    t3 = time.perf_counter()
+    record_plan_metrics("plan-with-osmr", t1 - t0, t3 - t0, computed, cache_status, "traffic_matrix_ms")
+
+    out = {
+        "solution": computed["solution"],
+        "traffic_info": computed["traffic_info"],
+        "metrics": {
+            "validate_ms": int((t1 - t0) * 1000),
+            "traffic_matrix_ms": computed["traffic_matrix_ms"] if cache_status in ("miss", "bypass") else 0,
+            "solve_ms": computed["solve_ms"] if cache_status in ("miss", "bypass") else 0,
+            "duration_ms": int((t3 - t0) * 1000),
+            "cache": cache_status
+        }
+    }
+    record_request("plan-with-osmr", data, capture, cache_status, out)
+    return plan_response(data, out)
+
+@app.post("/routes/plan/incremental")
+def plan_incremental():
+    """Agrega o quita paradas de un plan existente sin re-resolver desde cero.
+
+    Cuerpo: los puntos del plan (objetos o columnar, depósito primero), "plan" (rutas de IDs como
+    en previous_plan), "add" (puntos nuevos con "id"), "remove" (IDs) y "polish_ms" opcional.
+    Solo se calculan las filas/columnas de las paradas nuevas (haversine o caché OSRM); los arcos
+    del plan enviado que no están en caché se piden sueltos y el pulido usa la submatriz de las
+    rutas que cambiaron.
+    """
+    t0 = time.perf_counter()
+    try:
+        data, n_points = read_plan_body()
+        add = data.get("add", [])
+        add_body = add if isinstance(add, dict) else {"points": add}
+        n_add = count_points(add_body)
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+
+    provider = data.get("provider", "haversine")
+    remove_ids = [str(pid) for pid in data.get("remove", [])]
+    polish_ms = int(data.get("polish_ms", 0))
+
+    if provider not in ("haversine", "osrm"):
+        return jsonify({"error": "provider must be 'haversine' or 'osrm'"}), 400
+    if not data.get("plan"):
+        return jsonify({"error": "plan is required"}), 400
+    if not (3 <= n_points - len(remove_ids) + n_add <= 150):
+        return jsonify({"error": "points after changes must be 3..150"}), 400
+    if not (0 <= polish_ms <= PLAN_SLO_MS):
+        return jsonify({"error": f"polish_ms must be 0..{PLAN_SLO_MS}"}), 400
+
+    coords, ids, invalid_count = filter_valid_points(data)
+    add_coords, add_ids, add_invalid = validate_points(add_body)
+    has_add_ids = add_body.get("ids") is not None or any("id" in p for p in add_body.get("points", []))
+    add_ids = [pid if has_add_ids else f"add:{pid}" for pid in add_ids]
+    point_ids = list(ids) + list(add_ids)
+    node_of = {str(pid): node for node, pid in enumerate(point_ids)}
+    if len(node_of) != len(point_ids):
+        return jsonify({"error": "point ids must be unique across points and add"}), 400
+    if remove_ids and str(ids[0]) in remove_ids:
+        return jsonify({"error": "the depot cannot be removed"}), 400
+    added_and_removed = sorted(set(remove_ids) & {str(pid) for pid in add_ids})
+    if added_and_removed:
+        return jsonify({"error": f"ids cannot be both added and removed: {added_and_removed}"}), 400
+
+    routes = parse_previous_plan({"previous_plan": data["plan"]}, ids)["initial_routes"]
+    vehicles = int(data.get("vehicles", len(routes) or 1))
+    if not (1 <= vehicles <= 20) or len(routes) > vehicles:
+        return jsonify({"error": "vehicles must be 1..20 and at least the number of plan routes"}), 400
+
+    # Paradas repetidas en el plan: queda la primera; las no ruteadas ni quitadas se insertan
+    remove_nodes = [node_of[pid] for pid in remove_ids if pid in node_of]
+    seen = set()
+    routes = [[n for n in r if not (n in seen or seen.add(n))] for r in routes]
+    unrouted = [n for n in range(1, len(ids)) if n not in seen and n not in remove_nodes]
+    add_nodes = unrouted + list(range(len(ids), len(point_ids)))
+
+    all_coords = np.vstack([coords, add_coords.reshape(-1, 2)])
+    lookup = HaversineLookup(all_coords)
+    t1 = time.perf_counter()
+    if provider == "haversine":
+        costs = ArcCosts(len(all_coords), lambda r, c: lookup[r[:, None], c[None, :]],
+                         fetch_pairs=lambda r, c: lookup[r, c])
+        cost_kind = "meters"
+    else:
+        deadline = t0 + (PLAN_SLO_MS - OSRM_SOLVE_RESERVE_MS) / 1000
+        traffic_manager = make_traffic_manager()
+        matrix, known = osrm_cache.lookup(all_coords) if osrm_cache is not None else (None, None)
+        estimate = estimate_pairs = None
+        if OSRM_FALLBACK_SPEED_KMH:
+            estimate = lambda r, c: np.rint(lookup[r[:, None], c[None, :]] * (3.6 / OSRM_FALLBACK_SPEED_KMH))
+            estimate_pairs = lambda r, c: np.rint(lookup[r, c] * (3.6 / OSRM_FALLBACK_SPEED_KMH))
+        # Los arcos del plan enviado salen de la caché o, si faltan, de /route arco por arco
+        costs = ArcCosts(len(all_coords),
+                         lambda r, c: traffic_manager.fetch_table(all_coords, r.tolist(), c.tolist(), deadline),
+                         matrix, known, estimate,
+                         fetch_pairs=lambda r, c: traffic_manager.fetch_pairs(all_coords, r.tolist(), c.tolist(), deadline),
+                         estimate_pairs=estimate_pairs)
+        cost_kind = "seconds"
+
+    try:
+        solution = apply_changes(costs, routes, add_nodes, remove_nodes, vehicles, cost_kind, polish_ms)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except OSRMError as e:
+        OSRM_ERRORS.inc(kind="matrix")
+        log.warning("Fallo del proveedor de matriz", extra={"fields": {"endpoint": "plan-incremental", "error": str(e)}})
         return jsonify({"error": f"OSRM API error: {str(e)}"}), 500
-    
     t2 = time.perf_counter()
-    
-    vrp_result = solve_vrp_with_traffic(time_matrix, vehicles, time_limit_ms=tl_ms)
-    t3 = time.perf_counter()
+
+    removed = set(remove_nodes)
+    kept_ids = [pid for node, pid in enumerate(point_ids) if node not in removed]
+    for route in solution["routes"]:
+        route["stop_ids"] = [kept_ids[s] for s in route["stops"]]
+    changes = {
+        "added": [pid for pid in add_ids],
+        "removed": [point_ids[n] for n in remove_nodes],
+        "unknown_remove_ids": [pid for pid in remove_ids if pid not in node_of],
+        "unrouted_inserted": len(unrouted),
+        "invalid_points": invalid_count + sum(int(m.sum()) for m in add_invalid.values()),
+    }
+    if costs.error is not None:
+        changes["osrm_error"] = costs.error
+
+    matrix_ms = costs.fetch_ms
+    PHASE_SECONDS.observe(t1 - t0, endpoint="plan-incremental", phase="validate")
+    PHASE_SECONDS.observe(matrix_ms / 1000, endpoint="plan-incremental", phase="matrix")
+    PHASE_SECONDS.observe(t2 - t1 - matrix_ms / 1000, endpoint="plan-incremental", phase="solve")
+    PHASE_SECONDS.observe(t2 - t0, endpoint="plan-incremental", phase="total")
+    record_solution("plan-incremental", solution)
 
     out = {
-        "solution": vrp_result,
-        "traffic_info": {
-            "provider": traffic_result['provider_used'],
-            "has_realtime_traffic": traffic_result['has_realtime_traffic'],
-            "departure_time": departure_time,
-            "matrix_calculation_ms": traffic_result['calculation_time_ms']
-        },
+        "solution": solution,
+        "point_ids": kept_ids,
+        "changes": changes,
         "metrics": {
             "validate_ms": int((t1 - t0) * 1000),
-            "traffic_matrix_ms": int((t2 - t1) * 1000),
-            "solve_ms": int((t3 - t2) * 1000),
-            "duration_ms": int((t3 - t0) * 1000)
+            "matrix_ms": round(matrix_ms, 2),
+            "solve_ms": round((t2 - t1) * 1000 - matrix_ms, 2),
+            "duration_ms": round((t2 - t0) * 1000, 2),
+            "cells_computed": costs.computed,
+            "cells_estimated": costs.estimated,
+            "cells_total": len(all_coords) ** 2,
         }
     }
-    
-    return jsonify(out), 200
+    return plan_response(data, out)
+
+@app.post("/routes/time-matrices")
+def register_time_matrices():
+    """Registra el cubo por franjas de un conjunto de paradas recurrente.
+
+    "durations": franjas x N x N explícitas (p. ej. tiempos observados); si no, se consulta la
+    matriz OSRM una vez y se escala por "profile" (un factor por franja, 1.0 por defecto).
+    """
+    if time_matrix_store is None:
+        return jsonify({"error": "time matrix store disabled (TIME_MATRIX_DIR)"}), 404
+    try:
+        data, n_points = read_plan_body()
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+    if not (3 <= n_points <= 150):
+        return jsonify({"error": "points must be 3..150"}), 400
+
+    coords, ids, invalid_count = filter_valid_points(data)
+    buckets = time_matrix_store.buckets
+    try:
+        if "durations" in data:
+            durations = np.asarray(data["durations"], dtype=np.int32)
+            source = "explicit"
+        else:
+            profile = np.asarray(data.get("profile", [1.0] * buckets), dtype=np.float64)
+            if profile.shape != (buckets,) or np.any(profile <= 0):
+                return jsonify({"error": f"profile must have {buckets} positive factors"}), 400
+            # Sin respaldo haversine: el cubo sirve días enteros sin volver a OSRM
+            traffic_manager = make_traffic_manager(fallback=False)
+            base = traffic_manager.calculate_traffic_matrix(coords)['matrix']
+            durations = np.rint(base[None, :, :] * profile[:, None, None]).astype(np.int32)
+            source = "osrm_profile"
+        described = time_matrix_store.put(coords, durations, source)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        OSRM_ERRORS.inc(kind="matrix")
+        return jsonify({"error": f"OSRM API error: {str(e)}"}), 500
+    return jsonify({**described, "invalid_points": invalid_count}), 201
+
+@app.get("/routes/time-matrices")
+def time_matrices_stats():
+    if time_matrix_store is None:
+        return jsonify({"error": "time matrix store disabled (TIME_MATRIX_DIR)"}), 404
+    return jsonify(time_matrix_store.stats()), 200
+
+@app.post("/routes/plan/stream")
+def plan_stream():
+    """Emite cada solución que mejora (SSE por defecto, ?format=ndjson para JSON por líneas)."""
+    t0 = time.perf_counter()
+    try:
+        data, n_points = read_plan_body()
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+    fmt = request.args.get("format", "sse")
+
+    provider = data.get("provider", "haversine")
+    departure_time = data.get("departure_time", "now")
+    # Todo error de la solicitud sale como 400 antes de abrir el stream
+    try:
+        vehicles = int(data.get("vehicles", 1))
+        tl_ms = int(data.get("time_limit_ms", 3500 if provider == "haversine" else 4500))
+        early_stop = parse_early_stop(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    if fmt not in ("sse", "ndjson"):
+        return jsonify({"error": "format must be 'sse' or 'ndjson'"}), 400
+    if provider not in ("haversine", "osrm"):
+        return jsonify({"error": "provider must be 'haversine' or 'osrm'"}), 400
+    if not (1 <= vehicles <= 20):
+        return jsonify({"error": "vehicles must be 1..20"}), 400
+    if not (3 <= n_points <= 150):
+        return jsonify({"error": "points must be 3..150"}), 400
+    if tl_ms <= 0:
+        return jsonify({"error": "time_limit_ms must be positive"}), 400
+
+    coords, ids, invalid_count = filter_valid_points(data)
+    events = queue.Queue()
+
+    def run():
+        try:
+            t1 = time.perf_counter()
+            extra = {}
+            if provider == "haversine":
+                matrix, cost_kind = haversine_matrix(coords), "meters"
+            else:
+                traffic_manager = make_traffic_manager()
+                traffic_result = traffic_manager.calculate_traffic_matrix(coords)
+                matrix, cost_kind = traffic_result['matrix'], "seconds"
+                extra["traffic_info"] = build_traffic_info(traffic_result, departure_time)
+            t2 = time.perf_counter()
+            res = solve_vrp(matrix, vehicles, time_limit_ms=tl_ms, cost_kind=cost_kind,
+                            on_solution=lambda s: events.put(("solution", s)), **early_stop)
+            t3 = time.perf_counter()
+            PHASE_SECONDS.observe(t1 - t0, endpoint="plan-stream", phase="validate")
+            PHASE_SECONDS.observe(t2 - t1, endpoint="plan-stream", phase="matrix")
+            PHASE_SECONDS.observe(t3 - t2, endpoint="plan-stream", phase="solve")
+            PHASE_SECONDS.observe(t3 - t0, endpoint="plan-stream", phase="total")
+            record_solution("plan-stream", res)
+            events.put(("result", {
+                "solution": res,
+                **extra,
+                "metrics": {
+                    "validate_ms": int((t1 - t0) * 1000),
+                    "matrix_ms": int((t2 - t1) * 1000),
+                    "solve_ms": int((t3 - t2) * 1000),
+                    "duration_ms": int((t3 - t0) * 1000)
+                }
+            }))
+        except Exception as e:
+            events.put(("error", {"error": str(e)}))
+
+    threading.Thread(target=run, daemon=True).start()
+
+    def generate():
+        while True:
+            event, payload = events.get()
+            if fmt == "sse":
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            else:
+                yield json.dumps({"event": event, **payload}) + "\n"
+            if event != "solution":
+                break
+
+    mimetype = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={"Cache-Control": "no-cache"})
+
+@app.post("/routes/plan/batch")
+def plan_batch():
+    """Muchos problemas independientes en un cuerpo; responde NDJSON con cada resultado al terminar.
+
+    Cuerpo: {"problems": [{points | lat/lng, vehicles, time_limit_ms, provider, mode, id}, ...],
+    "cpu_budget_ms": N}; las claves de primer nivel (salvo "problems") son valores por defecto de
+    cada problema. Un problema inválido emite su evento "error" sin frenar al resto.
+
+    Orden de los eventos: primero los "error" de validación (en el orden del cuerpo), luego un
+    "result" o "error" por problema aceptado a medida que termina, y al final un único "summary".
+    Cada evento lleva "index" (posición en "problems") e "id" (el del problema o, si no trae,
+    su índice) para emparejarlo con la solicitud.
+    """
+    t0 = time.perf_counter()
+    try:
+        data = read_body(request)
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+    items = data.get("problems")
+    cpu_budget_ms = int(data.get("cpu_budget_ms", BATCH_CPU_BUDGET_MS)) or None
+    if not isinstance(items, list) or not (1 <= len(items) <= BATCH_MAX_PROBLEMS):
+        return jsonify({"error": f"problems must be a list of 1..{BATCH_MAX_PROBLEMS} plan requests"}), 400
+    defaults = {k: v for k, v in data.items() if k not in ("problems", "cpu_budget_ms")}
+
+    problems, rejected = [], []
+    for index, item in enumerate(items):
+        item = {**defaults, **item} if isinstance(item, dict) else None
+        pid = item.get("id", index) if item is not None else index
+        try:
+            if item is None:
+                raise ValueError("problem must be an object")
+            n_points = count_points(item)
+            vehicles = int(item.get("vehicles", 1))
+            provider = item.get("provider", "haversine")
+            mode = parse_mode(item)
+            default_tl = FAST_TIME_LIMIT_MS if mode == "fast" else 3500 if provider == "haversine" else 4500
+            time_limit_ms = int(item.get("time_limit_ms", default_tl))
+            if provider not in ("haversine", "osrm"):
+                raise ValueError("provider must be 'haversine' or 'osrm'")
+            if not (1 <= vehicles <= 20):
+                raise ValueError("vehicles must be 1..20")
+            if not (3 <= n_points <= 150):
+                raise ValueError("points must be 3..150")
+            if time_limit_ms <= 0:
+                raise ValueError("time_limit_ms must be positive")
+            coords, ids, invalid_count = filter_valid_points(item)
+        except (TypeError, ValueError) as e:
+            rejected.append({"index": index, "id": pid, "error": str(e)})
+            continue
+        problems.append({"index": index, "id": pid, "coords": coords, "vehicles": vehicles, "provider": provider,
+                         "mode": mode, "time_limit_ms": time_limit_ms, "invalid_points": invalid_count})
+    validate_ms = int((time.perf_counter() - t0) * 1000)
+    PHASE_SECONDS.observe(validate_ms / 1000, endpoint="plan-batch", phase="validate")
+    log.info("Lote de planificación", extra={"fields": {
+        "problems": len(items), "accepted": len(problems), "rejected": len(rejected), "cpu_budget_ms": cpu_budget_ms,
+    }})
+
+    def build_osrm(coords):
+        traffic_result = make_traffic_manager().calculate_traffic_matrix(coords)
+        return traffic_result['matrix'], {"traffic_info": build_traffic_info(traffic_result, "now")}
+
+    events = run_batch(get_plan_jobs().pool, problems, build_osrm, cpu_budget_ms, BATCH_MIN_TIME_LIMIT_MS) if problems else iter(())
+
+    def generate():
+        try:
+            for payload in rejected:
+                yield json.dumps({"event": "error", **payload}) + "\n"
+            summary = None
+            for event, payload in events:
+                if event == "summary":
+                    summary = payload
+                    continue
+                yield json.dumps({"event": event, **payload}) + "\n"
+            summary = summary or {"problems": 0, "solved": 0, "failed": 0}
+            summary.update({"problems": len(items), "accepted": summary["problems"], "rejected": len(rejected),
+                            "validate_ms": validate_ms,
+                            "duration_ms": int((time.perf_counter() - t0) * 1000)})
+            yield json.dumps({"event": "summary", **summary}) + "\n"
+        finally:
+            if problems:
+                events.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers={"Cache-Control": "no-cache"})
+
+@app.post("/routes/jobs")
+def submit_plan_job():
+    t0 = time.perf_counter()
+    try:
+        data, n_points = read_plan_body()
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+
+    provider = data.get("provider", "haversine")
+    vehicles = int(data.get("vehicles", 1))
+    tl_ms = int(data.get("time_limit_ms", 3500 if provider == "haversine" else 4500))
+    departure_time = data.get("departure_time", "now")
+
+    if provider not in ("haversine", "osrm"):
+        return jsonify({"error": "provider must be 'haversine' or 'osrm'"}), 400
+    if not (1 <= vehicles <= 20):
+        return jsonify({"error": "vehicles must be 1..20"}), 400
+    if not (3 <= n_points <= 150):
+        return jsonify({"error": "points must be 3..150"}), 400
+
+    coords, ids, invalid_count = filter_valid_points(data)
+    metrics = {"validate_ms": int((time.perf_counter() - t0) * 1000)}
+
+    if provider == "haversine":
+        def build_matrix():
+            return {"matrix": haversine_matrix(coords)}
+        cost_kind = "meters"
+    else:
+        def build_matrix():
+            traffic_manager = make_traffic_manager()
+            traffic_result = traffic_manager.calculate_traffic_matrix(coords)
+            return {"matrix": traffic_result['matrix'], "traffic_info": build_traffic_info(traffic_result, departure_time)}
+        cost_kind = "seconds"
+
+    plan_jobs = get_plan_jobs()
+    try:
+        job = plan_jobs.submit(build_matrix, vehicles, tl_ms, cost_kind, metrics)
+    except QueueFullError as e:
+        return jsonify({"error": str(e), "queue": plan_jobs.stats()}), 429
+
+    return jsonify({**job, "queue": plan_jobs.stats()}), 202
+
+@app.get("/routes/jobs/stats")
+def plan_jobs_stats():
+    return jsonify(get_plan_jobs().stats()), 200
+
+@app.get("/routes/jobs/<job_id>")
+def get_plan_job(job_id):
+    # wait_ms > 0 activa la espera larga hasta que el trabajo termine (máximo 30 s)
+    wait_ms = min(int(request.args.get("wait_ms", 0)), 30000)
+    job = get_plan_jobs().get(job_id, wait_s=wait_ms / 1000.0)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job), 200
+
+@app.get("/health/live")
+def health_live():
+    return jsonify({"status": "ok", "pid": os.getpid()}), 200
+
+@app.get("/health/ready")
+def health_ready():
+    # 503 mientras el proceso calienta; sin hook de arranque (p. ej. flask run) la primera sonda lo dispara en segundo plano
+    if not readiness.ready:
+        readiness.start_background()
+        return jsonify(readiness.view()), 503
+    return jsonify(readiness.view()), 200
+
+@app.get("/metrics")
+def metrics():
+    # Exposición Prometheus; ?format=json devuelve P50/P95/P99 estimados por serie
+    if request.args.get("format") == "json":
+        return jsonify(REGISTRY.snapshot()), 200
+    return Response(REGISTRY.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.get("/routes/auto-time-limit/stats")
+def auto_time_limit_stats():
+    return jsonify({"slo_ms": PLAN_SLO_MS, "margin_ms": AUTO_TL_MARGIN_MS, "buckets": convergence_history.stats()}), 200
+
+@app.get("/routes/recordings/stats")
+def recording_stats():
+    if traffic_recorder is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **traffic_recorder.stats()}), 200
+
+@app.get("/routes/osrm/stats")
+def osrm_stats():
+    return jsonify({
+        "breaker": osrm_breaker.stats(),
+        "fallback_speed_kmh": OSRM_FALLBACK_SPEED_KMH,
+        "hybrid_calibration": hybrid_calibration.stats(),
+    }), 200
+
+@app.get("/routes/portfolio/stats")
+def portfolio_stats():
+    top_k = request.args.get("top_k", type=int)
+    return jsonify(rank_configs(PORTFOLIO_HISTORY_PATH, top_k) if PORTFOLIO_HISTORY_PATH else {"runs": 0, "wins": []}), 200
 
 @app.post("/debug/compare-haversine-vs-osrm")
 def compare_haversine_vs_osrm():
+    """Grilla proveedor x límite x semilla en paralelo sobre el pool de experimentos.
+
+    Por defecto responde el reporte completo; ?stream=ndjson emite cada matriz y cada corrida
+    al terminar y luego el reporte; "background": true lo encola y responde 202 con el job_id.
+    """
     data = request.get_json(force=True)
     vehicles = int(data.get("vehicles", 3))
     points = data.get("points", [])
-    time_limits = data.get("time_limits", [1000, 3000, 5000, 10000, 20000])
+    time_limits = [int(t) for t in data.get("time_limits", [1000, 3000, 5000, 10000, 20000])]
     avg_speed_kmh = float(data.get("avg_speed_kmh", 50))
-    
+    providers = data.get("providers", list(PROVIDERS))
+    seeds = data.get("seeds", 1)
+    seeds = list(range(int(seeds))) if isinstance(seeds, int) else [int(s) for s in seeds]
+    stream = request.args.get("stream")
+
     if not (3 <= len(points) <= 150):
-        return jsonify({"error": "points must be 3..25 for OSRM comparison"}), 400
-    
+        return jsonify({"error": "points must be 3..150 for OSRM comparison"}), 400
+    if not providers or set(providers) - set(PROVIDERS):
+        return jsonify({"error": f"providers must be a subset of {list(PROVIDERS)}"}), 400
+    if not seeds or not time_limits:
+        return jsonify({"error": "seeds and time_limits must not be empty"}), 400
+    if len(providers) * len(time_limits) * len(seeds) > EXPERIMENT_MAX_RUNS:
+        return jsonify({"error": f"experiment grid exceeds {EXPERIMENT_MAX_RUNS} runs"}), 400
+    if stream not in (None, "ndjson"):
+        return jsonify({"error": "stream must be 'ndjson'"}), 400
+
     coords = [(p["lat"], p["lng"]) for p in points]
-    
-    print(f"\nCOMPARACION HAVERSINE vs OSRM: {len(points)} puntos, {vehicles} vehículos")
-    
-    haversine_results = []
-    osrm_results = []
-    
-    print(f"\nPROBANDO CON HAVERSINE:")
-    for time_limit in time_limits:
+    log.info("Experimento haversine vs OSRM", extra={"fields": {
+        "points": len(points), "vehicles": vehicles, "providers": providers,
+        "time_limits": time_limits, "seeds": seeds,
+    }})
+
+    # Sin respaldo haversine: una corrida "osrm" que en realidad usó haversine falsearía la comparación
+    def build_osrm():
+        traffic_manager = make_traffic_manager(fallback=False)
+        traffic_result = traffic_manager.calculate_traffic_matrix(coords)
+        return traffic_result['matrix'], "seconds", {
+            "cache_hit_ratio": traffic_result['cache_hit_ratio'],
+            "osrm_cells_fetched": traffic_result['osrm_cells_fetched'],
+        }
+
+    available = {"haversine": lambda: (haversine_matrix(coords), "meters", {}), "osrm": build_osrm}
+    builders = {p: available[p] for p in PROVIDERS if p in providers}
+
+    if data.get("background", False):
+        experiments = get_experiment_jobs()
         try:
-            M = haversine_matrix(coords)
-            result = solve_vrp(M, vehicles, time_limit_ms=time_limit)
-            distance_m = result.get("total_distance_m", 0)
-            estimated_time_s = (distance_m / 1000) / avg_speed_kmh * 3600
-            
-            haversine_results.append({
-                "time_limit_ms": time_limit,
-                "total_distance_m": distance_m,
-                "estimated_time_s": int(estimated_time_s),
-                "solve_time_ms": result.get("solver_info", {}).get("actual_solve_time_ms", 0),
-                "method": "haversine",
-                "solution": result
-            })
-            print(f"   {time_limit:>5}ms → {distance_m:>8}m (~{int(estimated_time_s):>6}s)")
-            print(f"      Debug: {len(result.get('routes', []))} rutas, solution_found: {result.get('solution_found', False)}")
-            print(f"      Keys en result: {list(result.keys())}")
-            if 'routes' in result and result['routes']:
-                print(f"      Primera ruta: vehículo {result['routes'][0].get('vehicle')}, clientes: {result['routes'][0].get('customers_served')}")
-        except Exception as e:
-            haversine_results.append({"time_limit_ms": time_limit, "error": str(e), "method": "haversine"})
-    
-    print(f"\nPROBANDO CON OSRM:")
-    for time_limit in time_limits:
+            job = experiments.submit(builders, vehicles, time_limits, seeds, avg_speed_kmh)
+        except ExperimentQueueFullError as e:
+            return jsonify({"error": str(e), "queue": experiments.stats()}), 429
+        return jsonify(job), 202
+
+    events = run_experiment(get_experiment_pool(), builders, vehicles, time_limits, seeds)
+    if stream is None:
+        matrices, runs = [], []
+        for event, payload in events:
+            (matrices if event == "matrix" else runs).append(payload)
+        return jsonify(summarize(runs, time_limits, avg_speed_kmh, seeds, matrices)), 200
+
+    def generate():
+        matrices, runs = [], []
         try:
-            traffic_manager = TrafficAPIManager()
-            traffic_result = traffic_manager.calculate_traffic_matrix(coords)
-            time_matrix = traffic_result['matrix']
-            result = solve_vrp_with_traffic(time_matrix, vehicles, time_limit_ms=time_limit)
-            actual_time_s = result.get("total_travel_time_s", 0)
-            estimated_distance_m = int((actual_time_s / 3600) * avg_speed_kmh * 1000)
-            
-            osrm_results.append({
-                "time_limit_ms": time_limit,
-                "total_time_s": actual_time_s,
-                "estimated_distance_m": estimated_distance_m,
-                "solve_time_ms": result.get("solver_info", {}).get("actual_solve_time_ms", 0),
-                "method": "osrm",
-                "solution": result  
-            })
-            print(f"   {time_limit:>5}ms → {actual_time_s:>8}s (~{estimated_distance_m:>6}m)")
-            print(f"      Debug: {len(result.get('routes', []))} rutas, solution_found: {result.get('solution_found', False)}")
-            print(f"      Keys en result: {list(result.keys())}")
-            if 'routes' in result and result['routes']:
-                print(f"      Primera ruta: vehículo {result['routes'][0].get('vehicle')}, clientes: {result['routes'][0].get('customers_served')}")
-        except Exception as e:
-            osrm_results.append({"time_limit_ms": time_limit, "error": str(e), "method": "osrm"})
-    
-    def calculate_percentage_improvements(results, metric_key):
-        improvements = []
-        for i in range(1, len(results)):
-            if "error" not in results[i] and "error" not in results[i-1]:
-                prev_value = results[i-1][metric_key]
-                curr_value = results[i][metric_key]
-                improvement_pct = ((prev_value - curr_value) / prev_value) * 100 if prev_value > 0 else 0
-                
-                improvements.append({
-                    "from_ms": results[i-1]["time_limit_ms"],
-                    "to_ms": results[i]["time_limit_ms"],
-                    "improvement_pct": round(improvement_pct, 3)
-                })
-        return improvements
-    
-    haversine_improvements = calculate_percentage_improvements(haversine_results, "estimated_time_s")
-    osrm_improvements = calculate_percentage_improvements(osrm_results, "total_time_s")
-    
-    print(f"\nCOMPARACION DE PATRONES DE MEJORA:")
-    print(f"\nHAVERSINE (mejoras porcentuales):")
-    for imp in haversine_improvements:
-        status = "[HIGH]" if imp["improvement_pct"] > 1 else "[GOOD]" if imp["improvement_pct"] > 0.1 else "[MINOR]" if imp["improvement_pct"] > 0 else "[NONE]"
-        print(f"   {status} {imp['from_ms']:>5}ms→{imp['to_ms']:>5}ms: {imp['improvement_pct']:>6.3f}%")
-    
-    print(f"\nOSRM (mejoras porcentuales):")
-    for imp in osrm_improvements:
-        status = "[HIGH]" if imp["improvement_pct"] > 1 else "[GOOD]" if imp["improvement_pct"] > 0.1 else "[MINOR]" if imp["improvement_pct"] > 0 else "[NONE]"
-        print(f"   {status} {imp['from_ms']:>5}ms→{imp['to_ms']:>5}ms: {imp['improvement_pct']:>6.3f}%")
-    
-    pattern_similarity = 0
-    if len(haversine_improvements) == len(osrm_improvements):
-        differences = [abs(h["improvement_pct"] - o["improvement_pct"]) 
-                      for h, o in zip(haversine_improvements, osrm_improvements)]
-        avg_difference = sum(differences) / len(differences) if differences else 0
-        pattern_similarity = max(0, 100 - avg_difference * 10)
-    
-    print(f"\nSIMILITUD DE PATRONES: {pattern_similarity:.1f}%")
-    
-    route_comparisons = []
-    for i, time_limit in enumerate(time_limits):
-        if i < len(haversine_results) and i < len(osrm_results):
-            h_result = haversine_results[i]
-            o_result = osrm_results[i]
-            
-            if "error" not in h_result and "error" not in o_result:
-                h_routes = []
-                o_routes = []
-                
-                h_solution = h_result.get("solution", {})
-                if "routes" in h_solution:
-                    for route in h_solution["routes"]:
-                        if route.get("customers_served", 0) > 0:
-                            h_routes.append({
-                                "vehicle": route["vehicle"],
-                                "stops": route["stops"],
-                                "customers": route["customers_served"]
-                            })
-                
-                o_solution = o_result.get("solution", {})
-                if "routes" in o_solution:
-                    for route in o_solution["routes"]:
-                        if route.get("customers_served", 0) > 0:
-                            o_routes.append({
-                                "vehicle": route["vehicle"], 
-                                "stops": route["stops"],
-                                "customers": route["customers_served"]
-                            })
-                
-                print(f"      Rutas extraídas - Haversine: {len(h_routes)}, OSRM: {len(o_routes)}")
-                
-                route_similarity = calculate_route_similarity(h_routes, o_routes)
-                
-                route_comparisons.append({
-                    "time_limit_ms": time_limit,
-                    "haversine_routes": h_routes,
-                    "osrm_routes": o_routes,
-                    "route_similarity_pct": route_similarity,
-                    "identical_routes": route_similarity > 95,
-                    "similar_assignments": route_similarity > 70,
-                    "route_analysis": analyze_route_differences(h_routes, o_routes)
-                })
-    
-    avg_route_similarity = sum(rc.get("route_similarity_pct", 0) for rc in route_comparisons) / len(route_comparisons) if route_comparisons else 0
-    
-    print(f"\nANALISIS DE RUTAS:")
-    for rc in route_comparisons:
-        status = "[HIGH]" if rc["route_similarity_pct"] > 90 else "[MED]" if rc["route_similarity_pct"] > 70 else "[LOW]"
-        print(f"   {status} {rc['time_limit_ms']:>5}ms: {rc['route_similarity_pct']:>5.1f}% similitud de rutas")
-        
-        if rc["route_similarity_pct"] < 90:
-            analysis = rc["route_analysis"]
-            if analysis["different_assignments"] > 0:
-                print(f"      → {analysis['different_assignments']} asignaciones diferentes")
-            if analysis["route_order_differences"] > 0:
-                print(f"      → {analysis['route_order_differences']} órdenes de visita diferentes")
-    
-    print(f"\nSIMILITUD PROMEDIO DE RUTAS: {avg_route_similarity:.1f}%")
-    
-    return jsonify({
-        "haversine_results": haversine_results,
-        "osrm_results": osrm_results,
-        "percentage_improvements": {
-            "haversine": haversine_improvements,
-            "osrm": osrm_improvements
-        },
-        "route_analysis": {
-            "detailed_comparisons": route_comparisons,
-            "avg_route_similarity_pct": round(avg_route_similarity, 1),
-            "interpretation": {
-                "identical_routing": avg_route_similarity > 95,
-                "similar_routing": avg_route_similarity > 80,
-                "different_routing": avg_route_similarity < 70,
-                "explanation": "Alta similitud indica que ambos métodos toman decisiones de enrutamiento muy similares"
-            }
-        },
-        "pattern_analysis": {
-            "avg_speed_used_kmh": avg_speed_kmh,
-            "pattern_similarity_pct": round(pattern_similarity, 1),
-            "interpretation": {
-                "high_similarity": pattern_similarity > 80,
-                "similar_behavior": pattern_similarity > 60,
-                "explanation": "Similitud alta indica que ambos métodos siguen patrones similares de optimización"
-            }
-        },
-        "overall_comparison": {
-            "performance_pattern_similarity": round(pattern_similarity, 1),
-            "routing_decision_similarity": round(avg_route_similarity, 1),
-            "haversine_pattern": "convergencia_subita" if any(imp["improvement_pct"] > 2 for imp in haversine_improvements) else "rendimientos_decrecientes",
-            "osrm_pattern": "convergencia_subita" if any(imp["improvement_pct"] > 2 for imp in osrm_improvements) else "rendimientos_decrecientes",
-            "overall_conclusion": determine_overall_conclusion(pattern_similarity, avg_route_similarity)
-        }
-    }), 200
+            for event, payload in events:
+                (matrices if event == "matrix" else runs).append(payload)
+                yield json.dumps({"event": event, **payload}) + "\n"
+            yield json.dumps({"event": "result", **summarize(runs, time_limits, avg_speed_kmh, seeds, matrices)}) + "\n"
+        finally:
+            events.close()
 
-def calculate_route_similarity(routes1, routes2):
-    if not routes1 or not routes2:
-        return 0.0
-    
-    assignments1 = get_customer_assignments(routes1)
-    assignments2 = get_customer_assignments(routes2)
-    
-    if not assignments1 or not assignments2:
-        return 0.0
-    
-    total_customers = len(set(assignments1.keys()) | set(assignments2.keys()))
-    if total_customers == 0:
-        return 100.0
-    
-    identical_assignments = 0
-    for customer in assignments1:
-        if customer in assignments2 and assignments1[customer] == assignments2[customer]:
-            identical_assignments += 1
-    
-    route_order_similarity = 0
-    total_routes = max(len(routes1), len(routes2))
-    
-    for route1 in routes1:
-        best_match = 0
-        for route2 in routes2:
-            stops1 = [s for s in route1["stops"] if s != 0]
-            stops2 = [s for s in route2["stops"] if s != 0]
-            
-            if set(stops1) == set(stops2):
-                if stops1 == stops2:
-                    best_match = 1.0
-                else:
-                    best_match = 0.7
-                break
-        route_order_similarity += best_match
-    
-    assignment_similarity = (identical_assignments / total_customers) * 100
-    order_similarity = (route_order_similarity / total_routes) * 100 if total_routes > 0 else 0
-    
-    return (assignment_similarity * 0.7) + (order_similarity * 0.3)
-
-def analyze_route_differences(routes1, routes2):
-    assignments1 = get_customer_assignments(routes1)
-    assignments2 = get_customer_assignments(routes2)
-    
-    different_assignments = 0
-    route_order_differences = 0
-    
-    for customer in assignments1:
-        if customer in assignments2 and assignments1[customer] != assignments2[customer]:
-            different_assignments += 1
-    
-    for route1 in routes1:
-        for route2 in routes2:
-            if route1["vehicle"] == route2["vehicle"]:
-                stops1 = [s for s in route1["stops"] if s != 0]
-                stops2 = [s for s in route2["stops"] if s != 0]
-                if set(stops1) == set(stops2) and stops1 != stops2:
-                    route_order_differences += 1
-    
-    return {
-        "different_assignments": different_assignments,
-        "route_order_differences": route_order_differences,
-        "total_customers": len(assignments1)
-    }
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers={"Cache-Control": "no-cache"})
 
-def determine_overall_conclusion(pattern_similarity, route_similarity):
-    if pattern_similarity > 85 and route_similarity > 90:
-        return "MÉTODOS VIRTUALMENTE IDÉNTICOS: Mismas rutas y mismo comportamiento de optimización"
-    elif pattern_similarity > 80 and route_similarity > 80:
-        return "MÉTODOS MUY SIMILARES: Comportamiento y rutas muy parecidos con diferencias menores"
-    elif pattern_similarity > 70 or route_similarity > 70:
-        return "MÉTODOS SIMILARES: Algunos patrones comunes pero con diferencias notables en rutas"
-    else:
-        return "MÉTODOS DIFERENTES: Comportamientos y decisiones de enrutamiento significativamente distintos"
+@app.get("/debug/experiments/stats")
+def experiment_jobs_stats():
+    return jsonify(get_experiment_jobs().stats()), 200
 
+@app.get("/debug/experiments/<job_id>")
+def get_experiment_job(job_id):
+    # since=k devuelve solo las corridas nuevas; wait_ms > 0 espera hasta que llegue alguna (máximo 30 s)
+    since = max(0, int(request.args.get("since", 0)))
+    wait_ms = min(int(request.args.get("wait_ms", 0)), 30000)
+    job = get_experiment_jobs().get(job_id, since=since, wait_s=wait_ms / 1000.0)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job), 200
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080)
+    prestart_plan_jobs()
+    readiness.run()
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
@@ -0,0 +1,165 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from heuristics import solve_fast
+from matrices import haversine_matrices
+from telemetry import PHASE_SECONDS, record_solution
+from vrp_solver import COST_KINDS, solve_vrp
+
+log = logging.getLogger(__name__)
+
+# Matrices OSRM de un lote en vuelo a la vez (cada una a su vez se divide en teselas del cliente)
+_osrm_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="batch-osrm")
+
+
+def _solve_problem(matrix: np.ndarray, n_vehicles: int, time_limit_ms: int, cost_kind: str, mode: str):
+    """Corre en un proceso resolutor; devuelve (inicio epoch, resultado) para medir la espera en cola."""
+    started = time.time()
+    if mode == "fast":
+        return started, solve_fast(matrix, n_vehicles, time_limit_ms=time_limit_ms, cost_kind=cost_kind)
+    return started, solve_vrp(matrix, n_vehicles, time_limit_ms=time_limit_ms, cost_kind=cost_kind)
+
+
+def allocate_time_limits(requested: List[int], cpu_budget_ms: Optional[int], min_time_limit_ms: int):
+    """Escala los límites pedidos para que su suma (tiempo de CPU de resolución) quepa en el presupuesto.
+
+    Devuelve (límites, factor aplicado). Ningún límite baja de `min_time_limit_ms`, así que con
+    demasiados problemas la suma puede pasarse del presupuesto (se reporta en el resumen).
+    """
+    total = sum(requested)
+    if not cpu_budget_ms or total <= cpu_budget_ms:
+        return list(requested), 1.0
+    scale = cpu_budget_ms / total
+    return [max(min_time_limit_ms, int(t * scale)) for t in requested], round(scale, 4)
+
+
+def _percentile(values, q):
+    return int(np.percentile(values, q)) if values else 0
+
+
+def run_batch(pool, problems: List[Dict], build_osrm: Callable, cpu_budget_ms: Optional[int],
+              min_time_limit_ms: int = 200):
+    """Resuelve muchos problemas independientes en el SolverPool y emite eventos a medida que terminan.
+
+    `problems` son dicts con index, id, coords, vehicles, time_limit_ms, provider y mode.
+    Las matrices haversine se calculan juntas (haversine_matrices); las OSRM en hilos, y cada
+    una se encola apenas está lista. Los límites se escalan al presupuesto global de CPU y se
+    encolan de mayor a menor (LPT) para acortar el tiempo total. Genera ('result'|'error', {...})
+    por problema y al final ('summary', {...}).
+    """
+    start = time.perf_counter()
+    batch_start = time.time()
+    limits, scale = allocate_time_limits([p["time_limit_ms"] for p in problems], cpu_budget_ms, min_time_limit_ms)
+    for problem, limit in zip(problems, limits):
+        problem["allocated_time_limit_ms"] = limit
+
+    events = queue.Queue()
+    futures = []
+    lock = threading.Lock()
+    closed = threading.Event()
+
+    def submit(problem, matrix, cost_kind, matrix_ms, extra):
+        with lock:
+            if closed.is_set():
+                return
+            submitted = time.time()
+            future = pool.run(_solve_problem, matrix, problem["vehicles"], problem["allocated_time_limit_ms"],
+                              cost_kind, problem["mode"])
+            futures.append(future)
+        future.add_done_callback(lambda f: events.put((problem, f, submitted, matrix_ms, cost_kind, extra)))
+
+    def build_and_submit(problem):
+        t = time.perf_counter()
+        try:
+            matrix, extra = build_osrm(problem["coords"])
+        except Exception as e:
+            events.put((problem, e, None, (time.perf_counter() - t) * 1000, None, None))
+            return
+        submit(problem, matrix, "seconds", (time.perf_counter() - t) * 1000, extra)
+
+    haversine = [p for p in problems if p["provider"] == "haversine"]
+    osrm = [p for p in problems if p["provider"] == "osrm"]
+    for problem in osrm:
+        _osrm_executor.submit(build_and_submit, problem)
+
+    t = time.perf_counter()
+    matrices = haversine_matrices([p["coords"] for p in haversine])
+    haversine_ms = (time.perf_counter() - t) * 1000
+    cells = sum(m.size for m in matrices) or 1
+    for problem, matrix in sorted(zip(haversine, matrices), key=lambda pm: -pm[0]["allocated_time_limit_ms"]):
+        # Tiempo del pase vectorizado repartido por celdas
+        submit(problem, matrix, "meters", haversine_ms * matrix.size / cells, {})
+
+    waits, solve_ms, matrix_ms, failed = [], [], [haversine_ms], 0
+    try:
+        for _ in range(len(problems)):
+            problem, outcome, submitted, built_ms, cost_kind, extra = events.get()
+            base = {"index": problem["index"], "id": problem["id"]}
+            if isinstance(outcome, Exception):
+                failed += 1
+                matrix_ms.append(built_ms)
+                yield "error", {**base, "error": f"OSRM API error: {outcome}"}
+                continue
+            try:
+                started, solution = outcome.result()
+            except Exception as e:
+                failed += 1
+                yield "error", {**base, "error": str(e)}
+                continue
+            if problem["provider"] == "osrm":
+                matrix_ms.append(built_ms)
+            queue_wait = max(0.0, started - submitted) * 1000
+            solved_ms = solution["solver_info"]["actual_solve_time_ms"]
+            waits.append(queue_wait)
+            solve_ms.append(solved_ms)
+            PHASE_SECONDS.observe(built_ms / 1000, endpoint="plan-batch", phase="matrix")
+            PHASE_SECONDS.observe(queue_wait / 1000, endpoint="plan-batch", phase="queue_wait")
+            PHASE_SECONDS.observe(solved_ms / 1000, endpoint="plan-batch", phase="solve")
+            record_solution("plan-batch", solution)
+            yield "result", {
+                **base,
+                "solution": solution,
+                **extra,
+                "metrics": {
+                    "points": len(problem["coords"]),
+                    "invalid_points": problem["invalid_points"],
+                    "time_limit_ms": problem["allocated_time_limit_ms"],
+                    "matrix_ms": round(built_ms, 2),
+                    "queue_wait_ms": int(queue_wait),
+                    "solve_ms": solved_ms,
+                    "duration_ms": int((time.time() - batch_start) * 1000),
+                    "objective": solution[COST_KINDS[cost_kind]["total_key"]],
+                },
+            }
+
+        wall_ms = (time.perf_counter() - start) * 1000
+        PHASE_SECONDS.observe(wall_ms / 1000, endpoint="plan-batch", phase="total")
+        yield "summary", {
+            "problems": len(problems),
+            "solved": len(solve_ms),
+            "failed": failed,
+            "workers": pool.workers,
+            "wall_ms": int(wall_ms),
+            "cpu_budget_ms": cpu_budget_ms,
+            "time_limit_scale": scale,
+            "allocated_solve_ms": sum(limits),
+            "over_budget": bool(cpu_budget_ms) and sum(limits) > cpu_budget_ms,
+            "matrix_ms": {"haversine_pass": round(haversine_ms, 2), "total": round(sum(matrix_ms), 2),
+                          "haversine_problems": len(haversine), "osrm_problems": len(osrm)},
+            "solve_ms": {"total": int(sum(solve_ms)), "p50": _percentile(solve_ms, 50), "max": max(solve_ms, default=0)},
+            "queue_wait_ms": {"p50": _percentile(waits, 50), "p95": _percentile(waits, 95), "max": int(max(waits, default=0))},
+            # Tiempo de resolución sumado sobre tiempo de pared x workers: qué tan ocupados estuvieron los núcleos
+            "pool_utilization": round(sum(solve_ms) / max(1.0, wall_ms * pool.workers), 3),
+        }
+    finally:
+        # Si el cliente corta el stream: no se encola nada más y se cancela lo que no arrancó
+        with lock:
+            closed.set()
+            for future in futures:
+                future.cancel()
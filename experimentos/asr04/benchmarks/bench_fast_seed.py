@@ -0,0 +1,75 @@
+"""Arranque desde la heurística rápida ("initial_solution": "fast") contra OR-Tools en frío.
+
+Por semilla y límite de tiempo: resuelve en frío con time_limit_ms y, como hace run_solver,
+corre solve_fast (--seed-ms) y luego OR-Tools desde sus rutas con lo que queda del límite.
+Reporta el objetivo de la heurística, el de cada variante, la brecha relativa (negativa = la
+semilla es mejor) y el tiempo de búsqueda que usó OR-Tools en cada una.
+
+Uso: python benchmarks/bench_fast_seed.py [--points 100] [--vehicles 5] [--time-limits-ms 250,1000,3000]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from heuristics import solve_fast  # noqa: E402
+from instances import generate_points  # noqa: E402
+from matrices import haversine_matrix  # noqa: E402
+from vrp_solver import solve_vrp  # noqa: E402
+
+
+def summarize(rows, key):
+    values = [r[key] for r in rows if r[key] is not None]
+    return round(float(np.mean(values)), 3) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=100)
+    parser.add_argument("--vehicles", type=int, default=5)
+    parser.add_argument("--time-limits-ms", default="250,1000,3000")
+    parser.add_argument("--seed-ms", type=int, default=50)
+    parser.add_argument("--seeds", type=int, default=3)
+    args = parser.parse_args()
+
+    time_limits = [int(t) for t in args.time_limits_ms.split(",")]
+    report = {"points": args.points, "vehicles": args.vehicles, "seed_ms": args.seed_ms, "time_limits": {}}
+    rows = {tl: [] for tl in time_limits}
+    for seed in range(args.seeds):
+        matrix = haversine_matrix(np.asarray(generate_points(args.points, seed=seed)))
+        for tl in time_limits:
+            cold = solve_vrp(matrix, args.vehicles, time_limit_ms=tl)
+            fast = solve_fast(matrix, args.vehicles, time_limit_ms=args.seed_ms)
+            fast_ms = fast["solver_info"]["actual_solve_time_ms"]
+            seeded = solve_vrp(matrix, args.vehicles, time_limit_ms=max(1, tl - fast_ms),
+                               initial_routes=[[s for s in r["stops"] if s != 0] for r in fast["routes"]])
+            rows[tl].append({
+                "seed": seed,
+                "fast": fast["total_distance_m"],
+                "cold": cold["total_distance_m"],
+                "seeded": seeded["total_distance_m"],
+                "gap_pct": round((seeded["total_distance_m"] - cold["total_distance_m"]) / cold["total_distance_m"] * 100, 3),
+                "fast_ms": fast_ms,
+                "cold_solve_ms": cold["solver_info"]["actual_solve_time_ms"],
+                "seeded_solve_ms": seeded["solver_info"]["actual_solve_time_ms"],
+            })
+
+    for tl in time_limits:
+        report["time_limits"][tl] = {
+            "mean_gap_pct": summarize(rows[tl], "gap_pct"),
+            "seeded_better": sum(1 for r in rows[tl] if r["seeded"] < r["cold"]),
+            "seeded_worse": sum(1 for r in rows[tl] if r["seeded"] > r["cold"]),
+            "mean_cold_solve_ms": summarize(rows[tl], "cold_solve_ms"),
+            "mean_seeded_solve_ms": summarize(rows[tl], "seeded_solve_ms"),
+            "runs": rows[tl],
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Matriz OSRM completa vs híbrida (estimación calibrada + k vecinos + arcos de la solución).
+
+Ambos modos resuelven con el mismo límite contra el stub OSRM con desvíos; la calidad se mide
+evaluando las rutas de cada uno sobre la matriz OSRM completa (la "verdad").
+Las primeras --warmup instancias solo calibran el factor por región.
+
+Uso: python benchmarks/bench_hybrid_matrix.py [--points 150] [--vehicles 8] [--latency-ms 30] [--detour 0.4]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from hybrid_matrix import DetourCalibration, HybridMatrixProvider, solve_hybrid  # noqa: E402
+from instances import generate_points  # noqa: E402
+from osrm_client import OSRMTableClient  # noqa: E402
+from osrm_stub import start_stub_server  # noqa: E402
+from traffic_manager import TrafficAPIManager  # noqa: E402
+from vrp_solver import solve_vrp  # noqa: E402
+
+
+def true_cost(matrix, routes):
+    total = 0
+    for route in routes:
+        stops = np.asarray(route["stops"], dtype=np.intp)
+        if len(stops) > 1:
+            total += int(matrix[stops[:-1], stops[1:]].sum())
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=150)
+    parser.add_argument("--vehicles", type=int, default=8)
+    parser.add_argument("--instances", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--knn", type=int, default=10)
+    parser.add_argument("--time-limit-ms", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--detour", type=float, default=0.4)
+    args = parser.parse_args()
+
+    server, config, base_url = start_stub_server(latency_ms=args.latency_ms, detour=args.detour)
+    manager = TrafficAPIManager(client=OSRMTableClient(base_url=base_url))
+    calibration = DetourCalibration()
+    provider = HybridMatrixProvider(manager, calibration, k=args.knn)
+
+    for seed in range(args.warmup):
+        coords = generate_points(args.points, "clustered", seed=1000 + seed)
+        provider.build(coords)
+
+    runs = []
+    for seed in range(args.instances):
+        coords = generate_points(args.points, "clustered", seed=seed)
+
+        cells_before = config.cells
+        start = time.perf_counter()
+        full = manager.calculate_traffic_matrix(coords)["matrix"]
+        full_ms = (time.perf_counter() - start) * 1000
+        full_cells = config.cells - cells_before
+        full_res = solve_vrp(full, args.vehicles, time_limit_ms=args.time_limit_ms, cost_kind="seconds")
+
+        cells_before = config.cells
+        start = time.perf_counter()
+        matrix, known, meters, info = provider.build(coords)
+        hybrid_build_ms = (time.perf_counter() - start) * 1000
+        hybrid_res, info = solve_hybrid(provider, coords, matrix, known, meters, info, args.vehicles, args.time_limit_ms)
+        hybrid_cells = config.cells - cells_before
+
+        estimated = ~known
+        runs.append({
+            "seed": seed,
+            "full": {"matrix_ms": round(full_ms, 1), "osrm_cells": full_cells,
+                     "objective": true_cost(full, full_res["routes"])},
+            "hybrid": {
+                "matrix_ms": round(hybrid_build_ms, 1),
+                "osrm_cells": hybrid_cells,
+                "objective": true_cost(full, hybrid_res["routes"]),
+                "reported_objective": hybrid_res["total_travel_time_s"],
+                "estimate_mape_pct": round(float(np.mean(
+                    np.abs(matrix[estimated] - full[estimated]) / np.maximum(full[estimated], 1)
+                )) * 100, 2) if estimated.any() else 0.0,
+                "resolved": info["resolved"],
+                "solution_arcs_refined": info["solution_arcs_refined"],
+            },
+        })
+        runs[-1]["hybrid"]["gap_vs_full_pct"] = round(
+            (runs[-1]["hybrid"]["objective"] / runs[-1]["full"]["objective"] - 1) * 100, 3
+        )
+
+    server.shutdown()
+    print(json.dumps({
+        "points": args.points,
+        "vehicles": args.vehicles,
+        "knn": args.knn,
+        "calibration": calibration.stats(),
+        "runs": runs,
+        "mean_gap_vs_full_pct": round(float(np.mean([r["hybrid"]["gap_vs_full_pct"] for r in runs])), 3),
+        "mean_cells_ratio": round(float(np.mean([r["hybrid"]["osrm_cells"] / r["full"]["osrm_cells"] for r in runs])), 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
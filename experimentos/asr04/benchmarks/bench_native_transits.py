@@ -0,0 +1,85 @@
+"""Compara callbacks Python vs tránsitos nativos (matriz/vector) dentro del mismo time_limit_ms.
+
+Uso: python benchmarks/bench_native_transits.py [--points 100] [--vehicles 5] [--time-limit-ms 3500]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from matrices import haversine_matrix  # noqa: E402
+from vrp_solver import build_model, capacity_per_vehicle, search_parameters  # noqa: E402
+
+
+def build_callback_model(matrix, n_vehicles):
+    """Modelo anterior: closures Python para el costo de arco y la demanda."""
+    n = matrix.shape[0]
+    manager = pywrapcp.RoutingIndexManager(n, n_vehicles, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    def dist_cb(f, t):
+        i, j = manager.IndexToNode(f), manager.IndexToNode(t)
+        return int(matrix[i, j])
+
+    cb_index = routing.RegisterTransitCallback(dist_cb)
+    routing.SetArcCostEvaluatorOfAllVehicles(cb_index)
+
+    max_capacity = capacity_per_vehicle(n, n_vehicles)
+    if max_capacity is not None:
+        def demand_cb(idx):
+            return 1 if manager.IndexToNode(idx) != 0 else 0
+
+        demand_cb_index = routing.RegisterUnaryTransitCallback(demand_cb)
+        routing.AddDimensionWithVehicleCapacity(
+            demand_cb_index, 0, [max_capacity] * n_vehicles, True, 'Capacity'
+        )
+    return manager, routing
+
+
+def run(builder, matrix, n_vehicles, time_limit_ms):
+    manager, routing = builder(matrix, n_vehicles)
+    sol = routing.SolveWithParameters(search_parameters(n_vehicles, time_limit_ms))
+    solver = routing.solver()
+    return {
+        "objective": sol.ObjectiveValue() if sol else None,
+        "branches": solver.Branches(),
+        "accepted_neighbors": solver.AcceptedNeighbors(),
+        "solutions": solver.Solutions(),
+        "wall_time_ms": solver.WallTime(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=100)
+    parser.add_argument("--vehicles", type=int, default=5)
+    parser.add_argument("--time-limit-ms", type=int, default=3500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    coords = list(zip(rng.uniform(4.55, 4.75, args.points), rng.uniform(-74.15, -74.0, args.points)))
+    matrix = haversine_matrix(coords)
+
+    callback = run(build_callback_model, matrix, args.vehicles, args.time_limit_ms)
+    native = run(build_model, matrix, args.vehicles, args.time_limit_ms)
+
+    report = {
+        "points": args.points,
+        "vehicles": args.vehicles,
+        "time_limit_ms": args.time_limit_ms,
+        "callback": callback,
+        "native": native,
+        "branches_ratio": round(native["branches"] / max(1, callback["branches"]), 2),
+        "accepted_neighbors_ratio": round(native["accepted_neighbors"] / max(1, callback["accepted_neighbors"]), 2),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""/routes/plan-with-osmr ante fallas inyectadas en el stub OSRM: circuito, plazo y respaldo haversine.
+
+Escenarios en orden: sano -> caído (cada modo de falla) -> lento (más que el plazo) -> recuperado.
+Por cada solicitud reporta proveedor usado, motivo del respaldo, latencia y estado del circuito;
+`checks` resume si se cumplió lo esperado (código de salida 1 si no).
+
+Uso: python benchmarks/bench_osrm_faults.py [--points 60] [--requests 5] [--slow-ms 6000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from instances import generate_instance  # noqa: E402
+from osrm_stub import FAIL_MODES, start_stub_server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=60)
+    parser.add_argument("--vehicles", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=5, help="Solicitudes por escenario")
+    parser.add_argument("--time-limit-ms", type=int, default=500)
+    parser.add_argument("--slow-ms", type=float, default=6000.0)
+    parser.add_argument("--reset-s", type=float, default=1.0)
+    args = parser.parse_args()
+
+    stub, config, base_url = start_stub_server(latency_ms=5)
+    os.environ.update({
+        "OSRM_BASE_URL": base_url,
+        "OSRM_CACHE_PATH": "",
+        "OSRM_TILE_RETRIES": "1",
+        "OSRM_BREAKER_RESET_S": str(args.reset_s),
+    })
+    import app as asr04_app
+
+    client = asr04_app.app.test_client()
+    body = generate_instance(args.points, args.vehicles, "clustered", seed=3)
+    body = {"points": body["points"], "vehicles": args.vehicles, "time_limit_ms": args.time_limit_ms, "use_cache": False}
+
+    def run(scenario):
+        rows = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.post("/routes/plan-with-osmr", json=body)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            info = response.get_json().get("traffic_info", {})
+            rows.append({
+                "status": response.status_code,
+                "provider": info.get("provider"),
+                "fallback_reason": info.get("fallback_reason"),
+                "latency_ms": round(elapsed_ms, 1),
+                "breaker": asr04_app.osrm_breaker.stats()["state"],
+            })
+        return {"scenario": scenario, "requests": rows}
+
+    report = {"points": args.points, "slo_ms": asr04_app.PLAN_SLO_MS, "scenarios": []}
+    try:
+        report["scenarios"].append(run("healthy"))
+
+        for mode in FAIL_MODES:
+            config.fail_rate, config.fail_mode = 1.0, mode
+            report["scenarios"].append(run(f"down:{mode}"))
+            config.fail_rate = 0.0
+            time.sleep(args.reset_s)
+            report["scenarios"].append(run(f"recovered:{mode}"))
+
+        config.slow_rate, config.slow_ms = 1.0, args.slow_ms
+        report["scenarios"].append(run("slow"))
+        config.slow_rate = 0.0
+        time.sleep(args.reset_s)
+        report["scenarios"].append(run("recovered:slow"))
+    finally:
+        stub.shutdown()
+
+    rows = [r for s in report["scenarios"] for r in s["requests"]]
+    by_name = {s["scenario"]: s["requests"] for s in report["scenarios"]}
+    report["checks"] = {
+        "all_http_200": all(r["status"] == 200 for r in rows),
+        "within_slo": all(r["latency_ms"] <= report["slo_ms"] for r in rows),
+        "healthy_uses_osrm": all(r["provider"] == "osrm" for r in by_name["healthy"]),
+        "outage_opens_circuit": all(
+            any(r["fallback_reason"] == "circuit_open" for r in by_name[f"down:{m}"]) for m in FAIL_MODES
+        ),
+        "slow_degrades_by_deadline": by_name["slow"][0]["fallback_reason"] == "deadline_exceeded",
+        "recovers_to_osrm": all(
+            by_name[name][-1]["provider"] == "osrm" for name in by_name if name.startswith("recovered:")
+        ),
+    }
+    report["breaker"] = asr04_app.osrm_breaker.stats()
+    print(json.dumps(report, indent=2))
+    if not all(report["checks"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Descarga tabla OSRM completa vs por bloques concurrentes contra el stub local (sin red).
+
+Uso: python benchmarks/bench_osrm_tiles.py [--points 400] [--tile-size 100] [--latency-ms 50] [--fail-rate 0.05]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from osrm_client import OSRMTableClient  # noqa: E402
+from osrm_stub import start_stub_server, stub_durations  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=400)
+    parser.add_argument("--tile-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    coords = list(zip(rng.uniform(4.55, 4.75, args.points), rng.uniform(-74.15, -74.0, args.points)))
+    everyone = list(range(args.points))
+    expected = stub_durations(np.array([(lng, lat) for lat, lng in coords]), everyone, everyone, 40.0).astype(np.int32)
+
+    report = {"points": args.points, "tile_size": args.tile_size, "latency_ms": args.latency_ms}
+    for name, tile_size, workers in (("serial", args.tile_size, 1), ("tiled", args.tile_size, args.workers)):
+        server, config, base_url = start_stub_server(
+            latency_ms=args.latency_ms, fail_rate=args.fail_rate, max_table_size=args.tile_size, seed=args.seed
+        )
+        client = OSRMTableClient(base_url=base_url, tile_size=tile_size, max_workers=workers, retries=5, backoff_s=0.01)
+        start = time.perf_counter()
+        matrix = client.table(coords, everyone, everyone)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        report[name] = {
+            "elapsed_ms": round(elapsed_ms, 1),
+            "http_requests": config.requests,
+            "matches_reference": bool(np.array_equal(matrix, expected)),
+        }
+        client.close()
+        server.shutdown()
+
+    # Una sola URL con todas las coordenadas, como hacía _osrm_matrix
+    server, config, base_url = start_stub_server(max_table_size=args.tile_size)
+    client = OSRMTableClient(base_url=base_url, tile_size=args.points, max_workers=1, retries=0)
+    try:
+        client.table(coords, everyone, everyone)
+        report["single_request"] = "ok"
+    except Exception as e:
+        report["single_request"] = f"error: {e}"
+    client.close()
+    server.shutdown()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Memoria y latencia del modelo de distancias denso (haversine_matrix) vs k-NN disperso.
+
+Uso: python benchmarks/bench_sparse_knn.py [--sizes 150 1000 5000] [--k 20] [--solve-ms 0]
+Con --solve-ms > 0 también resuelve con ambos modelos (el denso solo hasta --dense-solve-max) y,
+hasta --native-max-points, el disperso dos veces: costos por callback Python y en matriz nativa.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from matrices import KnnDistanceModel, haversine_matrix  # noqa: E402
+from vrp_solver import solve_vrp, solve_vrp_sparse  # noqa: E402
+
+
+def measure(fn):
+    """Latencia sin trazar memoria y, en una segunda corrida, pico de memoria con tracemalloc."""
+    start = time.perf_counter()
+    value = fn()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, round(elapsed_ms, 1), round(peak / 2**20, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[150, 1000, 5000])
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--vehicles", type=int, default=5)
+    parser.add_argument("--solve-ms", type=int, default=0)
+    parser.add_argument("--dense-solve-max", type=int, default=1000)
+    parser.add_argument("--native-max-points", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    report = []
+    for n in args.sizes:
+        rng = np.random.default_rng(args.seed)
+        coords = np.column_stack([rng.uniform(4.45, 4.85, n), rng.uniform(-74.25, -73.95, n)])
+        dense, dense_ms, dense_peak = measure(lambda: haversine_matrix(coords))
+        sparse, sparse_ms, sparse_peak = measure(lambda: KnnDistanceModel(coords, k=args.k))
+        row = {
+            "points": n,
+            "dense": {"build_ms": dense_ms, "peak_mib": dense_peak, "result_mib": round(dense.nbytes / 2**20, 2)},
+            "sparse": {"build_ms": sparse_ms, "peak_mib": sparse_peak, "result_mib": round(sparse.nbytes / 2**20, 2)},
+        }
+        if args.solve_ms:
+            res = solve_vrp_sparse(sparse, args.vehicles, time_limit_ms=args.solve_ms)
+            row["sparse"]["objective_m"] = res["total_distance_m"]
+            if n <= args.native_max_points:
+                res = solve_vrp_sparse(sparse, args.vehicles, time_limit_ms=args.solve_ms, native_max_points=n)
+                row["sparse"]["native_objective_m"] = res["total_distance_m"]
+            if n <= args.dense_solve_max:
+                res = solve_vrp(dense, args.vehicles, time_limit_ms=args.solve_ms)
+                row["dense"]["objective_m"] = res["total_distance_m"]
+        del dense
+        report.append(row)
+
+    print(json.dumps({"k": args.k, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
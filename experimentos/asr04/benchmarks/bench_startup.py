@@ -0,0 +1,175 @@
+"""Arranque en frío del ASR-04: tiempo hasta la primera solicitud y hasta la primera resolución rápida.
+
+Levanta el servidor como subproceso (gunicorn con gunicorn.conf.py, o `python app.py`) sin
+calentamiento, con calentamiento, y con calentamiento más el pool resolutor arrancado al
+iniciar (SOLVER_POOL_PRESTART), y mide desde el lanzamiento: cuándo responde /health/live,
+cuándo /health/ready da 200 en todos los workers web (--web-workers), la primera solicitud de
+cada tipo (OR-Tools con las opciones por defecto y "mode": "fast") contra la misma solicitud
+repetida ya en caliente, y el primer trabajo de /routes/jobs (que usa el pool resolutor).
+Solo haversine: no hace falta OSRM.
+
+Uso: python benchmarks/bench_startup.py [--server gunicorn|dev] [--runs 3] [--points 60] [--web-workers 2]
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from instances import generate_instance  # noqa: E402
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, started: float, timeout_s: float, ok_status=(200,)) -> float:
+    """Segundos desde el lanzamiento hasta que `url` responde con alguno de `ok_status`."""
+    while time.perf_counter() - started < timeout_s:
+        try:
+            if requests.get(url, timeout=1).status_code in ok_status:
+                return time.perf_counter() - started
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} not available after {timeout_s}s")
+
+
+def wait_all_ready(url: str, started: float, timeout_s: float, workers: int) -> float:
+    """Segundos hasta que /health/ready respondió 200 desde `workers` procesos distintos."""
+    ready = set()
+    while time.perf_counter() - started < timeout_s:
+        try:
+            # Conexión nueva por sonda: el maestro reparte entre los workers
+            response = requests.get(url, timeout=1, headers={"Connection": "close"})
+            if response.status_code == 200:
+                ready.add(response.json()["pid"])
+                if len(ready) >= workers:
+                    return time.perf_counter() - started
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} ready on {len(ready)}/{workers} workers after {timeout_s}s")
+
+
+def timed_post(url: str, body: dict):
+    t = time.perf_counter()
+    response = requests.post(url, json=body, timeout=60)
+    response.raise_for_status()
+    return (time.perf_counter() - t) * 1000, response.json()
+
+
+def first_job_ms(base: str, body: dict) -> float:
+    # Los trabajos viven en el worker web que los recibió: la misma conexión para crear y consultar
+    t = time.perf_counter()
+    with requests.Session() as session:
+        response = session.post(f"{base}/routes/jobs", json=body, timeout=60)
+        response.raise_for_status()
+        job = session.get(f"{base}/routes/jobs/{response.json()['job_id']}?wait_ms=30000", timeout=60).json()
+    if job["status"] != "done":
+        raise RuntimeError(f"job not done: {job['status']}")
+    return (time.perf_counter() - t) * 1000
+
+
+def run_once(server: str, warmup: bool, prestart: bool, args) -> dict:
+    port = free_port()
+    cache_dir = tempfile.mkdtemp(prefix="asr04-startup-")
+    web_workers = args.web_workers if server == "gunicorn" else 1
+    env = {
+        **os.environ,
+        "WARMUP_ENABLED": "1" if warmup else "0",
+        "SOLVER_POOL_PRESTART": "1" if prestart else "0",
+        "SOLVER_POOL_WORKERS": str(args.solver_workers),
+        "OSRM_CACHE_PATH": os.path.join(cache_dir, "osrm.sqlite"),
+        "PROFILE_DIR": os.path.join(cache_dir, "profiles"),
+        "TIME_MATRIX_DIR": os.path.join(cache_dir, "time_matrices"),
+        "CONVERGENCE_HISTORY_PATH": "",
+        "SOLUTION_CACHE_TTL_S": "0",
+        "LOG_LEVEL": "WARNING",
+    }
+    if server == "gunicorn":
+        env.update({"GUNICORN_BIND": f"127.0.0.1:{port}", "WEB_CONCURRENCY": str(args.web_workers)})
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"]
+    else:
+        env["PORT"] = str(port)
+        cmd = [sys.executable, "app.py"]
+
+    base = f"http://127.0.0.1:{port}"
+    fast_body = {**generate_instance(args.points, args.vehicles, seed=1), "mode": "fast"}
+    full_body = {**generate_instance(args.points, args.vehicles, seed=2), "time_limit_ms": args.time_limit_ms}
+    started = time.perf_counter()
+    process = subprocess.Popen(cmd, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        live_s = wait_for(f"{base}/health/live", started, args.timeout_s)
+        ready_s = wait_all_ready(f"{base}/health/ready", started, args.timeout_s, web_workers)
+        # Primera solicitud: /routes/plan con las opciones por defecto (OR-Tools); luego la primera rápida
+        full_ms, _ = timed_post(f"{base}/routes/plan", full_body)
+        first_request_s = time.perf_counter() - started
+        fast_ms, fast = timed_post(f"{base}/routes/plan", fast_body)
+        first_fast_s = time.perf_counter() - started
+        warm_fast_ms, _ = timed_post(f"{base}/routes/plan", fast_body)
+        warm_full_ms, _ = timed_post(f"{base}/routes/plan", full_body)
+        job_ms = first_job_ms(base, full_body)
+        readiness = requests.get(f"{base}/health/ready", timeout=5).json()
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return {
+        "live_s": live_s,
+        "ready_s": ready_s,
+        "time_to_first_request_s": first_request_s,
+        "time_to_first_fast_solve_s": first_fast_s,
+        "first_request_ms": full_ms,
+        "warm_request_ms": warm_full_ms,
+        "first_fast_ms": fast_ms,
+        "warm_fast_ms": warm_fast_ms,
+        "fast_solve_ms": fast["solution"]["solver_info"]["actual_solve_time_ms"],
+        "first_job_ms": job_ms,
+        "warm_up": readiness.get("warm_up"),
+    }
+
+
+def summarize(runs):
+    keys = [k for k in runs[0] if k != "warm_up"]
+    out = {k: round(float(np.median([r[k] for r in runs])), 3 if k.endswith("_s") else 1) for k in keys}
+    out["warm_up"] = runs[-1]["warm_up"]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--server", choices=("gunicorn", "dev"), default="gunicorn" if shutil.which("gunicorn") else "dev")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--points", type=int, default=60)
+    parser.add_argument("--vehicles", type=int, default=4)
+    parser.add_argument("--time-limit-ms", type=int, default=500)
+    parser.add_argument("--web-workers", type=int, default=2)
+    parser.add_argument("--solver-workers", type=int, default=2)
+    parser.add_argument("--timeout-s", type=float, default=60.0)
+    args = parser.parse_args()
+
+    report = {"server": args.server, "points": args.points, "runs": args.runs,
+              "web_workers": args.web_workers if args.server == "gunicorn" else 1,
+              "solver_workers": args.solver_workers}
+    for name, warmup, prestart in (("cold", False, False), ("warm_up", True, False), ("warm_up_prestart", True, True)):
+        runs = [run_once(args.server, warmup, prestart, args) for _ in range(args.runs)]
+        report[name] = summarize(runs)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
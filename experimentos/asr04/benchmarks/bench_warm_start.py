@@ -0,0 +1,99 @@
+"""Arranque en caliente (previous_plan) contra resolución en frío con el mismo time_limit_ms.
+
+Por semilla: resuelve una instancia (el plan de ayer), cambia una fracción de las paradas
+(--churn: quita unas y agrega otras nuevas) y resuelve el día nuevo dos veces por límite de
+tiempo, en frío y desde el plan de ayer traducido como en parse_previous_plan. Reporta el
+objetivo de cada una, la brecha relativa (negativa = el arranque en caliente es mejor), el
+tiempo de búsqueda usado y cuánto tardó el caliente en igualar el objetivo final del frío.
+
+Uso: python benchmarks/bench_warm_start.py [--points 100] [--vehicles 5] [--time-limits-ms 250,1000,3000]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from instances import generate_points  # noqa: E402
+from matrices import haversine_matrix  # noqa: E402
+from vrp_solver import solve_vrp  # noqa: E402
+
+
+def next_day(points, churn: float, rng):
+    """Paradas de hoy (el depósito sigue primero) e índice de cada una en el día anterior (-1 = nueva)."""
+    n = len(points)
+    k = int(round((n - 1) * churn))
+    dropped = set(rng.choice(np.arange(1, n), size=k, replace=False).tolist())
+    kept = [i for i in range(n) if i not in dropped]
+    fresh = generate_points(k + 1, seed=int(rng.integers(1 << 30)))[1:]
+    today = [points[i] for i in kept] + fresh
+    origin = kept + [-1] * len(fresh)
+    return today, origin
+
+
+def translate(routes, origin):
+    node_of = {old: new for new, old in enumerate(origin) if old >= 0}
+    return [[node_of[s] for s in r["stops"] if s != 0 and s in node_of] for r in routes]
+
+
+def summarize(rows, key):
+    values = [r[key] for r in rows if r[key] is not None]
+    return round(float(np.mean(values)), 3) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=100)
+    parser.add_argument("--vehicles", type=int, default=5)
+    parser.add_argument("--time-limits-ms", default="250,1000,3000")
+    parser.add_argument("--previous-time-limit-ms", type=int, default=3000)
+    parser.add_argument("--churn", type=float, default=0.05)
+    parser.add_argument("--seeds", type=int, default=3)
+    args = parser.parse_args()
+
+    time_limits = [int(t) for t in args.time_limits_ms.split(",")]
+    report = {"points": args.points, "vehicles": args.vehicles, "churn": args.churn, "time_limits": {}}
+    rows = {tl: [] for tl in time_limits}
+    for seed in range(args.seeds):
+        rng = np.random.default_rng(seed)
+        yesterday = generate_points(args.points, seed=seed)
+        previous = solve_vrp(haversine_matrix(np.asarray(yesterday)), args.vehicles,
+                             time_limit_ms=args.previous_time_limit_ms)
+        today, origin = next_day(yesterday, args.churn, rng)
+        matrix = haversine_matrix(np.asarray(today))
+        initial_routes = translate(previous["routes"], origin)
+        for tl in time_limits:
+            cold = solve_vrp(matrix, args.vehicles, time_limit_ms=tl)
+            warm = solve_vrp(matrix, args.vehicles, time_limit_ms=tl, initial_routes=initial_routes,
+                             target_objective=cold["total_distance_m"])
+            info = warm["solver_info"]["warm_start"]
+            rows[tl].append({
+                "seed": seed,
+                "cold": cold["total_distance_m"],
+                "warm": warm["total_distance_m"],
+                "warm_initial": info["initial_objective"],
+                "gap_pct": round((warm["total_distance_m"] - cold["total_distance_m"]) / cold["total_distance_m"] * 100, 3),
+                "cold_solve_ms": cold["solver_info"]["actual_solve_time_ms"],
+                "warm_solve_ms": warm["solver_info"]["actual_solve_time_ms"],
+                "warm_matches_cold_ms": info["time_to_match_previous_ms"],
+            })
+
+    for tl in time_limits:
+        report["time_limits"][tl] = {
+            "mean_gap_pct": summarize(rows[tl], "gap_pct"),
+            "warm_better": sum(1 for r in rows[tl] if r["warm"] < r["cold"]),
+            "warm_worse": sum(1 for r in rows[tl] if r["warm"] > r["cold"]),
+            "mean_cold_solve_ms": summarize(rows[tl], "cold_solve_ms"),
+            "mean_warm_solve_ms": summarize(rows[tl], "warm_solve_ms"),
+            "mean_warm_matches_cold_ms": summarize(rows[tl], "warm_matches_cold_ms"),
+            "runs": rows[tl],
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Generador de instancias sintéticas reproducibles (ciudad uniforme o con barrios densos).
+
+Uso: python benchmarks/instances.py --points 80 --vehicles 5 --kind clustered --seed 7 > instancia.json
+"""
+import argparse
+import json
+import math
+
+import numpy as np
+
+# Centro de Bogotá; el radio acota la ciudad sintética
+CENTER = (4.65, -74.08)
+KM_PER_DEG_LAT = 111.32
+
+DEFAULT_SIZES = (10, 25, 50, 100, 150)
+DEFAULT_VEHICLES = (1, 5, 10, 20)
+
+
+def generate_points(n_points: int, kind: str = "uniform", seed: int = 0, radius_km: float = 12.0,
+                    n_clusters: int = None, center=CENTER):
+    """Coordenadas (lat, lng) con el depósito en el centro como primer punto."""
+    if kind not in ("uniform", "clustered"):
+        raise ValueError("kind must be 'uniform' or 'clustered'")
+    rng = np.random.default_rng(seed)
+    n = n_points - 1
+    if kind == "uniform":
+        # Uniforme en el disco (no en el cuadrado) para no sesgar hacia las esquinas
+        r = radius_km * np.sqrt(rng.uniform(0, 1, n))
+        theta = rng.uniform(0, 2 * math.pi, n)
+        dy, dx = r * np.sin(theta), r * np.cos(theta)
+    else:
+        k = n_clusters or max(2, int(round(math.sqrt(n_points) / 2)))
+        centers_r = radius_km * 0.8 * np.sqrt(rng.uniform(0, 1, k))
+        centers_t = rng.uniform(0, 2 * math.pi, k)
+        sizes = rng.dirichlet(np.ones(k)) * n
+        labels = np.repeat(np.arange(k), np.diff(np.round(np.concatenate([[0], np.cumsum(sizes)])).astype(int)))
+        spread = radius_km * 0.08
+        dy = centers_r[labels] * np.sin(centers_t[labels]) + rng.normal(0, spread, n)
+        dx = centers_r[labels] * np.cos(centers_t[labels]) + rng.normal(0, spread, n)
+    lat = center[0] + dy / KM_PER_DEG_LAT
+    lng = center[1] + dx / (KM_PER_DEG_LAT * math.cos(math.radians(center[0])))
+    return [center] + list(zip(np.round(lat, 6).tolist(), np.round(lng, 6).tolist()))
+
+
+def generate_instance(n_points: int, n_vehicles: int, kind: str = "uniform", seed: int = 0, **kwargs):
+    """Cuerpo de solicitud listo para /routes/plan o /routes/plan-with-osmr."""
+    coords = generate_points(n_points, kind, seed, **kwargs)
+    return {
+        "name": f"{kind}-n{n_points}-v{n_vehicles}-s{seed}",
+        "vehicles": n_vehicles,
+        "points": [{"id": i, "lat": lat, "lng": lng} for i, (lat, lng) in enumerate(coords)],
+    }
+
+
+def instance_grid(sizes=DEFAULT_SIZES, vehicles=DEFAULT_VEHICLES, kinds=("uniform", "clustered"), seed: int = 0):
+    """Producto tamaño x vehículos x tipo; se omiten combinaciones con más vehículos que clientes."""
+    instances = []
+    for kind in kinds:
+        for n in sizes:
+            for v in vehicles:
+                if v < n:
+                    instances.append(generate_instance(n, v, kind, seed=seed + n * 100 + v))
+    return instances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=50)
+    parser.add_argument("--vehicles", type=int, default=3)
+    parser.add_argument("--kind", choices=("uniform", "clustered"), default="uniform")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(generate_instance(args.points, args.vehicles, args.kind, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Prueba de carga y regresión del ASR-04 (≤ 5 s, P95/P99) contra /routes/plan y /routes/plan-with-osmr.
+
+Sin --url levanta la app en proceso con el stub OSRM local (latencia configurable); con --url
+ataca un despliegue existente (p. ej. gunicorn), que debe apuntar su OSRM_BASE_URL a donde
+corresponda. El reporte JSON trae percentiles por fase, throughput y calidad de solución, y
+con --baseline marca las regresiones (código de salida 1 si hay alguna).
+
+Uso:
+  python benchmarks/load_test.py --concurrency 4 --out report.json --save-baseline baseline.json
+  python benchmarks/load_test.py --concurrency 4 --baseline baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from instances import instance_grid  # noqa: E402
+from osrm_stub import start_stub_server  # noqa: E402
+
+SLO_MS = 5000
+ENDPOINTS = {
+    "plan": {"path": "/routes/plan", "objective": "total_distance_m", "matrix": "matrix_ms"},
+    "plan-with-osmr": {"path": "/routes/plan-with-osmr", "objective": "total_travel_time_s", "matrix": "traffic_matrix_ms"},
+}
+PHASES = ("client_ms", "validate_ms", "matrix_ms", "solve_ms", "duration_ms")
+
+
+def start_app(osrm_latency_ms: float, osrm_cache: bool):
+    """App en proceso sobre un servidor werkzeug con hilos, apuntando al stub OSRM."""
+    stub, _, stub_url = start_stub_server(latency_ms=osrm_latency_ms)
+    os.environ["OSRM_BASE_URL"] = stub_url
+    if not osrm_cache:
+        os.environ["OSRM_CACHE_PATH"] = ""
+    from werkzeug.serving import make_server
+    import app as asr04_app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, asr04_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", [server, stub]
+
+
+def payload_for(endpoint: str, instance: dict, time_limit_ms, use_cache: bool):
+    body = {"points": instance["points"], "vehicles": instance["vehicles"], "use_cache": use_cache}
+    if time_limit_ms:
+        body["time_limit_ms"] = time_limit_ms
+    if endpoint == "plan" and len(instance["points"]) > 150:
+        body["distance_model"] = "sparse"
+    return body
+
+
+def run_one(session: requests.Session, base_url: str, endpoint: str, instance: dict, body: dict):
+    spec = ENDPOINTS[endpoint]
+    start = time.perf_counter()
+    try:
+        response = session.post(base_url + spec["path"], json=body, timeout=60)
+        client_ms = (time.perf_counter() - start) * 1000
+        data = response.json()
+    except Exception as e:
+        return {"endpoint": endpoint, "instance": instance["name"], "ok": False, "error": str(e),
+                "client_ms": (time.perf_counter() - start) * 1000}
+    if response.status_code != 200:
+        return {"endpoint": endpoint, "instance": instance["name"], "ok": False,
+                "error": data.get("error", f"HTTP {response.status_code}"), "client_ms": client_ms}
+    metrics = data.get("metrics", {})
+    solution = data["solution"]
+    return {
+        "endpoint": endpoint,
+        "instance": instance["name"],
+        "ok": True,
+        "client_ms": client_ms,
+        "validate_ms": metrics.get("validate_ms"),
+        "matrix_ms": metrics.get(spec["matrix"]),
+        "solve_ms": metrics.get("solve_ms"),
+        "duration_ms": metrics.get("duration_ms"),
+        "cache": metrics.get("cache"),
+        "objective": solution.get(spec["objective"]),
+        "solution_found": solution.get("solution_found", False),
+        "time_limit_reached": solution.get("solver_info", {}).get("time_limit_reached", False),
+    }
+
+
+def percentiles(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1),
+            "max": round(float(max(values)), 1)}
+
+
+def summarize(records, wall_s: float):
+    ok = [r for r in records if r["ok"]]
+    best = {}
+    for r in ok:
+        if r["solution_found"] and r["objective"] is not None:
+            best[r["instance"]] = min(best.get(r["instance"], r["objective"]), r["objective"])
+    gaps = [
+        (r["objective"] - best[r["instance"]]) / best[r["instance"]] * 100
+        for r in ok if r["instance"] in best and r["objective"] is not None and best[r["instance"]] > 0
+    ]
+    return {
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "wall_s": round(wall_s, 2),
+        "throughput_rps": round(len(ok) / wall_s, 3) if wall_s > 0 else None,
+        "slo_ms": SLO_MS,
+        "within_slo_pct": round(sum(1 for r in ok if r["client_ms"] <= SLO_MS) / len(records) * 100, 2) if records else None,
+        "phases_ms": {phase: percentiles([r.get(phase) for r in ok]) for phase in PHASES},
+        "quality": {
+            "solution_found_pct": round(sum(1 for r in ok if r["solution_found"]) / len(ok) * 100, 2) if ok else None,
+            "time_limit_reached_pct": round(sum(1 for r in ok if r["time_limit_reached"]) / len(ok) * 100, 2) if ok else None,
+            "mean_gap_to_run_best_pct": round(float(np.mean(gaps)), 3) if gaps else None,
+            "best_objective": best,
+        },
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance_pct: float, min_delta_ms: float, quality_tolerance_pct: float):
+    """Regresiones: percentiles más lentos, menos throughput, peor objetivo o menos soluciones."""
+    regressions = []
+    for endpoint, current in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(endpoint)
+        if base is None:
+            continue
+        for phase in PHASES:
+            cur_p, base_p = current["phases_ms"].get(phase), base["phases_ms"].get(phase)
+            if not cur_p or not base_p:
+                continue
+            for q in ("p95", "p99"):
+                limit = base_p[q] * (1 + tolerance_pct / 100)
+                if cur_p[q] > limit and cur_p[q] - base_p[q] >= min_delta_ms:
+                    regressions.append({"endpoint": endpoint, "metric": f"{phase}.{q}",
+                                        "baseline": base_p[q], "current": cur_p[q]})
+        if base.get("throughput_rps") and current.get("throughput_rps") is not None:
+            if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance_pct / 100):
+                regressions.append({"endpoint": endpoint, "metric": "throughput_rps",
+                                    "baseline": base["throughput_rps"], "current": current["throughput_rps"]})
+        cur_q, base_q = current["quality"], base["quality"]
+        if (cur_q["solution_found_pct"] or 0) < (base_q["solution_found_pct"] or 0):
+            regressions.append({"endpoint": endpoint, "metric": "solution_found_pct",
+                                "baseline": base_q["solution_found_pct"], "current": cur_q["solution_found_pct"]})
+        ratios = [
+            cur_q["best_objective"][name] / obj
+            for name, obj in base_q["best_objective"].items()
+            if name in cur_q["best_objective"] and obj > 0
+        ]
+        if ratios:
+            worse_pct = (float(np.mean(ratios)) - 1) * 100
+            if worse_pct > quality_tolerance_pct:
+                regressions.append({"endpoint": endpoint, "metric": "objective_vs_baseline_pct",
+                                    "baseline": 0.0, "current": round(worse_pct, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Despliegue a atacar; por defecto se levanta la app en proceso")
+    parser.add_argument("--endpoints", default="plan,plan-with-osmr")
+    parser.add_argument("--sizes", default="10,25,50,100,150")
+    parser.add_argument("--vehicles", default="1,5,10,20")
+    parser.add_argument("--kinds", default="uniform,clustered")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Solicitudes por instancia y endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--time-limit-ms", type=int, help="Por defecto el de cada endpoint")
+    parser.add_argument("--osrm-latency-ms", type=float, default=20.0)
+    parser.add_argument("--osrm-cache", action="store_true", help="Usa la caché SQLite de OSRM en proceso")
+    parser.add_argument("--use-cache", action="store_true", help="Permite aciertos de la caché de soluciones")
+    parser.add_argument("--out", help="Ruta del reporte JSON (además de imprimirlo)")
+    parser.add_argument("--baseline", help="Reporte de referencia contra el cual marcar regresiones")
+    parser.add_argument("--save-baseline", help="Guarda este reporte como nueva referencia")
+    parser.add_argument("--tolerance-pct", type=float, default=10.0)
+    parser.add_argument("--min-delta-ms", type=float, default=25.0)
+    parser.add_argument("--quality-tolerance-pct", type=float, default=2.0)
+    args = parser.parse_args()
+
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {sorted(unknown)}")
+    instances = instance_grid(
+        sizes=[int(s) for s in args.sizes.split(",")],
+        vehicles=[int(v) for v in args.vehicles.split(",")],
+        kinds=args.kinds.split(","),
+        seed=args.seed,
+    )
+
+    owned = []
+    base_url = args.url.rstrip("/") if args.url else None
+    if base_url is None:
+        base_url, owned = start_app(args.osrm_latency_ms, args.osrm_cache)
+
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "out")},
+        "instances": len(instances),
+        "endpoints": {},
+    }
+    try:
+        for endpoint in endpoints:
+            # plan-with-osmr no admite más de 150 puntos
+            targets = [i for i in instances if endpoint == "plan" or len(i["points"]) <= 150]
+            for instance in targets[:args.warmup]:
+                run_one(session(), base_url, endpoint, instance,
+                        payload_for(endpoint, instance, args.time_limit_ms, False))
+            jobs = [i for i in targets for _ in range(args.repeat)]
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                records = list(executor.map(
+                    lambda i: run_one(session(), base_url, endpoint, i,
+                                      payload_for(endpoint, i, args.time_limit_ms, args.use_cache)),
+                    jobs,
+                ))
+            wall_s = time.perf_counter() - start
+            report["endpoints"][endpoint] = summarize(records, wall_s)
+            report["endpoints"][endpoint]["failures"] = [
+                {"instance": r["instance"], "error": r["error"]} for r in records if not r["ok"]
+            ][:20]
+    finally:
+        for server in owned:
+            server.shutdown()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report, baseline, args.tolerance_pct, args.min_delta_ms,
+                                        args.quality_tolerance_pct)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text)
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
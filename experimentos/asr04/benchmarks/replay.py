@@ -0,0 +1,234 @@
+"""Repite offline, contra el resolutor actual, las solicitudes grabadas con RECORD_SAMPLE_RATE.
+
+Cada grabación se vuelve a enviar a la app en proceso con su mismo cuerpo (opciones, ids y
+puntos inválidos por motivo). /routes/plan recalcula la matriz haversine y /routes/plan-with-osmr
+recibe la matriz grabada en vez de consultar OSRM: no hay red. --speed 1 respeta los tiempos de
+llegada originales, --speed 10 los acelera 10x y --speed 0 las envía seguidas (con --concurrency
+en vuelo). Por solicitud reporta latencia y objetivo grabados contra los de ahora; con
+--max-regression-pct el código de salida es 1 si algún objetivo empeora más que eso.
+Se omiten las que no se pueden repetir sin red (matriz híbrida o por franjas).
+
+Uso:
+  python benchmarks/replay.py .cache/recordings --speed 0 --out replay.json
+  python benchmarks/replay.py .cache/recordings --speed 10 --concurrency 4 --max-regression-pct 2
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+ENDPOINTS = {
+    "plan": {"path": "/routes/plan", "objective": "total_distance_m", "matrix": "matrix_ms"},
+    "plan-with-osmr": {"path": "/routes/plan-with-osmr", "objective": "total_travel_time_s", "matrix": "traffic_matrix_ms"},
+}
+
+
+class RecordedTraffic:
+    """Reemplaza al gestor OSRM de la app: entrega la matriz grabada de la solicitud en curso.
+
+    El cliente de pruebas de Flask atiende en el hilo que llama, así que la grabación en
+    curso se pasa por un thread-local.
+    """
+
+    def __init__(self):
+        self.current = threading.local()
+
+    def calculate_traffic_matrix(self, coords, deadline=None):
+        record, arrays = self.current.record, self.current.arrays
+        if "matrix" not in arrays or len(coords) != arrays["matrix"].shape[0]:
+            raise RuntimeError("no recorded matrix for these nodes (replay is offline)")
+        info = record.get("traffic_info") or {}
+        result = {
+            "matrix": arrays["matrix"],
+            "provider_used": info.get("provider", "osrm"),
+            "has_realtime_traffic": False,
+            "calculation_time_ms": 0,
+            "cache_hit_ratio": 1.0,
+            "osrm_cells_fetched": 0,
+        }
+        if "fallback_reason" in info:
+            result["fallback_reason"] = info["fallback_reason"]
+            result["fallback_speed_kmh"] = info.get("fallback_speed_kmh")
+        return result
+
+
+def replayable(record: dict, arrays) -> str:
+    """Motivo por el que no se puede repetir sin red ('' si se puede)."""
+    if record["endpoint"] != "plan-with-osmr":
+        return ""
+    provider = (record.get("traffic_info") or {}).get("provider")
+    if provider == "osrm_hybrid":
+        return "hybrid matrix needs OSRM during the solve"
+    if provider == "time_buckets" or "matrix" not in arrays:
+        return "no recorded matrix"
+    return ""
+
+
+def load_app():
+    """La app en proceso sin estado compartido entre corridas: sin cachés, historial, grabación ni red."""
+    os.environ.update({
+        "RECORD_SAMPLE_RATE": "0",
+        "SOLUTION_CACHE_MAX_ENTRIES": "0",
+        "OSRM_CACHE_PATH": "",
+        "TIME_MATRIX_DIR": "",
+        "CONVERGENCE_HISTORY_PATH": "",
+        "PORTFOLIO_HISTORY_PATH": "",
+        "PROFILE_DIR": "",
+        # Cualquier consulta que se escape del gestor grabado falla de inmediato
+        "OSRM_BASE_URL": "http://127.0.0.1:9",
+    })
+    import app as asr04_app
+
+    logging.getLogger("asr04").setLevel(logging.WARNING)
+    traffic = RecordedTraffic()
+    asr04_app.make_traffic_manager = lambda fallback=True: traffic
+    asr04_app.readiness.run()
+    return asr04_app, traffic
+
+
+def replay_one(asr04_app, traffic, record, arrays, body, scheduled, started):
+    endpoint = ENDPOINTS[record["endpoint"]]
+    traffic.current.record, traffic.current.arrays = record, arrays
+    begin = time.perf_counter()
+    response = asr04_app.app.test_client().post(endpoint["path"], json=body)
+    latency_ms = (time.perf_counter() - begin) * 1000
+    original = record["metrics"]
+    row = {
+        "id": record["id"],
+        "endpoint": record["endpoint"],
+        "points": record["points"],
+        "invalid_points": record["invalid_points"],
+        "start_lag_ms": round((begin - started - scheduled) * 1000, 1),
+        "status": response.status_code,
+        "original": {
+            "duration_ms": original["duration_ms"],
+            "matrix_ms": original.get(endpoint["matrix"]),
+            "solve_ms": original["solve_ms"],
+            "objective": record["solution"].get(endpoint["objective"]),
+        },
+    }
+    if response.status_code != 200:
+        row["error"] = (response.get_json(silent=True) or {}).get("error")
+        return row
+    out = response.get_json()
+    objective = out["solution"].get(endpoint["objective"])
+    row["replay"] = {
+        "latency_ms": round(latency_ms, 1),
+        "duration_ms": out["metrics"]["duration_ms"],
+        "matrix_ms": out["metrics"].get(endpoint["matrix"]),
+        "solve_ms": out["metrics"]["solve_ms"],
+        "objective": objective,
+    }
+    row["duration_delta_ms"] = out["metrics"]["duration_ms"] - original["duration_ms"]
+    row["solve_delta_ms"] = out["metrics"]["solve_ms"] - original["solve_ms"]
+    previous = row["original"]["objective"]
+    if previous is not None and objective is not None:
+        row["objective_delta"] = objective - previous
+        row["objective_delta_pct"] = round((objective - previous) / previous * 100, 3) if previous else 0.0
+    if record["endpoint"] == "plan" and "matrix" in arrays:
+        # La matriz haversine de hoy contra la grabada: un cambio aquí explica diferencias de objetivo
+        row["matrix_changed"] = not np.array_equal(asr04_app.haversine_matrix(arrays["nodes"]), arrays["matrix"])
+    return row
+
+
+def percentiles(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1), "max": round(float(max(values)), 1)}
+
+
+def summarize(rows, skipped, wall_s):
+    ok = [r for r in rows if r["status"] == 200]
+    deltas = [r["objective_delta_pct"] for r in ok if "objective_delta_pct" in r]
+    return {
+        "replayed": len(rows),
+        "ok": len(ok),
+        "failed": len(rows) - len(ok),
+        "skipped": len(skipped),
+        "wall_s": round(wall_s, 2),
+        "duration_ms": {
+            "original": percentiles([r["original"]["duration_ms"] for r in ok]),
+            "replay": percentiles([r["replay"]["duration_ms"] for r in ok]),
+        },
+        "solve_ms": {
+            "original": percentiles([r["original"]["solve_ms"] for r in ok]),
+            "replay": percentiles([r["replay"]["solve_ms"] for r in ok]),
+        },
+        "start_lag_ms": percentiles([r["start_lag_ms"] for r in rows]),
+        "objective_delta_pct": {
+            "mean": round(float(np.mean(deltas)), 3) if deltas else None,
+            "worst": max(deltas, default=None),
+            "better": sum(1 for d in deltas if d < 0),
+            "equal": sum(1 for d in deltas if d == 0),
+            "worse": sum(1 for d in deltas if d > 0),
+        },
+        "matrix_changed": sum(1 for r in ok if r.get("matrix_changed")),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="Directorio de grabaciones (RECORD_DIR)")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = ritmo original, N = N veces más rápido, 0 = sin pausas")
+    parser.add_argument("--concurrency", type=int, default=4, help="Solicitudes en vuelo como máximo")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), help="Solo las de este endpoint")
+    parser.add_argument("--limit", type=int, help="Solo las primeras N grabaciones")
+    parser.add_argument("--max-regression-pct", type=float, help="Falla si algún objetivo empeora más que esto")
+    parser.add_argument("--out", help="Guardar el reporte JSON completo")
+    args = parser.parse_args()
+
+    from recorder import load_index, rebuild_body
+
+    asr04_app, traffic = load_app()
+    records = load_index(args.root)
+    if args.endpoint:
+        records = [r for r in records if r["endpoint"] == args.endpoint]
+    records = records[:args.limit]
+
+    jobs, skipped = [], []
+    for record in records:
+        with np.load(os.path.join(args.root, f"{record['id']}.npz")) as npz:
+            arrays = dict(npz)
+        reason = replayable(record, arrays)
+        if reason:
+            skipped.append({"id": record["id"], "endpoint": record["endpoint"], "reason": reason})
+            continue
+        jobs.append((record, arrays, rebuild_body(record, arrays)))
+
+    first = jobs[0][0]["received_at"] if jobs else 0.0
+    started = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for record, arrays, body in jobs:
+            scheduled = (record["received_at"] - first) / args.speed if args.speed > 0 else 0.0
+            pause = started + scheduled - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+            futures.append(executor.submit(replay_one, asr04_app, traffic, record, arrays, body, scheduled, started))
+        rows = [f.result() for f in futures]
+    wall_s = time.perf_counter() - started
+
+    report = {"root": args.root, "speed": args.speed, "concurrency": args.concurrency,
+              "summary": summarize(rows, skipped, wall_s), "skipped": skipped, "requests": rows}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps({**report, "requests": rows if not args.out else f"{len(rows)} rows in {args.out}"}, indent=2))
+    if args.max_regression_pct is not None:
+        worst = report["summary"]["objective_delta_pct"]["worst"]
+        if worst is not None and worst > args.max_regression_pct:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import logging
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from matrices import R
+
+log = logging.getLogger(__name__)
+
+_OFFSETS = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+
+class Colocation:
+    """Paradas co-ubicadas agrupadas en super-nodos (el depósito queda siempre solo).
+
+    `labels[i]` es el super-nodo de la parada i; `leaders[s]` la parada que representa al
+    super-nodo s (la primera del grupo en el orden de la solicitud, cuyas coordenadas usa
+    la matriz) y `demands[s]` cuántas paradas agrupa (0 en el depósito).
+    """
+
+    def __init__(self, labels: np.ndarray, leaders: np.ndarray, radius_m: float, build_ms: float):
+        self.labels = labels
+        self.leaders = leaders
+        self.radius_m = radius_m
+        self.build_ms = build_ms
+        self.demands = np.bincount(labels, minlength=len(leaders))
+        self.demands[0] = 0
+        # Miembros de cada super-nodo en el orden de la solicitud
+        order = np.argsort(labels, kind="stable")
+        self.members = np.split(order, np.cumsum(np.bincount(labels, minlength=len(leaders)))[:-1])
+
+    @property
+    def shrunk(self) -> bool:
+        return len(self.leaders) < len(self.labels)
+
+    def reduce(self, coords) -> np.ndarray:
+        return np.asarray(coords, dtype=np.float64).reshape(-1, 2)[self.leaders]
+
+    def reduce_routes(self, routes: List[List[int]]) -> List[List[int]]:
+        """Rutas de paradas (p. ej. previous_plan) en super-nodos; cada super-nodo queda donde aparece primero."""
+        seen = set()
+        reduced = []
+        for route in routes:
+            nodes = []
+            for node in route:
+                s = int(self.labels[node])
+                if s != 0 and s not in seen:
+                    seen.add(s)
+                    nodes.append(s)
+            reduced.append(nodes)
+        return reduced
+
+    def expand(self, result: Dict) -> Dict:
+        """Reemplaza cada super-nodo de las rutas por sus paradas; los saltos dentro de un grupo cuestan 0."""
+        for route in result.get("routes", []):
+            stops = []
+            for s in route["stops"]:
+                stops.extend([0] if s == 0 else self.members[s].tolist())
+            route["stops"] = stops
+            route["customers_served"] = sum(1 for node in stops if node != 0)
+        result["solver_info"]["colocation"] = self.info()
+        return result
+
+    def info(self) -> Dict:
+        n, m = len(self.labels), len(self.leaders)
+        return {
+            "radius_m": self.radius_m,
+            "points": n,
+            "nodes": m,
+            "merged_stops": n - m,
+            "largest_group": int(self.demands.max()) if m > 1 else 0,
+            "shrink_pct": round((1 - m / n) * 100, 2),
+            "matrix_cells_saved_pct": round((1 - (m / n) ** 2) * 100, 2),
+            "build_ms": round(self.build_ms, 2),
+        }
+
+
+def merge_colocated(coords, radius_m: float) -> Colocation:
+    """Agrupa paradas a menos de `radius_m` metros del representante de su grupo.
+
+    Agrupamiento por líder en orden de la solicitud sobre una rejilla de celdas de lado
+    `radius_m` (proyección equirectangular local): solo se recorren en Python las paradas
+    con otra parada en su vecindario 3x3; las aisladas se resuelven vectorizadas.
+    """
+    start = time.perf_counter()
+    arr = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    n = len(arr)
+    x = R * arr[:, 1] * np.cos(arr[:, 0].mean())
+    y = R * arr[:, 0]
+    cell = max(float(radius_m), 0.01)
+    cx = np.floor((x - x.min()) / cell).astype(np.int64)
+    cy = np.floor((y - y.min()) / cell).astype(np.int64)
+    width = int(cx.max()) + 3
+    key = (cy + 1) * width + (cx + 1)
+    key[0] = -1  # el depósito no se agrupa
+
+    sorted_keys, counts = np.unique(key[1:], return_counts=True)
+    crowded = np.zeros(n, dtype=bool)
+    for dx, dy in _OFFSETS:
+        at = np.minimum(np.searchsorted(sorted_keys, key + dy * width + dx), len(sorted_keys) - 1)
+        hit = sorted_keys[at] == key + dy * width + dx
+        # La celda propia cuenta si tiene otra parada además de esta
+        crowded |= hit & (counts[at] > (1 if dx == dy == 0 else 0))
+    crowded[0] = False
+
+    labels = np.empty(n, dtype=np.intp)
+    is_leader = ~crowded
+    is_leader[0] = True
+    radius2 = float(radius_m) ** 2
+    leaders_by_cell: Dict[int, List[int]] = {}
+    for i in np.flatnonzero(crowded).tolist():
+        found = -1
+        for dx, dy in _OFFSETS:
+            for j in leaders_by_cell.get(int(key[i]) + dy * width + dx, ()):
+                if (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 <= radius2:
+                    found = j
+                    break
+            if found >= 0:
+                break
+        if found < 0:
+            is_leader[i] = True
+            leaders_by_cell.setdefault(int(key[i]), []).append(i)
+            found = i
+        labels[i] = found
+
+    leaders = np.flatnonzero(is_leader)
+    node_of = np.full(n, -1, dtype=np.intp)
+    node_of[leaders] = np.arange(len(leaders))
+    labels[is_leader] = leaders
+    labels = node_of[labels]
+    colocation = Colocation(labels, leaders, float(radius_m), (time.perf_counter() - start) * 1000)
+    if colocation.shrunk:
+        log.debug("Paradas co-ubicadas agrupadas", extra={"fields": colocation.info()})
+    return colocation
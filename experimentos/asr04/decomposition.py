@@ -0,0 +1,277 @@
+import logging
+import math
+import time
+
+import numpy as np
+
+from matrices import HaversineLookup, haversine_matrix
+from vrp_solver import solve_vrp
+
+log = logging.getLogger(__name__)
+
+
+def sweep_clusters(coords: np.ndarray, n_clusters: int):
+    """Sectores angulares alrededor del depósito (coords[0]) con igual número de paradas.
+
+    El barrido empieza en el mayor hueco angular para no partir un grupo denso en dos.
+    """
+    depot = coords[0]
+    customers = np.arange(1, len(coords))
+    angles = np.arctan2(coords[1:, 0] - depot[0], (coords[1:, 1] - depot[1]) * math.cos(math.radians(depot[0])))
+    order = np.argsort(angles)
+    sorted_angles = angles[order]
+    gaps = np.diff(np.concatenate([sorted_angles, sorted_angles[:1] + 2 * math.pi]))
+    start = (int(np.argmax(gaps)) + 1) % len(order)
+    order = np.roll(order, -start)
+    return [customers[chunk] for chunk in np.array_split(order, n_clusters) if len(chunk)]
+
+
+def kmeans_clusters(coords: np.ndarray, n_clusters: int, iterations: int = 25, seed: int = 0):
+    """k-means (Lloyd) sobre las paradas en coordenadas planas locales."""
+    customers = np.arange(1, len(coords))
+    scale = math.cos(math.radians(float(coords[0, 0])))
+    xy = np.column_stack([coords[1:, 0], coords[1:, 1] * scale])
+    rng = np.random.default_rng(seed)
+    centroids = xy[rng.choice(len(xy), size=n_clusters, replace=False)]
+    labels = np.zeros(len(xy), dtype=np.intp)
+    for iteration in range(iterations):
+        d2 = ((xy[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+        new_labels = np.argmin(d2, axis=1)
+        if iteration > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for k in range(n_clusters):
+            members = xy[labels == k]
+            if len(members):
+                centroids[k] = members.mean(axis=0)
+    return [customers[labels == k] for k in range(n_clusters) if np.any(labels == k)]
+
+
+def allocate_vehicles(sizes, n_vehicles: int):
+    """Reparte vehículos proporcionalmente al tamaño de cada región (mínimo uno por región)."""
+    sizes = np.asarray(sizes, dtype=np.float64)
+    alloc = np.ones(len(sizes), dtype=np.int64)
+    spare = n_vehicles - len(sizes)
+    if spare > 0:
+        share = sizes / sizes.sum() * n_vehicles - 1
+        extra = np.floor(np.clip(share, 0, None)).astype(np.int64)
+        while extra.sum() > spare:
+            extra[np.argmax(extra)] -= 1
+        remainder = share - extra
+        for k in np.argsort(-remainder)[:spare - extra.sum()]:
+            extra[k] += 1
+        alloc += extra
+    return alloc
+
+
+def cluster_order(coords: np.ndarray, clusters):
+    """Regiones en orden angular alrededor del depósito (por su centroide), para repartirlas contiguas."""
+    depot = coords[0]
+    scale = math.cos(math.radians(float(depot[0])))
+    angles = [
+        math.atan2(float(coords[m, 0].mean() - depot[0]), float(coords[m, 1].mean() - depot[1]) * scale)
+        for m in clusters
+    ]
+    return [clusters[i] for i in np.argsort(angles, kind="stable")]
+
+
+def share_vehicles(sizes, n_vehicles: int):
+    """Vehículo de cada región cuando hay más regiones que vehículos.
+
+    Las regiones (en orden angular) se reparten en tramos contiguos con un número de paradas
+    parecido: cada región va al vehículo en cuyo tramo cae su parada del medio.
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    middle = np.cumsum(sizes) - sizes / 2
+    return np.minimum((middle / sizes.sum() * n_vehicles).astype(np.int64), n_vehicles - 1)
+
+
+def join_tours(lookup: HaversineLookup, tours):
+    """Une los recorridos de un vehículo en una sola ruta sin volver al depósito entre regiones.
+
+    Cada recorrido se invierte si así el salto desde el final del anterior es más corto.
+    """
+    route = []
+    for tour in tours:
+        if not tour:
+            continue
+        last = route[-1] if route else 0
+        if lookup[[last], [tour[-1]]][0] < lookup[[last], [tour[0]]][0]:
+            tour = tour[::-1]
+        route.extend(tour)
+    return route
+
+
+def _solve_cluster(cluster_coords, n_vehicles: int, time_limit_ms: int):
+    """Corre en un proceso resolutor: matriz solo de la región (depósito incluido)."""
+    start = time.perf_counter()
+    matrix = haversine_matrix(cluster_coords)
+    res = solve_vrp(matrix, n_vehicles, time_limit_ms=time_limit_ms)
+    return {
+        "paths": [r["stops"] for r in res["routes"]],
+        "objective": res["total_distance_m"],
+        "solution_found": res["solution_found"],
+        "solve_ms": (time.perf_counter() - start) * 1000,
+    }
+
+
+def repair_boundaries(lookup: HaversineLookup, routes, route_cluster, centroids, labels, capacity: int,
+                      boundary_ratio: float = 0.85):
+    """Reubica paradas de frontera a una ruta de la región vecina si reduce el costo y hay cupo.
+
+    Solo se consideran paradas cuyo segundo centroide más cercano está casi tan cerca como
+    el propio (relación >= boundary_ratio); los costos se calculan bajo demanda.
+    """
+    customers = np.arange(1, lookup.shape[0])
+    pts = np.column_stack([lookup.lat[1:], lookup.lon[1:]])
+    d = np.sqrt(((pts[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2))
+    nearest = np.argsort(d, axis=1)[:, :2]
+    own = d[np.arange(len(pts)), labels]
+    neighbour = np.where(nearest[:, 0] == labels, nearest[:, 1], nearest[:, 0])
+    other = d[np.arange(len(pts)), neighbour]
+    boundary = customers[(own / np.maximum(other, 1e-12)) >= boundary_ratio]
+
+    where = {}
+    for r, route in enumerate(routes):
+        for pos, node in enumerate(route):
+            where[node] = (r, pos)
+
+    moves = 0
+    gain_total = 0
+    for node in boundary.tolist():
+        r, pos = where[node]
+        route = routes[r]
+        prev_node = route[pos - 1] if pos > 0 else 0
+        next_node = route[pos + 1] if pos + 1 < len(route) else 0
+        removal_gain = int(lookup[[prev_node, node], [node, next_node]].sum() - lookup[[prev_node], [next_node]][0])
+
+        best = None
+        target_cluster = neighbour[node - 1]
+        for t, target in enumerate(routes):
+            if route_cluster[t] != target_cluster or len(target) >= capacity:
+                continue
+            tour = np.asarray([0] + target + [0], dtype=np.intp)
+            here = np.full(len(tour) - 1, node, dtype=np.intp)
+            deltas = lookup[tour[:-1], here] + lookup[here, tour[1:]] - lookup[tour[:-1], tour[1:]]
+            p = int(np.argmin(deltas))
+            if best is None or deltas[p] < best[0]:
+                best = (int(deltas[p]), t, p)
+        if best is not None and best[0] < removal_gain:
+            _, t, p = best
+            route.pop(pos)
+            routes[t].insert(p, node)
+            for q, moved in enumerate(route):
+                where[moved] = (r, q)
+            for q, moved in enumerate(routes[t]):
+                where[moved] = (t, q)
+            moves += 1
+            gain_total += removal_gain - best[0]
+    return moves, gain_total
+
+
+def solve_decomposed(pool, coords, n_vehicles: int, time_limit_ms: int = 3500, method: str = "sweep",
+                     cluster_size: int = 120):
+    """Agrupa primero, resuelve sub-VRPs en paralelo, une y repara fronteras.
+
+    Se arman ceil(clientes / cluster_size) regiones. Con vehículos de sobra cada región recibe
+    los suyos (ver allocate_vehicles); con más regiones que vehículos, cada vehículo recorre
+    un tramo contiguo de regiones (ver share_vehicles) y sus recorridos se unen en una ruta.
+    Nunca construye la matriz N x N completa: cada región arma la suya y la reparación
+    usa distancias bajo demanda. El resultado tiene el formato de solve_vrp.
+    """
+    if method not in ("sweep", "kmeans"):
+        raise ValueError("method must be 'sweep' or 'kmeans'")
+    if cluster_size < 1:
+        raise ValueError("cluster_size must be positive")
+    start = time.perf_counter()
+    coords = np.asarray(coords, dtype=np.float64)
+    n_customers = len(coords) - 1
+    # El número de regiones lo fija cluster_size; con más regiones que vehículos, estos se comparten
+    n_clusters = max(1, min(n_customers, math.ceil(n_customers / cluster_size)))
+    if method == "kmeans":
+        clusters = cluster_order(coords, kmeans_clusters(coords, n_clusters))
+    else:
+        clusters = sweep_clusters(coords, n_clusters)
+    shared = len(clusters) > n_vehicles
+    if shared:
+        vehicles_per_cluster = np.ones(len(clusters), dtype=np.int64)
+        cluster_vehicle = share_vehicles([len(c) for c in clusters], n_vehicles)
+    else:
+        vehicles_per_cluster = allocate_vehicles([len(c) for c in clusters], n_vehicles)
+
+    # Si hay más regiones que procesos, se resuelven por oleadas dentro del mismo plazo;
+    # 10% por oleada cubre la construcción del modelo y el ida y vuelta al proceso
+    waves = math.ceil(len(clusters) / pool.workers)
+    repair_margin_ms = 150
+    cluster_limit_ms = max(100, int((time_limit_ms - repair_margin_ms) / waves * 0.9))
+
+    futures = [
+        pool.run(_solve_cluster, np.vstack([coords[:1], coords[members]]), int(k), cluster_limit_ms)
+        for members, k in zip(clusters, vehicles_per_cluster)
+    ]
+    outcomes = [f.result() for f in futures]
+
+    routes = []
+    route_cluster = []
+    labels = np.zeros(n_customers, dtype=np.intp)
+    centroids = np.zeros((len(clusters), 2))
+    for c, (members, outcome) in enumerate(zip(clusters, outcomes)):
+        labels[members - 1] = c
+        centroids[c] = np.radians(coords[members].mean(axis=0))
+        for path in outcome["paths"]:
+            routes.append([int(members[node - 1]) for node in path if node != 0])
+            route_cluster.append(c)
+
+    lookup = HaversineLookup(coords)
+    capacity = max(1, math.ceil(n_customers / n_vehicles)) if n_vehicles > 1 else n_customers
+    t_repair = time.perf_counter()
+    # Compartiendo vehículos se repara entre recorridos de región: ninguno crece más que el mayor
+    moves, gain = repair_boundaries(lookup, routes, route_cluster, centroids, labels,
+                                    max(len(r) for r in routes) if shared else capacity)
+    if shared:
+        routes = [
+            join_tours(lookup, [routes[t] for t in range(len(routes)) if cluster_vehicle[route_cluster[t]] == v])
+            for v in range(n_vehicles)
+        ]
+    repair_ms = (time.perf_counter() - t_repair) * 1000
+
+    solve_time = (time.perf_counter() - start) * 1000
+    out_routes = []
+    total = 0
+    for v, route in enumerate(routes):
+        path = [0] + route + [0]
+        nodes = np.asarray(path, dtype=np.intp)
+        dist = int(lookup[nodes[:-1], nodes[1:]].sum())
+        out_routes.append({"vehicle": v, "stops": path, "distance_m": dist, "customers_served": len(route)})
+        total += dist
+
+    solution_found = all(o["solution_found"] for o in outcomes)
+    active_vehicles = sum(1 for r in out_routes if r["customers_served"] > 0)
+    log.debug("Descomposición resuelta", extra={"fields": {"clusters": len(clusters), "boundary_moves": moves, "solve_ms": int(solve_time)}})
+    return {
+        "routes": out_routes,
+        "total_distance_m": total,
+        "solution_found": solution_found,
+        "solver_info": {
+            "actual_solve_time_ms": int(solve_time),
+            "time_limit_used_ms": time_limit_ms,
+            "solver_status": None,
+            "time_limit_reached": solve_time >= time_limit_ms * 0.95,
+            "decomposition": {
+                "method": method,
+                "cluster_size": cluster_size,
+                "shared_vehicles": shared,
+                "cluster_time_limit_ms": cluster_limit_ms,
+                "clusters": [
+                    {"points": int(len(m)), "vehicles": int(k), "objective": o["objective"], "solve_ms": int(o["solve_ms"]),
+                     **({"vehicle": int(cluster_vehicle[c])} if shared else {})}
+                    for c, (m, k, o) in enumerate(zip(clusters, vehicles_per_cluster, outcomes))
+                ],
+                "boundary_moves": moves,
+                "boundary_gain_m": gain,
+                "repair_ms": int(repair_ms),
+            },
+        },
+        "active_vehicles": active_vehicles,
+        "vehicle_utilization": active_vehicles / n_vehicles,
+    }
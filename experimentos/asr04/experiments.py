@@ -0,0 +1,410 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from shared_solve import share_matrix, solve_shared
+from vrp_solver import COST_KINDS
+
+log = logging.getLogger(__name__)
+
+PROVIDERS = ("haversine", "osrm")
+
+
+class ExperimentQueueFullError(Exception):
+    """Hay demasiados experimentos en curso."""
+
+
+def run_experiment(pool, builders: Dict[str, Callable[[], tuple]], n_vehicles: int, time_limits, seeds):
+    """Recorre la grilla proveedor x límite x semilla en el SolverPool y emite eventos a medida que terminan.
+
+    `builders` mapea proveedor -> función que devuelve (matriz, cost_kind, extras). Cada matriz
+    se construye una sola vez y todas sus corridas la leen desde memoria compartida; las corridas
+    de un proveedor arrancan mientras se construye la matriz del siguiente. Genera tuplas
+    ('matrix', {...}) y ('run', {...}); si la matriz de un proveedor no se puede construir,
+    cada una de sus corridas sale como 'run' con error (cuenta en failed_runs).
+    """
+    shared = []
+    pending = {}
+    try:
+        for provider, build in builders.items():
+            start = time.perf_counter()
+            try:
+                matrix, cost_kind, extra = build()
+            except Exception as e:
+                log.warning("Experimento: no se pudo construir la matriz",
+                            extra={"fields": {"provider": provider, "error": str(e)}})
+                yield "matrix", {"provider": provider, "error": str(e)}
+                for time_limit in time_limits:
+                    for seed in seeds:
+                        yield "run", {"provider": provider, "time_limit_ms": time_limit, "seed": seed,
+                                      "error": f"matrix build failed: {e}"}
+                continue
+            shm, shape, dtype = share_matrix(matrix)
+            shared.append(shm)
+            yield "matrix", {"provider": provider, "cost_kind": cost_kind,
+                             "matrix_ms": int((time.perf_counter() - start) * 1000), **extra}
+            for time_limit in time_limits:
+                for seed in seeds:
+                    future = pool.run(solve_shared, shm.name, shape, dtype, n_vehicles, time_limit, {"seed": seed}, cost_kind)
+                    pending[future] = (provider, cost_kind, time_limit, seed)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider, cost_kind, time_limit, seed = pending.pop(future)
+                run = {"provider": provider, "time_limit_ms": time_limit, "seed": seed}
+                try:
+                    solution = future.result()["solution"]
+                except Exception as e:
+                    yield "run", {**run, "error": str(e)}
+                    continue
+                yield "run", {
+                    **run,
+                    "objective": solution[COST_KINDS[cost_kind]["total_key"]],
+                    "solve_time_ms": solution["solver_info"]["actual_solve_time_ms"],
+                    "solution_found": solution["solution_found"],
+                    "solution": solution,
+                }
+    finally:
+        # Si el consumidor abandona el generador: se cancela lo que no arrancó y se espera lo que ya lee la matriz
+        for future in pending:
+            future.cancel()
+        wait([f for f in pending if not f.cancelled()])
+        for shm in shared:
+            shm.close()
+            shm.unlink()
+
+
+def get_customer_assignments(routes):
+    assignments = {}
+    for route in routes:
+        vehicle = route["vehicle"]
+        for stop in route["stops"]:
+            if stop != 0:
+                assignments[stop] = vehicle
+    return assignments
+
+
+def calculate_route_similarity(routes1, routes2):
+    if not routes1 or not routes2:
+        return 0.0
+
+    assignments1 = get_customer_assignments(routes1)
+    assignments2 = get_customer_assignments(routes2)
+
+    if not assignments1 or not assignments2:
+        return 0.0
+
+    total_customers = len(set(assignments1.keys()) | set(assignments2.keys()))
+    if total_customers == 0:
+        return 100.0
+
+    identical_assignments = 0
+    for customer in assignments1:
+        if customer in assignments2 and assignments1[customer] == assignments2[customer]:
+            identical_assignments += 1
+
+    route_order_similarity = 0
+    total_routes = max(len(routes1), len(routes2))
+
+    for route1 in routes1:
+        best_match = 0
+        for route2 in routes2:
+            stops1 = [s for s in route1["stops"] if s != 0]
+            stops2 = [s for s in route2["stops"] if s != 0]
+
+            if set(stops1) == set(stops2):
+                if stops1 == stops2:
+                    best_match = 1.0
+                else:
+                    best_match = 0.7
+                break
+        route_order_similarity += best_match
+
+    assignment_similarity = (identical_assignments / total_customers) * 100
+    order_similarity = (route_order_similarity / total_routes) * 100 if total_routes > 0 else 0
+
+    return (assignment_similarity * 0.7) + (order_similarity * 0.3)
+
+
+def analyze_route_differences(routes1, routes2):
+    assignments1 = get_customer_assignments(routes1)
+    assignments2 = get_customer_assignments(routes2)
+
+    different_assignments = 0
+    route_order_differences = 0
+
+    for customer in assignments1:
+        if customer in assignments2 and assignments1[customer] != assignments2[customer]:
+            different_assignments += 1
+
+    for route1 in routes1:
+        for route2 in routes2:
+            if route1["vehicle"] == route2["vehicle"]:
+                stops1 = [s for s in route1["stops"] if s != 0]
+                stops2 = [s for s in route2["stops"] if s != 0]
+                if set(stops1) == set(stops2) and stops1 != stops2:
+                    route_order_differences += 1
+
+    return {
+        "different_assignments": different_assignments,
+        "route_order_differences": route_order_differences,
+        "total_customers": len(assignments1)
+    }
+
+
+def determine_overall_conclusion(pattern_similarity, route_similarity):
+    if pattern_similarity > 85 and route_similarity > 90:
+        return "MÉTODOS VIRTUALMENTE IDÉNTICOS: Mismas rutas y mismo comportamiento de optimización"
+    elif pattern_similarity > 80 and route_similarity > 80:
+        return "MÉTODOS MUY SIMILARES: Comportamiento y rutas muy parecidos con diferencias menores"
+    elif pattern_similarity > 70 or route_similarity > 70:
+        return "MÉTODOS SIMILARES: Algunos patrones comunes pero con diferencias notables en rutas"
+    else:
+        return "MÉTODOS DIFERENTES: Comportamientos y decisiones de enrutamiento significativamente distintos"
+
+
+def _provider_results(provider, runs, time_limits, avg_speed_kmh):
+    """Una fila por límite con el formato previo (mejor semilla) más el detalle por semilla."""
+    results = []
+    for time_limit in time_limits:
+        cell = [r for r in runs if r["provider"] == provider and r["time_limit_ms"] == time_limit]
+        ok = [r for r in cell if "error" not in r]
+        if not ok:
+            error = cell[0]["error"] if cell else "not run"
+            results.append({"time_limit_ms": time_limit, "error": error, "method": provider})
+            continue
+        best = min(ok, key=lambda r: r["objective"])
+        row = {"time_limit_ms": time_limit}
+        if provider == "haversine":
+            row["total_distance_m"] = best["objective"]
+            row["estimated_time_s"] = int((best["objective"] / 1000) / avg_speed_kmh * 3600)
+        else:
+            row["total_time_s"] = best["objective"]
+            row["estimated_distance_m"] = int((best["objective"] / 3600) * avg_speed_kmh * 1000)
+        objectives = [r["objective"] for r in ok]
+        row.update({
+            "solve_time_ms": best["solve_time_ms"],
+            "method": provider,
+            "best_seed": best["seed"],
+            "seeds": [{"seed": r["seed"], "objective": r["objective"], "solve_time_ms": r["solve_time_ms"]}
+                      for r in sorted(ok, key=lambda r: r["seed"])],
+            "mean_objective": round(float(np.mean(objectives)), 1),
+            "objective_spread_pct": round((max(objectives) - min(objectives)) / min(objectives) * 100, 3)
+            if min(objectives) > 0 else 0.0,
+            "solution": best["solution"],
+        })
+        results.append(row)
+    return results
+
+
+def calculate_percentage_improvements(results, metric_key):
+    improvements = []
+    for i in range(1, len(results)):
+        if "error" not in results[i] and "error" not in results[i-1]:
+            prev_value = results[i-1][metric_key]
+            curr_value = results[i][metric_key]
+            improvement_pct = ((prev_value - curr_value) / prev_value) * 100 if prev_value > 0 else 0
+
+            improvements.append({
+                "from_ms": results[i-1]["time_limit_ms"],
+                "to_ms": results[i]["time_limit_ms"],
+                "improvement_pct": round(improvement_pct, 3)
+            })
+    return improvements
+
+
+def _active_routes(solution):
+    return [
+        {"vehicle": route["vehicle"], "stops": route["stops"], "customers": route["customers_served"]}
+        for route in solution.get("routes", []) if route.get("customers_served", 0) > 0
+    ]
+
+
+def summarize(runs, time_limits, avg_speed_kmh: float, seeds, matrices=None):
+    """Reporte de comparación haversine vs OSRM (mismo formato que la versión secuencial)."""
+    haversine_results = _provider_results("haversine", runs, time_limits, avg_speed_kmh)
+    osrm_results = _provider_results("osrm", runs, time_limits, avg_speed_kmh)
+
+    haversine_improvements = calculate_percentage_improvements(haversine_results, "estimated_time_s")
+    osrm_improvements = calculate_percentage_improvements(osrm_results, "total_time_s")
+
+    pattern_similarity = 0
+    if len(haversine_improvements) == len(osrm_improvements):
+        differences = [abs(h["improvement_pct"] - o["improvement_pct"])
+                       for h, o in zip(haversine_improvements, osrm_improvements)]
+        avg_difference = sum(differences) / len(differences) if differences else 0
+        pattern_similarity = max(0, 100 - avg_difference * 10)
+
+    route_comparisons = []
+    for h_result, o_result in zip(haversine_results, osrm_results):
+        if "error" in h_result or "error" in o_result:
+            continue
+        h_routes = _active_routes(h_result["solution"])
+        o_routes = _active_routes(o_result["solution"])
+        route_similarity = calculate_route_similarity(h_routes, o_routes)
+        route_comparisons.append({
+            "time_limit_ms": h_result["time_limit_ms"],
+            "haversine_routes": h_routes,
+            "osrm_routes": o_routes,
+            "route_similarity_pct": route_similarity,
+            "identical_routes": route_similarity > 95,
+            "similar_assignments": route_similarity > 70,
+            "route_analysis": analyze_route_differences(h_routes, o_routes)
+        })
+
+    avg_route_similarity = sum(rc["route_similarity_pct"] for rc in route_comparisons) / len(route_comparisons) if route_comparisons else 0
+    log.info("Comparación haversine vs OSRM", extra={"fields": {
+        "pattern_similarity_pct": round(pattern_similarity, 1),
+        "avg_route_similarity_pct": round(avg_route_similarity, 1),
+        "runs": len(runs),
+    }})
+
+    return {
+        "haversine_results": haversine_results,
+        "osrm_results": osrm_results,
+        "percentage_improvements": {
+            "haversine": haversine_improvements,
+            "osrm": osrm_improvements
+        },
+        "route_analysis": {
+            "detailed_comparisons": route_comparisons,
+            "avg_route_similarity_pct": round(avg_route_similarity, 1),
+            "interpretation": {
+                "identical_routing": avg_route_similarity > 95,
+                "similar_routing": avg_route_similarity > 80,
+                "different_routing": avg_route_similarity < 70,
+                "explanation": "Alta similitud indica que ambos métodos toman decisiones de enrutamiento muy similares"
+            }
+        },
+        "pattern_analysis": {
+            "avg_speed_used_kmh": avg_speed_kmh,
+            "pattern_similarity_pct": round(pattern_similarity, 1),
+            "interpretation": {
+                "high_similarity": pattern_similarity > 80,
+                "similar_behavior": pattern_similarity > 60,
+                "explanation": "Similitud alta indica que ambos métodos siguen patrones similares de optimización"
+            }
+        },
+        "overall_comparison": {
+            "performance_pattern_similarity": round(pattern_similarity, 1),
+            "routing_decision_similarity": round(avg_route_similarity, 1),
+            "haversine_pattern": "convergencia_subita" if any(imp["improvement_pct"] > 2 for imp in haversine_improvements) else "rendimientos_decrecientes",
+            "osrm_pattern": "convergencia_subita" if any(imp["improvement_pct"] > 2 for imp in osrm_improvements) else "rendimientos_decrecientes",
+            "overall_conclusion": determine_overall_conclusion(pattern_similarity, avg_route_similarity)
+        },
+        "experiment": {
+            "seeds": list(seeds),
+            "time_limits_ms": list(time_limits),
+            "runs": len(runs),
+            "failed_runs": sum(1 for r in runs if "error" in r),
+            "failed_matrices": [m["provider"] for m in matrices or [] if "error" in m],
+            "matrices": matrices or [],
+        },
+    }
+
+
+class ExperimentJobs:
+    """Experimentos en segundo plano: la grilla corre en el SolverPool y las corridas se publican al terminar.
+
+    `get(job_id, since=k)` devuelve solo las corridas a partir de la k-ésima, con espera larga
+    hasta que llegue alguna nueva; el reporte completo queda en 'result' al finalizar.
+    """
+
+    def __init__(self, get_pool: Callable[[], object], max_pending: int, retention_s: float = 3600.0):
+        self.get_pool = get_pool
+        self.max_pending = max_pending
+        self.retention_s = retention_s
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._orchestrator = ThreadPoolExecutor(max_workers=max_pending, thread_name_prefix="experiment")
+
+    def submit(self, builders, n_vehicles: int, time_limits, seeds, avg_speed_kmh: float) -> dict:
+        with self._lock:
+            self._purge()
+            active = sum(1 for j in self._jobs.values() if j["status"] in ("queued", "running"))
+            if active >= self.max_pending:
+                raise ExperimentQueueFullError(f"experiment queue full ({self.max_pending} pending)")
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "status": "queued",
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "total_runs": len(builders) * len(time_limits) * len(seeds),
+                "matrices": [],
+                "runs": [],
+                "result": None,
+                "error": None,
+                "changed": threading.Condition(),
+            }
+            self._jobs[job_id] = job
+        self._orchestrator.submit(self._run, job, builders, n_vehicles, time_limits, seeds, avg_speed_kmh)
+        return self._view(job, 0)
+
+    def _run(self, job, builders, n_vehicles, time_limits, seeds, avg_speed_kmh):
+        try:
+            job["status"] = "running"
+            for event, payload in run_experiment(self.get_pool(), builders, n_vehicles, time_limits, seeds):
+                with job["changed"]:
+                    job["matrices" if event == "matrix" else "runs"].append(payload)
+                    job["changed"].notify_all()
+            job["result"] = summarize(job["runs"], time_limits, avg_speed_kmh, seeds, job["matrices"])
+            job["status"] = "done"
+        except Exception as e:
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            with job["changed"]:
+                job["finished_at"] = time.time()
+                job["changed"].notify_all()
+
+    def get(self, job_id: str, since: int = 0, wait_s: float = 0.0) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if wait_s > 0:
+            with job["changed"]:
+                job["changed"].wait_for(lambda: len(job["runs"]) > since or job["finished_at"] is not None,
+                                        timeout=wait_s)
+        return self._view(job, since)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._purge()
+            return {
+                "max_pending": self.max_pending,
+                "queued": sum(1 for j in self._jobs.values() if j["status"] == "queued"),
+                "running": sum(1 for j in self._jobs.values() if j["status"] == "running"),
+                "retained": len(self._jobs),
+            }
+
+    def _purge(self):
+        cutoff = time.time() - self.retention_s
+        expired = [k for k, j in self._jobs.items() if j["finished_at"] is not None and j["finished_at"] < cutoff]
+        for k in expired:
+            del self._jobs[k]
+
+    @staticmethod
+    def _view(job: dict, since: int) -> dict:
+        with job["changed"]:
+            runs = job["runs"][since:]
+            view = {
+                "job_id": job["job_id"],
+                "status": job["status"],
+                "progress": {"completed": len(job["runs"]), "total": job["total_runs"]},
+                "matrices": list(job["matrices"]),
+                "runs": runs,
+                "next_since": since + len(runs),
+            }
+        if job["status"] == "done":
+            view["result"] = job["result"]
+        elif job["status"] == "failed":
+            view["error"] = job["error"]
+        return view
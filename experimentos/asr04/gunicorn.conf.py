@@ -0,0 +1,25 @@
+"""Configuración de gunicorn para el ASR-04: `gunicorn -c gunicorn.conf.py app:app`.
+
+El maestro importa la app una sola vez (Flask, numpy, OR-Tools) y los workers la heredan
+por fork; cada worker hace una resolución sintética antes de aceptar conexiones, así la
+primera solicitud no paga la inicialización perezosa de OR-Tools.
+"""
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8080")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+# La app reparte SOLVER_POOL_WORKERS entre los workers web: que vea el mismo número que gunicorn
+os.environ["WEB_CONCURRENCY"] = str(workers)
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT_S", 60))
+preload_app = True
+
+
+def post_worker_init(worker):
+    # Con preload el maestro no arranca hilos ni procesos: el pool resolutor y el calentamiento son por worker.
+    # El pool arranca en segundo plano; el worker acepta conexiones cuando termina el calentamiento
+    import app
+
+    app.prestart_plan_jobs()
+    if not app.readiness.run():
+        worker.log.warning("Calentamiento fallido; /health/ready responde 503 y lo reintenta")
@@ -0,0 +1,190 @@
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp
+
+from vrp_solver import COST_KINDS, capacity_per_vehicle, demand_capacity, format_result
+
+log = logging.getLogger(__name__)
+
+# Largo máximo de los segmentos que mueve Or-opt
+OR_OPT_MAX_SEGMENT = 3
+
+
+def nearest_neighbor_routes(matrix: np.ndarray, n_vehicles: int, weights: np.ndarray, capacity: int) -> List[List[int]]:
+    """Una ruta por vehículo: arranca en la parada pendiente más lejana al depósito y sigue por vecino más cercano.
+
+    Una ruta se cierra solo cuando ninguna parada pendiente cabe, así con la capacidad de
+    demand_capacity todas las paradas quedan asignadas.
+    """
+    n = matrix.shape[0]
+    pending = np.ones(n, dtype=bool)
+    pending[0] = False
+    routes = []
+    for _ in range(n_vehicles):
+        route, load, current = [], 0, 0
+        while True:
+            fits = pending & (weights <= capacity - load)
+            if not fits.any():
+                break
+            row = matrix[0] if current == 0 else matrix[current]
+            candidates = np.flatnonzero(fits)
+            pick = candidates[np.argmax(row[candidates])] if current == 0 else candidates[np.argmin(row[candidates])]
+            route.append(int(pick))
+            pending[pick] = False
+            load += int(weights[pick])
+            current = int(pick)
+        routes.append(route)
+    # Con un solo vehículo (o sin 'Capacity') la capacidad es infinita: no quedan pendientes
+    for node in np.flatnonzero(pending).tolist():
+        routes[int(np.argmin([sum(weights[r]) for r in routes]))].append(node)
+    return routes
+
+
+def two_opt(matrix: np.ndarray, route: List[int]) -> (List[int], int):
+    """2-opt dentro de una ruta, vectorizado sobre todos los pares (i, j); admite matrices asimétricas.
+
+    Aplica la mejor inversión mientras mejore. Devuelve (ruta, movimientos aplicados).
+    """
+    moves = 0
+    while len(route) >= 3:
+        path = np.asarray([0] + route + [0], dtype=np.intp)
+        forward = matrix[path[:-1], path[1:]]
+        # Invertir p[i+1..j] también invierte los arcos internos: su diferencia sale de sumas acumuladas
+        inner = np.concatenate([[0], np.cumsum(matrix[path[1:], path[:-1]] - forward)])
+        i = np.arange(len(path) - 1)[:, None]
+        j = np.arange(len(path) - 1)[None, :]
+        delta = (matrix[path[i], path[j]] + matrix[path[i + 1], path[j + 1]]
+                 - forward[i] - forward[j] + inner[j] - inner[i + 1])
+        delta = np.where(j > i + 1, delta, 0)
+        best = int(np.argmin(delta))
+        if delta.flat[best] >= 0:
+            break
+        a, b = divmod(best, delta.shape[1])
+        route = route[:a] + route[a:b][::-1] + route[b:]
+        moves += 1
+    return route, moves
+
+
+def or_opt_move(matrix: np.ndarray, routes: List[List[int]], weights: np.ndarray, capacity: Optional[int]):
+    """Mejor traslado de un segmento de 1..3 paradas a otro arco (de la misma u otra ruta con cupo).
+
+    Evalúa todos los pares (segmento, arco) de una vez. Devuelve (delta, movimiento) o (0, None).
+    """
+    paths = [np.asarray([0] + r + [0], dtype=np.intp) for r in routes]
+    loads = np.asarray([int(weights[r].sum()) for r in routes])
+
+    seg_route, seg_start, seg_len = [], [], []
+    for r, route in enumerate(routes):
+        for k in range(1, min(OR_OPT_MAX_SEGMENT, len(route)) + 1):
+            starts = np.arange(1, len(route) - k + 2)
+            seg_route.append(np.full(len(starts), r))
+            seg_start.append(starts)
+            seg_len.append(np.full(len(starts), k))
+    if not seg_route:
+        return 0, None
+    seg_route, seg_start, seg_len = (np.concatenate(a) for a in (seg_route, seg_start, seg_len))
+
+    offsets = np.concatenate([[0], np.cumsum([len(p) for p in paths])])
+    flat = np.concatenate(paths)
+    edge_route = np.concatenate([np.full(len(p) - 1, r) for r, p in enumerate(paths)])
+    edge_pos = np.concatenate([np.arange(len(p) - 1) for p in paths])
+    edge_from = flat[offsets[edge_route] + edge_pos]
+    edge_to = flat[offsets[edge_route] + edge_pos + 1]
+
+    base = offsets[seg_route]
+    first = flat[base + seg_start]
+    last = flat[base + seg_start + seg_len - 1]
+    prev = flat[base + seg_start - 1]
+    nxt = flat[base + seg_start + seg_len]
+    cumulative = np.concatenate([[0], np.cumsum(weights[flat])])
+    seg_weight = cumulative[base + seg_start + seg_len] - cumulative[base + seg_start]
+
+    gain = matrix[prev, first] + matrix[last, nxt] - matrix[prev, nxt]
+    cost = (matrix[edge_from[None, :], first[:, None]] + matrix[last[:, None], edge_to[None, :]]
+            - matrix[edge_from, edge_to][None, :])
+    delta = cost - gain[:, None]
+
+    same = seg_route[:, None] == edge_route[None, :]
+    # En la misma ruta no valen los arcos que tocan el segmento (ni el anterior a él)
+    touching = same & (edge_pos[None, :] >= seg_start[:, None] - 1) & (edge_pos[None, :] <= (seg_start + seg_len - 1)[:, None])
+    invalid = touching
+    if capacity is not None:
+        invalid = invalid | (~same & (loads[edge_route][None, :] + seg_weight[:, None] > capacity))
+    delta = np.where(invalid, 0, delta)
+    best = int(np.argmin(delta))
+    if delta.flat[best] >= 0:
+        return 0, None
+    s, e = divmod(best, delta.shape[1])
+    return int(delta.flat[best]), (int(seg_route[s]), int(seg_start[s]), int(seg_len[s]),
+                                   int(edge_route[e]), int(edge_pos[e]))
+
+
+def apply_or_opt(routes: List[List[int]], move) -> List[int]:
+    """Aplica un movimiento de or_opt_move. Devuelve las rutas modificadas."""
+    r, start, length, target, pos = move
+    segment = routes[r][start - 1:start - 1 + length]
+    del routes[r][start - 1:start - 1 + length]
+    # pos es el índice del arco en la ruta original (con depósito): se inserta tras su origen
+    if target == r and pos >= start:
+        pos -= length
+    routes[target][pos:pos] = segment
+    return [r] if target == r else [r, target]
+
+
+def solve_fast(matrix: np.ndarray, n_vehicles: int, time_limit_ms: int = 50, cost_kind: str = "meters",
+               demands=None) -> Dict:
+    """Modo rápido sin OR-Tools: vecino más cercano con capacidad balanceada + 2-opt y Or-opt vectorizados.
+
+    Respeta la misma capacidad que la dimensión 'Capacity' de build_model (o la de `demands`)
+    y devuelve el formato de solve_vrp; sus rutas sirven como `initial_routes` del resolutor.
+    """
+    if cost_kind not in COST_KINDS:
+        raise ValueError(f"cost_kind must be one of {sorted(COST_KINDS)}")
+    start = time.perf_counter()
+    deadline = start + time_limit_ms / 1000
+    matrix = np.asarray(matrix, dtype=np.int64)
+    n = matrix.shape[0]
+    if demands is None:
+        weights = np.ones(n, dtype=np.int64)
+        capacity = capacity_per_vehicle(n, n_vehicles)
+    else:
+        weights = np.asarray(demands, dtype=np.int64)
+        capacity = demand_capacity(demands, n_vehicles)
+    weights[0] = 0
+
+    routes = nearest_neighbor_routes(matrix, n_vehicles, weights, capacity if capacity is not None else n * int(weights.max() or 1))
+    initial_objective = sum(int(matrix[np.asarray([0] + r), np.asarray(r + [0])].sum()) for r in routes if r)
+
+    two_opt_moves, or_opt_moves = 0, 0
+    for v, route in enumerate(routes):
+        routes[v], moves = two_opt(matrix, route)
+        two_opt_moves += moves
+    converged = False
+    while time.perf_counter() < deadline:
+        delta, move = or_opt_move(matrix, routes, weights, capacity)
+        if move is None:
+            converged = True
+            break
+        or_opt_moves += 1
+        for v in apply_or_opt(routes, move):
+            routes[v], moves = two_opt(matrix, routes[v])
+            two_opt_moves += moves
+
+    solve_time = (time.perf_counter() - start) * 1000
+    paths = [[0] + r + [0] for r in routes]
+    result = format_result(matrix, paths, n_vehicles, cost_kind, solve_time, time_limit_ms,
+                           pywrapcp.RoutingModel.ROUTING_SUCCESS, True)
+    result["solver_info"]["time_limit_reached"] = not converged
+    result["solver_info"]["fast"] = {
+        "construction": "nearest_neighbor",
+        "initial_objective": initial_objective,
+        "two_opt_moves": two_opt_moves,
+        "or_opt_moves": or_opt_moves,
+        "converged": converged,
+        "capacity": capacity,
+    }
+    log.debug("Modo rápido resuelto", extra={"fields": {"points": n, "solve_ms": round(solve_time, 2), **result["solver_info"]["fast"]}})
+    return result
@@ -0,0 +1,261 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from matrices import haversine_matrix, knn_haversine
+from osrm_client import UNREACHABLE_S
+from vrp_solver import format_result, solve_vrp
+
+log = logging.getLogger(__name__)
+
+# Bloques de la matriz híbrida en vuelo a la vez (cada uno a su vez se divide en teselas del cliente)
+_fetch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-block")
+
+
+class DetourCalibration:
+    """Factor segundos/metro por región (celda de rejilla del origen), aprendido de celdas OSRM reales.
+
+    Cada lote de duraciones OSRM actualiza la mediana del cociente duración / distancia haversine
+    de cada región; las regiones con menos de `min_samples` muestras usan el factor global.
+    """
+
+    def __init__(self, prior_speed_kmh: float = 30.0, cell_deg: float = 0.05, min_samples: int = 20,
+                 max_weight: int = 2000, min_distance_m: float = 200.0):
+        self.cell_deg = cell_deg
+        self.min_samples = min_samples
+        self.max_weight = max_weight
+        self.min_distance_m = min_distance_m
+        self.global_factor = 3.6 / prior_speed_kmh
+        self.global_samples = 0
+        self._regions: Dict[Tuple[int, int], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def region_keys(self, coords: np.ndarray):
+        cells = np.floor(np.asarray(coords, dtype=np.float64) / self.cell_deg).astype(np.int64)
+        return [tuple(c) for c in cells.tolist()]
+
+    def row_factors(self, coords) -> np.ndarray:
+        keys = self.region_keys(coords)
+        with self._lock:
+            return np.array([
+                self._regions[k][0] if k in self._regions and self._regions[k][1] >= self.min_samples
+                else self.global_factor
+                for k in keys
+            ], dtype=np.float64)
+
+    def estimate(self, coords, meters: Optional[np.ndarray] = None) -> np.ndarray:
+        """Matriz de duraciones estimadas (int32, s) = haversine x factor de la región de origen."""
+        if meters is None:
+            meters = haversine_matrix(coords)
+        return np.rint(meters * self.row_factors(coords)[:, None]).astype(np.int32)
+
+    def update(self, coords, meters: np.ndarray, rows, cols, durations: np.ndarray):
+        """Incorpora un bloque OSRM real (len(rows) x len(cols)) al factor de cada región."""
+        rows = np.asarray(rows, dtype=np.intp)
+        cols = np.asarray(cols, dtype=np.intp)
+        m = meters[np.ix_(rows, cols)].astype(np.float64)
+        d = np.asarray(durations, dtype=np.float64)
+        usable = (m >= self.min_distance_m) & (d > 0) & (d < UNREACHABLE_S)
+        if not usable.any():
+            return
+        ratio = np.where(usable, d / np.maximum(m, 1.0), np.nan)
+        keys = self.region_keys(np.asarray(coords, dtype=np.float64)[rows])
+        by_region: Dict[Tuple[int, int], List[np.ndarray]] = {}
+        for key, row in zip(keys, ratio):
+            by_region.setdefault(key, []).append(row[~np.isnan(row)])
+
+        with self._lock:
+            for key, chunks in by_region.items():
+                values = np.concatenate(chunks)
+                if not len(values):
+                    continue
+                factor, weight = self._regions.get(key, (self.global_factor, 0))
+                added = len(values)
+                factor = (factor * weight + float(np.median(values)) * added) / (weight + added)
+                self._regions[key] = (factor, min(weight + added, self.max_weight))
+            all_values = ratio[usable]
+            added = len(all_values)
+            self.global_factor = (
+                (self.global_factor * self.global_samples + float(np.median(all_values)) * added)
+                / (self.global_samples + added)
+            )
+            self.global_samples = min(self.global_samples + added, self.max_weight * 10)
+
+    def stats(self) -> dict:
+        with self._lock:
+            calibrated = sum(1 for _, w in self._regions.values() if w >= self.min_samples)
+            return {
+                "global_speed_kmh": round(3.6 / self.global_factor, 2),
+                "global_samples": self.global_samples,
+                "regions": len(self._regions),
+                "calibrated_regions": calibrated,
+            }
+
+
+class HybridMatrixProvider:
+    """Matriz de duraciones híbrida: estimación calibrada + OSRM solo para los arcos relevantes.
+
+    Se piden a OSRM (y a la caché de duraciones) la fila y columna del depósito y los k vecinos
+    más cercanos de cada parada; el resto se estima. Tras resolver, los arcos de la solución
+    que seguían estimados se refinan y, si cambian, se vuelve a resolver desde esa solución.
+    """
+
+    def __init__(self, traffic_manager, calibration: DetourCalibration, k: int = 10, group_size: int = 25):
+        self.traffic_manager = traffic_manager
+        self.calibration = calibration
+        self.k = k
+        self.group_size = group_size
+
+    def build(self, coords, deadline: Optional[float] = None):
+        """Devuelve (matriz int32, máscara de celdas reales, metros haversine, info)."""
+        start = time.perf_counter()
+        n = len(coords)
+        meters = haversine_matrix(coords)
+        matrix = self.calibration.estimate(coords, meters)
+        known = np.zeros((n, n), dtype=bool)
+        np.fill_diagonal(known, True)
+        matrix[known] = 0
+
+        cache = self.traffic_manager.cache
+        if cache is not None:
+            cached, found = cache.lookup(coords)
+            matrix[found] = cached[found]
+            known |= found
+        cache_cells = int(known.sum()) - n
+
+        # Fila y columna del depósito (1 x N y N x 1) más los vecinos de cada parada, por grupos
+        everyone = np.arange(n)
+        blocks = [(rows, cols) for rows, cols in ((np.array([0]), everyone[~known[0]]),
+                                                   (everyone[~known[:, 0]], np.array([0])))
+                  if len(rows) and len(cols)]
+        if n > 2:
+            wanted = np.zeros((n, n), dtype=bool)
+            neighbors, _ = knn_haversine(coords, min(self.k, n - 1))
+            wanted[np.repeat(everyone, neighbors.shape[1]), neighbors.ravel()] = True
+            wanted[0, :] = wanted[:, 0] = False
+            blocks += self.group_blocks(coords, wanted & ~known)
+        fetched, error = self.fetch(coords, meters, matrix, known, blocks, deadline)
+
+        info = {
+            "k": self.k,
+            "cells_total": n * n,
+            "cells_from_cache": cache_cells,
+            "osrm_cells_fetched": fetched,
+            "estimated_cells_pct": round(float((~known).sum()) / (n * n) * 100, 2),
+            "build_ms": int((time.perf_counter() - start) * 1000),
+        }
+        if error is not None:
+            info["osrm_error"] = error
+        return matrix, known, meters, info
+
+    def group_blocks(self, coords, needed):
+        """Parte las celdas `needed` en tablas rectangulares: grupos de orígenes cercanos x unión de destinos."""
+        rows = np.flatnonzero(needed.any(axis=1))
+        if not len(rows):
+            return []
+        # Orígenes en orden espacial (bandas de latitud): cada grupo comparte la mayor parte de sus destinos
+        lat = np.asarray([coords[i][0] for i in rows])
+        lng = np.asarray([coords[i][1] for i in rows])
+        band = max(float(np.ptp(lat)) / max(1, int(math.sqrt(len(rows) / self.group_size))), 1e-6)
+        order = rows[np.lexsort((lng, np.floor((lat - lat.min()) / band)))]
+        return [
+            (group, np.flatnonzero(needed[group].any(axis=0)))
+            for group in (order[g:g + self.group_size] for g in range(0, len(order), self.group_size))
+        ]
+
+    def fetch(self, coords, meters, matrix, known, blocks, deadline=None):
+        """Pide los bloques a OSRM en paralelo y los escribe en `matrix`/`known`.
+
+        Devuelve (celdas traídas, primer error o None). Los bloques fallidos siguen estimados.
+        """
+        futures = [
+            (rows, cols, _fetch_executor.submit(self.traffic_manager.fetch_table, coords, rows.tolist(), cols.tolist(), deadline))
+            for rows, cols in blocks
+        ]
+        fetched, error = 0, None
+        for rows, cols, future in futures:
+            try:
+                table = future.result()
+            except Exception as e:
+                error = error or self._unavailable(e)
+                continue
+            matrix[np.ix_(rows, cols)] = table
+            known[np.ix_(rows, cols)] = True
+            self.calibration.update(coords, meters, rows, cols, table)
+            fetched += table.size
+        return fetched, error
+
+    @staticmethod
+    def _unavailable(error: Exception) -> str:
+        log.warning("Matriz híbrida: OSRM no disponible, se conservan estimaciones",
+                    extra={"fields": {"error": str(error)}})
+        return str(error)
+
+    def refine_solution(self, coords, meters, matrix, known, result, deadline=None):
+        """Trae de OSRM los arcos de la solución aún estimados. Devuelve (arcos refinados, cambiaron, error)."""
+        needed = np.zeros_like(known)
+        for route in result["routes"]:
+            stops = np.asarray(route["stops"], dtype=np.intp)
+            if len(stops) > 1:
+                needed[stops[:-1], stops[1:]] = True
+        needed &= ~known
+        arcs = int(needed.sum())
+        if not arcs:
+            return 0, False, None
+        before = matrix[needed].copy()
+        _, error = self.fetch(coords, meters, matrix, known, self.group_blocks(coords, needed), deadline)
+        changed = bool(np.any(matrix[needed] != before))
+        return arcs, changed, error
+
+
+def solve_hybrid(provider: HybridMatrixProvider, coords, matrix, known, meters, info, n_vehicles: int,
+                 time_limit_ms: int, deadline: Optional[float] = None, first_share: float = 0.6):
+    """Resuelve sobre la matriz híbrida (de provider.build); si los arcos refinados cambian, re-resuelve en caliente.
+
+    Devuelve (resultado con formato solve_vrp en segundos, info del modo híbrido). Los costos
+    reportados usan duraciones OSRM reales en los arcos de la solución final (salvo que OSRM
+    no esté disponible). `matrix` y `known` se actualizan en el lugar.
+    """
+    start = time.perf_counter()
+    first_ms = max(100, int(time_limit_ms * first_share))
+    result = solve_vrp(matrix, n_vehicles, time_limit_ms=first_ms, cost_kind="seconds")
+    arcs, changed, error = provider.refine_solution(coords, meters, matrix, known, result, deadline)
+    estimated_objective = result["total_travel_time_s"]
+
+    resolved = False
+    if changed:
+        remaining_ms = time_limit_ms - int((time.perf_counter() - start) * 1000)
+        if remaining_ms >= 100:
+            previous = [[s for s in r["stops"] if s != 0] for r in result["routes"]]
+            result = solve_vrp(matrix, n_vehicles, time_limit_ms=remaining_ms, cost_kind="seconds",
+                               initial_routes=previous)
+            resolved = True
+            more, _, more_error = provider.refine_solution(coords, meters, matrix, known, result, deadline)
+            arcs += more
+            error = error or more_error
+
+    # Costos finales con la matriz ya refinada; el tiempo cubre ambas resoluciones y los refinamientos
+    solve_time = (time.perf_counter() - start) * 1000
+    paths = [r["stops"] for r in result["routes"]]
+    final = format_result(matrix, paths, n_vehicles, "seconds", solve_time, time_limit_ms,
+                          result["solver_info"]["solver_status"], result["solution_found"])
+    final["solver_info"] = {**result["solver_info"], **final["solver_info"]}
+
+    info.update({
+        "solution_arcs_refined": arcs,
+        "refined_arcs_changed_cost": changed,
+        "resolved": resolved,
+        "objective_on_estimates": estimated_objective,
+        # Celdas reales que no vinieron de la caché ni son la diagonal
+        "osrm_cells_fetched": int(known.sum()) - len(coords) - info["cells_from_cache"],
+        "calibration": provider.calibration.stats(),
+    })
+    if error is not None:
+        info["osrm_error"] = error
+    return final, info
+
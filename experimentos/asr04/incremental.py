@@ -0,0 +1,225 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp
+
+from vrp_solver import COST_KINDS, capacity_per_vehicle, format_result, solve_vrp
+
+log = logging.getLogger(__name__)
+
+
+class ArcCosts:
+    """Matriz de costos que se llena bajo demanda: solo se calculan los bloques que se piden.
+
+    `fetch(rows, cols)` devuelve el bloque len(rows) x len(cols); si falla y hay `estimate`,
+    el bloque se estima (p. ej. haversine a velocidad fija) y se anota el error. Con
+    `fetch_pairs(rows, cols)` los arcos sueltos se calculan celda a celda (OSRM: /route) y, si
+    falla, se estiman con `estimate_pairs`; sin él, con el rectángulo que los cubre. Se puede
+    indexar como una matriz (`costs[rows, cols]`), así format_result la acepta tal cual.
+    """
+
+    def __init__(self, n: int, fetch: Callable, matrix: Optional[np.ndarray] = None,
+                 known: Optional[np.ndarray] = None, estimate: Optional[Callable] = None,
+                 fetch_pairs: Optional[Callable] = None, estimate_pairs: Optional[Callable] = None):
+        self.shape = (n, n)
+        self.matrix = np.zeros((n, n), dtype=np.int64) if matrix is None else np.asarray(matrix, dtype=np.int64)
+        self.known = np.eye(n, dtype=bool) if known is None else (np.asarray(known, dtype=bool) | np.eye(n, dtype=bool))
+        self.fetch = fetch
+        self.estimate = estimate
+        self.fetch_pairs = fetch_pairs
+        self.estimate_pairs = estimate_pairs
+        self.computed = 0
+        self.estimated = 0
+        self.error = None
+        self.fetch_ms = 0.0
+
+    def ensure(self, rows, cols):
+        rows = np.unique(np.asarray(rows, dtype=np.intp))
+        cols = np.unique(np.asarray(cols, dtype=np.intp))
+        if not len(rows) or not len(cols):
+            return
+        missing = ~self.known[np.ix_(rows, cols)]
+        if not missing.any():
+            return
+        # Rectángulo mínimo que cubre las celdas faltantes
+        rows, cols = rows[missing.any(axis=1)], cols[missing.any(axis=0)]
+        index = np.ix_(rows, cols)
+        new_cells = int((~self.known[index]).sum())
+        start = time.perf_counter()
+        try:
+            block = np.asarray(self.fetch(rows, cols))
+            self.computed += new_cells
+        except Exception as e:
+            if self.estimate is None:
+                raise
+            self.error = self.error or str(e)
+            block = np.asarray(self.estimate(rows, cols))
+            self.estimated += new_cells
+        self.fetch_ms += (time.perf_counter() - start) * 1000
+        self.matrix[index] = block
+        self.known[index] = True
+
+    def ensure_pairs(self, rows, cols):
+        rows, cols = np.broadcast_arrays(np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp))
+        missing = ~self.known[rows, cols]
+        if not missing.any():
+            return
+        if self.fetch_pairs is None:
+            self.ensure(rows[missing], cols[missing])
+            return
+        # Pares únicos: un arco repetido se pide una vez
+        pairs = np.unique(np.stack([rows[missing], cols[missing]], axis=1), axis=0)
+        rows, cols = pairs[:, 0], pairs[:, 1]
+        start = time.perf_counter()
+        try:
+            values = np.asarray(self.fetch_pairs(rows, cols))
+            self.computed += len(rows)
+        except Exception as e:
+            if self.estimate_pairs is None:
+                raise
+            self.error = self.error or str(e)
+            values = np.asarray(self.estimate_pairs(rows, cols))
+            self.estimated += len(rows)
+        self.fetch_ms += (time.perf_counter() - start) * 1000
+        self.matrix[rows, cols] = values
+        self.known[rows, cols] = True
+
+    def __getitem__(self, key):
+        rows, cols = key
+        self.ensure_pairs(rows, cols)
+        return self.matrix[rows, cols]
+
+    def full(self) -> np.ndarray:
+        everyone = np.arange(self.shape[0])
+        self.ensure(everyone, everyone)
+        return self.matrix
+
+
+def route_arcs(routes: List[List[int]]):
+    """(orígenes, destinos, ruta) de todos los arcos de las rutas (solo clientes; el depósito es 0)."""
+    prev, nxt, owner = [], [], []
+    for r, route in enumerate(routes):
+        prev.extend([0] + route)
+        nxt.extend(route + [0])
+        owner.extend([r] * (len(route) + 1))
+    return np.asarray(prev, dtype=np.intp), np.asarray(nxt, dtype=np.intp), np.asarray(owner, dtype=np.intp)
+
+
+def plan_cost(costs: ArcCosts, routes: List[List[int]]) -> int:
+    prev, nxt, _ = route_arcs([r for r in routes if r])
+    return int(costs[prev, nxt].sum()) if len(prev) else 0
+
+
+def remove_stops(costs: ArcCosts, routes: List[List[int]], nodes) -> int:
+    """Quita los nodos uniendo cada anterior con su siguiente. Devuelve la variación del objetivo.
+
+    Los arcos nuevos de todas las rutas se piden juntos (una sola consulta de pares).
+    """
+    nodes = set(nodes)
+    changed = [r for r, route in enumerate(routes) if nodes.intersection(route)]
+    before = plan_cost(costs, [routes[r] for r in changed])
+    for r in changed:
+        routes[r][:] = [node for node in routes[r] if node not in nodes]
+    return plan_cost(costs, [routes[r] for r in changed]) - before
+
+
+def insert_cheapest(costs: ArcCosts, routes: List[List[int]], nodes, capacity: Optional[int]):
+    """Inserción más barata factible (respetando 'Capacity'), de la parada más lejana al depósito a la más cercana.
+
+    Devuelve (variación del objetivo, paradas sin lugar por capacidad).
+    """
+    nodes = np.asarray(nodes, dtype=np.intp)
+    if not len(nodes):
+        return 0, []
+    everyone = np.arange(costs.shape[0])
+    # Filas y columnas de las paradas nuevas: lo único que la inserción necesita además de los arcos actuales
+    costs.ensure(nodes, everyone)
+    costs.ensure(everyone, nodes)
+    delta, unplaced = 0, []
+    for node in nodes[np.argsort(-costs.matrix[0, nodes], kind="stable")].tolist():
+        open_routes = [r for r, route in enumerate(routes) if capacity is None or len(route) < capacity]
+        if not open_routes:
+            unplaced.append(node)
+            continue
+        prev, nxt, owner = route_arcs([routes[r] for r in open_routes])
+        position = np.concatenate([np.arange(len(routes[r]) + 1) for r in open_routes])
+        extra = costs.matrix[prev, node] + costs.matrix[node, nxt] - costs[prev, nxt]
+        best = int(np.argmin(extra))
+        routes[open_routes[owner[best]]].insert(int(position[best]), node)
+        delta += int(extra[best])
+    return delta, unplaced
+
+
+def apply_changes(costs: ArcCosts, routes: List[List[int]], add_nodes, remove_nodes, n_vehicles: int,
+                  cost_kind: str, polish_ms: int = 0) -> Dict:
+    """Quita y agrega paradas sobre un plan existente; con polish_ms > 0 pule con búsqueda local acotada
+    las rutas que cambiaron (sin pedir la matriz completa).
+
+    `routes` son nodos cliente por vehículo en el espacio de `costs` (que incluye las paradas
+    quitadas); el resultado usa el espacio compacto (sin las quitadas, en el mismo orden).
+    """
+    start = time.perf_counter()
+    n = costs.shape[0]
+    routes = [list(r) for r in routes] + [[] for _ in range(max(0, n_vehicles - len(routes)))]
+    removed = set(int(x) for x in remove_nodes)
+    keep = np.asarray([i for i in range(n) if i not in removed], dtype=np.intp)
+    capacity = capacity_per_vehicle(len(keep), n_vehicles)
+
+    submitted = [list(r) for r in routes]
+    previous_objective = plan_cost(costs, routes)
+    removal_delta = remove_stops(costs, routes, sorted(removed))
+    insertion_delta, unplaced = insert_cheapest(costs, routes, add_nodes, capacity)
+    objective = previous_objective + removal_delta + insertion_delta
+    insert_ms = (time.perf_counter() - start) * 1000
+
+    remap = np.full(n, -1, dtype=np.intp)
+    remap[keep] = np.arange(len(keep))
+    total_key = COST_KINDS[cost_kind]["total_key"]
+    polished = None
+    status = pywrapcp.RoutingModel.ROUTING_SUCCESS
+    # Se pule solo entre las rutas que cambiaron (su submatriz); lo que no cupo abre todas las rutas
+    touched = list(range(len(routes))) if unplaced else [r for r, route in enumerate(routes) if route != submitted[r]]
+    if (polish_ms > 0 and touched) or unplaced:
+        nodes = np.asarray([0] + sorted(s for r in touched for s in routes[r]) + list(unplaced), dtype=np.intp)
+        costs.ensure(nodes, nodes)
+        local = np.full(n, -1, dtype=np.intp)
+        local[nodes] = np.arange(len(nodes))
+        touched_cost = plan_cost(costs, [routes[r] for r in touched])
+        result = solve_vrp(costs.matrix[np.ix_(nodes, nodes)], len(touched), time_limit_ms=max(polish_ms, 100),
+                           cost_kind=cost_kind,
+                           initial_routes=[local[np.asarray(routes[r], dtype=np.intp)].tolist() for r in touched])
+        if result["solution_found"] and (unplaced or result[total_key] < touched_cost):
+            polished = {
+                "objective_before": objective,
+                "objective_after": objective - touched_cost + result[total_key],
+                "routes": len(touched),
+                "points": len(nodes),
+            }
+            for r, route in zip(touched, result["routes"]):
+                routes[r] = [int(nodes[s]) for s in route["stops"] if s != 0]
+            objective = polished["objective_after"]
+            status = result["solver_info"]["solver_status"]
+            unplaced = []
+    solve_time = (time.perf_counter() - start) * 1000
+
+    paths = [[0] + r + [0] for r in routes]
+    solution = format_result(costs, paths, n_vehicles, cost_kind, solve_time, polish_ms, status, True)
+    solution["solver_info"]["time_limit_reached"] = polished is not None and solution["solver_info"]["time_limit_reached"]
+    for route in solution["routes"]:
+        route["stops"] = remap[np.asarray(route["stops"], dtype=np.intp)].tolist()
+    over_capacity = sum(1 for r in routes if capacity is not None and len(r) > capacity)
+    solution["solver_info"]["incremental"] = {
+        "previous_objective": previous_objective,
+        "objective": objective,
+        "delta": objective - previous_objective,
+        "removal_delta": removal_delta,
+        "insertion_delta": insertion_delta,
+        "capacity": capacity,
+        "over_capacity_routes": over_capacity,
+        "unplaced_stops": len(unplaced),
+        "insert_ms": round(insert_ms, 2),
+        "polish": polished,
+    }
+    return solution
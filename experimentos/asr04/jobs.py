@@ -0,0 +1,250 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from telemetry import PHASE_SECONDS, record_solution
+from vrp_solver import solve_vrp
+from warmup import warm_up
+
+
+class QueueFullError(Exception):
+    """La cola de trabajos alcanzó su límite de admisión."""
+
+
+def _warm_up():
+    return warm_up()
+
+
+def _solve_in_worker(matrix: np.ndarray, n_vehicles: int, time_limit_ms: int, cost_kind: str):
+    started = time.time()
+    result = solve_vrp(matrix, n_vehicles, time_limit_ms=time_limit_ms, cost_kind=cost_kind)
+    return started, result
+
+
+class SolverPool:
+    """Pool acotado de procesos resolutores arrancados de antemano ('spawn': sin hilos heredados)."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        # Fuerza el arranque de todos los procesos (import de OR-Tools y una resolución sintética) antes del primer trabajo
+        for future in [self._executor.submit(_warm_up) for _ in range(workers)]:
+            future.result()
+
+    def submit(self, matrix: np.ndarray, n_vehicles: int, time_limit_ms: int, cost_kind: str):
+        return self._executor.submit(_solve_in_worker, matrix, n_vehicles, time_limit_ms, cost_kind)
+
+    def run(self, fn, *args):
+        """Ejecuta una función arbitraria (importable a nivel de módulo) en un proceso resolutor."""
+        return self._executor.submit(fn, *args)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedJobCounts:
+    """Cuentas de trabajos de todos los workers web del host, en memoria compartida.
+
+    Se crea antes del fork (gunicorn con preload_app importa la app en el maestro) y cada
+    worker web publica en su propia fila cuántos trabajos tiene activos, en cola y resolviendo
+    y su profundidad de cola. La admisión y /routes/jobs/stats suman las filas de los procesos
+    vivos; la fila de un worker reciclado deja de contar y se reutiliza.
+    """
+
+    FIELDS = ("active", "queued", "solving", "queue_depth")
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.lock = multiprocessing.Lock()
+        self._pids = multiprocessing.RawArray("q", slots)
+        self._counts = multiprocessing.RawArray("q", slots * len(self.FIELDS))
+        self._row = None
+        self._row_pid = None
+
+    def _own_row(self) -> int:
+        """Fila de este proceso (se toma una libre la primera vez); llamar con `lock` tomado."""
+        pid = os.getpid()
+        if self._row_pid == pid:
+            return self._row
+        free = [r for r in range(self.slots) if self._pids[r] == 0 or not _alive(self._pids[r])]
+        if not free:
+            raise RuntimeError(f"no free job counter slot ({self.slots} web workers alive)")
+        row = free[0]
+        self._pids[row] = pid
+        width = len(self.FIELDS)
+        self._counts[row * width:(row + 1) * width] = [0] * width
+        self._row, self._row_pid = row, pid
+        return row
+
+    def publish(self, **values):
+        """Reemplaza las cuentas de este proceso; llamar con `lock` tomado."""
+        row = self._own_row()
+        width = len(self.FIELDS)
+        for name, value in values.items():
+            self._counts[row * width + self.FIELDS.index(name)] = value
+
+    def totals(self) -> Dict[str, int]:
+        """Sumas sobre los workers web vivos; llamar con `lock` tomado."""
+        width = len(self.FIELDS)
+        out = dict.fromkeys(self.FIELDS, 0)
+        out["web_workers"] = 0
+        for row in range(self.slots):
+            pid = self._pids[row]
+            if pid == 0 or (pid != os.getpid() and not _alive(pid)):
+                continue
+            out["web_workers"] += 1
+            for i, name in enumerate(self.FIELDS):
+                out[name] += self._counts[row * width + i]
+        return out
+
+
+class PlanJobs:
+    """Trabajos de planificación asíncronos: admisión, estado, espera larga y profundidad de cola.
+
+    La matriz se construye en un hilo del proceso HTTP (E/S hacia OSRM o NumPy) y la
+    resolución se delega al SolverPool, así los workers web nunca bloquean en OR-Tools.
+    `max_pending` acota los trabajos activos de todo el host cuando `counts` es compartido
+    entre los workers web (ver SharedJobCounts); sin él, los de este proceso.
+    """
+
+    def __init__(self, pool: SolverPool, max_pending: int, retention_s: float = 600.0,
+                 counts: Optional[SharedJobCounts] = None):
+        self.pool = pool
+        self.max_pending = max_pending
+        self.retention_s = retention_s
+        self.counts = counts if counts is not None else SharedJobCounts(slots=1)
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._orchestrator = ThreadPoolExecutor(max_workers=max_pending, thread_name_prefix="plan-job")
+
+    def submit(self, build_matrix: Callable[[], dict], n_vehicles: int, time_limit_ms: int,
+               cost_kind: str, metrics: dict) -> dict:
+        """`build_matrix` devuelve {'matrix': ndarray, ...extras de respuesta} y corre fuera del request."""
+        with self._lock, self.counts.lock:
+            self._purge()
+            self._publish()
+            if self.counts.totals()["active"] >= self.max_pending:
+                raise QueueFullError(f"job queue full ({self.max_pending} pending)")
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "status": "queued",
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "error": None,
+                "done": threading.Event(),
+            }
+            self._jobs[job_id] = job
+            self._publish()
+        self._orchestrator.submit(self._run, job, build_matrix, n_vehicles, time_limit_ms, cost_kind, metrics)
+        return self._view(job)
+
+    def _run(self, job, build_matrix, n_vehicles, time_limit_ms, cost_kind, metrics):
+        try:
+            t0 = time.perf_counter()
+            built = build_matrix()
+            matrix = built.pop('matrix')
+            t1 = time.perf_counter()
+            self._set_status(job, "solving")
+            submitted = time.time()
+            started, solution = self.pool.submit(matrix, n_vehicles, time_limit_ms, cost_kind).result()
+            t2 = time.perf_counter()
+
+            out = {"solution": solution, **built}
+            out["metrics"] = {
+                **metrics,
+                "matrix_ms": int((t1 - t0) * 1000),
+                "queue_wait_ms": int(max(0.0, started - submitted) * 1000),
+                "solve_ms": solution["solver_info"]["actual_solve_time_ms"],
+                "duration_ms": int((time.time() - job["submitted_at"]) * 1000) + metrics.get("validate_ms", 0),
+                "pool_round_trip_ms": int((t2 - t1) * 1000),
+            }
+            PHASE_SECONDS.observe(t1 - t0, endpoint="jobs", phase="matrix")
+            PHASE_SECONDS.observe(max(0.0, started - submitted), endpoint="jobs", phase="queue_wait")
+            PHASE_SECONDS.observe(solution["solver_info"]["actual_solve_time_ms"] / 1000, endpoint="jobs", phase="solve")
+            record_solution("jobs", solution)
+            job["result"] = out
+            self._set_status(job, "done")
+        except Exception as e:
+            job["error"] = str(e)
+            self._set_status(job, "failed")
+        finally:
+            job["finished_at"] = time.time()
+            job["done"].set()
+
+    def get(self, job_id: str, wait_s: float = 0.0) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if wait_s > 0:
+            job["done"].wait(timeout=wait_s)
+        return self._view(job)
+
+    def stats(self) -> dict:
+        """Cola de todo el host (suma de los workers web) y, en "web_worker", la de este proceso."""
+        with self._lock, self.counts.lock:
+            self._purge()
+            local = self._local_counts()
+            self.counts.publish(**local)
+            totals = self.counts.totals()
+        return {
+            "solver_workers": self.pool.workers * totals["web_workers"],
+            "max_pending": self.max_pending,
+            "web_workers": totals["web_workers"],
+            "active": totals["active"],
+            "queued": totals["queued"],
+            "solving": totals["solving"],
+            "queue_depth": totals["queue_depth"],
+            "web_worker": {"pid": os.getpid(), "solver_workers": self.pool.workers, **local},
+        }
+
+    def _set_status(self, job: dict, status: str):
+        with self._lock, self.counts.lock:
+            job["status"] = status
+            self._publish()
+
+    def _local_counts(self) -> Dict[str, int]:
+        queued = sum(1 for j in self._jobs.values() if j["status"] == "queued")
+        solving = sum(1 for j in self._jobs.values() if j["status"] == "solving")
+        # Cada worker web tiene su propio pool: lo que pasa de sus procesos espera
+        return {"active": queued + solving, "queued": queued, "solving": solving,
+                "queue_depth": queued + max(0, solving - self.pool.workers)}
+
+    def _publish(self):
+        """Publica las cuentas de este proceso; llamar con `_lock` y `counts.lock` tomados."""
+        self.counts.publish(**self._local_counts())
+
+    def _purge(self):
+        cutoff = time.time() - self.retention_s
+        expired = [k for k, j in self._jobs.items() if j["finished_at"] is not None and j["finished_at"] < cutoff]
+        for k in expired:
+            del self._jobs[k]
+
+    @staticmethod
+    def _view(job: dict) -> dict:
+        view = {"job_id": job["job_id"], "status": job["status"]}
+        if job["status"] == "done":
+            view["result"] = job["result"]
+        elif job["status"] == "failed":
+            view["error"] = job["error"]
+        return view
@@ -0,0 +1,152 @@
+import numpy as np
+
+R = 6371000.0
+
+def haversine_matrix(coords):
+    arr = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    lat, lon = arr[:, 0], arr[:, 1]
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat/2.0)**2 + np.cos(lat)[:,None]*np.cos(lat)[None,:]*np.sin(dlon/2.0)**2
+    return (2.0 * R * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))).astype(np.int64)
+
+def haversine_matrices(coords_list, max_cells: int = 32_768):
+    """Matrices haversine de muchos problemas con pocas operaciones NumPy.
+
+    Los problemas se ordenan por tamaño y se agrupan en tensores (problemas x N x N) con
+    relleno de hasta `max_cells` celdas (bloques que caben en caché: en problemas chicos se
+    ahorra el costo fijo por llamada); el resultado es idéntico a haversine_matrix por problema.
+    """
+    arrays = [np.radians(np.asarray(c, dtype=np.float64).reshape(-1, 2)) for c in coords_list]
+    out = [None] * len(arrays)
+    order = sorted(range(len(arrays)), key=lambda i: len(arrays[i]))
+    while order:
+        # El grupo arranca por el más grande pendiente: el relleno queda acotado por ese tamaño
+        size = max(1, len(arrays[order[-1]]))
+        take = max(1, min(len(order), max_cells // (size * size)))
+        group, order = order[-take:], order[:-take]
+        padded = np.zeros((len(group), size, 2))
+        for g, i in enumerate(group):
+            padded[g, :len(arrays[i])] = arrays[i]
+        lat, lon = padded[:, :, 0], padded[:, :, 1]
+        dlat = lat[:, :, None] - lat[:, None, :]
+        dlon = lon[:, :, None] - lon[:, None, :]
+        a = np.sin(dlat/2.0)**2 + np.cos(lat)[:, :, None]*np.cos(lat)[:, None, :]*np.sin(dlon/2.0)**2
+        block = (2.0 * R * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))).astype(np.int64)
+        for g, i in enumerate(group):
+            n = len(arrays[i])
+            out[i] = np.ascontiguousarray(block[g, :n, :n])
+    return out
+
+def haversine_duration_matrix(coords, speed_kmh: float):
+    """Duraciones (s) a velocidad constante; sustituto de OSRM cuando no está disponible."""
+    return np.rint(haversine_matrix(coords) * (3.6 / speed_kmh)).astype(np.int32)
+
+def haversine_pairs(lat1, lon1, lat2, lon2):
+    """Distancia en metros entre pares (radianes), con broadcasting de NumPy."""
+    a = np.sin((lat2 - lat1)/2.0)**2 + np.cos(lat1)*np.cos(lat2)*np.sin((lon2 - lon1)/2.0)**2
+    return 2.0 * R * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
+
+class HaversineLookup:
+    """Matriz haversine calculada bajo demanda: `lookup[rows, cols]` sin materializar N x N."""
+
+    def __init__(self, coords):
+        arr = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+        self.lat = arr[:, 0]
+        self.lon = arr[:, 1]
+        self.shape = (len(arr), len(arr))
+
+    def __getitem__(self, key):
+        rows, cols = key
+        rows = np.asarray(rows, dtype=np.intp)
+        cols = np.asarray(cols, dtype=np.intp)
+        return haversine_pairs(self.lat[rows], self.lon[rows], self.lat[cols], self.lon[cols]).astype(np.int64)
+
+def knn_haversine(coords, k: int):
+    """k vecinos más cercanos de cada punto con un índice espacial de rejilla.
+
+    Solo se calculan distancias entre cada celda y su vecindario (bloques float32), así que
+    la memoria es O(N * k) en vez de O(N^2). Devuelve (vecinos int32 N x k, metros int32 N x k).
+    """
+    arr = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    n = len(arr)
+    k = min(k, n - 1)
+    lat, lon = arr[:, 0], arr[:, 1]
+    x = (R * lon * np.cos(lat.mean())).astype(np.float32)
+    y = (R * lat).astype(np.float32)
+
+    # Celdas con ~(k+1)/4 puntos en promedio: el vecindario 3x3 suele bastar
+    area = max(float(np.ptp(x)) * float(np.ptp(y)), 1.0)
+    cell = max(np.sqrt(area * (k + 1) / (4.0 * n)), 1.0)
+    cx = ((x - x.min()) / cell).astype(np.int64)
+    cy = ((y - y.min()) / cell).astype(np.int64)
+    width = int(cx.max()) + 1
+    key = cy * width + cx
+    order = np.argsort(key, kind="stable")
+    sorted_keys = key[order]
+    cells, starts, counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+    slot = {int(c): (int(s), int(s + m)) for c, s, m in zip(cells, starts, counts)}
+
+    lat32, lon32 = lat.astype(np.float32), lon.astype(np.float32)
+    neighbors = np.empty((n, k), dtype=np.int32)
+    dists = np.empty((n, k), dtype=np.int32)
+    height = int(cy.max()) + 1
+    for c, (s, e) in slot.items():
+        members = order[s:e]
+        gx, gy = c % width, c // width
+        ring = 1
+        while True:
+            candidates = [
+                order[slot[yy * width + xx][0]:slot[yy * width + xx][1]]
+                for yy in range(max(0, gy - ring), min(height, gy + ring + 1))
+                for xx in range(max(0, gx - ring), min(width, gx + ring + 1))
+                if yy * width + xx in slot
+            ]
+            candidates = np.concatenate(candidates)
+            if len(candidates) > k:
+                d = haversine_pairs(lat32[members][:, None], lon32[members][:, None],
+                                    lat32[candidates][None, :], lon32[candidates][None, :])
+                d[members[:, None] == candidates[None, :]] = np.inf
+                part = np.argpartition(d, k - 1, axis=1)[:, :k]
+                kth = np.take_along_axis(d, part, axis=1).max()
+                # Exacto si el k-ésimo vecino cae dentro del radio cubierto por el vecindario
+                if kth <= ring * cell or len(candidates) == n:
+                    break
+            ring += 1
+        part_d = np.take_along_axis(d, part, axis=1)
+        rank = np.argsort(part_d, axis=1)
+        neighbors[members] = candidates[np.take_along_axis(part, rank, axis=1)]
+        dists[members] = np.take_along_axis(part_d, rank, axis=1)
+    return neighbors, dists
+
+class KnnDistanceModel:
+    """Modelo disperso: arcos a los k vecinos precalculados, el resto bajo demanda.
+
+    `model[rows, cols]` devuelve metros como una matriz densa, sin materializarla.
+    """
+
+    def __init__(self, coords, k: int = 20):
+        self.lookup = HaversineLookup(coords)
+        self.shape = self.lookup.shape
+        self.neighbors, self.dists = knn_haversine(coords, k)
+        self.near = [dict(zip(nb.tolist(), d.tolist())) for nb, d in zip(self.neighbors, self.dists)]
+
+    def cost(self, i: int, j: int, far_penalty: float = 1.0) -> int:
+        d = self.near[i].get(j)
+        if d is not None:
+            return d
+        return int(self.lookup[[i], [j]][0] * far_penalty)
+
+    def cost_matrix(self, far_penalty: float = 1.0) -> np.ndarray:
+        """Los costos de `cost` para todos los pares como matriz N x N int64 (tránsito nativo)."""
+        everyone = np.arange(self.shape[0])
+        out = (self.lookup[everyone[:, None], everyone[None, :]] * far_penalty).astype(np.int64)
+        out[np.repeat(everyone, self.neighbors.shape[1]), self.neighbors.ravel()] = self.dists.ravel()
+        return out
+
+    def __getitem__(self, key):
+        return self.lookup[key]
+
+    @property
+    def nbytes(self):
+        return self.neighbors.nbytes + self.dists.nbytes + self.lookup.lat.nbytes + self.lookup.lon.nbytes
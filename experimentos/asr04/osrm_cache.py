@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+_reconnect_lock = threading.Lock()
+
+
+class DurationCache:
+    """Caché persistente (SQLite) de duraciones OSRM por par de coordenadas cuantizadas.
+
+    Las entradas expiran por TTL y, al superar `max_entries`, se desalojan las más antiguas
+    (created_at) hasta el 90 % del tope. El desalojo no corre en cada escritura: corre cada
+    `evict_every` celdas escritas, cada `evict_interval_s` segundos o cuando la cuenta de filas
+    que lleva el proceso pasa el tope. Esa cuenta se resincroniza con COUNT(*) en cada desalojo
+    (otros workers también escriben y los reemplazos la inflan). Las lecturas no escriben.
+    """
+
+    MAX_PRECISION = 7
+
+    def __init__(self, path: str, precision: int = 5, ttl_s: float = 7 * 24 * 3600,
+                 max_entries: int = 2_000_000, evict_every: int = 100_000, evict_interval_s: float = 300.0):
+        if not (0 <= precision <= self.MAX_PRECISION):
+            raise ValueError(f"precision must be 0..{self.MAX_PRECISION}")
+        self.path = path
+        self.precision = precision
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.evict_interval_s = evict_interval_s
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS durations ("
+            " src INTEGER NOT NULL, dst INTEGER NOT NULL, duration INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (src, dst)) WITHOUT ROWID"
+        )
+        # last_used queda en el esquema por compatibilidad con cachés existentes, pero ya no se mantiene
+        self._conn.execute("DROP INDEX IF EXISTS durations_last_used")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS durations_created_at ON durations(created_at)")
+        self._conn.commit()
+        self._sync_count()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._writes = 0
+        self._evicted_at = time.time()
+
+    def _sync_count(self):
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM durations").fetchone()
+
+    def _ensure_process(self):
+        """Con preload (gunicorn) el maestro abre la conexión y cada worker debe abrir la suya tras el fork.
+
+        La heredada no se cierra ni se usa: SQLite no admite compartir una conexión entre procesos.
+        """
+        if self._pid != os.getpid():
+            with _reconnect_lock:
+                if self._pid != os.getpid():
+                    self._lock = threading.Lock()
+                    self._connect()
+                    self._sync_count()
+
+    def keys(self, coords: List[Tuple[float, float]]) -> np.ndarray:
+        """Codifica cada (lat, lng) cuantizado en un único entero de 64 bits."""
+        scale = 10 ** self.precision
+        arr = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        lat_q = np.rint((arr[:, 0] + 90.0) * scale).astype(np.int64)
+        lng_q = np.rint((arr[:, 1] + 180.0) * scale).astype(np.int64)
+        return lat_q * (360 * scale + 1) + lng_q
+
+    def lookup(self, coords: List[Tuple[float, float]]):
+        """Devuelve (matriz int32, máscara de celdas encontradas) para los pares vigentes en caché."""
+        keys = self.keys(coords)
+        n = len(keys)
+        matrix = np.zeros((n, n), dtype=np.int32)
+        found = np.zeros((n, n), dtype=bool)
+        if n == 0:
+            return matrix, found
+
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        position = {int(k): i for i, k in enumerate(unique_keys)}
+        sub = np.zeros((len(unique_keys), len(unique_keys)), dtype=np.int32)
+        sub_found = np.zeros_like(sub, dtype=bool)
+
+        min_created = time.time() - self.ttl_s
+        key_list = [int(k) for k in unique_keys]
+        # Bloques de 400 llaves para respetar el límite de parámetros de SQLite (999)
+        blocks = [key_list[i:i + 400] for i in range(0, len(key_list), 400)]
+        self._ensure_process()
+        with self._lock:
+            for src_keys in blocks:
+                for dst_keys in blocks:
+                    # "+created_at": el filtro no usa el índice de desalojo, la búsqueda va por la llave primaria
+                    sql = (
+                        f"SELECT src, dst, duration FROM durations"
+                        f" WHERE src IN ({','.join('?' * len(src_keys))})"
+                        f" AND dst IN ({','.join('?' * len(dst_keys))})"
+                        f" AND +created_at >= ?"
+                    )
+                    for src, dst, duration in self._conn.execute(sql, (*src_keys, *dst_keys, min_created)):
+                        i, j = position[src], position[dst]
+                        sub[i, j] = duration
+                        sub_found[i, j] = True
+
+        matrix[:] = sub[inverse[:, None], inverse[None, :]]
+        found[:] = sub_found[inverse[:, None], inverse[None, :]]
+        return matrix, found
+
+    def store(self, coords: List[Tuple[float, float]], rows, cols, values: np.ndarray):
+        """Guarda el bloque `values` (len(rows) x len(cols)) y desaloja si toca (ver la clase)."""
+        keys = self.keys(coords)
+        src = np.repeat(keys[np.asarray(rows, dtype=np.intp)], len(cols))
+        dst = np.tile(keys[np.asarray(cols, dtype=np.intp)], len(rows))
+        self._insert(src, dst, values)
+
+    def store_pairs(self, coords: List[Tuple[float, float]], sources, destinations, values: np.ndarray):
+        """Guarda los arcos sueltos sources[k] -> destinations[k] con duración values[k]."""
+        keys = self.keys(coords)
+        self._insert(keys[np.asarray(sources, dtype=np.intp)], keys[np.asarray(destinations, dtype=np.intp)], values)
+
+    def _insert(self, src: np.ndarray, dst: np.ndarray, values: np.ndarray):
+        now = time.time()
+        data = zip(src.tolist(), dst.tolist(), np.asarray(values).ravel().tolist(),
+                   [now] * len(src), [now] * len(src))
+        self._ensure_process()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO durations (src, dst, duration, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)", data
+            )
+            self._count += len(src)
+            self._writes += len(src)
+            if (self._count > self.max_entries or self._writes >= self.evict_every
+                    or now - self._evicted_at >= self.evict_interval_s):
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM durations WHERE created_at < ?", (now - self.ttl_s,))
+        self._sync_count()
+        if self._count > self.max_entries:
+            excess = self._count - int(self.max_entries * 0.9)
+            self._conn.execute(
+                "DELETE FROM durations WHERE (src, dst) IN"
+                " (SELECT src, dst FROM durations ORDER BY created_at LIMIT ?)", (excess,)
+            )
+            self._count -= excess
+        self._writes = 0
+        self._evicted_at = now
+
+    def __len__(self):
+        self._ensure_process()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM durations").fetchone()[0]
+
+    def close(self):
+        self._ensure_process()
+        with self._lock:
+            self._conn.close()
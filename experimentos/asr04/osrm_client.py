@@ -0,0 +1,261 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from telemetry import OSRM_BREAKER_OPENS, OSRM_ERRORS
+
+UNREACHABLE_S = 999999
+
+log = logging.getLogger(__name__)
+
+
+class OSRMError(Exception):
+    """Falla al obtener una tabla de OSRM (respuesta de error, red, presupuesto o circuito abierto)."""
+
+
+class OSRMDeadlineExceeded(OSRMError, TimeoutError):
+    """Se agotó el presupuesto de la solicitud antes de completar la tabla."""
+
+
+class CircuitOpenError(OSRMError):
+    """El circuito hacia OSRM está abierto: no se intenta la consulta."""
+
+
+class CircuitBreaker:
+    """Corta las consultas a OSRM tras `failure_threshold` fallos o respuestas lentas seguidos.
+
+    Abierto, rechaza de inmediato; pasados `reset_after_s` deja pasar una sola consulta de
+    prueba (semiabierto) que lo cierra si sale bien o lo reabre si falla o es lenta.
+    """
+
+    def __init__(self, failure_threshold: int = 3, slow_call_s: float = 2.0, reset_after_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.slow_call_s = slow_call_s
+        self.reset_after_s = reset_after_s
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.opens = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.perf_counter() - self.opened_at >= self.reset_after_s:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record(self, elapsed_s: float, ok: bool):
+        failed = not ok or elapsed_s >= self.slow_call_s
+        with self._lock:
+            self._probe_in_flight = False
+            if not failed:
+                self.state = "closed"
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opens += 1
+                    OSRM_BREAKER_OPENS.inc()
+                    log.warning("Circuito OSRM abierto", extra={"fields": {"consecutive_failures": self.consecutive_failures}})
+                self.state = "open"
+                self.opened_at = time.perf_counter()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "opens": self.opens,
+                "failure_threshold": self.failure_threshold,
+                "slow_call_ms": int(self.slow_call_s * 1000),
+                "reset_after_s": self.reset_after_s,
+            }
+
+
+class OSRMTableClient:
+    """Cliente del servicio /table de OSRM que divide la matriz en bloques origen x destino.
+
+    Cada bloque se pide con solo sus propias coordenadas (URLs cortas, dentro del límite de
+    tamaño del servidor), los bloques se descargan en paralelo sobre una sesión keep-alive
+    compartida y se escriben directamente en un arreglo int32 preasignado. Los arcos sueltos
+    (`pairs`) van por /route para no pedir el rectángulo que los cubre.
+    """
+
+    def __init__(self, base_url: str = "http://router.project-osrm.org", profile: str = "driving",
+                 tile_size: int = 100, max_workers: int = 8, timeout_s: float = 30.0,
+                 retries: int = 2, backoff_s: float = 0.2):
+        self.base_url = base_url.rstrip('/')
+        self.profile = profile
+        self.tile_size = tile_size
+        self.max_workers = max_workers
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.backoff_s = backoff_s
+
+        # La sesión (y el import de requests) se crea en el primer bloque: el camino solo haversine no la paga
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="osrm-tile")
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def table(self, coords: List[Tuple[float, float]], sources: Sequence[int],
+              destinations: Sequence[int], deadline: Optional[float] = None) -> np.ndarray:
+        """Duraciones (s) de `sources` x `destinations` como int32; rutas imposibles -> UNREACHABLE_S.
+
+        `deadline` (instante de time.perf_counter()) acota el timeout y los reintentos de cada
+        bloque; si se alcanza se lanza OSRMDeadlineExceeded.
+        """
+        sources = list(sources)
+        destinations = list(destinations)
+        out = np.empty((len(sources), len(destinations)), dtype=np.int32)
+
+        tiles = [
+            (r, c)
+            for r in range(0, len(sources), self.tile_size)
+            for c in range(0, len(destinations), self.tile_size)
+        ]
+        futures = [
+            self._executor.submit(self._fetch_tile, coords, sources, destinations, r, c, out, deadline)
+            for r, c in tiles
+        ]
+        try:
+            for future in futures:
+                future.result(timeout=None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        except FutureTimeoutError:
+            raise OSRMDeadlineExceeded("OSRM table exceeded the request deadline") from None
+        finally:
+            for future in futures:
+                future.cancel()
+        return out
+
+    def _fetch_tile(self, coords, sources, destinations, r, c, out, deadline=None):
+        rows = sources[r:r + self.tile_size]
+        cols = destinations[c:c + self.tile_size]
+
+        # Solo las coordenadas del bloque viajan en la URL
+        points = list(dict.fromkeys(rows + cols))
+        local = {p: i for i, p in enumerate(points)}
+        coords_str = ';'.join(f"{coords[p][1]},{coords[p][0]}" for p in points)
+        url = f"{self.base_url}/table/v1/{self.profile}/{coords_str}"
+        params = {
+            'sources': ';'.join(str(local[p]) for p in rows),
+            'destinations': ';'.join(str(local[p]) for p in cols),
+            'annotations': 'duration'
+        }
+        data = self._get(url, params, deadline, {"row": r, "col": c})
+        durations = np.array(data['durations'], dtype=np.float64)
+        out[r:r + len(rows), c:c + len(cols)] = np.nan_to_num(
+            durations, nan=UNREACHABLE_S, posinf=UNREACHABLE_S, neginf=UNREACHABLE_S
+        )
+
+    def pairs(self, coords: List[Tuple[float, float]], sources: Sequence[int], destinations: Sequence[int],
+              deadline: Optional[float] = None) -> np.ndarray:
+        """Duraciones (s) de los arcos sueltos sources[k] -> destinations[k] como int32.
+
+        Usa /route: los arcos se encadenan como waypoints (a1, b1, a2, b2, ...; si a(k+1) == b(k)
+        no se repite) y se leen las duraciones de las etapas que corresponden a cada arco. Los
+        arcos consecutivos de una ruta salen en una sola etapa cada uno, sin pedir la tabla que
+        los cubre. Bloques de hasta `tile_size` waypoints en paralelo, como las teselas.
+        """
+        chunks = []
+        waypoints, legs = [], []
+        for a, b in zip(sources, destinations):
+            a, b = int(a), int(b)
+            if not waypoints or waypoints[-1] != a:
+                if len(waypoints) + 2 > max(2, self.tile_size):
+                    chunks.append((waypoints, legs))
+                    waypoints, legs = [], []
+                waypoints.append(a)
+            elif len(waypoints) + 1 > max(2, self.tile_size):
+                chunks.append((waypoints, legs))
+                waypoints, legs = [a], []
+            waypoints.append(b)
+            legs.append(len(waypoints) - 2)
+        if legs:
+            chunks.append((waypoints, legs))
+
+        out = np.empty(sum(len(legs) for _, legs in chunks), dtype=np.int32)
+        offsets = np.cumsum([0] + [len(legs) for _, legs in chunks])
+        futures = [
+            self._executor.submit(self._fetch_legs, coords, waypoints, legs, out, int(offset), deadline)
+            for (waypoints, legs), offset in zip(chunks, offsets)
+        ]
+        try:
+            for future in futures:
+                future.result(timeout=None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        except FutureTimeoutError:
+            raise OSRMDeadlineExceeded("OSRM route exceeded the request deadline") from None
+        finally:
+            for future in futures:
+                future.cancel()
+        return out
+
+    def _fetch_legs(self, coords, waypoints, legs, out, offset, deadline=None):
+        coords_str = ';'.join(f"{coords[p][1]},{coords[p][0]}" for p in waypoints)
+        url = f"{self.base_url}/route/v1/{self.profile}/{coords_str}"
+        params = {'overview': 'false', 'steps': 'false', 'alternatives': 'false'}
+        data = self._get(url, params, deadline, {"waypoints": len(waypoints)})
+        durations = [leg['duration'] for leg in data['routes'][0]['legs']]
+        # Misma conversión a int32 que las tablas, para que ambos caminos den el mismo valor por arco
+        out[offset:offset + len(legs)] = np.asarray(durations, dtype=np.float64)[legs]
+
+    def _get(self, url, params, deadline, fields):
+        """GET con reintentos y backoff acotados por `deadline`; devuelve el JSON con code 'Ok'."""
+        last_error = None
+        for attempt in range(self.retries + 1):
+            timeout_s = self.timeout_s
+            if deadline is not None:
+                timeout_s = min(timeout_s, deadline - time.perf_counter())
+                if timeout_s <= 0:
+                    raise OSRMDeadlineExceeded("OSRM exceeded the request deadline")
+            try:
+                response = self.session.get(url, params=params, timeout=timeout_s)
+                data = response.json()
+                if data.get('code') != 'Ok':
+                    raise OSRMError(f"OSRM API error: {data.get('message', 'Unknown error')}")
+                return data
+            except Exception as e:
+                last_error = e
+                pause_s = self.backoff_s * (2 ** attempt)
+                if deadline is not None and time.perf_counter() + pause_s >= deadline:
+                    break
+                if attempt < self.retries:
+                    OSRM_ERRORS.inc(kind="tile_retry")
+                    log.info("Reintentando bloque OSRM", extra={"fields": {**fields, "attempt": attempt + 1, "error": str(e)}})
+                    time.sleep(pause_s)
+        OSRM_ERRORS.inc(kind="tile_failed")
+        log.warning("Bloque OSRM fallido", extra={"fields": {**fields, "error": str(last_error)}})
+        # Errores de red o de respuesta mal formada también salen como OSRMError
+        if isinstance(last_error, OSRMError):
+            raise last_error
+        raise OSRMError(str(last_error)) from last_error
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if self._session is not None:
+            self._session.close()
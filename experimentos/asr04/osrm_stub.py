@@ -0,0 +1,171 @@
+"""Servidor OSRM local de prueba: responde /table/v1/<perfil>/<coords> y /route/v1/<perfil>/<coords> sin red.
+
+Las duraciones son distancia haversine a velocidad constante. Permite simular latencia,
+fallos aleatorios y el límite de tamaño de tabla del servidor real (`max-table-size`).
+Inyección de fallas: `fail_mode` elige cómo falla una solicitud ('http' 500, 'osrm' código
+de error con 200, 'malformed' cuerpo no JSON, 'drop' conexión cerrada sin respuesta) y
+`slow_rate`/`slow_ms` agregan picos de latencia. `detour` > 0 multiplica cada duración por un
+factor de desvío determinista por par (1..1+detour), para que no sea haversine pura. Los campos de StubConfig se pueden cambiar
+en caliente para simular caídas y recuperaciones.
+
+Uso: python osrm_stub.py [--port 5001] [--latency-ms 0] [--fail-rate 0] [--fail-mode http]
+                         [--slow-rate 0] [--slow-ms 3000] [--max-table-size 100]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+
+FAIL_MODES = ("http", "osrm", "malformed", "drop")
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 0.0, fail_rate: float = 0.0, max_table_size: int = 100,
+                 speed_kmh: float = 40.0, seed: int = 0, fail_mode: str = "http",
+                 slow_rate: float = 0.0, slow_ms: float = 3000.0, detour: float = 0.0):
+        if fail_mode not in FAIL_MODES:
+            raise ValueError(f"fail_mode must be one of {FAIL_MODES}")
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.fail_mode = fail_mode
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.max_table_size = max_table_size
+        self.speed_kmh = speed_kmh
+        self.detour = detour
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.cells = 0
+
+
+def stub_durations(coords: np.ndarray, sources, destinations, speed_kmh: float, detour: float = 0.0) -> np.ndarray:
+    lat = np.radians(coords[:, 1])
+    lon = np.radians(coords[:, 0])
+    src, dst = np.asarray(sources), np.asarray(destinations)
+    dlat = lat[src][:, None] - lat[dst][None, :]
+    dlon = lon[src][:, None] - lon[dst][None, :]
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat[src])[:, None] * np.cos(lat[dst])[None, :] * np.sin(dlon / 2.0) ** 2
+    meters = 2.0 * 6371000.0 * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
+    if detour:
+        # Desvío pseudoaleatorio pero fijo para cada par de coordenadas
+        u = np.sin(coords[src, 0][:, None] * 12.9898e3 + coords[dst, 1][None, :] * 78.233e3) * 43758.5453
+        meters = meters * (1.0 + detour * (u - np.floor(u)))
+    return np.round(meters / (speed_kmh / 3.6), 1)
+
+
+def make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _fail(self, mode):
+            if mode == "osrm":
+                return self._send(200, {"code": "NoTable", "message": "injected failure"})
+            if mode == "malformed":
+                payload = b"<html>502 Bad Gateway</html>"
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+            if mode == "drop":
+                self.close_connection = True
+                return
+            return self._send(500, {"code": "InternalError", "message": "injected failure"})
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            parts = url.path.strip('/').split('/')
+            if len(parts) != 4 or parts[0] not in ('table', 'route'):
+                return self._send(400, {"code": "InvalidUrl", "message": "expected /table|route/v1/<profile>/<coords>"})
+
+            with config.lock:
+                config.requests += 1
+                fail = config.random.random() < config.fail_rate
+                slow = config.random.random() < config.slow_rate
+            delay_ms = config.latency_ms + (config.slow_ms if slow else 0.0)
+            if delay_ms:
+                time.sleep(delay_ms / 1000.0)
+            if fail:
+                return self._fail(config.fail_mode)
+
+            try:
+                coords = np.array([[float(v) for v in c.split(',')] for c in parts[3].split(';')])
+            except ValueError:
+                return self._send(400, {"code": "InvalidQuery", "message": "bad coordinates"})
+
+            if parts[0] == 'route':
+                # Una etapa por par de waypoints consecutivos, con las mismas duraciones que /table
+                legs = [float(stub_durations(coords, [k], [k + 1], config.speed_kmh, config.detour)[0, 0])
+                        for k in range(len(coords) - 1)]
+                with config.lock:
+                    config.cells += len(legs)
+                return self._send(200, {"code": "Ok", "routes": [{
+                    "duration": sum(legs), "legs": [{"duration": d} for d in legs],
+                }]})
+
+            query = parse_qs(url.query)
+            n = len(coords)
+            sources = [int(i) for i in query['sources'][0].split(';')] if 'sources' in query else list(range(n))
+            destinations = [int(i) for i in query['destinations'][0].split(';')] if 'destinations' in query else list(range(n))
+            if len(sources) * len(destinations) > config.max_table_size ** 2:
+                return self._send(400, {"code": "TooBig", "message": "Too many table coordinates"})
+
+            durations = stub_durations(coords, sources, destinations, config.speed_kmh, config.detour)
+            with config.lock:
+                config.cells += durations.size
+            self._send(200, {"code": "Ok", "durations": durations.tolist()})
+
+    return Handler
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, **kwargs):
+    """Arranca el stub en un hilo daemon. Devuelve (server, config, base_url)."""
+    config = StubConfig(**kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, config, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-mode", choices=FAIL_MODES, default="http")
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+    parser.add_argument("--max-table-size", type=int, default=100)
+    parser.add_argument("--speed-kmh", type=float, default=40.0)
+    parser.add_argument("--detour", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, _, base_url = start_stub_server(
+        args.host, args.port, latency_ms=args.latency_ms, fail_rate=args.fail_rate,
+        max_table_size=args.max_table_size, speed_kmh=args.speed_kmh, fail_mode=args.fail_mode,
+        slow_rate=args.slow_rate, slow_ms=args.slow_ms, detour=args.detour
+    )
+    print(f"OSRM stub escuchando en {base_url} (usar OSRM_BASE_URL={base_url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
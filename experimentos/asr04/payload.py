@@ -0,0 +1,201 @@
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Codificadores opcionales: sin ellos se acepta/responde solo JSON (con el módulo estándar)
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depende del entorno
+    msgpack = None
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+BINARY_TYPE = "application/octet-stream"
+# Claves con los puntos: no forman parte de las opciones (ni de la huella de la caché de soluciones)
+POINT_KEYS = ("points", "lat", "lng", "ids")
+
+
+class PayloadError(ValueError):
+    """Cuerpo de la solicitud ilegible o con un formato de puntos no soportado."""
+
+
+def _query_value(value: str):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def read_body(req) -> dict:
+    """Cuerpo de una solicitud de planificación como dict, según su Content-Type.
+
+    - JSON: {"points": [{lat, lng, id?}, ...]} o columnar {"lat": [...], "lng": [...], "ids"?: [...]}.
+    - msgpack: las mismas claves; "lat"/"lng" pueden ser arreglos o binario float64 little-endian.
+    - octet-stream: pares (lat, lng) float64 little-endian intercalados; las opciones van en la query.
+    """
+    content_type = (req.mimetype or "").lower()
+    if content_type == BINARY_TYPE:
+        raw = req.get_data(cache=False)
+        if len(raw) % 16:
+            raise PayloadError("binary body must be little-endian float64 (lat, lng) pairs")
+        pairs = np.frombuffer(raw, dtype="<f8").reshape(-1, 2)
+        data = {k: _query_value(v) for k, v in req.args.items()}
+        data["lat"], data["lng"] = pairs[:, 0], pairs[:, 1]
+        return data
+    if content_type in MSGPACK_TYPES:
+        if msgpack is None:
+            raise PayloadError("msgpack bodies require the 'msgpack' package on the server")
+        try:
+            data = msgpack.unpackb(req.get_data(cache=False), raw=False)
+        except Exception as e:
+            raise PayloadError(f"invalid msgpack body: {e}") from e
+    else:
+        data = req.get_json(force=True)
+    if not isinstance(data, dict):
+        raise PayloadError("request body must be an object")
+    return data
+
+
+def count_points(data: dict) -> int:
+    """Número de puntos del cuerpo; verifica la forma (no los valores) para responder 400 temprano."""
+    if "lat" in data or "lng" in data:
+        lengths = {name: _length(data.get(name, []), name) for name in ("lat", "lng")}
+        if data.get("ids") is not None:
+            lengths["ids"] = _length(data["ids"], "ids")
+        if len(set(lengths.values())) > 1:
+            raise PayloadError("'lat', 'lng' and 'ids' must have the same length")
+        return lengths["lat"]
+    points = data.get("points", [])
+    if not isinstance(points, list) or not all(isinstance(p, dict) for p in points):
+        raise PayloadError("'points' must be an array of {lat, lng} objects")
+    return len(points)
+
+
+def _length(values, name: str) -> int:
+    if isinstance(values, (bytes, bytearray, memoryview)) and name != "ids":
+        if len(values) % 8:
+            raise PayloadError(f"binary '{name}' must be little-endian float64")
+        return len(values) // 8
+    if not isinstance(values, (list, tuple, np.ndarray)):
+        raise PayloadError(f"'{name}' must be an array")
+    return len(values)
+
+
+def _as_column(values, name: str):
+    """(float64, faltantes, no numéricos) de una columna; NaN binario cuenta como faltante."""
+    if isinstance(values, (bytes, bytearray, memoryview)):
+        if len(values) % 8:
+            raise PayloadError(f"binary '{name}' must be little-endian float64")
+        values = np.frombuffer(values, dtype="<f8")
+    if isinstance(values, np.ndarray) and values.dtype.kind == "f":
+        column = values.astype(np.float64, copy=False)
+        return column, np.isnan(column), np.zeros(len(column), dtype=bool)
+    if not isinstance(values, (list, tuple)):
+        raise PayloadError(f"'{name}' must be an array")
+
+    missing = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+    try:
+        # None -> NaN; cadenas numéricas se convierten igual que con float()
+        column = np.asarray(values, dtype=np.float64)
+        non_numeric = np.zeros(len(values), dtype=bool)
+    except (ValueError, TypeError):
+        column = np.full(len(values), np.nan)
+        non_numeric = ~missing
+        for i in np.flatnonzero(non_numeric):
+            try:
+                column[i] = float(values[i])
+                non_numeric[i] = False
+            except (ValueError, TypeError):
+                pass
+    if column.ndim != 1:
+        raise PayloadError(f"'{name}' must be a flat array of numbers")
+    return column, missing, non_numeric
+
+
+def point_columns(data: dict):
+    """Todos los puntos del cuerpo tal como llegaron (formato objetos o columnar), sin filtrar.
+
+    Devuelve (lat, lng float64, ids o None si no vinieron, faltantes, no numéricos); los
+    valores faltantes o no numéricos quedan en NaN.
+    """
+    if "lat" in data or "lng" in data:
+        lat, lat_missing, lat_bad = _as_column(data.get("lat", []), "lat")
+        lng, lng_missing, lng_bad = _as_column(data.get("lng", []), "lng")
+        if len(lat) != len(lng):
+            raise PayloadError("'lat' and 'lng' must have the same length")
+        ids = data.get("ids")
+        if ids is not None and len(ids) != len(lat):
+            raise PayloadError("'ids' must have the same length as 'lat'")
+    else:
+        points = data.get("points", [])
+        if not all(isinstance(p, dict) for p in points):
+            raise PayloadError("'points' must be an array of {lat, lng} objects")
+        lat, lat_missing, lat_bad = _as_column([p.get("lat") for p in points], "lat")
+        lng, lng_missing, lng_bad = _as_column([p.get("lng") for p in points], "lng")
+        ids = [p.get("id", i) for i, p in enumerate(points)] if any("id" in p for p in points) else None
+
+    missing = lat_missing | lng_missing
+    return lat, lng, ids, missing, ~missing & (lat_bad | lng_bad)
+
+
+def validate_points(data: dict) -> Tuple[np.ndarray, List, Dict[str, np.ndarray]]:
+    """Máscaras vectorizadas sobre los puntos del cuerpo (formato objetos o columnar).
+
+    Devuelve (coords N x 2 float64 de los válidos, ids de los válidos, máscaras de inválidos
+    por motivo: 'missing', 'non_numeric', 'out_of_range'). Sin "id"/"ids" el id es el índice.
+    """
+    lat, lng, ids, missing, non_numeric = point_columns(data)
+    # NaN falla ambas comparaciones: un NaN explícito que no es faltante queda fuera de rango
+    in_range = (np.abs(lat) <= 90) & (np.abs(lng) <= 180)
+    out_of_range = ~missing & ~non_numeric & ~in_range
+    valid = np.flatnonzero(~(missing | non_numeric | out_of_range))
+
+    coords = np.column_stack([lat[valid], lng[valid]])
+    if ids is None:
+        valid_ids = valid.tolist()
+    else:
+        valid_ids = [ids[i] for i in valid.tolist()]
+    return coords, valid_ids, {"missing": missing, "non_numeric": non_numeric, "out_of_range": out_of_range}
+
+
+def compact_routes(solution: dict) -> dict:
+    """Rutas como columnas paralelas ({"vehicle": [...], "stops": [[...]], ...}) en vez de una lista de objetos."""
+    routes = solution.get("routes")
+    if not routes:
+        return solution
+    keys = list(dict.fromkeys(k for route in routes for k in route))
+    return {**solution, "routes": {k: [route.get(k) for route in routes] for k in keys}}
+
+
+def wants_compact(req, data: dict) -> bool:
+    return data.get("response_format") == "compact" or req.args.get("format") == "compact"
+
+
+def encode(req, payload: dict, compact: bool = False):
+    """(cuerpo, mimetype) según Accept: msgpack si se pide y está instalado; si no JSON.
+
+    En modo compacto la solución va con rutas columnares y el JSON sale sin ordenar claves
+    ni espacios (orjson si está disponible). (None, None) = formato por defecto (jsonify).
+    """
+    if compact and "solution" in payload:
+        payload = {**payload, "solution": compact_routes(payload["solution"])}
+    accept = req.headers.get("Accept", "")
+    if msgpack is not None and any(t in accept for t in MSGPACK_TYPES):
+        return msgpack.packb(payload, use_bin_type=True, default=_to_builtin), MSGPACK_TYPES[0]
+    if compact:
+        if orjson is not None:
+            return orjson.dumps(payload, default=_to_builtin, option=orjson.OPT_SERIALIZE_NUMPY), "application/json"
+        return json.dumps(payload, separators=(",", ":"), default=_to_builtin), "application/json"
+    return None, None
+
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"cannot serialize {type(value).__name__}")
@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import wait
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+from shared_solve import share_matrix, solve_shared
+from vrp_solver import format_result
+
+# Portafolio por defecto: estrategia inicial x metaheurística x semilla.
+# OR-Tools no expone semilla para el routing: la semilla perturba el lambda de GLS y, con las demás
+# metaheurísticas, arranca la búsqueda desde rutas al azar (ver shared_solve.solve_shared).
+DEFAULT_PORTFOLIO = [
+    {"first_solution": "PARALLEL_CHEAPEST_INSERTION", "metaheuristic": "GUIDED_LOCAL_SEARCH", "seed": 0},
+    {"first_solution": "PATH_CHEAPEST_ARC", "metaheuristic": "GUIDED_LOCAL_SEARCH", "seed": 0},
+    {"first_solution": "SAVINGS", "metaheuristic": "GUIDED_LOCAL_SEARCH", "seed": 0},
+    {"first_solution": "PARALLEL_CHEAPEST_INSERTION", "metaheuristic": "SIMULATED_ANNEALING", "seed": 0},
+    {"first_solution": "PATH_CHEAPEST_ARC", "metaheuristic": "TABU_SEARCH", "seed": 0},
+    {"first_solution": "PARALLEL_CHEAPEST_INSERTION", "metaheuristic": "GUIDED_LOCAL_SEARCH", "seed": 1},
+]
+
+# Nombres aceptados en "portfolio": los enums de OR-Tools menos los que este modelo no admite
+# (SWEEP y EVALUATOR_STRATEGY necesitan datos que build_model no registra; ALL_UNPERFORMED no
+# encuentra solución sin disyunciones)
+FIRST_SOLUTIONS = tuple(
+    name for name in routing_enums_pb2.FirstSolutionStrategy.Value.keys()
+    if name not in ("UNSET", "SWEEP", "EVALUATOR_STRATEGY", "ALL_UNPERFORMED")
+)
+METAHEURISTICS = tuple(name for name in routing_enums_pb2.LocalSearchMetaheuristic.Value.keys() if name != "UNSET")
+
+log = logging.getLogger(__name__)
+
+
+def parse_configs(value):
+    """Valida "portfolio": true -> None (portafolio por defecto) o lista de configuraciones completas.
+
+    Cada configuración es {"first_solution", "metaheuristic", "seed"}; las estrategias que faltan
+    toman las de DEFAULT_PORTFOLIO[0]. Lanza ValueError con nombres fuera de los enums de OR-Tools.
+    """
+    if value is True:
+        return None
+    if not isinstance(value, list) or not value:
+        raise ValueError("portfolio must be true or a non-empty list of configs")
+    configs = []
+    for i, config in enumerate(value):
+        if not isinstance(config, dict):
+            raise ValueError(f"portfolio[{i}] must be an object")
+        first_solution = config.get("first_solution", DEFAULT_PORTFOLIO[0]["first_solution"])
+        metaheuristic = config.get("metaheuristic", DEFAULT_PORTFOLIO[0]["metaheuristic"])
+        seed = config.get("seed", 0)
+        if first_solution not in FIRST_SOLUTIONS:
+            raise ValueError(f"portfolio[{i}].first_solution must be one of {list(FIRST_SOLUTIONS)}")
+        if metaheuristic not in METAHEURISTICS:
+            raise ValueError(f"portfolio[{i}].metaheuristic must be one of {list(METAHEURISTICS)}")
+        if not isinstance(seed, int) or isinstance(seed, bool) or seed < 0:
+            raise ValueError(f"portfolio[{i}].seed must be a non-negative integer")
+        configs.append({"first_solution": first_solution, "metaheuristic": metaheuristic, "seed": seed})
+    return configs
+
+
+def config_key(config: dict) -> str:
+    return f"{config['first_solution']}/{config['metaheuristic']}/{config.get('seed', 0)}"
+
+
+def solve_portfolio(pool, matrix: np.ndarray, n_vehicles: int, time_limit_ms: int = 4500,
+                    cost_kind: str = "meters", configs=None, history_path: str = None, grace_ms: int = 2000):
+    """Corre varias configuraciones en paralelo sobre el SolverPool y devuelve la mejor.
+
+    Todas las configuraciones leen una sola copia de la matriz en memoria compartida. Se espera
+    a lo sumo time_limit_ms + grace_ms (armar el modelo, esperar un proceso libre): la mejor de
+    las que terminaron gana y las demás quedan como "timed_out". El resultado tiene el formato
+    de solve_vrp con solver_info['portfolio'] añadido.
+    """
+    configs = configs or DEFAULT_PORTFOLIO
+    # Una configuración por proceso resolutor: las que no caben no terminarían antes del plazo
+    dropped = [config_key(c) for c in configs[pool.workers:]]
+    configs = configs[:pool.workers]
+    if dropped:
+        log.info("Portafolio recortado al pool", extra={"fields": {"workers": pool.workers, "dropped": dropped}})
+    start = time.perf_counter()
+    shm, shape, dtype = share_matrix(matrix)
+    futures = []
+    try:
+        futures = [pool.run(solve_shared, shm.name, shape, dtype, n_vehicles, time_limit_ms, config) for config in configs]
+        done, _ = wait(futures, timeout=(time_limit_ms + grace_ms) / 1000)
+    finally:
+        for future in futures:
+            future.cancel()
+        # Un proceso que sigue resolviendo conserva su mapeo; el nombre ya no hace falta
+        shm.close()
+        shm.unlink()
+    solve_time = (time.perf_counter() - start) * 1000
+
+    candidates, timed_out, failed = [], [], []
+    for config, future in zip(configs, futures):
+        if future not in done:
+            timed_out.append(config_key(config))
+        elif future.exception() is not None:
+            failed.append({"config": config_key(config), "error": str(future.exception())})
+        else:
+            candidates.append(future.result())
+    if timed_out or failed:
+        log.warning("Portafolio incompleto", extra={"fields": {"timed_out": timed_out, "failed": failed}})
+
+    found = [c for c in candidates if c["objective"] is not None]
+    best = min(found, key=lambda c: c["objective"]) if found else (candidates[0] if candidates else None)
+    log.debug("Portafolio resuelto", extra={"fields": {
+        "candidates": len(candidates), "winner": config_key(best["config"]) if best else None
+    }})
+
+    if best is None:
+        result = format_result(matrix, [], n_vehicles, cost_kind, solve_time, time_limit_ms,
+                               pywrapcp.RoutingModel.ROUTING_FAIL_TIMEOUT, False)
+    else:
+        result = format_result(matrix, best["paths"], n_vehicles, cost_kind, solve_time, time_limit_ms,
+                               best["status"], bool(found))
+    result["solver_info"]["portfolio"] = {
+        "winner": config_key(best["config"]) if found else None,
+        "candidates": [
+            {"config": config_key(c["config"]), "objective": c["objective"], "solve_ms": int(c["solve_ms"])}
+            for c in candidates
+        ],
+        "timed_out": timed_out,
+        "failed": failed,
+        "dropped": dropped,
+    }
+
+    if history_path and found:
+        record_outcome(history_path, {
+            "ts": time.time(),
+            "points": int(matrix.shape[0]),
+            "vehicles": n_vehicles,
+            "time_limit_ms": time_limit_ms,
+            "cost_kind": cost_kind,
+            **result["solver_info"]["portfolio"],
+        })
+    return result
+
+
+_history_lock = threading.Lock()
+
+
+def record_outcome(history_path: str, record: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(history_path)), exist_ok=True)
+    with _history_lock, open(history_path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def rank_configs(history_path: str, top_k: int = None):
+    """Victorias por configuración según el historial; base para afinar DEFAULT_PORTFOLIO."""
+    wins = Counter()
+    runs = 0
+    if os.path.exists(history_path):
+        with open(history_path) as f:
+            for line in f:
+                if line.strip():
+                    wins[json.loads(line)["winner"]] += 1
+                    runs += 1
+    return {"runs": runs, "wins": [{"config": k, "wins": v} for k, v in wins.most_common(top_k)]}
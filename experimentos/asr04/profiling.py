@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Optional
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def parse_profile(data) -> Optional[Dict]:
+    """ "profile": true | {"dump": true}. None = sin perfilado (la resolución no registra nada extra)."""
+    profile = data.get("profile")
+    if not profile:
+        return None
+    return {"dump": bool(profile.get("dump", False)) if isinstance(profile, dict) else False}
+
+
+class ProfileDumper:
+    """Guarda instancias perfiladas para análisis offline: `<id>.npz` (matriz, coordenadas) y `<id>.json`.
+
+    El JSON lleva las opciones de la solicitud, los tiempos por fase, el perfil de la búsqueda
+    y las rutas; `np.load(<id>.npz)["matrix"]` reproduce la resolución sin red (sin matriz en
+    el modelo disperso).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def dump(self, endpoint: str, matrix, coords, options: dict, result: dict, timings: dict) -> str:
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        base = os.path.join(self.root, profile_id)
+        arrays = {"coords": np.asarray(coords, dtype=np.float64).reshape(-1, 2)}
+        # El modelo disperso no tiene matriz N x N: se reconstruye desde las coordenadas
+        if isinstance(matrix, np.ndarray):
+            arrays["matrix"] = matrix
+        np.savez_compressed(f"{base}.npz", **arrays)
+        record = {
+            "id": profile_id,
+            "endpoint": endpoint,
+            "created_at": time.time(),
+            "options": options,
+            "timings": timings,
+            "profile": result["solver_info"].get("profile"),
+            "solution": {k: v for k, v in result.items() if k != "solver_info"},
+        }
+        with open(f"{base}.json.tmp", "w") as f:
+            json.dump(record, f, default=lambda v: v.item() if isinstance(v, np.generic) else str(v))
+        os.replace(f"{base}.json.tmp", f"{base}.json")
+        log.info("Perfil guardado", extra={"fields": {"endpoint": endpoint, "profile_id": profile_id}})
+        return profile_id
@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+
+from payload import POINT_KEYS, point_columns, validate_points
+
+log = logging.getLogger(__name__)
+
+# Motivo de invalidez por punto en la grabación (0 = válido); así el replay reproduce las tasas por motivo
+INVALID_REASONS = ("missing", "non_numeric", "out_of_range")
+# Partes de solver_info que crecen con la búsqueda y no hacen falta para comparar
+_HEAVY_SOLVER_INFO = ("profile", "convergence")
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+class TrafficRecorder:
+    """Graba una muestra de las solicitudes de planificación para repetirlas offline (benchmarks/replay.py).
+
+    Cada grabación es `<id>.npz` (columnas lat/lng tal como llegaron, motivo de invalidez por
+    punto, ids y la matriz resuelta con sus nodos) más una línea en `index.jsonl` con el
+    endpoint, la hora de llegada, las opciones, los tiempos por fase y la solución. La
+    escritura va en un hilo aparte: la solicitud grabada solo paga copiar sus referencias.
+    """
+
+    def __init__(self, root: str, sample_rate: float, max_records: int = 10_000, max_pending: int = 32):
+        self.root = root
+        self.sample_rate = sample_rate
+        self.max_records = max_records
+        self.max_pending = max_pending
+        self.index_path = os.path.join(root, "index.jsonl")
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recorder")
+        self._pending = 0
+        self.recorded = self._count_existing()
+        self.dropped = 0
+
+    def _count_existing(self) -> int:
+        if not os.path.exists(self.index_path):
+            return 0
+        with open(self.index_path) as f:
+            return sum(1 for line in f if line.strip())
+
+    def sample(self) -> Optional[Dict]:
+        """Captura vacía si esta solicitud entra en la muestra (None si no); el handler le agrega la matriz."""
+        with self._lock:
+            if self.recorded + self._pending >= self.max_records or self._random.random() >= self.sample_rate:
+                return None
+        return {"received_at": time.time()}
+
+    def submit(self, endpoint: str, data: dict, capture: Dict, out: dict):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending += 1
+        self._executor.submit(self._write, endpoint, data, capture, out)
+
+    def _write(self, endpoint: str, data: dict, capture: Dict, out: dict):
+        try:
+            record_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            arrays = self._arrays(data, capture)
+            np.savez_compressed(os.path.join(self.root, f"{record_id}.npz"), **arrays)
+            solution = out["solution"]
+            record = {
+                "id": record_id,
+                "endpoint": endpoint,
+                "received_at": capture["received_at"],
+                "options": {k: v for k, v in data.items() if k not in POINT_KEYS},
+                "points": len(arrays["lat"]),
+                "invalid_points": int((arrays["invalid"] > 0).sum()),
+                "metrics": out["metrics"],
+                "traffic_info": out.get("traffic_info"),
+                "has_matrix": "matrix" in arrays,
+                "solution": {
+                    **{k: v for k, v in solution.items() if k != "solver_info"},
+                    "solver_info": {k: v for k, v in solution["solver_info"].items() if k not in _HEAVY_SOLVER_INFO},
+                },
+            }
+            line = json.dumps(record, default=_json_default)
+            with self._lock:
+                with open(self.index_path, "a") as f:
+                    f.write(line + "\n")
+                self.recorded += 1
+            log.debug("Solicitud grabada", extra={"fields": {"endpoint": endpoint, "record_id": record_id}})
+        except Exception:
+            log.exception("No se pudo grabar la solicitud", extra={"fields": {"endpoint": endpoint}})
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    @staticmethod
+    def _arrays(data: dict, capture: Dict) -> Dict[str, np.ndarray]:
+        _, _, invalid = validate_points(data)
+        lat, lng, ids, _, _ = point_columns(data)
+        reason = np.zeros(len(lat), dtype=np.uint8)
+        for code, name in enumerate(INVALID_REASONS, start=1):
+            reason[invalid[name]] = code
+        arrays = {"lat": lat, "lng": lng, "invalid": reason}
+        if ids is not None:
+            arrays["ids"] = np.asarray([str(i) for i in ids])
+        if capture.get("matrix") is not None:
+            arrays["matrix"] = np.asarray(capture["matrix"])
+            arrays["nodes"] = np.asarray(capture["nodes"], dtype=np.float64).reshape(-1, 2)
+        return arrays
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "root": self.root,
+                "sample_rate": self.sample_rate,
+                "recorded": self.recorded,
+                "pending": self._pending,
+                "dropped": self.dropped,
+                "max_records": self.max_records,
+            }
+
+
+def load_index(root: str):
+    """Grabaciones de `root` en orden de llegada."""
+    with open(os.path.join(root, "index.jsonl")) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda r: r["received_at"])
+
+
+def rebuild_body(record: dict, arrays) -> dict:
+    """Cuerpo columnar equivalente al grabado: mismas opciones y mismos puntos inválidos por motivo."""
+    reason = arrays["invalid"]
+    # Basta con invalidar la latitud: validate_points clasifica el punto por el primer motivo que aplica
+    substitute = {1: None, 2: "?", 3: 999.0}
+    body = {k: v for k, v in record["options"].items() if k != "response_format"}
+    body["lat"] = [substitute[int(r)] if r else float(v) for v, r in zip(arrays["lat"], reason)]
+    body["lng"] = np.nan_to_num(arrays["lng"]).tolist()
+    if "ids" in arrays:
+        body["ids"] = arrays["ids"].tolist()
+    return body
@@ -0,0 +1,76 @@
+import random
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from vrp_solver import build_model, extract_routes, format_result, repair_routes, search_parameters
+
+
+def gls_lambda(seed: int):
+    """Lambda de GLS perturbado por semilla (OR-Tools no expone semilla para el routing); 0 = el de defecto."""
+    if not seed:
+        return None
+    return round(random.Random(seed).uniform(0.05, 0.3), 4)
+
+
+def seeded_routes(matrix: np.ndarray, n_vehicles: int, seed: int):
+    """Rutas iniciales al azar, reproducibles por semilla: clientes barajados y repartidos (con cupo) entre vehículos."""
+    order = 1 + np.random.default_rng(seed).permutation(matrix.shape[0] - 1)
+    routes, _ = repair_routes(matrix, [r.tolist() for r in np.array_split(order, n_vehicles)], n_vehicles)
+    return routes
+
+
+def share_matrix(matrix: np.ndarray):
+    """Copia la matriz a memoria compartida; devuelve (shm, shape, dtype). El llamador hace close y unlink."""
+    matrix = np.ascontiguousarray(matrix)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, matrix.nbytes))
+    np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)[:] = matrix
+    return shm, matrix.shape, matrix.dtype.str
+
+
+def solve_shared(shm_name: str, shape, dtype: str, n_vehicles: int, time_limit_ms: int, config: dict,
+                 cost_kind: str = "meters"):
+    """Corre en un proceso resolutor: lee la matriz compartida sin copiarla por pickle.
+
+    `config` tiene "first_solution" y "metaheuristic" (ausentes = los de solve_vrp) y "seed". Con
+    GLS la semilla perturba su lambda; con las demás metaheurísticas (que no tienen lambda) una
+    semilla > 0 arranca desde seeded_routes en vez de la estrategia inicial.
+    Devuelve el objetivo, los caminos y el estado de OR-Tools, más la solución con el formato
+    de solve_vrp en "solution".
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = None
+    try:
+        matrix = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        start = time.perf_counter()
+        manager, routing = build_model(matrix, n_vehicles)
+        seed = config.get("seed", 0)
+        gls = config.get("metaheuristic") in (None, "GUIDED_LOCAL_SEARCH")
+        params = search_parameters(
+            n_vehicles, time_limit_ms, first_solution=config.get("first_solution"),
+            metaheuristic=config.get("metaheuristic"), gls_lambda=gls_lambda(seed) if gls else None
+        )
+        initial = None
+        if seed and not gls:
+            # Cerrar con los parámetros de la búsqueda antes de leer las rutas (ver solve_vrp)
+            routing.CloseModelWithParameters(params)
+            initial = routing.ReadAssignmentFromRoutes(seeded_routes(matrix, n_vehicles, seed), True)
+        if initial is not None:
+            sol = routing.SolveFromAssignmentWithParameters(initial, params)
+        else:
+            sol = routing.SolveWithParameters(params)
+        solve_ms = (time.perf_counter() - start) * 1000
+        paths = extract_routes(manager, routing, sol, n_vehicles) if sol else []
+        return {
+            "config": config,
+            "objective": sol.ObjectiveValue() if sol else None,
+            "paths": paths,
+            "solve_ms": solve_ms,
+            "status": routing.status(),
+            "solution": format_result(matrix, paths, n_vehicles, cost_kind, solve_ms, time_limit_ms,
+                                      routing.status(), sol is not None),
+        }
+    finally:
+        del matrix
+        shm.close()
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+import numpy as np
+
+
+def fingerprint(provider: str, coords, vehicles: int, time_limit_ms: int, options: dict = None) -> str:
+    """Huella canónica de una solicitud de planificación (coordenadas redondeadas a 1e-7°)."""
+    canonical = {
+        "provider": provider,
+        "coords": np.round(np.asarray(coords, dtype=np.float64).reshape(-1, 2), 7).tolist(),
+        "vehicles": int(vehicles),
+        "time_limit_ms": int(time_limit_ms),
+        "options": options or {},
+    }
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SolutionCache:
+    """Caché LRU con TTL de resultados de planificación, con deduplicación 'single-flight'.
+
+    Solicitudes concurrentes con la misma huella esperan al único cálculo en curso en vez
+    de lanzar su propia resolución. Los errores y los resultados con "cacheable": False no
+    se guardan (las solicitudes en espera sí los reciben).
+    """
+
+    def __init__(self, ttl_s: float = 60.0, max_entries: int = 256):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: str, compute: Callable[[], dict]):
+        """Devuelve (resultado, estado) con estado 'hit', 'coalesced' o 'miss'."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= time.time():
+                self._entries.move_to_end(key)
+                return entry[1], "hit"
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = {"done": threading.Event(), "value": None, "error": None}
+                self._inflight[key] = flight
+
+        if not leader:
+            flight["done"].wait()
+            if flight["error"] is not None:
+                raise flight["error"]
+            return flight["value"], "coalesced"
+
+        try:
+            value = compute()
+            flight["value"] = value
+            if not value.get("cacheable", True):
+                return value, "miss"
+            with self._lock:
+                self._entries[key] = (time.time() + self.ttl_s, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value, "miss"
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight["done"].set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "inflight": len(self._inflight)}
@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+
+# Segundos: cubre desde validaciones de milisegundos hasta resoluciones de 30 s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 4.0, 5.0, 7.5, 10.0, 20.0, 30.0)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [{**dict(zip(self.labelnames, key)), "value": value} for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0, "max": 0.0}
+            series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+            series["max"] = max(series["max"], value)
+
+    def quantile(self, q: float, counts, total: int):
+        """Estimación por interpolación lineal dentro del bucket (como histogram_quantile)."""
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, c in enumerate(counts):
+            if cumulative + c >= rank and c > 0:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / c
+            cumulative += c
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets, series["counts"]):
+                    cumulative += c
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+    def snapshot(self):
+        out = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                row = dict(zip(self.labelnames, key))
+                row["count"] = series["count"]
+                row["mean_ms"] = round(series["sum"] / series["count"] * 1000, 1)
+                row["max_ms"] = round(series["max"] * 1000, 1)
+                for q in (0.5, 0.95, 0.99):
+                    # La interpolación no puede superar el máximo observado (series con pocas muestras)
+                    value = min(self.quantile(q, series["counts"], series["count"]), series["max"])
+                    row[f"p{int(q * 100)}_ms"] = round(value * 1000, 1)
+                out.append(row)
+        return out
+
+
+class Registry:
+    """Registro de métricas en proceso. Con varios workers de gunicorn cada uno expone las suyas."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+
+REGISTRY = Registry()
+
+PHASE_SECONDS = REGISTRY.histogram(
+    "asr04_phase_seconds", "Duración por fase de la planificación", ("endpoint", "phase")
+)
+OSRM_FETCH_SECONDS = REGISTRY.histogram(
+    "asr04_osrm_fetch_seconds", "Duración de las consultas a OSRM: /table (full, partial; todas sus teselas) o /route (pairs)", ("kind",)
+)
+SOLVER_STATUS = REGISTRY.counter(
+    "asr04_solver_status_total", "Resoluciones por estado de OR-Tools", ("endpoint", "status")
+)
+TIME_LIMIT_REACHED = REGISTRY.counter(
+    "asr04_solver_time_limit_reached_total", "Resoluciones que agotaron el límite de tiempo", ("endpoint",)
+)
+OSRM_ERRORS = REGISTRY.counter(
+    "asr04_osrm_errors_total", "Errores al obtener la matriz de OSRM", ("kind",)
+)
+OSRM_BREAKER_OPENS = REGISTRY.counter(
+    "asr04_osrm_breaker_opens_total", "Aperturas del circuito hacia OSRM"
+)
+OSRM_FALLBACKS = REGISTRY.counter(
+    "asr04_osrm_fallbacks_total", "Matrices OSRM sustituidas por duraciones haversine", ("reason",)
+)
+INVALID_POINTS = REGISTRY.counter(
+    "asr04_invalid_points_total", "Puntos descartados en la validación", ("reason",)
+)
+
+
+def record_solution(endpoint: str, solution: dict):
+    """Cuenta el estado final del resolutor; sirve igual para resultados de procesos resolutores."""
+    info = solution.get("solver_info", {})
+    SOLVER_STATUS.inc(endpoint=endpoint, status=info.get("solver_status"))
+    if info.get("time_limit_reached"):
+        TIME_LIMIT_REACHED.inc(endpoint=endpoint)
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por evento; los campos de `extra={"fields": {...}}` van al primer nivel."""
+
+    def format(self, record):
+        event = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        event.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+def configure_logging():
+    """Nivel por LOG_LEVEL (WARNING por defecto: los eventos DEBUG/INFO del camino crítico no se emiten)."""
+    root = logging.getLogger()
+    if any(isinstance(h.formatter, JsonFormatter) for h in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    root.addHandler(handler)
+    root.setLevel(os.environ.get("LOG_LEVEL", "WARNING").upper())
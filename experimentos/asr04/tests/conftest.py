@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+# La app se configura por entorno al importarse: sin estado persistente, sin caché de soluciones
+# ni red (cualquier consulta a OSRM que no pase por el stub falla de inmediato)
+_STATE_DIR = tempfile.mkdtemp(prefix="asr04-tests-")
+os.environ.update({
+    "OSRM_CACHE_PATH": "",
+    "OSRM_BASE_URL": "http://127.0.0.1:9",
+    "OSRM_TILE_RETRIES": "0",
+    "SOLUTION_CACHE_MAX_ENTRIES": "0",
+    "CONVERGENCE_HISTORY_PATH": "",
+    "PORTFOLIO_HISTORY_PATH": "",
+    "PROFILE_DIR": "",
+    "RECORD_SAMPLE_RATE": "0",
+    "TIME_MATRIX_DIR": os.path.join(_STATE_DIR, "time_matrices"),
+    "SOLVER_POOL_WORKERS": "2",
+    "EXPERIMENT_POOL_WORKERS": "1",
+    "WARMUP_ENABLED": "0",
+    "LOG_LEVEL": "WARNING",
+})
+
+from instances import generate_instance, generate_points  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def asr04():
+    import app as asr04_app
+
+    yield asr04_app
+    if asr04_app._plan_jobs is not None:
+        asr04_app._plan_jobs.pool.shutdown()
+
+
+@pytest.fixture
+def client(asr04):
+    return asr04.app.test_client()
+
+
+@pytest.fixture
+def osrm_stub(asr04, monkeypatch):
+    """Stub OSRM local con la app apuntando a él y un circuito nuevo; devuelve el StubConfig."""
+    from osrm_client import CircuitBreaker, OSRMTableClient
+    from osrm_stub import start_stub_server
+
+    server, config, url = start_stub_server()
+    client = OSRMTableClient(base_url=url, retries=0, timeout_s=5)
+    monkeypatch.setattr(asr04, "osrm_client", client)
+    monkeypatch.setattr(asr04, "osrm_breaker", CircuitBreaker(failure_threshold=2, reset_after_s=60))
+    config.url = url
+    yield config
+    client.close()
+    server.shutdown()
+
+
+@pytest.fixture
+def instance():
+    def make(n=20, vehicles=3, seed=1):
+        return generate_instance(n, vehicles, seed=seed)
+    return make
+
+
+@pytest.fixture
+def points():
+    return generate_points
@@ -0,0 +1,111 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batch import allocate_time_limits, run_batch
+
+
+class ThreadPool:
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def run(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+
+def events(response):
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_allocate_time_limits_without_budget_keeps_requests():
+    assert allocate_time_limits([1000, 500], None, 200) == ([1000, 500], 1.0)
+    assert allocate_time_limits([1000, 500], 2000, 200) == ([1000, 500], 1.0)
+
+
+def test_allocate_time_limits_scales_to_budget():
+    limits, scale = allocate_time_limits([2000, 1000, 1000], 2000, 200)
+    assert scale == 0.5
+    assert limits == [1000, 500, 500]
+
+
+def test_allocate_time_limits_never_below_minimum():
+    limits, scale = allocate_time_limits([1000] * 10, 1000, 200)
+    assert scale == 0.1
+    # El piso gana sobre el presupuesto: la suma se pasa y el resumen lo reporta
+    assert limits == [200] * 10
+
+
+def test_run_batch_summary_reports_budget_split(points):
+    problems = [
+        {"index": i, "id": f"p{i}", "coords": points(8, seed=i), "vehicles": 2, "time_limit_ms": 1000,
+         "provider": "haversine", "mode": "fast", "invalid_points": 0}
+        for i in range(3)
+    ]
+    out = list(run_batch(ThreadPool(2), problems, None, cpu_budget_ms=450, min_time_limit_ms=200))
+    assert [e for e, _ in out] == ["result"] * 3 + ["summary"]
+    assert sorted(p["id"] for _, p in out[:3]) == ["p0", "p1", "p2"]
+    assert all(p["metrics"]["time_limit_ms"] == 200 for _, p in out[:3])
+    summary = out[-1][1]
+    assert summary["time_limit_scale"] == 0.15
+    assert summary["allocated_solve_ms"] == 600
+    assert summary["over_budget"]
+    assert summary["solved"] == 3 and summary["failed"] == 0
+
+
+def test_run_batch_reports_matrix_failures(points):
+    problems = [{"index": 0, "id": 0, "coords": points(5, seed=1), "vehicles": 1, "time_limit_ms": 100,
+                 "provider": "osrm", "mode": "fast", "invalid_points": 0}]
+
+    def build_osrm(coords):
+        raise RuntimeError("down")
+
+    out = list(run_batch(ThreadPool(1), problems, build_osrm, None))
+    assert out[0] == ("error", {"index": 0, "id": 0, "error": "OSRM API error: down"})
+    assert out[1][0] == "summary"
+    assert out[1][1]["failed"] == 1 and out[1][1]["solved"] == 0
+
+
+def test_plan_batch_streams_rejects_then_results_then_summary(client, instance):
+    good = [{**instance(8, 2, seed=s), "id": f"route-{s}", "time_limit_ms": 100} for s in range(2)]
+    good[1]["points"][3]["lat"] = 123.0
+    body = {
+        "mode": "fast",
+        "problems": [good[0], 7, {"points": "nope"}, good[1], {"points": instance(2, 1)["points"]}],
+    }
+    response = client.post("/routes/plan/batch", json=body)
+    assert response.status_code == 200
+    out = events(response)
+
+    # Rechazos de validación primero, en el orden del cuerpo
+    assert [e["event"] for e in out[:3]] == ["error"] * 3
+    assert [(e["index"], e["id"]) for e in out[:3]] == [(1, 1), (2, 2), (4, 4)]
+    assert out[0]["error"] == "problem must be an object"
+    assert "points" in out[1]["error"] and "points must be 3..150" in out[2]["error"]
+
+    results = {e["index"]: e for e in out[3:5]}
+    assert all(e["event"] == "result" for e in results.values())
+    assert {i: e["id"] for i, e in results.items()} == {0: "route-0", 3: "route-1"}
+    assert results[3]["metrics"]["invalid_points"] == 1
+    assert sum(r["customers_served"] for r in results[3]["solution"]["routes"]) == 6
+
+    summary = out[-1]
+    assert len(out) == 6 and summary["event"] == "summary"
+    assert summary["problems"] == 5
+    assert summary["accepted"] == 2 and summary["rejected"] == 3
+    assert summary["solved"] == 2 and summary["failed"] == 0
+
+
+def test_plan_batch_only_rejects_still_ends_with_summary(client):
+    out = events(client.post("/routes/plan/batch", json={"problems": [None]}))
+    assert [e["event"] for e in out] == ["error", "summary"]
+    assert out[1]["rejected"] == 1 and out[1]["solved"] == 0
+
+
+@pytest.mark.parametrize("problems", [[], {"points": []}, "x"])
+def test_plan_batch_rejects_bad_problem_list(client, problems):
+    response = client.post("/routes/plan/batch", json={"problems": problems})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
@@ -0,0 +1,57 @@
+from colocation import merge_colocated
+from matrices import haversine_matrix
+from vrp_solver import solve_vrp
+
+
+def building(lat, lng, n, step=1e-5):
+    return [(lat + i * step, lng) for i in range(n)]
+
+
+def test_merges_stops_within_radius():
+    depot = [(4.60, -74.10)]
+    # Dos edificios de 4 y 3 paradas (a ~1 m entre sí) y una parada aislada
+    coords = depot + building(4.65, -74.05, 4) + building(4.70, -74.00, 3) + [(4.62, -74.08)]
+    colocation = merge_colocated(coords, radius_m=10)
+    assert colocation.shrunk
+    assert len(colocation.leaders) == 4
+    assert colocation.demands.tolist() == [0, 4, 3, 1]
+    assert colocation.labels[0] == 0
+
+
+def test_depot_is_never_merged():
+    coords = building(4.65, -74.05, 5)
+    colocation = merge_colocated(coords, radius_m=10)
+    assert colocation.demands[0] == 0
+    assert [m.tolist() for m in colocation.members][0] == [0]
+
+
+def test_expand_restores_every_stop():
+    coords = [(4.60, -74.10)] + building(4.65, -74.05, 5) + building(4.70, -74.00, 5) + building(4.61, -74.02, 2)
+    colocation = merge_colocated(coords, radius_m=10)
+    nodes = colocation.reduce(coords)
+    result = solve_vrp(haversine_matrix(nodes), 2, time_limit_ms=100, demands=colocation.demands)
+    colocation.expand(result)
+    stops = sorted(s for r in result["routes"] for s in r["stops"] if s != 0)
+    assert stops == list(range(1, len(coords)))
+    assert result["solver_info"]["colocation"]["merged_stops"] == len(coords) - len(nodes)
+
+
+def test_reduce_routes_keeps_first_position():
+    coords = [(4.60, -74.10)] + building(4.65, -74.05, 3) + [(4.62, -74.08)]
+    colocation = merge_colocated(coords, radius_m=10)
+    assert colocation.reduce_routes([[4, 2, 1, 3]]) == [[2, 1]]
+
+
+def test_plan_with_merge_colocated(client, instance):
+    body = instance(10, 2, seed=6)
+    body["points"] += [{"id": f"dup-{i}", "lat": body["points"][3]["lat"], "lng": body["points"][3]["lng"]} for i in range(4)]
+    body.update({"merge_colocated": True, "time_limit_ms": 100})
+    out = client.post("/routes/plan", json=body).get_json()
+    assert out["solution"]["solver_info"]["colocation"]["merged_stops"] == 4
+    served = sum(r["customers_served"] for r in out["solution"]["routes"])
+    assert served == len(body["points"]) - 1
+
+
+def test_plan_rejects_bad_colocation_radius(client, instance):
+    body = {**instance(6, 1), "merge_colocated": {"radius_m": 1000}}
+    assert client.post("/routes/plan", json=body).status_code == 400
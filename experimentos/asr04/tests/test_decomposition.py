@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from decomposition import allocate_vehicles, share_vehicles, solve_decomposed
+
+
+class ThreadPool:
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def run(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+
+def stops(solution):
+    return sorted(s for r in solution["routes"] for s in r["stops"] if s != 0)
+
+
+def test_allocate_vehicles_is_proportional():
+    assert allocate_vehicles([100, 50, 50], 8).tolist() == [4, 2, 2]
+    assert allocate_vehicles([10, 10], 2).tolist() == [1, 1]
+
+
+def test_share_vehicles_gives_contiguous_balanced_runs():
+    owner = share_vehicles([50] * 12, 3)
+    assert owner.tolist() == [0] * 4 + [1] * 4 + [2] * 4
+    assert share_vehicles([10, 200, 10, 10], 2).tolist() == [0, 0, 1, 1]
+
+
+@pytest.mark.parametrize("method", ["sweep", "kmeans"])
+def test_cluster_count_follows_cluster_size(points, method):
+    # Regresión: con 3 vehículos salían 3 regiones de ~200 paradas, ignorando cluster_size
+    coords = np.asarray(points(601, seed=1))
+    result = solve_decomposed(ThreadPool(2), coords, 3, time_limit_ms=3000, method=method, cluster_size=50)
+    info = result["solver_info"]["decomposition"]
+    assert info["shared_vehicles"]
+    assert len(info["clusters"]) == 12
+    assert max(c["points"] for c in info["clusters"]) <= (80 if method == "kmeans" else 50)
+    assert len(result["routes"]) == 3
+    assert stops(result) == list(range(1, 601))
+    assert result["total_distance_m"] == sum(r["distance_m"] for r in result["routes"])
+
+
+def test_spare_vehicles_are_split_between_clusters(points):
+    coords = np.asarray(points(121, seed=2))
+    result = solve_decomposed(ThreadPool(2), coords, 6, time_limit_ms=1000, cluster_size=60)
+    info = result["solver_info"]["decomposition"]
+    assert not info["shared_vehicles"]
+    assert [c["vehicles"] for c in info["clusters"]] == [3, 3]
+    assert stops(result) == list(range(1, 121))
+
+
+def test_rejects_bad_options(points):
+    coords = np.asarray(points(20))
+    with pytest.raises(ValueError):
+        solve_decomposed(ThreadPool(1), coords, 2, method="grid")
+    with pytest.raises(ValueError):
+        solve_decomposed(ThreadPool(1), coords, 2, cluster_size=0)
+
+
+@pytest.mark.parametrize("decompose", [
+    {"cluster_size": 0},
+    {"cluster_size": 5000},
+    {"method": "grid"},
+    {"cluster_size": "many"},
+])
+def test_bad_decompose_options_are_a_400(client, instance, decompose):
+    # Regresión: cluster_size 0 (ZeroDivisionError) y method desconocido respondían 500
+    response = client.post("/routes/plan", json={**instance(200, 3), "decompose": decompose})
+    assert response.status_code == 400
+    assert "decompose" in response.get_json()["error"] or "invalid literal" in response.get_json()["error"]
+
+
+def test_decompose_endpoint(client, instance):
+    body = {**instance(200, 2), "decompose": {"cluster_size": 50}, "time_limit_ms": 1500}
+    response = client.post("/routes/plan", json=body)
+    assert response.status_code == 200
+    solution = response.get_json()["solution"]
+    assert len(solution["routes"]) == 2
+    assert len(stops(solution)) == 199
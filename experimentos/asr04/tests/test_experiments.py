@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from experiments import ExperimentJobs, ExperimentQueueFullError, run_experiment, summarize
+from matrices import haversine_matrix
+
+
+class ThreadPool:
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def run(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+
+@pytest.fixture
+def experiment_pool(asr04, monkeypatch):
+    """El endpoint corre la grilla en hilos (sin procesos resolutores) y con una cola de trabajos nueva."""
+    pool = ThreadPool(2)
+    monkeypatch.setattr(asr04, "get_experiment_pool", lambda: pool)
+    monkeypatch.setattr(asr04, "_experiment_jobs", ExperimentJobs(lambda: pool, max_pending=2))
+    return pool
+
+
+def builders(coords, osrm=None):
+    def haversine():
+        return haversine_matrix(np.asarray(coords)), "meters", {}
+
+    def failing():
+        raise RuntimeError("osrm down")
+
+    return {"haversine": haversine, "osrm": osrm or failing}
+
+
+def test_run_experiment_covers_the_grid(points):
+    coords = points(12, seed=1)
+    osrm = lambda: (np.rint(haversine_matrix(np.asarray(coords)) / 10).astype(np.int64), "seconds", {"osrm_cells_fetched": 144})
+    events = list(run_experiment(ThreadPool(2), builders(coords, osrm), 2, [100, 200], [0, 1]))
+    matrices = [p for e, p in events if e == "matrix"]
+    runs = [p for e, p in events if e == "run"]
+    assert [m["provider"] for m in matrices] == ["haversine", "osrm"]
+    assert matrices[1]["cost_kind"] == "seconds" and matrices[1]["osrm_cells_fetched"] == 144
+    grid = sorted((r["provider"], r["time_limit_ms"], r["seed"]) for r in runs)
+    assert grid == [(p, t, s) for p in ("haversine", "osrm") for t in (100, 200) for s in (0, 1)]
+    assert all("error" not in r and r["solution_found"] for r in runs)
+
+    report = summarize(runs, [100, 200], 50.0, [0, 1], matrices)
+    assert [r["time_limit_ms"] for r in report["osrm_results"]] == [100, 200]
+    assert all(len(r["seeds"]) == 2 for r in report["haversine_results"] + report["osrm_results"])
+    assert report["experiment"]["runs"] == 8 and report["experiment"]["failed_runs"] == 0
+
+
+def test_failed_matrix_is_recorded_per_provider(points):
+    coords = points(10, seed=2)
+    events = list(run_experiment(ThreadPool(1), builders(coords), 2, [100, 200], [0, 1]))
+    matrices = [p for e, p in events if e == "matrix"]
+    runs = [p for e, p in events if e == "run"]
+    assert matrices[1] == {"provider": "osrm", "error": "osrm down"}
+    failed = [r for r in runs if "error" in r]
+    assert sorted((r["time_limit_ms"], r["seed"]) for r in failed) == [(100, 0), (100, 1), (200, 0), (200, 1)]
+    assert all(r["provider"] == "osrm" and "osrm down" in r["error"] for r in failed)
+
+    report = summarize(runs, [100, 200], 50.0, [0, 1], matrices)
+    assert report["experiment"]["failed_runs"] == 4
+    assert report["experiment"]["failed_matrices"] == ["osrm"]
+    assert all("matrix build failed" in r["error"] for r in report["osrm_results"])
+    assert all("error" not in r for r in report["haversine_results"])
+
+
+def test_compare_endpoint_runs_grid_against_stub(client, instance, osrm_stub, experiment_pool):
+    body = {**instance(12, 2, seed=3), "time_limits": [100, 200], "seeds": 2}
+    response = client.post("/debug/compare-haversine-vs-osrm", json=body)
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["experiment"]["runs"] == 8 and report["experiment"]["failed_runs"] == 0
+    assert report["experiment"]["failed_matrices"] == []
+    osrm_matrix = next(m for m in report["experiment"]["matrices"] if m["provider"] == "osrm")
+    assert osrm_matrix["osrm_cells_fetched"] == osrm_stub.cells == 144
+    assert all(r["best_seed"] in (0, 1) for r in report["osrm_results"])
+
+
+def test_compare_endpoint_counts_failed_osrm_matrix(client, instance, osrm_stub, experiment_pool):
+    osrm_stub.fail_rate = 1.0
+    body = {**instance(12, 2, seed=4), "time_limits": [100], "seeds": [0, 1]}
+    response = client.post("/debug/compare-haversine-vs-osrm?stream=ndjson", json=body)
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert events[-1]["event"] == "result"
+    experiment = events[-1]["experiment"]
+    assert experiment["failed_runs"] == 2 and experiment["failed_matrices"] == ["osrm"]
+    assert sum(1 for e in events if e["event"] == "run" and "error" in e) == 2
+
+
+@pytest.mark.parametrize("override", [
+    {"providers": ["google"]}, {"seeds": []}, {"time_limits": []}, {"seeds": 100, "time_limits": [100] * 5},
+])
+def test_compare_endpoint_rejects_bad_grids(client, instance, override):
+    response = client.post("/debug/compare-haversine-vs-osrm", json={**instance(10, 2), **override})
+    assert response.status_code == 400
+
+
+def test_background_job_lifecycle(client, instance, experiment_pool):
+    body = {**instance(10, 2, seed=5), "providers": ["haversine"], "time_limits": [100, 150], "seeds": 2,
+            "background": True}
+    response = client.post("/debug/compare-haversine-vs-osrm", json=body)
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job["status"] in ("queued", "running")
+    assert job["progress"] == {"completed": 0, "total": 4}
+
+    runs, since = [], 0
+    deadline = time.time() + 10
+    while job["status"] in ("queued", "running") and time.time() < deadline:
+        job = client.get(f"/debug/experiments/{job['job_id']}?since={since}&wait_ms=2000").get_json()
+        runs += job["runs"]
+        since = job["next_since"]
+    assert job["status"] == "done"
+    # Con since solo llegan las corridas nuevas: ninguna se repite
+    assert len(runs) == job["progress"]["completed"] == 4
+    assert job["result"]["experiment"]["runs"] == 4
+    assert client.get(f"/debug/experiments/{job['job_id']}?since=4").get_json()["runs"] == []
+    assert client.get("/debug/experiments/missing").status_code == 404
+    assert client.get("/debug/experiments/stats").get_json()["running"] == 0
+
+
+def test_jobs_report_failures_and_queue_limit(points):
+    class BrokenPool:
+        def run(self, fn, *args):
+            raise RuntimeError("pool closed")
+
+    coords = points(6, seed=6)
+    jobs = ExperimentJobs(lambda: BrokenPool(), max_pending=1)
+    job = jobs.submit({"haversine": builders(coords)["haversine"]}, 2, [100], [0], 50.0)
+    job = jobs.get(job["job_id"], wait_s=2)
+    deadline = time.time() + 5
+    while job["status"] != "failed" and time.time() < deadline:
+        job = jobs.get(job["job_id"], wait_s=0.1)
+    assert job["status"] == "failed" and job["error"] == "pool closed"
+
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return haversine_matrix(np.asarray(coords)), "meters", {}
+
+    blocked = jobs.submit({"haversine": slow}, 2, [100], [0], 50.0)
+    with pytest.raises(ExperimentQueueFullError):
+        jobs.submit({"haversine": slow}, 2, [100], [0], 50.0)
+    release.set()
+    assert jobs.get(blocked["job_id"], wait_s=5)["job_id"] == blocked["job_id"]
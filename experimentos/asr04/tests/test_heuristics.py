@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from heuristics import solve_fast
+from matrices import haversine_matrix
+from vrp_solver import capacity_per_vehicle
+
+
+def visited(result):
+    return sorted(s for r in result["routes"] for s in r["stops"] if s != 0)
+
+
+def test_solve_fast_matches_solver_format(points):
+    matrix = haversine_matrix(np.asarray(points(30, seed=8)))
+    result = solve_fast(matrix, 3, time_limit_ms=20)
+    assert result["solution_found"]
+    assert visited(result) == list(range(1, 30))
+    capacity = capacity_per_vehicle(30, 3)
+    assert all(r["customers_served"] <= capacity for r in result["routes"])
+    assert result["total_distance_m"] == sum(r["distance_m"] for r in result["routes"])
+
+
+def test_solve_fast_with_demands(points):
+    matrix = haversine_matrix(np.asarray(points(10, seed=9)))
+    demands = np.asarray([0, 3, 1, 1, 2, 1, 1, 4, 1, 1])
+    result = solve_fast(matrix, 2, time_limit_ms=20, demands=demands)
+    assert visited(result) == list(range(1, 10))
+
+
+def test_plan_fast_mode(client, instance):
+    out = client.post("/routes/plan", json={**instance(30, 3), "mode": "fast"}).get_json()
+    assert sum(r["customers_served"] for r in out["solution"]["routes"]) == 29
+
+
+@pytest.mark.parametrize("override", [
+    {"mode": "slow"},
+    {"initial_solution": "random"},
+    {"mode": "fast", "portfolio": True},
+])
+def test_plan_rejects_bad_fast_options(client, instance, override):
+    response = client.post("/routes/plan", json={**instance(10, 2), **override})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_fast_seed_searches_until_time_limit(client, instance):
+    # Regresión: la búsqueda sembrada por la heurística terminaba a los 5-80 ms
+    body = {**instance(60, 4, seed=21), "time_limit_ms": 600, "initial_solution": "fast"}
+    info = client.post("/routes/plan", json=body).get_json()["solution"]["solver_info"]
+    seed = info["fast_seed"]
+    assert info["warm_start"]["used"]
+    assert seed["solve_ms"] + seed["search_ms"] >= 550
+    assert seed["search_ms"] <= 600 - seed["solve_ms"] + 50
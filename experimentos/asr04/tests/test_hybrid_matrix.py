@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from hybrid_matrix import DetourCalibration, HybridMatrixProvider, solve_hybrid
+from matrices import haversine_matrix
+from osrm_client import OSRMTableClient
+from osrm_stub import stub_durations
+from traffic_manager import TrafficAPIManager
+
+
+@pytest.fixture
+def manager(osrm_stub):
+    client = OSRMTableClient(base_url=osrm_stub.url, retries=0)
+    yield TrafficAPIManager(client=client)
+    client.close()
+
+
+def real_durations(coords, osrm_stub):
+    lnglat = np.asarray(coords)[:, ::-1]
+    everyone = range(len(coords))
+    return stub_durations(lnglat, everyone, everyone, osrm_stub.speed_kmh, osrm_stub.detour).astype(np.int32)
+
+
+def test_calibration_learns_speed_and_regions(points):
+    coords = np.asarray(points(30, seed=1))
+    meters = haversine_matrix(coords)
+    calibration = DetourCalibration(prior_speed_kmh=30.0, min_samples=20)
+    assert calibration.stats()["global_speed_kmh"] == 30.0
+    # Duraciones reales a 45 km/h: el factor global y el de la región se acercan a esa velocidad
+    durations = meters / (45 / 3.6)
+    everyone = np.arange(30)
+    calibration.update(coords, meters, everyone, everyone, durations)
+    stats = calibration.stats()
+    assert stats["global_speed_kmh"] == pytest.approx(45.0, rel=0.01)
+    assert stats["calibrated_regions"] >= 1
+    factors = calibration.row_factors(coords)
+    assert np.allclose(factors[factors != calibration.global_factor], 3.6 / 45, rtol=0.01)
+    estimate = calibration.estimate(coords, meters)
+    assert np.allclose(estimate, durations, atol=2)
+
+
+def test_calibration_ignores_short_and_unreachable_cells(points):
+    coords = np.asarray(points(5, seed=2))
+    calibration = DetourCalibration(prior_speed_kmh=30.0, min_distance_m=1e9)
+    calibration.update(coords, haversine_matrix(coords), range(5), range(5), np.ones((5, 5)))
+    assert calibration.stats()["global_samples"] == 0
+
+
+def test_build_fetches_depot_and_neighbors_only(osrm_stub, manager, points):
+    coords = points(40, seed=3)
+    provider = HybridMatrixProvider(manager, DetourCalibration(), k=4, group_size=10)
+    matrix, known, meters, info = provider.build(coords)
+    assert known[0].all() and known[:, 0].all()
+    assert info["osrm_cells_fetched"] == osrm_stub.cells
+    assert osrm_stub.cells < 40 * 40 // 2
+    assert 0 < info["estimated_cells_pct"] < 100
+    assert "osrm_error" not in info
+    real = real_durations(coords, osrm_stub)
+    assert np.array_equal(matrix[known], real[known])
+
+
+def test_solve_hybrid_refines_solution_arcs_and_resolves(osrm_stub, manager, points):
+    # Con desvío los estimados difieren de OSRM: los arcos refinados cambian y se re-resuelve
+    osrm_stub.detour = 0.8
+    coords = points(30, seed=4)
+    provider = HybridMatrixProvider(manager, DetourCalibration(prior_speed_kmh=40.0), k=3)
+    matrix, known, meters, info = provider.build(coords)
+    solution, info = solve_hybrid(provider, coords, matrix, known, meters, info, 3, time_limit_ms=600)
+    assert info["solution_arcs_refined"] > 0
+    assert info["refined_arcs_changed_cost"] and info["resolved"]
+    real = real_durations(coords, osrm_stub)
+    total = 0
+    for route in solution["routes"]:
+        stops = np.asarray(route["stops"])
+        # Todos los arcos de la solución final son duraciones OSRM reales
+        assert known[stops[:-1], stops[1:]].all()
+        total += int(real[stops[:-1], stops[1:]].sum())
+    assert solution["total_travel_time_s"] == total
+    assert sorted(s for r in solution["routes"] for s in r["stops"] if s != 0) == list(range(1, 30))
+
+
+def test_build_keeps_estimates_when_osrm_is_down(osrm_stub, manager, points):
+    osrm_stub.fail_rate = 1.0
+    coords = points(20, seed=5)
+    calibration = DetourCalibration(prior_speed_kmh=30.0)
+    provider = HybridMatrixProvider(manager, calibration, k=3)
+    matrix, known, meters, info = provider.build(coords)
+    assert info["osrm_cells_fetched"] == 0 and "osrm_error" in info
+    assert np.array_equal(known, np.eye(20, dtype=bool))
+    assert np.array_equal(matrix, calibration.estimate(coords, meters) * ~known)
+    solution, info = solve_hybrid(provider, coords, matrix, known, meters, info, 2, time_limit_ms=200)
+    assert solution["solution_found"]
+    assert not info["resolved"] and "osrm_error" in info
+
+
+def test_plan_with_osrm_hybrid_falls_back_to_estimates(client, instance, osrm_stub):
+    osrm_stub.fail_rate = 1.0
+    body = {**instance(15, 2), "time_limit_ms": 200, "time_dependent": False, "matrix_mode": "hybrid"}
+    response = client.post("/routes/plan-with-osmr", json=body)
+    assert response.status_code == 200
+    hybrid = response.get_json()["traffic_info"]["hybrid"]
+    assert hybrid["osrm_cells_fetched"] == 0
+    assert "osrm_error" in hybrid
+    assert sum(r["customers_served"] for r in response.get_json()["solution"]["routes"]) == 14
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from incremental import ArcCosts, apply_changes, plan_cost
+from matrices import HaversineLookup, haversine_matrix
+from osrm_client import OSRMError
+
+
+def lookup_costs(coords):
+    lookup = HaversineLookup(np.asarray(coords))
+    return ArcCosts(len(coords), lambda r, c: lookup[r[:, None], c[None, :]], fetch_pairs=lambda r, c: lookup[r, c])
+
+
+def test_arc_costs_fetch_only_requested_cells(points):
+    costs = lookup_costs(points(10, seed=1))
+    costs.ensure([1, 2], [3, 4, 5])
+    assert costs.computed == 6
+    costs.ensure([1, 2], [3, 4, 5])
+    assert costs.computed == 6
+    assert np.array_equal(costs.full(), haversine_matrix(np.asarray(points(10, seed=1))))
+
+
+def test_arc_costs_estimate_on_fetch_error(points):
+    def fail(rows, cols):
+        raise RuntimeError("osrm down")
+
+    costs = ArcCosts(4, fail, estimate=lambda r, c: np.full((len(r), len(c)), 7))
+    costs.ensure([0, 1], [2, 3])
+    assert costs.estimated == 4 and costs.error == "osrm down"
+    assert costs[1, 3] == 7
+
+
+def test_apply_changes_remove_and_add(points):
+    coords = points(12, seed=2)
+    costs = lookup_costs(coords)
+    routes = [[1, 2, 3, 4, 5], [6, 7, 8, 9]]
+    before = plan_cost(costs, routes)
+    # Nodo 3 se quita; 10 y 11 son paradas nuevas
+    solution = apply_changes(costs, routes, [10, 11], [3], n_vehicles=2, cost_kind="meters")
+    info = solution["solver_info"]["incremental"]
+    assert info["previous_objective"] == before
+    assert info["objective"] == solution["total_distance_m"]
+    assert info["delta"] == info["removal_delta"] + info["insertion_delta"]
+    stops = sorted(s for r in solution["routes"] for s in r["stops"] if s != 0)
+    # Espacio compacto: 11 nodos sin el quitado
+    assert stops == list(range(1, 11))
+
+
+def test_apply_changes_polish_never_worse(points):
+    coords = points(30, seed=3)
+    costs = lookup_costs(coords)
+    routes = [list(range(1, 15)), list(range(15, 28))]
+    plain = apply_changes(lookup_costs(coords), routes, [28, 29], [], 2, "meters")
+    polished = apply_changes(costs, routes, [28, 29], [], 2, "meters", polish_ms=200)
+    assert polished["total_distance_m"] <= plain["total_distance_m"]
+
+
+def test_incremental_endpoint(client, instance):
+    body = instance(12, 2, seed=4)
+    ids = [p["id"] for p in body["points"]]
+    add = [{"id": "new-1", "lat": 4.66, "lng": -74.07}]
+    body.update({"plan": [ids[1:6], ids[6:]], "add": add, "remove": [ids[2]]})
+    response = client.post("/routes/plan/incremental", json=body)
+    assert response.status_code == 200, response.get_json()
+    out = response.get_json()
+    served = sorted(str(pid) for r in out["solution"]["routes"] for pid in r["stop_ids"] if pid != ids[0])
+    assert served == sorted({str(pid) for pid in ids[1:]} - {str(ids[2])} | {"new-1"})
+    assert out["changes"]["removed"] == [ids[2]]
+
+
+def test_incremental_endpoint_rejects_depot_removal(client, instance):
+    body = instance(8, 2, seed=5)
+    ids = [p["id"] for p in body["points"]]
+    body.update({"plan": [ids[1:]], "remove": [ids[0]]})
+    assert client.post("/routes/plan/incremental", json=body).status_code == 400
+
+
+def matrix_errors(asr04):
+    return sum(s["value"] for s in asr04.OSRM_ERRORS.snapshot() if s.get("kind") == "matrix")
+
+
+def test_incremental_endpoint_rejects_id_added_and_removed(client, instance):
+    body = instance(8, 2, seed=6)
+    ids = [p["id"] for p in body["points"]]
+    body.update({"plan": [ids[1:]], "add": [{"id": "new-1", "lat": 4.66, "lng": -74.07}], "remove": ["new-1"]})
+    response = client.post("/routes/plan/incremental", json=body)
+    assert response.status_code == 400
+    assert "new-1" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("error, status", [(ValueError("bad plan"), 400), (OSRMError("table failed"), 500)])
+def test_incremental_endpoint_maps_errors(client, instance, asr04, monkeypatch, error, status):
+    # Regresión: cualquier excepción salía como "OSRM API error" y sumaba a OSRM_ERRORS
+    def fail(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(asr04, "apply_changes", fail)
+    before = matrix_errors(asr04)
+    body = instance(8, 2, seed=7)
+    ids = [p["id"] for p in body["points"]]
+    body.update({"plan": [ids[1:]]})
+    response = client.post("/routes/plan/incremental", json=body)
+    assert response.status_code == status
+    assert response.get_json()["error"].startswith("OSRM API error") == (status == 500)
+    assert matrix_errors(asr04) - before == (status == 500)
+
+
+def test_arc_costs_estimate_pairs_on_fetch_error():
+    def fail(rows, cols):
+        raise OSRMError("route failed")
+
+    costs = ArcCosts(4, fail, fetch_pairs=fail, estimate_pairs=lambda r, c: np.full(len(r), 9))
+    assert costs[np.asarray([0, 1, 1]), np.asarray([1, 2, 2])].tolist() == [9, 9, 9]
+    assert costs.estimated == 2 and costs.error == "route failed"
+
+
+def test_apply_changes_polishes_only_touched_routes(points):
+    coords = points(40, seed=8)
+    costs = lookup_costs(coords)
+    routes = [list(range(1, 14)), list(range(14, 27)), list(range(27, 40))]
+    solution = apply_changes(costs, routes, [], [5], n_vehicles=3, cost_kind="meters", polish_ms=200)
+    polish = solution["solver_info"]["incremental"]["polish"]
+    # Solo cambió la primera ruta: se pule su submatriz y las otras quedan como vinieron
+    assert polish is None or (polish["routes"], polish["points"]) == (1, 13)
+    assert not costs.known[14:, 14:].all()
+    served = [[s for s in r["stops"] if s != 0] for r in solution["routes"]]
+    assert served[1:] == [[s - 1 for s in r] for r in routes[1:]]
+
+
+def test_osrm_incremental_fetches_plan_arcs_as_pairs(client, instance, osrm_stub):
+    body = instance(40, 3, seed=9)
+    ids = [p["id"] for p in body["points"]]
+    body.update({"provider": "osrm", "plan": [ids[1:14], ids[14:27], ids[27:]], "remove": [ids[3]]})
+    response = client.post("/routes/plan/incremental", json=body)
+    assert response.status_code == 200, response.get_json()
+    out = response.get_json()
+    # Los 42 arcos del plan y el que une la quitada, sin la tabla 40 x 40 que los cubre
+    assert out["metrics"]["cells_computed"] == 43
+    assert osrm_stub.cells < 40 * 40 // 10
+    assert out["solution"]["solver_info"]["incremental"]["previous_objective"] > 0
@@ -0,0 +1,109 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from jobs import PlanJobs, QueueFullError, SharedJobCounts
+
+
+class BlockingPool:
+    """Pool falso: cada trabajo queda resolviendo hasta `release`."""
+
+    workers = 1
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def submit(self, matrix, n_vehicles, time_limit_ms, cost_kind):
+        future = Future()
+
+        def finish():
+            self.release.wait(5)
+            future.set_result((0.0, {"solver_info": {"actual_solve_time_ms": 1}}))
+
+        threading.Thread(target=finish, daemon=True).start()
+        return future
+
+
+def build():
+    return {"matrix": np.zeros((3, 3), dtype=np.int64)}
+
+
+def _hold_jobs(counts, active, ready, done):
+    with counts.lock:
+        counts.publish(active=active, queued=0, solving=active, queue_depth=active - 1)
+    ready.set()
+    done.wait(10)
+
+
+def test_admission_and_queue_depth_span_web_workers():
+    counts = SharedJobCounts(slots=4)
+    ctx = multiprocessing.get_context("fork")
+    ready, done = ctx.Event(), ctx.Event()
+    # Otro worker web (proceso hijo) con 3 trabajos activos
+    other = ctx.Process(target=_hold_jobs, args=(counts, 3, ready, done))
+    other.start()
+    try:
+        assert ready.wait(10)
+        pool = BlockingPool()
+        jobs = PlanJobs(pool, max_pending=4, counts=counts)
+        jobs.submit(build, 2, 100, "meters", {})
+        with pytest.raises(QueueFullError):
+            jobs.submit(build, 2, 100, "meters", {})
+        stats = jobs.stats()
+        assert stats["web_workers"] == 2
+        assert stats["active"] == 4
+        assert stats["web_worker"]["active"] == 1
+        assert stats["queue_depth"] == 2 + stats["web_worker"]["queue_depth"]
+    finally:
+        done.set()
+        other.join(10)
+    # El worker que terminó deja de contar: vuelve a haber lugar
+    jobs.submit(build, 2, 100, "meters", {})
+    assert jobs.stats()["web_workers"] == 1
+    pool.release.set()
+
+
+def test_finished_jobs_free_their_slot():
+    pool = BlockingPool()
+    jobs = PlanJobs(pool, max_pending=1)
+    job = jobs.submit(build, 2, 100, "meters", {})
+    with pytest.raises(QueueFullError):
+        jobs.submit(build, 2, 100, "meters", {})
+    pool.release.set()
+    assert jobs.get(job["job_id"], wait_s=5)["status"] == "done"
+    assert jobs.stats()["active"] == 0
+    jobs.submit(build, 2, 100, "meters", {})
+
+
+def test_job_endpoint_reports_global_queue(client, instance):
+    response = client.post("/routes/jobs", json={**instance(10, 2), "time_limit_ms": 100})
+    assert response.status_code == 202
+    queue = response.get_json()["queue"]
+    assert queue["web_workers"] == 1
+    assert "web_worker" in queue
+    job_id = response.get_json()["job_id"]
+    assert client.get(f"/routes/jobs/{job_id}?wait_ms=20000").get_json()["status"] == "done"
+
+
+def test_pool_prestart_does_not_block_worker_init(asr04, monkeypatch):
+    # Regresión: post_worker_init arrancaba el pool antes del calentamiento y retrasaba /health/ready
+    started = threading.Event()
+
+    def slow_pool():
+        time.sleep(0.3)
+        started.set()
+
+    monkeypatch.setattr(asr04, "get_plan_jobs", slow_pool)
+    monkeypatch.setattr(asr04, "SOLVER_POOL_PRESTART", True)
+    t = time.perf_counter()
+    asr04.prestart_plan_jobs()
+    assert time.perf_counter() - t < 0.1
+    assert started.wait(5)
+    monkeypatch.setattr(asr04, "SOLVER_POOL_PRESTART", False)
+    started.clear()
+    asr04.prestart_plan_jobs()
+    assert not started.wait(0.5)
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from osrm_client import CircuitBreaker, CircuitOpenError, OSRMTableClient
+from traffic_manager import TrafficAPIManager
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_s=1.0, reset_after_s=60)
+    breaker.record(0.1, ok=False)
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record(0.1, ok=True)
+    breaker.record(0.1, ok=False)
+    assert breaker.state == "closed"
+    breaker.record(5.0, ok=True)  # lenta cuenta como fallo
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["opens"] == 1
+
+
+def test_breaker_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after_s=0.01)
+    breaker.record(0.1, ok=False)
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record(0.1, ok=False)
+    assert breaker.state == "open"
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record(0.1, ok=True)
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_traffic_manager_falls_back_and_breaker_opens(osrm_stub, points):
+    osrm_stub.fail_rate = 1.0
+    breaker = CircuitBreaker(failure_threshold=1, reset_after_s=60)
+    client = OSRMTableClient(base_url=osrm_stub.url, retries=0)
+    manager = TrafficAPIManager(client=client, breaker=breaker, fallback_speed_kmh=30)
+    coords = points(5, seed=6)
+    result = manager.calculate_traffic_matrix(coords)
+    assert result["provider_used"] == "haversine_fallback"
+    assert result["fallback_reason"] == "osrm_error"
+    assert breaker.state == "open"
+    assert manager.calculate_traffic_matrix(coords)["fallback_reason"] == "circuit_open"
+
+    strict = TrafficAPIManager(client=client, breaker=breaker)
+    with pytest.raises(CircuitOpenError):
+        strict.calculate_traffic_matrix(coords)
+    client.close()
+
+
+def test_plan_with_osrm_falls_back_when_stub_fails(client, instance, osrm_stub):
+    osrm_stub.fail_rate = 1.0
+    body = {**instance(10, 2), "time_limit_ms": 100, "time_dependent": False}
+    out = client.post("/routes/plan-with-osmr", json=body).get_json()
+    assert out["traffic_info"]["provider"] == "haversine_fallback"
+    assert out["traffic_info"]["fallback_reason"] == "osrm_error"
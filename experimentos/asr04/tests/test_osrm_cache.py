@@ -0,0 +1,91 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from osrm_cache import DurationCache
+from osrm_client import OSRMTableClient
+from traffic_manager import TrafficAPIManager
+
+
+def test_duration_cache_round_trip(tmp_path, points):
+    coords = points(6, seed=3)
+    cache = DurationCache(str(tmp_path / "d.sqlite"))
+    values = np.arange(36, dtype=np.int32).reshape(6, 6)
+    cache.store(coords, [0, 1], range(6), values[:2])
+    matrix, found = cache.lookup(coords)
+    assert found[:2].all() and not found[2:].any()
+    assert np.array_equal(matrix[:2], values[:2])
+    assert len(cache) == 12
+    cache.close()
+
+
+def test_duration_cache_reconnects_after_fork(tmp_path, points):
+    coords = points(4, seed=4)
+    cache = DurationCache(str(tmp_path / "d.sqlite"))
+    cache.store(coords, range(4), range(4), np.ones((4, 4), dtype=np.int32))
+    inherited = cache._conn
+    cache._pid = os.getpid() + 1  # como si el objeto viniera del maestro
+    matrix, found = cache.lookup(coords)
+    assert found.all()
+    assert cache._conn is not inherited
+
+
+def test_traffic_manager_fills_only_missing_cells(tmp_path, osrm_stub, points):
+    coords = points(12, seed=5)
+    cache = DurationCache(str(tmp_path / "d.sqlite"))
+    client = OSRMTableClient(base_url=osrm_stub.url, retries=0)
+    manager = TrafficAPIManager(cache=cache, client=client)
+    first = manager.calculate_traffic_matrix(coords[:10])
+    assert first["osrm_cells_fetched"] == 100
+    second = manager.calculate_traffic_matrix(coords)
+    assert second["cache_hit_ratio"] == pytest.approx(100 / 144, abs=1e-4)
+    assert second["osrm_cells_fetched"] < 144
+    assert np.array_equal(second["matrix"][:10, :10], first["matrix"])
+    client.close()
+
+
+def test_duration_cache_indexes_created_at(tmp_path):
+    cache = DurationCache(str(tmp_path / "d.sqlite"))
+    indexes = {name for (name,) in cache._conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "durations_created_at" in indexes and "durations_last_used" not in indexes
+    cache.close()
+
+
+def test_duration_cache_lookup_does_not_write(tmp_path, points):
+    coords = points(5, seed=7)
+    cache = DurationCache(str(tmp_path / "d.sqlite"))
+    cache.store(coords, range(5), range(5), np.ones((5, 5), dtype=np.int32))
+    changes = cache._conn.total_changes
+    assert cache.lookup(coords)[1].all()
+    assert cache._conn.total_changes == changes
+    cache.close()
+
+
+def test_duration_cache_evicts_every_n_writes(tmp_path, points):
+    coords = points(6, seed=8)
+    cache = DurationCache(str(tmp_path / "d.sqlite"), ttl_s=0.01, evict_every=30, evict_interval_s=3600)
+    cache.store(coords, [0, 1], range(6), np.ones((2, 6), dtype=np.int32))
+    time.sleep(0.02)
+    # 24 celdas escritas: por debajo de evict_every, las vencidas siguen en la tabla
+    cache.store(coords, [2, 3], range(6), np.ones((2, 6), dtype=np.int32))
+    assert len(cache) == 24
+    time.sleep(0.02)
+    cache.store(coords, [4, 5], range(6), np.ones((2, 6), dtype=np.int32))
+    assert len(cache) == 12
+    assert cache._count == 12 and cache._writes == 0
+    cache.close()
+
+
+def test_duration_cache_evicts_oldest_over_max_entries(tmp_path, points):
+    coords = points(6, seed=9)
+    cache = DurationCache(str(tmp_path / "d.sqlite"), max_entries=20)
+    for row in range(6):
+        cache.store(coords, [row], range(6), np.full((1, 6), row, dtype=np.int32))
+        time.sleep(0.002)
+    # Al pasar de 20 se baja al 90 % del tope borrando las filas escritas primero
+    _, found = cache.lookup(coords)
+    assert len(cache) == cache._count <= 20
+    assert found[5].all() and not found[0].any()
+    cache.close()
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from osrm_client import OSRMError, OSRMTableClient
+from osrm_stub import stub_durations
+
+
+def test_client_tiles_match_stub(osrm_stub, points):
+    coords = points(23, seed=2)
+    client = OSRMTableClient(base_url=osrm_stub.url, tile_size=10, retries=0)
+    try:
+        table = client.table(coords, range(23), range(23))
+    finally:
+        client.close()
+    lnglat = np.asarray(coords)[:, ::-1]
+    expected = stub_durations(lnglat, range(23), range(23), osrm_stub.speed_kmh)
+    assert table.shape == (23, 23)
+    assert np.allclose(table, expected, atol=1)
+    assert osrm_stub.requests == 9
+    assert osrm_stub.cells == 23 * 23
+
+
+def test_plan_with_osrm_uses_stub(client, instance, osrm_stub):
+    body = {**instance(15, 2), "time_limit_ms": 100, "time_dependent": False}
+    response = client.post("/routes/plan-with-osmr", json=body)
+    assert response.status_code == 200
+    out = response.get_json()
+    assert out["traffic_info"]["provider"] == "osrm"
+    assert osrm_stub.cells == 15 * 15
+    assert sum(r["customers_served"] for r in out["solution"]["routes"]) == 14
+
+
+def test_client_wraps_network_errors():
+    # Puerto cerrado: el error de requests sale como OSRMError
+    client = OSRMTableClient(base_url="http://127.0.0.1:9", retries=0, timeout_s=1)
+    try:
+        with pytest.raises(OSRMError):
+            client.table([(4.6, -74.0), (4.61, -74.01)], [0, 1], [0, 1])
+    finally:
+        client.close()
+
+
+def test_client_pairs_match_table(osrm_stub, points):
+    coords = points(12, seed=3)
+    client = OSRMTableClient(base_url=osrm_stub.url, tile_size=5, retries=0)
+    route = [0, 3, 7, 2, 0]
+    sources, destinations = route[:-1] + [5], route[1:] + [9]
+    try:
+        legs = client.pairs(coords, sources, destinations)
+        table = client.table(coords, range(12), range(12))
+    finally:
+        client.close()
+    assert legs.tolist() == table[sources, destinations].tolist()
+    # 4 arcos encadenados y uno suelto en bloques de 5 waypoints: 2 solicitudes /route
+    assert osrm_stub.requests == 2 + 9
+    assert osrm_stub.cells == 4 + 1 + 12 * 12
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from payload import PayloadError, count_points, point_columns, validate_points
+
+
+def test_objects_and_columnar_agree():
+    points = [{"id": "d", "lat": 4.6, "lng": -74.1}, {"id": "a", "lat": 4.7, "lng": -74.0}]
+    coords_obj, ids_obj, _ = validate_points({"points": points})
+    coords_col, ids_col, _ = validate_points({"lat": [4.6, 4.7], "lng": [-74.1, -74.0], "ids": ["d", "a"]})
+    assert np.array_equal(coords_obj, coords_col)
+    assert ids_obj == ids_col == ["d", "a"]
+
+
+def test_invalid_points_by_reason():
+    data = {"lat": [4.6, None, "x", 95.0, "4.7"], "lng": [-74.1, -74.0, -74.0, -74.0, -74.2]}
+    coords, ids, invalid = validate_points(data)
+    assert ids == [0, 4]
+    assert coords.tolist() == [[4.6, -74.1], [4.7, -74.2]]
+    assert invalid["missing"].tolist() == [False, True, False, False, False]
+    assert invalid["non_numeric"].tolist() == [False, False, True, False, False]
+    assert invalid["out_of_range"].tolist() == [False, False, False, True, False]
+
+
+def test_binary_columns_and_nan_as_missing():
+    lat = np.asarray([4.6, np.nan, 4.7], dtype="<f8").tobytes()
+    lng = np.asarray([-74.1, -74.0, -74.2], dtype="<f8").tobytes()
+    assert count_points({"lat": lat, "lng": lng}) == 3
+    coords, ids, invalid = validate_points({"lat": lat, "lng": lng})
+    assert ids == [0, 2]
+    assert invalid["missing"].sum() == 1
+
+
+@pytest.mark.parametrize("data", [
+    {"lat": [1.0, 2.0], "lng": [1.0]},
+    {"lat": [1.0], "lng": [1.0], "ids": [1, 2]},
+    {"points": [1, 2]},
+    {"lat": b"1234567", "lng": []},
+    {"lat": "1,2", "lng": "3,4"},
+])
+def test_count_points_rejects_bad_shapes(data):
+    with pytest.raises(PayloadError):
+        count_points(data)
+
+
+def test_plan_rejects_non_object_body(client):
+    response = client.post("/routes/plan", json=[1, 2, 3])
+    assert response.status_code == 400
+
+
+def test_plan_counts_invalid_points(client, instance):
+    body = instance(10, 2)
+    body["points"][4]["lat"] = 123.0
+    body["time_limit_ms"] = 100
+    out = client.post("/routes/plan", json=body).get_json()
+    assert sum(r["customers_served"] for r in out["solution"]["routes"]) == 8
+
+
+def test_point_columns_keeps_every_point():
+    points = [{"id": "d", "lat": 4.6, "lng": -74.1}, {"id": "x", "lat": None, "lng": "w"}, {"id": "a", "lat": 95, "lng": 0}]
+    lat, lng, ids, missing, non_numeric = point_columns({"points": points})
+    assert ids == ["d", "x", "a"]
+    assert np.isnan(lat[1]) and np.isnan(lng[1]) and lat[2] == 95
+    assert missing.tolist() == [False, True, False]
+    assert non_numeric.tolist() == [False, False, False]
+    assert point_columns({"lat": [4.6], "lng": [-74.1]})[2] is None
@@ -0,0 +1,81 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from matrices import haversine_matrix
+from portfolio import DEFAULT_PORTFOLIO, parse_configs, solve_portfolio
+
+
+class ThreadPool:
+    """SolverPool en hilos; la configuración con seed 99 nunca termina."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def run(self, fn, *args):
+        if args[-1].get("seed") == 99:
+            return Future()
+        return self._executor.submit(fn, *args)
+
+
+def test_parse_configs_fills_defaults():
+    assert parse_configs(True) is None
+    assert parse_configs([{"metaheuristic": "TABU_SEARCH"}]) == [
+        {"first_solution": DEFAULT_PORTFOLIO[0]["first_solution"], "metaheuristic": "TABU_SEARCH", "seed": 0}
+    ]
+
+
+@pytest.mark.parametrize("value", [
+    [{"first_solution": "NOPE"}],
+    [{"metaheuristic": "UNSET"}],
+    [{"first_solution": "SWEEP"}],
+    [{"seed": -1}],
+    [{"seed": "1"}],
+    ["SAVINGS"],
+    [],
+    "yes",
+])
+def test_parse_configs_rejects_unknown_names(value):
+    with pytest.raises(ValueError):
+        parse_configs(value)
+
+
+def test_unknown_strategy_is_a_400(client, instance):
+    # Regresión: antes llegaba al getattr de search_parameters en el proceso resolutor (HTML 500)
+    body = {**instance(10, 2), "portfolio": [{"first_solution": "NOPE", "metaheuristic": "GUIDED_LOCAL_SEARCH"}]}
+    response = client.post("/routes/plan", json=body)
+    assert response.status_code == 400
+    assert "first_solution" in response.get_json()["error"]
+    assert client.post("/routes/plan-with-osmr", json=body).status_code == 400
+
+
+def test_returns_best_finished_config_at_deadline(points):
+    matrix = haversine_matrix(np.asarray(points(20, seed=1)))
+    configs = [
+        {"first_solution": "PATH_CHEAPEST_ARC", "metaheuristic": "GUIDED_LOCAL_SEARCH", "seed": 0},
+        {"first_solution": "SAVINGS", "metaheuristic": "GUIDED_LOCAL_SEARCH", "seed": 99},
+    ]
+    result = solve_portfolio(ThreadPool(2), matrix, 2, time_limit_ms=100, configs=configs, grace_ms=400)
+    info = result["solver_info"]
+    assert result["solution_found"]
+    assert info["portfolio"]["winner"] == "PATH_CHEAPEST_ARC/GUIDED_LOCAL_SEARCH/0"
+    assert info["portfolio"]["timed_out"] == ["SAVINGS/GUIDED_LOCAL_SEARCH/99"]
+    assert info["actual_solve_time_ms"] < 1500
+
+
+def test_reports_configs_that_do_not_fit_the_pool(points):
+    matrix = haversine_matrix(np.asarray(points(15, seed=2)))
+    result = solve_portfolio(ThreadPool(2), matrix, 2, time_limit_ms=100, configs=DEFAULT_PORTFOLIO[:4])
+    portfolio = result["solver_info"]["portfolio"]
+    assert len(portfolio["candidates"]) == 2
+    assert portfolio["dropped"] == ["SAVINGS/GUIDED_LOCAL_SEARCH/0", "PARALLEL_CHEAPEST_INSERTION/SIMULATED_ANNEALING/0"]
+
+
+def test_portfolio_endpoint(client, instance):
+    body = {**instance(15, 2), "time_limit_ms": 200, "portfolio": True}
+    out = client.post("/routes/plan", json=body).get_json()
+    portfolio = out["solution"]["solver_info"]["portfolio"]
+    assert len(portfolio["candidates"]) == 2
+    assert len(portfolio["dropped"]) == len(DEFAULT_PORTFOLIO) - 2
@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pytest
+
+from profiling import ProfileDumper, parse_profile
+
+
+@pytest.fixture
+def profile_dir(asr04, tmp_path, monkeypatch):
+    monkeypatch.setattr(asr04, "profile_dumper", ProfileDumper(str(tmp_path)))
+    return tmp_path
+
+
+def plan(client, body):
+    response = client.post("/routes/plan", json={"time_limit_ms": 200, **body})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["solution"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None), (False, None), (True, {"dump": False}), ({"dump": True}, {"dump": True}), ({}, None),
+])
+def test_parse_profile(value, expected):
+    assert parse_profile({"profile": value}) == expected
+
+
+def test_plan_without_profile_records_nothing(client, instance, profile_dir):
+    solution = plan(client, instance(12, 2))
+    assert "profile" not in solution["solver_info"]
+    assert not list(profile_dir.iterdir())
+
+
+def test_plan_profile_dumps_dense_instance(client, instance, profile_dir):
+    body = {**instance(15, 2, seed=2), "profile": {"dump": True}}
+    profile = plan(client, body)["solver_info"]["profile"]
+    assert profile["trace"] and all(len(point) == 2 for point in profile["trace"])
+    assert profile["first_solution_ms"] is not None and profile["first_solution_ms"] <= profile["trace"][0][0] + 1
+    assert profile["validate_ms"] >= 0 and profile["matrix_ms"] >= 0
+    assert profile["metaheuristic"] == "GUIDED_LOCAL_SEARCH"
+
+    dump_id = profile["dump_id"]
+    assert sorted(p.name for p in profile_dir.iterdir()) == [f"{dump_id}.json", f"{dump_id}.npz"]
+    arrays = np.load(profile_dir / f"{dump_id}.npz")
+    assert arrays["matrix"].shape == (15, 15) and arrays["coords"].shape == (15, 2)
+    record = json.loads((profile_dir / f"{dump_id}.json").read_text())
+    assert record["endpoint"] == "plan"
+    assert "points" not in record["options"] and record["options"]["vehicles"] == 2
+    assert record["profile"]["trace"] == profile["trace"]
+    assert record["solution"]["total_distance_m"] > 0
+
+
+def test_plan_profile_without_dump_writes_no_files(client, instance, profile_dir):
+    profile = plan(client, {**instance(12, 2), "profile": True})["solver_info"]["profile"]
+    assert profile["trace"] and "dump_id" not in profile
+    assert not list(profile_dir.iterdir())
+
+
+def test_plan_profile_sparse_dump_has_no_matrix(client, instance, profile_dir):
+    body = {**instance(40, 3, seed=3), "distance_model": "sparse", "knn": 8, "profile": {"dump": True}}
+    profile = plan(client, body)["solver_info"]["profile"]
+    assert profile["trace"] and profile["first_solution_ms"] is not None
+    arrays = np.load(profile_dir / f"{profile['dump_id']}.npz")
+    # Sin matriz N x N: la instancia se reconstruye desde las coordenadas
+    assert arrays.files == ["coords"] and arrays["coords"].shape == (40, 2)
+
+
+def test_plan_profile_dump_disabled(client, instance, asr04, monkeypatch):
+    monkeypatch.setattr(asr04, "profile_dumper", None)
+    profile = plan(client, {**instance(12, 2), "profile": {"dump": True}})["solver_info"]["profile"]
+    assert "dump_id" not in profile
+    assert "PROFILE_DIR" in profile["dump_error"]
@@ -0,0 +1,14 @@
+import numpy as np
+
+from recorder import TrafficRecorder
+
+
+def test_arrays_keep_points_as_received():
+    data = {"points": [{"id": 7, "lat": 4.6, "lng": -74.1}, {"id": 8, "lat": "x", "lng": -74.0},
+                       {"id": 9, "lat": 4.7, "lng": 200}]}
+    capture = {"matrix": np.zeros((1, 1), dtype=np.int64), "nodes": [[4.6, -74.1]]}
+    arrays = TrafficRecorder._arrays(data, capture)
+    assert arrays["lat"][0] == 4.6 and np.isnan(arrays["lat"][1])
+    assert arrays["invalid"].tolist() == [0, 2, 3]
+    assert arrays["ids"].tolist() == ["7", "8", "9"]
+    assert arrays["nodes"].shape == (1, 2)
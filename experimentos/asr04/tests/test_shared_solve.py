@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from experiments import run_experiment
+from matrices import haversine_matrix
+from shared_solve import gls_lambda, seeded_routes, share_matrix, solve_shared
+
+
+class ThreadPool:
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def run(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+
+def test_gls_lambda_is_default_for_seed_zero():
+    assert gls_lambda(0) is None
+    assert gls_lambda(3) == gls_lambda(3)
+    assert 0.05 <= gls_lambda(3) <= 0.3
+
+
+def test_solve_shared_reads_the_shared_copy(points):
+    matrix = haversine_matrix(np.asarray(points(15, seed=13)))
+    shm, shape, dtype = share_matrix(matrix)
+    try:
+        out = solve_shared(shm.name, shape, dtype, 2, 100, {"metaheuristic": "TABU_SEARCH", "seed": 1})
+    finally:
+        shm.close()
+        shm.unlink()
+    assert out["objective"] == out["solution"]["total_distance_m"]
+    assert sorted(s for p in out["paths"] for s in p if s != 0) == list(range(1, 15))
+
+
+def test_seeded_routes_are_reproducible_and_cover_every_stop(points):
+    matrix = haversine_matrix(np.asarray(points(20, seed=15)))
+    routes = seeded_routes(matrix, 3, 4)
+    assert routes == seeded_routes(matrix, 3, 4) != seeded_routes(matrix, 3, 5)
+    assert sorted(s for r in routes for s in r) == list(range(1, 20))
+
+
+def test_seed_changes_non_gls_searches(points):
+    # Regresión: la semilla solo tocaba el lambda de GLS y SA/Tabu repetían la misma corrida
+    matrix = haversine_matrix(np.asarray(points(60, seed=3)))
+    shm, shape, dtype = share_matrix(matrix)
+    try:
+        objectives = {
+            solve_shared(shm.name, shape, dtype, 3, 300,
+                         {"first_solution": "PATH_CHEAPEST_ARC", "metaheuristic": "TABU_SEARCH", "seed": seed})["objective"]
+            for seed in range(4)
+        }
+    finally:
+        shm.close()
+        shm.unlink()
+    assert len(objectives) > 1
+
+
+def test_experiment_runs_on_the_shared_worker(points):
+    matrix = haversine_matrix(np.asarray(points(12, seed=14)))
+    builders = {"haversine": lambda: (matrix, "meters", {})}
+    events = list(run_experiment(ThreadPool(2), builders, 2, [100], [0, 1]))
+    runs = [payload for event, payload in events if event == "run"]
+    assert sorted(r["seed"] for r in runs) == [0, 1]
+    assert all(r["solution_found"] and r["objective"] == r["solution"]["total_distance_m"] for r in runs)
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from solution_cache import SolutionCache, fingerprint
+
+
+def test_fingerprint_rounds_coordinates_and_orders_options():
+    a = fingerprint("haversine", [(4.60000001, -74.1)], 2, 1000, {"x": 1, "y": 2})
+    b = fingerprint("haversine", [(4.6, -74.1)], 2, 1000, {"y": 2, "x": 1})
+    assert a == b
+    assert a != fingerprint("osrm", [(4.6, -74.1)], 2, 1000, {"x": 1, "y": 2})
+    assert a != fingerprint("haversine", [(4.6, -74.1)], 3, 1000, {"x": 1, "y": 2})
+
+
+def test_hit_after_miss():
+    cache = SolutionCache(ttl_s=60, max_entries=4)
+    calls = []
+    compute = lambda: calls.append(1) or {"v": len(calls)}
+    assert cache.get_or_compute("k", compute) == ({"v": 1}, "miss")
+    assert cache.get_or_compute("k", compute) == ({"v": 1}, "hit")
+    assert len(calls) == 1
+
+
+def test_expired_and_evicted_entries_recompute():
+    cache = SolutionCache(ttl_s=0.01, max_entries=1)
+    cache.get_or_compute("a", lambda: {"v": 1})
+    time.sleep(0.02)
+    assert cache.get_or_compute("a", lambda: {"v": 2})[1] == "miss"
+    cache.ttl_s = 60
+    cache.get_or_compute("b", lambda: {"v": 3})
+    assert cache.stats()["entries"] == 1
+    assert cache.get_or_compute("a", lambda: {"v": 4}) == ({"v": 4}, "miss")
+
+
+def test_non_cacheable_results_are_not_stored():
+    cache = SolutionCache()
+    cache.get_or_compute("k", lambda: {"cacheable": False})
+    assert cache.stats()["entries"] == 0
+
+
+def test_concurrent_requests_coalesce():
+    cache = SolutionCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(2)
+        return {"v": 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)[1])) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(results) == ["coalesced"] * 3 + ["miss"]
+
+
+def test_errors_propagate_and_are_not_cached():
+    cache = SolutionCache()
+
+    def boom():
+        raise RuntimeError("solver failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", boom)
+    assert cache.get_or_compute("k", lambda: {"v": 1})[1] == "miss"
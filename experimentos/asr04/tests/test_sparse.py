@@ -0,0 +1,34 @@
+import numpy as np
+
+from matrices import KnnDistanceModel
+from vrp_solver import solve_vrp_sparse
+
+
+def test_cost_matrix_matches_cost(points):
+    model = KnnDistanceModel(np.asarray(points(80, seed=11)), k=5)
+    matrix = model.cost_matrix(1.5)
+    rng = np.random.default_rng(0)
+    for i, j in rng.integers(0, 80, size=(300, 2)):
+        assert matrix[i, j] == model.cost(int(i), int(j), 1.5)
+
+
+def test_small_sparse_model_uses_native_transit(points):
+    model = KnnDistanceModel(np.asarray(points(60, seed=12)), k=8)
+    result = solve_vrp_sparse(model, 3, time_limit_ms=500, native_max_points=100)
+    info = result["solver_info"]
+    assert info["distance_model"]["transit"] == "matrix"
+    assert sorted(s for r in result["routes"] for s in r["stops"] if s != 0) == list(range(1, 60))
+    # Con el modelo cerrado por los parámetros propios la búsqueda (GLS) usa todo el límite
+    assert info["actual_solve_time_ms"] >= 450
+
+
+def test_large_sparse_model_keeps_callback(points):
+    model = KnnDistanceModel(np.asarray(points(60, seed=12)), k=8)
+    result = solve_vrp_sparse(model, 3, time_limit_ms=200, native_max_points=50)
+    assert result["solver_info"]["distance_model"]["transit"] == "callback"
+
+
+def test_plan_rejects_unknown_distance_model(client, instance):
+    response = client.post("/routes/plan", json={**instance(10, 2), "distance_model": "tree"})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
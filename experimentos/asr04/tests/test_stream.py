@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pytest
+
+from matrices import haversine_matrix
+from vrp_solver import solve_vrp
+
+
+def test_early_stop_marks_solver_info(points):
+    matrix = haversine_matrix(np.asarray(points(40, seed=7)))
+    result = solve_vrp(matrix, 3, time_limit_ms=5000, stall_ms=100, min_improvement_pct=50)
+    info = result["solver_info"]
+    assert info["early_stopped"]
+    assert not info["time_limit_reached"]
+    assert info["actual_solve_time_ms"] < 5000
+
+
+def ndjson_events(response):
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def sse_events(response):
+    assert response.mimetype == "text/event-stream"
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        name, data = block.split("\n")
+        assert name.startswith("event: ") and data.startswith("data: ")
+        events.append({"event": name[len("event: "):], **json.loads(data[len("data: "):])})
+    return events
+
+
+@pytest.mark.parametrize("fmt, parse", [("ndjson", ndjson_events), ("sse", sse_events)])
+def test_stream_progress_then_one_result(client, instance, fmt, parse):
+    body = {**instance(25, 3, seed=3), "time_limit_ms": 300}
+    events = parse(client.post(f"/routes/plan/stream?format={fmt}", json=body))
+    kinds = [e["event"] for e in events]
+    assert kinds.count("result") == 1 and kinds[-1] == "result"
+    progress = events[:-1]
+    assert progress and all(e["event"] == "solution" for e in progress)
+    objectives = [e["objective"] for e in progress]
+    assert objectives == sorted(objectives, reverse=True)
+    assert all(a["elapsed_ms"] <= b["elapsed_ms"] for a, b in zip(progress, progress[1:]))
+    result = events[-1]
+    assert result["solution"]["total_distance_m"] <= objectives[-1]
+    assert sum(r["customers_served"] for r in result["solution"]["routes"]) == 24
+
+
+@pytest.mark.parametrize("query, override", [
+    ("format=xml", {}),
+    ("", {"vehicles": 0}),
+    ("", {"vehicles": "two"}),
+    ("", {"time_limit_ms": "soon"}),
+    ("", {"time_limit_ms": 0}),
+    ("", {"early_stop": {"stall_ms": "x"}}),
+    ("", {"provider": "google"}),
+])
+def test_stream_rejects_bad_requests_before_streaming(client, instance, query, override):
+    response = client.post(f"/routes/plan/stream?{query}", json={**instance(10, 2), **override})
+    assert response.status_code == 400
+    assert response.mimetype == "application/json"
+    assert "error" in response.get_json()
+
+
+def test_stream_rejects_too_few_points(client, instance):
+    body = instance(10, 2)
+    body["points"] = body["points"][:2]
+    response = client.post("/routes/plan/stream?format=ndjson", json=body)
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "points must be 3..150"
@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+from telemetry import Histogram
+
+PHASES = ("validate", "matrix", "solve", "total")
+
+
+def phase_series(text, phase, suffix):
+    pattern = rf'^asr04_phase_seconds_{suffix}\{{endpoint="plan",phase="{phase}"(?:,le="([^"]+)")?\}} (\S+)$'
+    return [(m.group(1), float(m.group(2))) for m in re.finditer(pattern, text, re.M)]
+
+
+def phase_count(client, phase):
+    counts = phase_series(client.get("/metrics").get_data(as_text=True), phase, "count")
+    return counts[0][1] if counts else 0
+
+
+def test_histogram_quantile_interpolates_within_bucket():
+    histogram = Histogram("h", "test", buckets=(0.1, 0.2, 0.4))
+    for value in (0.15, 0.15, 0.3, 0.3):
+        histogram.observe(value)
+    (row,) = histogram.snapshot()
+    assert row["count"] == 4
+    assert row["p50_ms"] == pytest.approx(200.0)
+    # El percentil nunca pasa del máximo observado
+    assert row["p99_ms"] <= row["max_ms"] == 300.0
+
+
+def test_metrics_exposes_plan_phases(client, instance):
+    before = {phase: phase_count(client, phase) for phase in PHASES}
+    response = client.post("/routes/plan", json={**instance(10, 2), "time_limit_ms": 100})
+    assert response.status_code == 200
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.mimetype == "text/plain"
+    text = metrics.get_data(as_text=True)
+    for phase in PHASES:
+        (count,) = phase_series(text, phase, "count")
+        assert count[1] == before[phase] + 1
+        buckets = phase_series(text, phase, "bucket")
+        assert buckets[-1] == ("+Inf", count[1])
+        cumulative = [value for _, value in buckets]
+        assert cumulative == sorted(cumulative)
+
+
+def test_metrics_json_reports_percentiles(client, instance):
+    client.post("/routes/plan", json={**instance(10, 2), "time_limit_ms": 100})
+    snapshot = client.get("/metrics?format=json").get_json()
+    rows = {row["phase"]: row for row in snapshot["asr04_phase_seconds"] if row["endpoint"] == "plan"}
+    assert set(PHASES) <= set(rows)
+    for row in rows.values():
+        assert row["count"] >= 1
+        assert 0 <= row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"] <= row["max_ms"]
@@ -0,0 +1,69 @@
+import pytest
+
+from time_budget import ConvergenceHistory, bucket_key
+
+
+def curve(scale=1):
+    return [(10.0 * scale, 1200), (50.0 * scale, 1050), (400.0 * scale, 1000)]
+
+
+def lines(path):
+    with open(path) as f:
+        return sum(1 for line in f if line.strip())
+
+
+def test_history_file_is_bounded(tmp_path):
+    # Regresión: cada solicitud auto anexaba una línea y el archivo crecía sin límite
+    path = str(tmp_path / "history.jsonl")
+    history = ConvergenceHistory(path, max_curves=8, compact_every=16)
+    for _ in range(500):
+        history.record(40, 2, 1000, True, curve())
+    assert history.stats()[bucket_key(40, 2)] == {"curves": 8, "recorded": 500, "reference": 8}
+    assert lines(path) <= 8 + 16
+    reloaded = ConvergenceHistory(path, max_curves=8)
+    assert reloaded.stats()[bucket_key(40, 2)]["curves"] == 8
+
+
+def test_load_compacts_oversized_file(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    big = ConvergenceHistory(path, max_curves=100, compact_every=1000)
+    for _ in range(60):
+        big.record(40, 2, 1000, True, curve())
+    assert lines(path) == 60
+    ConvergenceHistory(path, max_curves=10)
+    assert lines(path) == 10
+
+
+def test_choose_never_exceeds_remaining_slo():
+    history = ConvergenceHistory(min_curves=1, explore_rate=0)
+    history.record(40, 2, 1000, True, curve())
+    # Regresión: el piso de 200 ms devolvía 200 aunque solo quedaran 80 ms del SLO
+    choice = history.choose(40, 2, 80, 1.0)
+    assert choice["time_limit_ms"] == 80
+    assert choice["reason"] == "slo"
+    assert not choice["reference"]
+    assert history.choose(40, 2, -50, 1.0)["time_limit_ms"] == 1
+    assert history.choose(40, 2, 5000, 1.0)["time_limit_ms"] == 500
+
+
+def test_auto_plan_records_dense_convergence(client, instance, asr04, monkeypatch):
+    history = ConvergenceHistory(min_curves=1, explore_rate=0)
+    monkeypatch.setattr(asr04, "convergence_history", history)
+    body = {**instance(20, 2, seed=11), "time_limit_ms": "auto"}
+    out = client.post("/routes/plan", json=body).get_json()
+    info = out["solution"]["solver_info"]
+    assert "convergence" not in info and info["auto_time_limit"]["time_limit_ms"] > 0
+    assert history.stats()[bucket_key(20, 2)]["recorded"] == 1
+
+
+@pytest.mark.parametrize("endpoint, option", [
+    ("/routes/plan", {"decompose": True}),
+    ("/routes/plan", {"distance_model": "sparse"}),
+    ("/routes/plan-with-osmr", {"matrix_mode": "hybrid"}),
+])
+def test_auto_rejected_where_convergence_is_not_recorded(client, instance, endpoint, option):
+    # Regresión: estas ramas usaban el historial de "auto" sin alimentarlo nunca
+    body = {**instance(20, 2, seed=12), "time_limit_ms": "auto", **option}
+    response = client.post(endpoint, json=body)
+    assert response.status_code == 400
+    assert "auto" in response.get_json()["error"]
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from time_matrices import seconds_of_day
+
+
+def test_seconds_of_day_clock_strings():
+    assert seconds_of_day("07:30") == 7 * 3600 + 30 * 60
+    assert seconds_of_day("23:59:59") == 86399
+
+
+@pytest.mark.parametrize("value", ["25:00", "24:00", "12:99", "12:30:60", "-1:00", "1:2:3:4", "ab:cd"])
+def test_seconds_of_day_rejects_out_of_range_clock(value):
+    # Regresión: "25:00" y "12:99" se aceptaban (módulo un día)
+    with pytest.raises(ValueError):
+        seconds_of_day(value)
+
+
+class Recorder:
+    def __init__(self):
+        self.captures = []
+
+    def sample(self):
+        return {"received_at": 0.0}
+
+    def submit(self, endpoint, data, capture, out):
+        self.captures.append(capture)
+
+
+@pytest.fixture
+def registered(client, instance, asr04):
+    body = instance(12, 2, seed=31)
+    buckets = asr04.time_matrix_store.buckets
+    coords = np.asarray([[p["lat"], p["lng"]] for p in body["points"]])
+    base = np.rint(np.abs(coords[:, None, 0] - coords[None, :, 0]) * 1e5 + 60).astype(int)
+    np.fill_diagonal(base, 0)
+    durations = np.repeat(base[None], buckets, axis=0).tolist()
+    assert client.post("/routes/time-matrices", json={**body, "durations": durations}).status_code == 201
+    return body
+
+
+def test_time_dependent_plan_uses_previous_plan_and_capture(client, registered, asr04, monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setattr(asr04, "traffic_recorder", recorder)
+    ids = [p["id"] for p in registered["points"]]
+    body = {**registered, "time_limit_ms": 300, "departure_time": "08:00",
+            "previous_plan": [ids[1:6], ids[6:]]}
+    out = client.post("/routes/plan-with-osmr", json=body).get_json()
+    assert out["traffic_info"]["provider"] == "time_buckets"
+    assert out["solution"]["solver_info"]["warm_start"]["used"]
+    assert recorder.captures[0]["matrix"].shape == (12, 12)
+
+
+@pytest.mark.parametrize("option", [{"early_stop": {"stall_ms": 100}}, {"portfolio": True}, {"profile": True},
+                                    {"time_limit_ms": "auto"}])
+def test_unsupported_options_skip_the_cube(client, registered, osrm_stub, option):
+    # Regresión: con cubo registrado estas opciones se ignoraban en silencio
+    body = {**registered, "time_limit_ms": 200, **option}
+    out = client.post("/routes/plan-with-osmr", json=body).get_json()
+    assert out["traffic_info"]["provider"] == "osrm"
+    assert out["traffic_info"]["time_dependent_skipped"] == list(option)
+
+
+def test_plan_with_osrm_rejects_bad_departure_time(client, instance):
+    body = {**instance(10, 2), "departure_time": "noon"}
+    assert client.post("/routes/plan-with-osmr", json=body).status_code == 400
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from matrices import haversine_matrix
+from vrp_solver import build_model, capacity_per_vehicle, solve_vrp
+
+
+def visited(result):
+    return sorted(s for r in result["routes"] for s in r["stops"] if s != 0)
+
+
+def test_build_model_registers_the_matrix_natively(points):
+    matrix = haversine_matrix(np.asarray(points(8, seed=11)))
+    manager, routing = build_model(matrix, 2)
+    routing.CloseModel()
+    # El costo de cada arco sale de la matriz registrada, sin callback Python
+    for i, j in [(0, 3), (3, 5), (7, 1)]:
+        assert routing.GetArcCostForVehicle(manager.NodeToIndex(i), manager.NodeToIndex(j), 0) == matrix[i, j]
+
+
+def test_solve_vrp_visits_every_stop_once(points):
+    matrix = haversine_matrix(np.asarray(points(30, seed=3)))
+    result = solve_vrp(matrix, 4, time_limit_ms=200)
+    assert result["solution_found"]
+    assert visited(result) == list(range(1, 30))
+    assert all(r["stops"][0] == 0 and r["stops"][-1] == 0 for r in result["routes"])
+    total = sum(r["distance_m"] for r in result["routes"])
+    assert result["total_distance_m"] == total
+
+
+def test_solve_vrp_balances_capacity(points):
+    matrix = haversine_matrix(np.asarray(points(25, seed=4)))
+    result = solve_vrp(matrix, 3, time_limit_ms=200)
+    capacity = capacity_per_vehicle(25, 3)
+    assert all(r["customers_served"] <= capacity for r in result["routes"])
+
+
+def test_solve_vrp_seconds_keys(points):
+    matrix = haversine_matrix(np.asarray(points(12, seed=5)))
+    result = solve_vrp(matrix, 2, time_limit_ms=100, cost_kind="seconds")
+    assert "total_travel_time_s" in result and "total_travel_time_h" in result
+    assert all("travel_time_s" in r for r in result["routes"])
+
+
+def test_solve_vrp_rejects_unknown_cost_kind(points):
+    matrix = haversine_matrix(np.asarray(points(5)))
+    with pytest.raises(ValueError):
+        solve_vrp(matrix, 1, time_limit_ms=50, cost_kind="furlongs")
+
+
+def test_plan_endpoint(client, instance):
+    body = {**instance(20, 3), "time_limit_ms": 150}
+    response = client.post("/routes/plan", json=body)
+    assert response.status_code == 200
+    out = response.get_json()
+    assert out["solution"]["solution_found"]
+    assert sum(r["customers_served"] for r in out["solution"]["routes"]) == 19
+    assert out["metrics"]["cache"] == "bypass"
+
+
+@pytest.mark.parametrize("vehicles", [0, 21])
+def test_plan_rejects_bad_vehicle_count(client, instance, vehicles):
+    response = client.post("/routes/plan", json={**instance(10, 2), "vehicles": vehicles})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_plan_rejects_too_many_points(client, instance):
+    assert client.post("/routes/plan", json=instance(151, 2)).status_code == 400
+    assert client.post("/routes/plan", json=instance(2, 1)).status_code == 400
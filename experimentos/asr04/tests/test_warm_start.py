@@ -0,0 +1,32 @@
+import numpy as np
+
+from matrices import haversine_matrix
+from vrp_solver import solve_vrp
+
+
+def visited(result):
+    return sorted(s for r in result["routes"] for s in r["stops"] if s != 0)
+
+
+def test_warm_start_repairs_partial_plan(points):
+    matrix = haversine_matrix(np.asarray(points(20, seed=6)))
+    # Plan previo con paradas faltantes: se insertan antes de buscar
+    result = solve_vrp(matrix, 2, time_limit_ms=200, initial_routes=[[1, 2, 3], [4, 5]])
+    warm = result["solver_info"]["warm_start"]
+    assert warm["used"]
+    assert warm["inserted_stops"] == 14
+    assert visited(result) == list(range(1, 20))
+
+
+def test_warm_start_searches_until_time_limit(points):
+    matrix = haversine_matrix(np.asarray(points(60, seed=10)))
+    previous = solve_vrp(matrix, 4, time_limit_ms=100)
+    routes = [[s for s in r["stops"] if s != 0] for r in previous["routes"]]
+    result = solve_vrp(matrix, 4, time_limit_ms=600, initial_routes=routes,
+                       target_objective=previous["total_distance_m"])
+    info = result["solver_info"]
+    # Antes el modelo se cerraba sin GLS y la búsqueda terminaba en el primer óptimo local (~50 ms)
+    assert info["actual_solve_time_ms"] >= 550
+    assert info["time_limit_reached"]
+    assert result["total_distance_m"] <= info["warm_start"]["initial_objective"]
+    assert info["warm_start"]["time_to_match_previous_ms"] is not None
@@ -0,0 +1,145 @@
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+# Cortes de los grupos de instancias (puntos, vehículos) que comparten curvas de convergencia
+SIZE_EDGES = (25, 50, 75, 100, 150, 300, 1000)
+VEHICLE_EDGES = (1, 3, 7, 20)
+
+
+def bucket_key(n_points: int, n_vehicles: int) -> str:
+    size = SIZE_EDGES[min(bisect_left(SIZE_EDGES, n_points), len(SIZE_EDGES) - 1)]
+    vehicles = VEHICLE_EDGES[min(bisect_left(VEHICLE_EDGES, n_vehicles), len(VEHICLE_EDGES) - 1)]
+    return f"n<={size}/v<={vehicles}"
+
+
+def time_to_reach(curve, tolerance_pct: float):
+    """Primer instante (ms) en que la curva queda dentro de tolerance_pct % de su mejor objetivo."""
+    best = min(objective for _, objective in curve)
+    threshold = best * (1 + tolerance_pct / 100.0)
+    for elapsed_ms, objective in curve:
+        if objective <= threshold:
+            return elapsed_ms
+    return curve[-1][0]
+
+
+class ConvergenceHistory:
+    """Curvas objetivo vs tiempo por grupo de tamaño y vehículos, y elección del límite 'auto'.
+
+    Solo las corridas de referencia (resueltas con todo el presupuesto disponible) cuentan
+    como mejor objetivo conocido; mientras un grupo tenga menos de `min_curves` se resuelve
+    siempre con todo el presupuesto, y luego una fracción `explore_rate` lo sigue haciendo
+    para que las curvas no se sesguen hacia los límites ya elegidos.
+
+    Cada grupo guarda a lo sumo `max_curves` curvas como muestra uniforme (reservorio) de
+    todas las registradas. El archivo se escribe por anexado y, cada `compact_every` líneas
+    nuevas, se reescribe con el contenido de los reservorios para que no crezca sin límite.
+    """
+
+    def __init__(self, path: str = None, max_curves: int = 64, min_curves: int = 5,
+                 explore_rate: float = 0.1, quantile: float = 0.9, safety: float = 1.25,
+                 min_limit_ms: int = 200, compact_every: int = 256):
+        self.path = path
+        self.max_curves = max_curves
+        self.min_curves = min_curves
+        self.explore_rate = explore_rate
+        self.quantile = quantile
+        self.safety = safety
+        self.min_limit_ms = min_limit_ms
+        self.compact_every = compact_every
+        self._curves = defaultdict(list)
+        self._seen = defaultdict(int)
+        self._appended = 0
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        if path and os.path.exists(path):
+            lines = 0
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        lines += 1
+                        self._keep(json.loads(line))
+            if lines > sum(len(curves) for curves in self._curves.values()):
+                self._compact()
+
+    def _keep(self, record):
+        # Muestreo de reservorio (algoritmo R) por grupo; devuelve si la curva quedó
+        key = record["bucket"]
+        curves = self._curves[key]
+        self._seen[key] += 1
+        if len(curves) < self.max_curves:
+            curves.append(record)
+            return True
+        slot = self._random.randrange(self._seen[key])
+        if slot < self.max_curves:
+            curves[slot] = record
+            return True
+        return False
+
+    def _compact(self):
+        # Reescritura atómica del archivo con lo que hay en los reservorios
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            for key in sorted(self._curves):
+                for record in sorted(self._curves[key], key=lambda r: r["ts"]):
+                    f.write(json.dumps(record) + "\n")
+        os.replace(tmp, self.path)
+        self._appended = 0
+
+    def choose(self, n_points: int, n_vehicles: int, budget_ms: int, tolerance_pct: float) -> dict:
+        """Menor límite esperado para quedar a tolerance_pct % del mejor conocido, sin pasar budget_ms."""
+        key = bucket_key(n_points, n_vehicles)
+        budget_ms = max(1, int(budget_ms))
+        with self._lock:
+            curves = list(self._curves[key])
+        reached = [time_to_reach(c["curve"], tolerance_pct) for c in curves if c["reference"] and c["curve"]]
+
+        choice = {"bucket": key, "budget_ms": budget_ms, "tolerance_pct": tolerance_pct, "reference_curves": len(reached)}
+        if budget_ms < self.min_limit_ms:
+            # Queda menos del piso dentro del SLO: se usa lo que queda y la curva no es de referencia
+            return {**choice, "time_limit_ms": budget_ms, "reason": "slo", "reference": False}
+        if len(reached) < self.min_curves:
+            return {**choice, "time_limit_ms": budget_ms, "reason": "bootstrap", "reference": True}
+        if self._random.random() < self.explore_rate:
+            return {**choice, "time_limit_ms": budget_ms, "reason": "explore", "reference": True}
+
+        expected_ms = float(np.quantile(reached, self.quantile)) * self.safety
+        limit = int(min(budget_ms, max(self.min_limit_ms, expected_ms)))
+        return {**choice, "time_limit_ms": limit, "expected_ms": int(expected_ms),
+                "reason": "budget" if limit == budget_ms else "history", "reference": limit == budget_ms}
+
+    def record(self, n_points: int, n_vehicles: int, time_limit_ms: int, reference: bool, curve):
+        if not curve:
+            return
+        record = {
+            "ts": time.time(),
+            "bucket": bucket_key(n_points, n_vehicles),
+            "points": n_points,
+            "vehicles": n_vehicles,
+            "time_limit_ms": time_limit_ms,
+            "reference": reference,
+            "curve": [[float(ms), int(objective)] for ms, objective in curve],
+        }
+        with self._lock:
+            if self._keep(record) and self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                if self._appended + 1 >= self.compact_every:
+                    self._compact()
+                else:
+                    with open(self.path, "a") as f:
+                        f.write(json.dumps(record) + "\n")
+                    self._appended += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                key: {"curves": len(curves), "recorded": self._seen[key],
+                      "reference": sum(1 for c in curves if c["reference"])}
+                for key, curves in sorted(self._curves.items())
+            }
@@ -0,0 +1,285 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from vrp_solver import format_result, solve_vrp
+
+log = logging.getLogger(__name__)
+
+DAY_S = 24 * 3600
+
+
+def seconds_of_day(departure_time, now: Optional[float] = None) -> float:
+    """Segundos desde la medianoche local para 'now', 'HH:MM[:SS]', ISO 8601 o epoch (s)."""
+    if departure_time in (None, "now"):
+        moment = datetime.fromtimestamp(time.time() if now is None else now)
+    elif isinstance(departure_time, (int, float)):
+        moment = datetime.fromtimestamp(float(departure_time))
+    elif isinstance(departure_time, str) and len(departure_time) <= 8 and ":" in departure_time:
+        try:
+            parts = [int(p) for p in departure_time.split(":")]
+        except ValueError as e:
+            raise ValueError(f"departure_time 'HH:MM[:SS]' must be numeric: {departure_time}") from e
+        hours, minutes, seconds = parts[0], parts[1], parts[2] if len(parts) > 2 else 0
+        if len(parts) > 3 or not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+            raise ValueError(f"departure_time 'HH:MM[:SS]' out of range: {departure_time}")
+        return float(hours * 3600 + minutes * 60 + seconds)
+    else:
+        try:
+            moment = datetime.fromisoformat(str(departure_time))
+        except ValueError as e:
+            raise ValueError(f"departure_time must be 'now', 'HH:MM', ISO 8601 or epoch seconds: {departure_time}") from e
+    return float(moment.hour * 3600 + moment.minute * 60 + moment.second + moment.microsecond / 1e6)
+
+
+class TimeDependentMatrix:
+    """Vista de un conjunto de paradas dentro de un cubo (franjas x N x N) mapeado en memoria.
+
+    `at(t)` interpola entre las dos franjas vecinas; `rows_at(times)` arma la matriz cuya fila i
+    se evalúa al instante de salida times[i]. Solo se leen las páginas de las celdas pedidas.
+    """
+
+    def __init__(self, cube: np.ndarray, positions: Optional[np.ndarray], bucket_s: int, set_key: str):
+        self.cube = cube
+        self.positions = positions
+        self.bucket_s = bucket_s
+        self.set_key = set_key
+        self.buckets = cube.shape[0]
+        self.n = cube.shape[1] if positions is None else len(positions)
+
+    def slot(self, seconds) -> tuple:
+        """(franja, franja siguiente, peso de la siguiente) para uno o varios instantes del día."""
+        position = (np.asarray(seconds, dtype=np.float64) % DAY_S) / self.bucket_s
+        bucket = np.floor(position).astype(np.intp) % self.buckets
+        return bucket, (bucket + 1) % self.buckets, position - np.floor(position)
+
+    def at(self, seconds: float) -> np.ndarray:
+        bucket, following, weight = self.slot(seconds)
+        if self.positions is None:
+            first, second = self.cube[int(bucket)], self.cube[int(following)]
+        else:
+            index = np.ix_(self.positions, self.positions)
+            first, second = self.cube[int(bucket)][index], self.cube[int(following)][index]
+        return np.rint((1.0 - weight) * first + weight * second).astype(np.int32)
+
+    def rows_at(self, times) -> np.ndarray:
+        bucket, following, weight = self.slot(times)
+        rows = np.arange(self.n) if self.positions is None else self.positions
+        cols = rows[None, :]
+        first = self.cube[bucket[:, None], rows[:, None], cols]
+        second = self.cube[following[:, None], rows[:, None], cols]
+        return np.rint((1.0 - weight[:, None]) * first + weight[:, None] * second).astype(np.int32)
+
+    def simulate(self, paths, departure_s: float):
+        """Recorre las rutas con duraciones según la hora de paso. Devuelve (salida de cada nodo, duración por ruta)."""
+        leave = np.full(self.n, float(departure_s))
+        durations = []
+        for path in paths:
+            t = float(departure_s)
+            for i, j in zip(path[:-1], path[1:]):
+                leave[i] = t
+                t += self._arc(i, j, t)
+            durations.append(t - departure_s)
+        return leave, durations
+
+    def _arc(self, i: int, j: int, t: float) -> float:
+        bucket, following, weight = self.slot(t)
+        if self.positions is not None:
+            i, j = self.positions[i], self.positions[j]
+        return (1.0 - weight) * float(self.cube[int(bucket), i, j]) + weight * float(self.cube[int(following), i, j])
+
+
+class TimeMatrixStore:
+    """Matrices de duración por franja horaria para conjuntos de paradas recurrentes.
+
+    Cada conjunto es un cubo int32 (franjas x N x N) en `<root>/<clave>.npy` con sus coordenadas
+    en `<clave>.json`; se abre con np.load(mmap_mode='r'), sin copiar, y los procesos que lo
+    mapean comparten la caché de páginas. Una solicitud usa el conjunto más chico que contenga
+    todas sus paradas (en cualquier orden).
+    """
+
+    def __init__(self, root: str, bucket_minutes: int = 15, precision: int = 5, refresh_s: float = 5.0):
+        if DAY_S % (bucket_minutes * 60):
+            raise ValueError("bucket_minutes must divide the day")
+        self.root = root
+        self.bucket_s = bucket_minutes * 60
+        self.buckets = DAY_S // self.bucket_s
+        self.precision = precision
+        self.refresh_s = refresh_s
+        self._sets: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._scanned_at = 0.0
+        os.makedirs(root, exist_ok=True)
+        self.refresh()
+
+    def refresh(self):
+        """Indexa los conjuntos nuevos o reemplazados en disco (p. ej. registrados por otro worker)."""
+        self._scanned_at = time.monotonic()
+        for path in glob.glob(os.path.join(self.root, "*.json")):
+            key = os.path.basename(path)[:-len(".json")]
+            with self._lock:
+                known = self._sets.get(key)
+            if known is None or known["mtime"] != os.path.getmtime(path):
+                self._index(path)
+
+    def point_keys(self, coords) -> np.ndarray:
+        scale = 10 ** self.precision
+        arr = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        lat_q = np.rint((arr[:, 0] + 90.0) * scale).astype(np.int64)
+        lng_q = np.rint((arr[:, 1] + 180.0) * scale).astype(np.int64)
+        return lat_q * (360 * scale + 1) + lng_q
+
+    def set_key(self, coords) -> str:
+        return hashlib.sha1(self.point_keys(coords).tobytes()).hexdigest()[:16]
+
+    def _index(self, meta_path: str):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("bucket_s") != self.bucket_s:
+            log.warning("Cubo con otra duración de franja, se ignora",
+                        extra={"fields": {"set": meta.get("key"), "bucket_s": meta.get("bucket_s")}})
+            return
+        keys = self.point_keys(meta["coords"])
+        order = np.argsort(keys, kind="stable")
+        with self._lock:
+            self._sets[meta["key"]] = {"meta": meta, "sorted_keys": keys[order], "order": order, "cube": None,
+                                       "mtime": os.path.getmtime(meta_path)}
+
+    def put(self, coords, durations: np.ndarray, source: str) -> dict:
+        """Guarda el cubo (franjas x N x N) de un conjunto de paradas; reemplaza el anterior de forma atómica."""
+        durations = np.asarray(durations)
+        n = len(coords)
+        if durations.shape != (self.buckets, n, n):
+            raise ValueError(f"durations must have shape ({self.buckets}, {n}, {n})")
+        key = self.set_key(coords)
+        cube_path = os.path.join(self.root, f"{key}.npy")
+        meta_path = os.path.join(self.root, f"{key}.json")
+        tmp = f"{cube_path}.{os.getpid()}.tmp"
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.int32, shape=durations.shape)
+        out[:] = durations
+        out.flush()
+        del out
+        os.replace(tmp, cube_path)
+        meta = {
+            "key": key,
+            "coords": np.asarray(coords, dtype=np.float64).reshape(-1, 2).tolist(),
+            "bucket_s": self.bucket_s,
+            "created_at": time.time(),
+            "source": source,
+        }
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        self._index(meta_path)
+        return self.describe(key)
+
+    def lookup(self, coords) -> Optional[TimeDependentMatrix]:
+        """Vista dependiente del tiempo para `coords` o None si ningún conjunto las contiene todas."""
+        found = self._match(coords)
+        if found is None and time.monotonic() - self._scanned_at >= self.refresh_s:
+            self.refresh()
+            found = self._match(coords)
+        return found
+
+    def _match(self, coords) -> Optional[TimeDependentMatrix]:
+        keys = self.point_keys(coords)
+        with self._lock:
+            candidates = sorted(self._sets.items(), key=lambda item: len(item[1]["order"]))
+        for key, entry in candidates:
+            sorted_keys = entry["sorted_keys"]
+            if len(sorted_keys) < len(keys):
+                continue
+            at = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+            if not np.all(sorted_keys[at] == keys):
+                continue
+            positions = entry["order"][at]
+            if len(positions) == len(sorted_keys) and np.array_equal(positions, np.arange(len(positions))):
+                positions = None
+            return TimeDependentMatrix(self._cube(key, entry), positions, self.bucket_s, key)
+        return None
+
+    def _cube(self, key: str, entry: dict) -> np.ndarray:
+        if entry["cube"] is None:
+            entry["cube"] = np.load(os.path.join(self.root, f"{key}.npy"), mmap_mode="r")
+        return entry["cube"]
+
+    def describe(self, key: str) -> dict:
+        with self._lock:
+            meta = self._sets[key]["meta"]
+        return {
+            "key": key,
+            "points": len(meta["coords"]),
+            "buckets": self.buckets,
+            "bucket_minutes": self.bucket_s // 60,
+            "bytes": self.buckets * len(meta["coords"]) ** 2 * 4,
+            "created_at": meta["created_at"],
+            "source": meta["source"],
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            keys = sorted(self._sets)
+        return {"root": self.root, "bucket_minutes": self.bucket_s // 60, "sets": [self.describe(k) for k in keys]}
+
+
+def solve_time_dependent(td: TimeDependentMatrix, departure_s: float, n_vehicles: int, time_limit_ms: int,
+                         rounds: int = 2, first_share: float = 0.8, initial_routes=None, target_objective=None):
+    """VRP con costos dependientes de la hora de paso por cada arco.
+
+    OR-Tools no admite costos que dependan del tiempo acumulado: se resuelve con la matriz de
+    la hora de salida y luego, por rondas, con la matriz cuya fila i está evaluada a la hora en
+    que la solución vigente sale de i, arrancando desde esa solución (búsqueda local que suele
+    converger en decenas de ms, por eso la primera resolución recibe la mayor parte del límite).
+    Los costos reportados son los de recorrer las rutas finales con esas horas de paso.
+    `initial_routes` / `target_objective` (previous_plan) arrancan la primera resolución.
+    """
+    start = time.perf_counter()
+    matrix = td.at(departure_s)
+    result = solve_vrp(matrix, n_vehicles, time_limit_ms=max(100, int(time_limit_ms * first_share)), cost_kind="seconds",
+                       initial_routes=initial_routes, target_objective=target_objective)
+    warm_start = result["solver_info"].get("warm_start")
+    paths = [r["stops"] for r in result["routes"]]
+    leave, durations = td.simulate(paths, departure_s)
+    static_objective = result["total_travel_time_s"]
+    best = (sum(durations), paths, leave, result)
+
+    done = 0
+    for _ in range(rounds):
+        remaining_ms = time_limit_ms - int((time.perf_counter() - start) * 1000)
+        if remaining_ms < 100 or not result["solution_found"]:
+            break
+        per_round = max(100, remaining_ms // (rounds - done))
+        effective = td.rows_at(leave)
+        previous = [[s for s in p if s != 0] for p in best[1]]
+        result = solve_vrp(effective, n_vehicles, time_limit_ms=per_round, cost_kind="seconds", initial_routes=previous)
+        paths = [r["stops"] for r in result["routes"]]
+        leave, durations = td.simulate(paths, departure_s)
+        done += 1
+        if sum(durations) < best[0]:
+            best = (sum(durations), paths, leave, result)
+
+    _, paths, leave, result = best
+    solve_time = (time.perf_counter() - start) * 1000
+    # Fila i a la hora real de salida de i: el costo de cada arco de la solución es su duración simulada
+    final = format_result(td.rows_at(leave), paths, n_vehicles, "seconds", solve_time, time_limit_ms,
+                          result["solver_info"]["solver_status"], result["solution_found"])
+    bucket, _, weight = td.slot(departure_s)
+    final["solver_info"]["time_dependent"] = {
+        "set": td.set_key,
+        "departure_s": int(departure_s),
+        "departure_bucket": int(bucket),
+        "interpolation_weight": round(float(weight), 3),
+        "rounds": done,
+        "static_objective": static_objective,
+    }
+    if warm_start is not None:
+        final["solver_info"]["warm_start"] = warm_start
+    return final
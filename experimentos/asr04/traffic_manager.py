@@ -1,45 +1,158 @@
-import requests
+import logging
 import numpy as np
 import time
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
+
+from matrices import haversine_duration_matrix
+from osrm_cache import DurationCache
+from osrm_client import CircuitBreaker, CircuitOpenError, OSRMDeadlineExceeded, OSRMTableClient
+from telemetry import OSRM_FALLBACKS, OSRM_FETCH_SECONDS
+
+log = logging.getLogger(__name__)
 
 class TrafficAPIManager:
-    def calculate_traffic_matrix(self, coords: List[Tuple[float, float]]) -> Dict:
-        print(f"Calculando matriz de tiempos con OSRM")
-        
+    def __init__(self, cache: Optional[DurationCache] = None, client: Optional[OSRMTableClient] = None,
+                 breaker: Optional[CircuitBreaker] = None, fallback_speed_kmh: Optional[float] = None):
+        self.cache = cache
+        self.client = client if client is not None else OSRMTableClient()
+        self.breaker = breaker
+        # Con velocidad de respaldo, un OSRM caído, lento o con el circuito abierto degrada a haversine
+        self.fallback_speed_kmh = fallback_speed_kmh
+
+    def calculate_traffic_matrix(self, coords: List[Tuple[float, float]], deadline: Optional[float] = None) -> Dict:
+        """`deadline` (instante de time.perf_counter()) es el fin del presupuesto para hablar con OSRM."""
+        log.debug("Calculando matriz de tiempos con OSRM", extra={"fields": {"points": len(coords)}})
+
         start_time = time.perf_counter()
-        matrix = self._osrm_matrix(coords)
+        n = len(coords)
+        try:
+            if self.cache is None:
+                matrix = self._osrm_matrix(coords, deadline)
+                cells_fetched = n * n
+                cache_hit_ratio = 0.0
+            else:
+                matrix, cells_fetched, cache_hit_ratio = self._cached_matrix(coords, deadline)
+        except Exception as e:
+            if self.fallback_speed_kmh is None:
+                raise
+            reason = (
+                "circuit_open" if isinstance(e, CircuitOpenError)
+                else "deadline_exceeded" if isinstance(e, OSRMDeadlineExceeded)
+                else "osrm_error"
+            )
+            return self._fallback(coords, reason, start_time, e)
         calc_time = time.perf_counter() - start_time
-        
+
         return {
             'matrix': matrix,
             'provider_used': 'osrm',
             'has_realtime_traffic': False,
             'calculation_time_ms': int(calc_time * 1000),
-            'matrix_size': f"{len(coords)}x{len(coords)}"
+            'matrix_size': f"{len(coords)}x{len(coords)}",
+            'cache_hit_ratio': round(cache_hit_ratio, 4),
+            'osrm_cells_fetched': cells_fetched
         }
-    
-    def _osrm_matrix(self, coords: List[Tuple[float, float]]) -> np.ndarray:
-        coords_str = ';'.join([f"{lng},{lat}" for lat, lng in coords])
-        
-        url = f"http://router.project-osrm.org/table/v1/driving/{coords_str}"
-        params = {
-            'sources': ';'.join([str(i) for i in range(len(coords))]),
-            'destinations': ';'.join([str(i) for i in range(len(coords))])
+
+    def _cached_matrix(self, coords: List[Tuple[float, float]], deadline: Optional[float] = None):
+        """Completa desde OSRM solo las filas/columnas que faltan en la caché."""
+        n = len(coords)
+        matrix, found = self.cache.lookup(coords)
+        hit_ratio = float(found.sum()) / (n * n) if n else 1.0
+        if found.all():
+            return matrix, 0, hit_ratio
+        if not found.any():
+            matrix = self._osrm_matrix(coords, deadline)
+            self.cache.store(coords, range(n), range(n), matrix)
+            return matrix, n * n, hit_ratio
+
+        # Cobertura voraz de las celdas faltantes con el menor número de puntos (filas + columnas)
+        missing = ~found
+        stale = []
+        while missing.any():
+            k = int(np.argmax(missing.sum(axis=0) + missing.sum(axis=1)))
+            stale.append(k)
+            missing[k, :] = False
+            missing[:, k] = False
+
+        stale = sorted(stale)
+        everyone = list(range(n))
+        stale_set = set(stale)
+        rest = [i for i in everyone if i not in stale_set]
+
+        rows = self._osrm_table(coords, stale, everyone, deadline)
+        matrix[stale, :] = rows
+        self.cache.store(coords, stale, everyone, rows)
+        cells_fetched = len(stale) * n
+        if rest:
+            cols = self._osrm_table(coords, rest, stale, deadline)
+            matrix[np.ix_(rest, stale)] = cols
+            self.cache.store(coords, rest, stale, cols)
+            cells_fetched += len(rest) * len(stale)
+
+        return matrix, cells_fetched, hit_ratio
+
+    def _osrm_matrix(self, coords: List[Tuple[float, float]], deadline: Optional[float] = None) -> np.ndarray:
+        everyone = list(range(len(coords)))
+        return self._osrm_table(coords, everyone, everyone, deadline)
+
+    def fetch_table(self, coords: List[Tuple[float, float]], sources: List[int], destinations: List[int],
+                    deadline: Optional[float] = None) -> np.ndarray:
+        """Bloque origen x destino desde OSRM (con circuito y métricas), guardado en la caché."""
+        table = self._osrm_table(coords, sources, destinations, deadline)
+        if self.cache is not None:
+            self.cache.store(coords, sources, destinations, table)
+        return table
+
+    def fetch_pairs(self, coords: List[Tuple[float, float]], sources: List[int], destinations: List[int],
+                    deadline: Optional[float] = None) -> np.ndarray:
+        """Arcos sueltos sources[k] -> destinations[k] desde OSRM (/route, con circuito y métricas), guardados en la caché."""
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError("OSRM circuit breaker is open")
+        start = time.perf_counter()
+        try:
+            durations = self.client.pairs(coords, sources, destinations, deadline=deadline)
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record(time.perf_counter() - start, ok=False)
+            raise
+        elapsed = time.perf_counter() - start
+        if self.breaker is not None:
+            self.breaker.record(elapsed, ok=True)
+        OSRM_FETCH_SECONDS.observe(elapsed, kind="pairs")
+        if self.cache is not None:
+            self.cache.store_pairs(coords, sources, destinations, durations)
+        return durations
+
+    def _fallback(self, coords: List[Tuple[float, float]], reason: str, start_time: float, error: Exception) -> Dict:
+        OSRM_FALLBACKS.inc(reason=reason)
+        log.warning("Matriz OSRM sustituida por haversine", extra={"fields": {"reason": reason, "error": str(error)}})
+        matrix = haversine_duration_matrix(coords, self.fallback_speed_kmh)
+        return {
+            'matrix': matrix,
+            'provider_used': 'haversine_fallback',
+            'has_realtime_traffic': False,
+            'calculation_time_ms': int((time.perf_counter() - start_time) * 1000),
+            'matrix_size': f"{len(coords)}x{len(coords)}",
+            'cache_hit_ratio': 0.0,
+            'osrm_cells_fetched': 0,
+            'fallback_reason': reason,
+            'fallback_speed_kmh': self.fallback_speed_kmh
         }
-        
-        response = requests.get(url, params=params, timeout=30)
-        data = response.json()
-        
-        if data['code'] != 'Ok':
-            raise Exception(f"OSRM API error: {data.get('message', 'Unknown error')}")
-        
-        clean_matrix = []
-        for row in data['durations']:
-            clean_row = [val if val is not None else 999999 for val in row]
-            clean_matrix.append(clean_row)
-        
-        matrix = np.array(clean_matrix, dtype=np.int32)
-        matrix = np.nan_to_num(matrix, nan=999999, posinf=999999, neginf=999999)
-        
-        return matrix
+
+    def _osrm_table(self, coords: List[Tuple[float, float]], sources: List[int], destinations: List[int],
+                    deadline: Optional[float] = None) -> np.ndarray:
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError("OSRM circuit breaker is open")
+        start = time.perf_counter()
+        try:
+            table = self.client.table(coords, sources, destinations, deadline=deadline)
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record(time.perf_counter() - start, ok=False)
+            raise
+        elapsed = time.perf_counter() - start
+        if self.breaker is not None:
+            self.breaker.record(elapsed, ok=True)
+        kind = "full" if len(sources) == len(destinations) == len(coords) else "partial"
+        OSRM_FETCH_SECONDS.observe(elapsed, kind=kind)
+        return table
@@ -0,0 +1,451 @@
+import logging
+import time
+import numpy as np
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+# Tipo de costo de la matriz -> llaves del resultado (por ruta y total)
+COST_KINDS = {
+    "meters": {"route_key": "distance_m", "total_key": "total_distance_m", "label": "VRP"},
+    "seconds": {"route_key": "travel_time_s", "total_key": "total_travel_time_s", "label": "VRP-Traffic"},
+}
+
+log = logging.getLogger(__name__)
+
+
+def capacity_per_vehicle(n: int, n_vehicles: int):
+    """Capacidad balanceada por vehículo, o None si no aplica la dimensión 'Capacity'."""
+    if n > n_vehicles and n_vehicles > 1:
+        customers = n - 1
+        return max(1, (customers + n_vehicles - 1) // n_vehicles)
+    return None
+
+
+def demand_capacity(demands, n_vehicles: int):
+    """Capacidad por vehículo con demandas por nodo (p. ej. super-nodos de paradas co-ubicadas).
+
+    Con demandas unitarias coincide con capacity_per_vehicle; si no, agrega la holgura
+    máx(demanda) - 1, con la que cualquier reparto por primer ajuste es factible.
+    """
+    demands = np.asarray(demands, dtype=np.int64)
+    total = int(demands[1:].sum())
+    if total + 1 > n_vehicles and n_vehicles > 1:
+        return max(1, (total + n_vehicles - 1) // n_vehicles) + int(demands[1:].max()) - 1
+    return None
+
+
+def build_model(matrix: np.ndarray, n_vehicles: int, demands=None):
+    """Construye el modelo con tránsitos nativos: OR-Tools nunca llama a Python por arco.
+
+    `demands` (una por nodo, 0 en el depósito) reemplaza la demanda unitaria de 'Capacity'.
+    """
+    n = matrix.shape[0]
+    manager = pywrapcp.RoutingIndexManager(n, n_vehicles, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    transit_index = routing.RegisterTransitMatrix(np.asarray(matrix, dtype=np.int64).tolist())
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_index)
+
+    if demands is None:
+        max_capacity = capacity_per_vehicle(n, n_vehicles)
+        demands = [0] + [1] * (n - 1)
+    else:
+        max_capacity = demand_capacity(demands, n_vehicles)
+        demands = [0] + [int(d) for d in demands[1:]]
+    if max_capacity is not None:
+        demand_index = routing.RegisterUnaryTransitVector(demands)
+        routing.AddDimensionWithVehicleCapacity(
+            demand_index, 0, [max_capacity] * n_vehicles, True, 'Capacity'
+        )
+
+    return manager, routing
+
+
+def build_sparse_model(model, n_vehicles: int, far_penalty: float = 1.5, native_max_points: int = 0):
+    """Modelo sobre un KnnDistanceModel: costo k-NN, con recargo `far_penalty` fuera de los vecinos.
+
+    Hasta `native_max_points` los costos se precalculan en una matriz de tránsito nativa (OR-Tools
+    no llama a Python por arco); por encima, para no materializar N x N, van por callback con
+    búsqueda en los k vecinos y los arcos lejanos se calculan bajo demanda. El recargo mantiene
+    la búsqueda local en el grafo de vecinos. Devuelve (manager, routing, "matrix"|"callback").
+    """
+    n = model.shape[0]
+    manager = pywrapcp.RoutingIndexManager(n, n_vehicles, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    if n <= native_max_points:
+        transit = "matrix"
+        transit_index = routing.RegisterTransitMatrix(model.cost_matrix(far_penalty).tolist())
+    else:
+        transit = "callback"
+
+        def arc_cost(f, t):
+            return model.cost(manager.IndexToNode(f), manager.IndexToNode(t), far_penalty)
+
+        transit_index = routing.RegisterTransitCallback(arc_cost)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_index)
+
+    max_capacity = capacity_per_vehicle(n, n_vehicles)
+    if max_capacity is not None:
+        demand_index = routing.RegisterUnaryTransitVector([0] + [1] * (n - 1))
+        routing.AddDimensionWithVehicleCapacity(
+            demand_index, 0, [max_capacity] * n_vehicles, True, 'Capacity'
+        )
+
+    return manager, routing, transit
+
+
+def knn_initial_routes(model, n_vehicles: int):
+    """Rutas iniciales por vecino más cercano sobre el grafo k-NN (saltos bajo demanda si se agota)."""
+    n = model.shape[0]
+    capacity = capacity_per_vehicle(n, n_vehicles) or (n - 1)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    routes = []
+    for v in range(n_vehicles):
+        route = []
+        current = 0
+        while len(route) < capacity and not visited.all():
+            nxt = None
+            if current != 0:
+                for j in model.neighbors[current]:
+                    if not visited[j]:
+                        nxt = int(j)
+                        break
+            if nxt is None:
+                pending = np.flatnonzero(~visited)
+                row = model.lookup[np.full(len(pending), current), pending]
+                nxt = int(pending[np.argmin(row)])
+            visited[nxt] = True
+            route.append(nxt)
+            current = nxt
+        routes.append(route)
+    return routes
+
+
+def search_parameters(n_vehicles: int, time_limit_ms: int, first_solution: str = None,
+                      metaheuristic: str = None, gls_lambda: float = None):
+    """Parámetros de búsqueda; las estrategias se pueden forzar por nombre del enum de OR-Tools."""
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    if first_solution is not None:
+        params.first_solution_strategy = getattr(routing_enums_pb2.FirstSolutionStrategy, first_solution)
+    elif n_vehicles > 1:
+        params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
+    else:
+        params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+
+    params.local_search_metaheuristic = getattr(
+        routing_enums_pb2.LocalSearchMetaheuristic, metaheuristic or "GUIDED_LOCAL_SEARCH"
+    )
+    if gls_lambda is not None:
+        params.guided_local_search_lambda_coefficient = gls_lambda
+    params.time_limit.FromMilliseconds(time_limit_ms)
+    params.log_search = False
+    return params
+
+
+def repair_routes(matrix: np.ndarray, routes, n_vehicles: int, demands=None):
+    """Completa rutas previas (solo clientes) hasta una asignación factible para el modelo.
+
+    Descarta nodos repetidos o fuera de rango, recorta cada ruta a la capacidad por vehículo
+    e inserta los nodos faltantes en la posición más barata de una ruta con cupo.
+    Devuelve (rutas, nodos_insertados).
+    """
+    n = matrix.shape[0]
+    if demands is None:
+        weight = [1] * n
+        capacity = capacity_per_vehicle(n, n_vehicles) or n
+    else:
+        weight = [int(d) for d in demands]
+        capacity = demand_capacity(demands, n_vehicles) or sum(weight)
+    seen = set()
+    repaired, loads = [], []
+    for route in list(routes)[:n_vehicles]:
+        clean, load = [], 0
+        for node in route:
+            if 0 < node < n and node not in seen and load + weight[node] <= capacity:
+                clean.append(node)
+                load += weight[node]
+                seen.add(node)
+        repaired.append(clean)
+        loads.append(load)
+    repaired += [[] for _ in range(n_vehicles - len(repaired))]
+    loads += [0] * (n_vehicles - len(loads))
+
+    missing = [node for node in range(1, n) if node not in seen]
+    for node in missing:
+        best = None
+        for v, route in enumerate(repaired):
+            if loads[v] + weight[node] > capacity:
+                continue
+            tour = np.asarray([0] + route + [0], dtype=np.intp)
+            deltas = matrix[tour[:-1], node] + matrix[node, tour[1:]] - matrix[tour[:-1], tour[1:]]
+            pos = int(np.argmin(deltas))
+            if best is None or deltas[pos] < best[0]:
+                best = (deltas[pos], v, pos)
+        _, v, pos = best
+        repaired[v].insert(pos, node)
+        loads[v] += weight[node]
+    return repaired, len(missing)
+
+
+def extract_routes(manager, routing, sol, n_vehicles: int):
+    """Lee las rutas de la asignación como listas de nodos, incluyendo el depósito en ambos extremos."""
+    paths = []
+    for v in range(n_vehicles):
+        idx = routing.Start(v)
+        path = []
+        while not routing.IsEnd(idx):
+            path.append(manager.IndexToNode(idx))
+            idx = sol.Value(routing.NextVar(idx))
+        path.append(manager.IndexToNode(idx))
+        paths.append(path)
+    return paths
+
+
+def current_routes(manager, routing, n_vehicles: int):
+    """Rutas de la solución en curso; solo válido dentro de un callback de solución."""
+    paths = []
+    for v in range(n_vehicles):
+        idx = routing.Start(v)
+        path = []
+        while not routing.IsEnd(idx):
+            path.append(manager.IndexToNode(idx))
+            idx = routing.NextVar(idx).Value()
+        path.append(manager.IndexToNode(idx))
+        paths.append(path)
+    return paths
+
+
+class AnytimeMonitor:
+    """Callback por solución: publica cada mejora y corta la búsqueda cuando se estanca.
+
+    Se detiene si pasan `stall_ms` sin una mejora de al menos `min_improvement_pct` %
+    respecto al último objetivo que sí la logró.
+    """
+
+    def __init__(self, manager, routing, n_vehicles: int, start: float, on_solution=None,
+                 stall_ms=None, min_improvement_pct: float = 0.0):
+        self.manager = manager
+        self.routing = routing
+        self.n_vehicles = n_vehicles
+        self.start = start
+        self.on_solution = on_solution
+        self.stall_ms = stall_ms
+        self.min_improvement_pct = min_improvement_pct
+        self.best = None
+        self.improvements = 0
+        self.first_solution_ms = None
+        self.reference = None
+        self.last_progress_ms = 0.0
+        self.early_stopped = False
+        self.target = None
+        self.target_reached_ms = None
+        self.trace = []
+
+    def __call__(self):
+        objective = self.routing.CostVar().Value()
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        if self.first_solution_ms is None:
+            self.first_solution_ms = elapsed_ms
+
+        if self.best is None or objective < self.best:
+            self.best = objective
+            self.improvements += 1
+            self.trace.append((round(elapsed_ms, 1), objective))
+            if self.on_solution is not None:
+                self.on_solution({
+                    "objective": objective,
+                    "elapsed_ms": round(elapsed_ms, 1),
+                    "routes": current_routes(self.manager, self.routing, self.n_vehicles),
+                })
+            if self.target is not None and self.target_reached_ms is None and objective <= self.target:
+                self.target_reached_ms = elapsed_ms
+            if self.reference is None or objective <= self.reference * (1 - self.min_improvement_pct / 100.0):
+                self.reference = objective
+                self.last_progress_ms = elapsed_ms
+
+        if self.stall_ms is not None and elapsed_ms - self.last_progress_ms >= self.stall_ms:
+            self.early_stopped = True
+            self.routing.solver().FinishCurrentSearch()
+
+
+def search_profile(routing, params, monitor, model_ms: float, solve_time: float) -> dict:
+    """Contadores del solver de OR-Tools y curva objetivo-tiempo de una búsqueda ya terminada."""
+    solver = routing.solver()
+    return {
+        "model_build_ms": round(model_ms, 2),
+        "search_ms": round(solve_time - model_ms, 2),
+        "first_solution_ms": None if monitor.first_solution_ms is None else round(monitor.first_solution_ms, 2),
+        "solutions": solver.Solutions(),
+        "improving_solutions": monitor.improvements,
+        "branches": solver.Branches(),
+        "failures": solver.Failures(),
+        "accepted_neighbors": solver.AcceptedNeighbors(),
+        "first_solution_strategy": routing_enums_pb2.FirstSolutionStrategy.Value.Name(params.first_solution_strategy),
+        "metaheuristic": routing_enums_pb2.LocalSearchMetaheuristic.Value.Name(params.local_search_metaheuristic),
+        "trace": [list(point) for point in monitor.trace],
+    }
+
+
+def format_result(matrix: np.ndarray, paths, n_vehicles: int, cost_kind: str,
+                  solve_time: float, time_limit_ms: int, status, solution_found: bool):
+    kind = COST_KINDS[cost_kind]
+    debug = log.isEnabledFor(logging.DEBUG)
+    routes = []
+    total = 0
+    for v, path in enumerate(paths):
+        nodes = np.asarray(path, dtype=np.intp)
+        cost = int(matrix[nodes[:-1], nodes[1:]].sum()) if len(path) > 1 else 0
+        customers_served = sum(1 for node in path if node != 0)
+        route = {"vehicle": v, "stops": path, kind["route_key"]: cost}
+        if cost_kind == "seconds":
+            route["travel_time_h"] = round(cost / 3600, 2)
+        route["customers_served"] = customers_served
+        routes.append(route)
+        total += cost
+        if debug and customers_served > 0:
+            log.debug("Ruta de vehículo", extra={"fields": {"vehicle": v, "customers": customers_served, kind["route_key"]: cost}})
+
+    result = {"routes": routes, kind["total_key"]: total}
+    if cost_kind == "seconds":
+        result["total_travel_time_h"] = round(total / 3600, 2)
+    result["solution_found"] = solution_found
+    result["solver_info"] = {
+        "actual_solve_time_ms": int(solve_time),
+        "time_limit_used_ms": time_limit_ms,
+        "solver_status": status,
+        "time_limit_reached": solve_time >= time_limit_ms * 0.95
+    }
+
+    if solution_found:
+        active_vehicles = sum(1 for route in routes if len(route["stops"]) > 2)
+        result["active_vehicles"] = active_vehicles
+        result["vehicle_utilization"] = active_vehicles / n_vehicles
+
+    return result
+
+
+def solve_vrp(matrix: np.ndarray, n_vehicles: int, time_limit_ms: int = 4500, cost_kind: str = "meters",
+              on_solution=None, stall_ms=None, min_improvement_pct: float = 0.0,
+              initial_routes=None, target_objective=None, record_trace: bool = False, demands=None,
+              profile: bool = False):
+    """Resuelve el VRP sobre una matriz de costos en metros ('meters') o segundos ('seconds').
+
+    `on_solution` recibe cada solución que mejora el objetivo; `stall_ms` activa el corte
+    temprano por estancamiento (ver AnytimeMonitor). `initial_routes` (nodos cliente por
+    vehículo) arranca la búsqueda desde un plan previo; `target_objective` mide cuánto
+    tarda en igualarse. `record_trace` agrega la curva de convergencia [[ms, objetivo], ...].
+    `demands` (por nodo) pesa cada parada en 'Capacity' en vez de contar 1. `profile` agrega
+    solver_info.profile (ver search_profile); apagado no se registra nada extra.
+    """
+    if cost_kind not in COST_KINDS:
+        raise ValueError(f"cost_kind must be one of {sorted(COST_KINDS)}")
+    label = COST_KINDS[cost_kind]["label"]
+
+    solve_start = time.perf_counter()
+    log.debug(f"Iniciando {label}", extra={"fields": {"points": matrix.shape[0], "vehicles": n_vehicles, "time_limit_ms": time_limit_ms}})
+
+    manager, routing = build_model(matrix, n_vehicles, demands)
+    model_ms = (time.perf_counter() - solve_start) * 1000 if profile else None
+    params = search_parameters(n_vehicles, time_limit_ms)
+
+    monitor = None
+    if on_solution is not None or stall_ms is not None or initial_routes is not None or record_trace or profile:
+        monitor = AnytimeMonitor(manager, routing, n_vehicles, solve_start, on_solution,
+                                 stall_ms, min_improvement_pct)
+        monitor.target = target_objective
+        routing.AddAtSolutionCallback(monitor)
+
+    warm_start = None
+    initial = None
+    if initial_routes is not None:
+        routes, inserted = repair_routes(matrix, initial_routes, n_vehicles, demands)
+        # ReadAssignmentFromRoutes cierra el modelo con los parámetros por defecto (sin GLS) si sigue
+        # abierto, y la búsqueda paraba en el primer óptimo local: se cierra antes con los de la búsqueda
+        routing.CloseModelWithParameters(params)
+        initial = routing.ReadAssignmentFromRoutes(routes, True)
+        warm_start = {
+            "used": initial is not None,
+            "inserted_stops": inserted,
+            "initial_objective": int(sum(
+                matrix[np.asarray([0] + r, dtype=np.intp), np.asarray(r + [0], dtype=np.intp)].sum()
+                for r in routes
+            )),
+            "target_objective": target_objective,
+        }
+
+    if initial is not None:
+        sol = routing.SolveFromAssignmentWithParameters(initial, params)
+    else:
+        sol = routing.SolveWithParameters(params)
+    solve_time = (time.perf_counter() - solve_start) * 1000
+
+    log.debug(f"{label} resuelto", extra={"fields": {
+        "solve_ms": int(solve_time), "time_limit_ms": time_limit_ms, "status": routing.status(), "solution_found": bool(sol)
+    }})
+
+    paths = extract_routes(manager, routing, sol, n_vehicles) if sol else []
+
+    result = format_result(matrix, paths, n_vehicles, cost_kind, solve_time, time_limit_ms,
+                           routing.status(), sol is not None)
+    if monitor is not None:
+        info = result["solver_info"]
+        info["early_stopped"] = monitor.early_stopped
+        info["time_limit_reached"] = info["time_limit_reached"] and not monitor.early_stopped
+        info["improving_solutions"] = monitor.improvements
+        info["first_solution_ms"] = None if monitor.first_solution_ms is None else int(monitor.first_solution_ms)
+        if record_trace:
+            info["convergence"] = [list(point) for point in monitor.trace]
+    if warm_start is not None:
+        warm_start["time_to_match_previous_ms"] = (
+            None if monitor.target_reached_ms is None else int(monitor.target_reached_ms)
+        )
+        result["solver_info"]["warm_start"] = warm_start
+    if profile:
+        result["solver_info"]["profile"] = search_profile(routing, params, monitor, model_ms, solve_time)
+    return result
+
+
+def solve_vrp_sparse(model, n_vehicles: int, time_limit_ms: int = 4500, far_penalty: float = 1.5,
+                     profile: bool = False, native_max_points: int = 0):
+    """VRP en modo disperso (k-NN): arranca de rutas por vecino más cercano y mejora con búsqueda local.
+
+    `native_max_points` es el tamaño hasta el que los costos van en una matriz nativa (ver build_sparse_model).
+    """
+    solve_start = time.perf_counter()
+    n = model.shape[0]
+    log.debug("Iniciando VRP disperso", extra={"fields": {
+        "points": n, "k": int(model.neighbors.shape[1]), "vehicles": n_vehicles, "time_limit_ms": time_limit_ms
+    }})
+
+    manager, routing, transit = build_sparse_model(model, n_vehicles, far_penalty, native_max_points)
+    params = search_parameters(n_vehicles, time_limit_ms)
+    # Igual que en solve_vrp: cerrar con los parámetros propios antes de leer las rutas iniciales (GLS)
+    routing.CloseModelWithParameters(params)
+    initial = routing.ReadAssignmentFromRoutes(knn_initial_routes(model, n_vehicles), True)
+    monitor = None
+    if profile:
+        model_ms = (time.perf_counter() - solve_start) * 1000
+        monitor = AnytimeMonitor(manager, routing, n_vehicles, solve_start)
+        routing.AddAtSolutionCallback(monitor)
+    if initial is not None:
+        sol = routing.SolveFromAssignmentWithParameters(initial, params)
+    else:
+        sol = routing.SolveWithParameters(params)
+    solve_time = (time.perf_counter() - solve_start) * 1000
+
+    log.debug("VRP disperso resuelto", extra={"fields": {"solve_ms": int(solve_time), "time_limit_ms": time_limit_ms}})
+
+    paths = extract_routes(manager, routing, sol, n_vehicles) if sol else []
+    result = format_result(model, paths, n_vehicles, "meters", solve_time, time_limit_ms,
+                           routing.status(), sol is not None)
+    result["solver_info"]["distance_model"] = {
+        "kind": "sparse",
+        "k": int(model.neighbors.shape[1]),
+        "far_penalty": far_penalty,
+        "transit": transit,
+        "model_bytes": int(model.nbytes),
+    }
+    if profile:
+        result["solver_info"]["profile"] = search_profile(routing, params, monitor, model_ms, solve_time)
+    return result
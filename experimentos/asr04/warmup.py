@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from heuristics import solve_fast
+from matrices import haversine_matrix
+from vrp_solver import solve_vrp
+
+log = logging.getLogger(__name__)
+
+
+def warm_up(points: int = 12, vehicles: int = 2, time_limit_ms: int = 50) -> Dict:
+    """Resolución sintética mínima: matriz haversine, modo rápido y OR-Tools sobre una instancia fija.
+
+    La primera resolución de cada proceso paga la inicialización perezosa de OR-Tools y de
+    los caminos de numpy; así la paga el arranque y no la primera solicitud. Devuelve los
+    tiempos por paso en ms.
+    """
+    timings = {}
+    rng = np.random.default_rng(0)
+    coords = np.column_stack([4.65 + rng.uniform(-0.02, 0.02, points), -74.08 + rng.uniform(-0.02, 0.02, points)])
+
+    t = time.perf_counter()
+    matrix = haversine_matrix(coords)
+    timings["matrix_ms"] = round((time.perf_counter() - t) * 1000, 2)
+    t = time.perf_counter()
+    fast = solve_fast(matrix, vehicles, time_limit_ms=time_limit_ms)
+    timings["fast_solve_ms"] = round((time.perf_counter() - t) * 1000, 2)
+    t = time.perf_counter()
+    full = solve_vrp(matrix, vehicles, time_limit_ms=time_limit_ms)
+    timings["solve_ms"] = round((time.perf_counter() - t) * 1000, 2)
+    if not (fast["solution_found"] and full["solution_found"]):
+        raise RuntimeError("warm-up solve found no solution")
+    return timings
+
+
+class Readiness:
+    """Preparación del proceso web: listo solo después de que warm_up terminó bien.
+
+    `run()` calienta en el hilo actual (hook post_fork de gunicorn, o antes de app.run);
+    `start_background()` lo hace en un hilo aparte para servidores sin hook, mientras la
+    sonda de preparación responde 503.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._started = False
+        self._ready = threading.Event()
+        self.pid = None
+        self.timings: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.ready_at = None
+
+    @property
+    def ready(self) -> bool:
+        # Tras un fork el estado heredado del maestro no vale: cada proceso calienta lo suyo
+        return self._ready.is_set() and self.pid == os.getpid()
+
+    def run(self) -> bool:
+        with self._lock:
+            if self.ready:
+                return True
+            self._started = True
+            self.pid = os.getpid()
+            self._ready.clear()
+        start = time.perf_counter()
+        try:
+            timings = warm_up() if self.enabled else {}
+        except Exception as e:
+            self.error = str(e)
+            log.exception("Calentamiento fallido", extra={"fields": {"pid": self.pid}})
+            with self._lock:
+                self._started = False
+            return False
+        self.timings = {**timings, "total_ms": round((time.perf_counter() - start) * 1000, 2), "enabled": self.enabled}
+        self.error = None
+        self.ready_at = time.time()
+        self._ready.set()
+        log.info("Proceso listo", extra={"fields": {"pid": self.pid, **self.timings}})
+        return True
+
+    def start_background(self):
+        with self._lock:
+            if self.ready or (self._started and self.pid == os.getpid()):
+                return
+            self._started = True
+            self.pid = os.getpid()
+        threading.Thread(target=self.run, name="warm-up", daemon=True).start()
+
+    def view(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "pid": os.getpid(),
+            "warm_up": self.timings if self.ready else None,
+            "ready_at": self.ready_at if self.ready else None,
+            "error": self.error,
+        }